@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Embedding Coalescer Benchmark
+
+Sends single-chunk embedding requests (what OpenWebUI does while indexing a
+document) to the Ollama stub directly and through embed_coalescer/, at
+several concurrency levels, and reports throughput, latency and the batch
+sizes the coalescer produced.
+
+Each worker is closed-loop: it sends one /api/embed request with one chunk,
+waits for the vector and sends the next. The stub charges a fixed cost per
+call (embed_overhead_ms) plus prefill time per token and serves
+max_concurrency calls at once, so the direct run shows the per-call overhead
+and the coalesced run shows what batching recovers.
+
+Usage:
+    python stub_provider.py --profile ollama --port 11434 &
+    python ../embed_coalescer/embed_coalescer.py --upstream http://localhost:11434 --port 8090 &
+    python embed_coalescer_bench.py --direct http://localhost:11434 --coalescer http://localhost:8090 \\
+        --concurrency 1,8,32,64 --duration 20
+"""
+
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import aiohttp
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from loadgen import QUESTIONS, RunSummary, parse_levels  # noqa: E402
+
+
+def fake_chunk(rng: random.Random) -> str:
+    # ~500 characters, the size of an OpenWebUI chunk with the default splitter
+    return " ".join(rng.choice(QUESTIONS) for _ in range(8))[:500]
+
+
+async def get_stats(session: aiohttp.ClientSession, base_url: str) -> Optional[Dict]:
+    try:
+        async with session.get(base_url.rstrip("/") + "/stats") as response:
+            return await response.json() if response.status == 200 else None
+    except aiohttp.ClientError:
+        return None
+
+
+async def run_level(base_url: str, model: str, concurrency: int, duration: float, timeout: float,
+                    seed: int) -> Dict:
+    url = base_url.rstrip("/") + "/api/embed"
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    deadline = time.perf_counter() + duration
+
+    async def worker(session: aiohttp.ClientSession, index: int) -> None:
+        rng = random.Random(seed * 1000 + index)
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                async with session.post(url, json={"model": model, "input": fake_chunk(rng)}) as response:
+                    data = await response.json(content_type=None)
+                    status = response.status if len(data.get("embeddings") or []) == 1 else -3
+            except asyncio.TimeoutError:
+                status = -1
+            except aiohttp.ClientError:
+                status = -2
+            if status == 200:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors[str(status)] = errors.get(str(status), 0) + 1
+
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        before = await get_stats(session, base_url)
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(session, i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        after = await get_stats(session, base_url)
+
+    p50, p95 = RunSummary._percentile(latencies, 50), RunSummary._percentile(latencies, 95)
+    row = {
+        "concurrency": concurrency,
+        "ok": len(latencies),
+        "embeddings_per_s": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "latency_p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+        "latency_p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+        "errors": errors,
+    }
+    if before and after and "batches" in after:
+        # Coalescer: batches sent upstream during this level
+        batches = after["batches"] - before["batches"]
+        inputs = after["inputs"] - before["inputs"]
+        row["upstream_calls"] = batches
+        row["mean_batch"] = round(inputs / batches, 1) if batches else None
+    elif before and after:
+        row["upstream_calls"] = after["served"] - before["served"]
+        row["mean_batch"] = 1.0
+    return row
+
+
+async def sweep(targets: Dict[str, str], args) -> List[Dict]:
+    rows = []
+    for concurrency in args.concurrency:
+        for target, base_url in targets.items():
+            row = {"target": target, **await run_level(base_url, args.model, concurrency, args.duration,
+                                                       args.timeout, args.seed)}
+            rows.append(row)
+            if not args.json:
+                print(f"[INFO] {target} concurrency={concurrency}: {row['embeddings_per_s']} emb/s, "
+                      f"p95 {row['latency_p95_ms']} ms", file=sys.stderr)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare direct Ollama embedding calls with the coalescer")
+    parser.add_argument("--direct", default="http://localhost:11434", help="Ollama stub (or a real Ollama)")
+    parser.add_argument("--coalescer", default="http://localhost:8090", help="embed_coalescer in front of it")
+    parser.add_argument("--model", default="bge-m3")
+    parser.add_argument("--concurrency", type=parse_levels, default=[1, 8, 32, 64])
+    parser.add_argument("--duration", type=float, default=20, help="Seconds per level and target")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    targets = {name: url for name, url in (("direct", args.direct), ("coalesced", args.coalescer)) if url}
+    rows = asyncio.run(sweep(targets, args))
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+    columns = ["target", "concurrency", "ok", "embeddings_per_s", "latency_p50_ms", "latency_p95_ms",
+               "upstream_calls", "mean_batch", "errors"]
+    widths = {c: max(len(c), *(len(str(r.get(c, ""))) for r in rows)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    for row in rows:
+        print("  ".join(str(row.get(c, "")).ljust(widths[c]) for c in columns))
+
+
+if __name__ == "__main__":
+    main()
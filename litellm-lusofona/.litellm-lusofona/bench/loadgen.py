@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Lusochat Proxy Load Generator
+
+Closed-loop asyncio load generator for any OpenAI-compatible endpoint (the
+LiteLLM proxy, or a stub provider directly). Each of N virtual users sends a
+chat completion, waits for the full answer and immediately sends the next one,
+so N is the number of concurrent chats.
+
+Reported per concurrency level:
+    throughput      successful requests/s and output tokens/s
+    TTFT            time to first content chunk (streaming only), p50/p95/p99
+    latency         full request latency, p50/p95/p99
+    errors          count per HTTP status (429 = throttled end to end)
+
+Usage:
+    python loadgen.py --base-url http://localhost:4001 --api-key sk-bench \\
+        --model bench-chat --concurrency 1,8,32 --duration 60
+    python loadgen.py --model bench-chat --no-stream --requests 200 --json
+"""
+
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import aiohttp
+
+# Lusobot-like questions: short, varied, Portuguese
+QUESTIONS = [
+    "Quais são as propinas do mestrado em Engenharia Informática?",
+    "Como faço a candidatura para maiores de 23 anos?",
+    "Qual é o horário da secretaria durante as férias?",
+    "Que documentos preciso para pedir equivalências?",
+    "Existe residência universitária para estudantes deslocados?",
+    "Quando abrem as inscrições para a segunda fase?",
+    "Como posso pedir o estatuto de trabalhador-estudante?",
+    "A licenciatura em Psicologia tem regime pós-laboral?",
+]
+
+
+@dataclass
+class RequestResult:
+    status: int
+    latency: float
+    ttft: Optional[float] = None
+    output_tokens: int = 0
+
+
+@dataclass
+class RunSummary:
+    concurrency: int
+    duration: float
+    results: List[RequestResult] = field(default_factory=list)
+
+    @staticmethod
+    def _percentile(values: List[float], pct: float) -> Optional[float]:
+        if not values:
+            return None
+        values = sorted(values)
+        k = (len(values) - 1) * pct / 100
+        lower = int(k)
+        upper = min(lower + 1, len(values) - 1)
+        return values[lower] + (values[upper] - values[lower]) * (k - lower)
+
+    def as_dict(self) -> Dict:
+        ok = [r for r in self.results if r.status == 200]
+        ttfts = [r.ttft for r in ok if r.ttft is not None]
+        latencies = [r.latency for r in ok]
+        summary = {
+            "concurrency": self.concurrency,
+            "duration_s": round(self.duration, 2),
+            "requests": len(self.results),
+            "ok": len(ok),
+            "errors": dict(Counter(str(r.status) for r in self.results if r.status != 200)),
+            "throughput_rps": round(len(ok) / self.duration, 3) if self.duration else 0.0,
+            "output_tokens_per_s": round(sum(r.output_tokens for r in ok) / self.duration, 1) if self.duration else 0.0,
+        }
+        for name, values in (("ttft", ttfts), ("latency", latencies)):
+            for pct in (50, 95, 99):
+                value = self._percentile(values, pct)
+                summary[f"{name}_p{pct}_ms"] = round(value * 1000, 1) if value is not None else None
+        return summary
+
+
+async def one_request(session: aiohttp.ClientSession, url: str, headers: Dict[str, str],
+                      model: str, stream: bool, max_tokens: int, timeout: float) -> RequestResult:
+    payload = {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": "És o Lusobot, assistente da Universidade Lusófona."},
+            {"role": "user", "content": random.choice(QUESTIONS)},
+        ],
+        "max_tokens": max_tokens,
+        "stream": stream,
+    }
+    if stream:
+        payload["stream_options"] = {"include_usage": True}
+
+    started = time.perf_counter()
+    ttft = None
+    output_tokens = 0
+    try:
+        async with session.post(url, json=payload, headers=headers,
+                                timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            if response.status != 200:
+                await response.read()
+                return RequestResult(response.status, time.perf_counter() - started)
+            if not stream:
+                body = await response.json()
+                output_tokens = (body.get("usage") or {}).get("completion_tokens", 0)
+                return RequestResult(200, time.perf_counter() - started, None, output_tokens)
+
+            chunks = 0
+            async for raw in response.content:
+                line = raw.decode("utf-8", "ignore").strip()
+                if not line.startswith("data:") or line == "data: [DONE]":
+                    continue
+                event = json.loads(line[5:])
+                usage = event.get("usage")
+                if usage:
+                    output_tokens = usage.get("completion_tokens", output_tokens)
+                for choice in event.get("choices") or []:
+                    if (choice.get("delta") or {}).get("content"):
+                        if ttft is None:
+                            ttft = time.perf_counter() - started
+                        chunks += 1
+            return RequestResult(200, time.perf_counter() - started, ttft, output_tokens or chunks)
+    except asyncio.TimeoutError:
+        return RequestResult(-1, time.perf_counter() - started)
+    except aiohttp.ClientError:
+        return RequestResult(-2, time.perf_counter() - started)
+
+
+async def run_level(base_url: str, api_key: str, model: str, concurrency: int, duration: Optional[float],
+                    total_requests: Optional[int], stream: bool, max_tokens: int, timeout: float) -> RunSummary:
+    """Run `concurrency` virtual users for `duration` seconds or `total_requests` requests."""
+    url = base_url.rstrip("/") + "/v1/chat/completions"
+    headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+    results: List[RequestResult] = []
+    remaining = [total_requests]
+    deadline = time.perf_counter() + duration if duration else None
+
+    def more() -> bool:
+        if deadline is not None and time.perf_counter() >= deadline:
+            return False
+        if remaining[0] is not None:
+            if remaining[0] <= 0:
+                return False
+            remaining[0] -= 1
+        return True
+
+    async def user(session):
+        while more():
+            results.append(await one_request(session, url, headers, model, stream, max_tokens, timeout))
+
+    connector = aiohttp.TCPConnector(limit=0)
+    started = time.perf_counter()
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*(user(session) for _ in range(concurrency)))
+    return RunSummary(concurrency, time.perf_counter() - started, results)
+
+
+def print_table(rows: List[Dict], label_keys: List[str] = ()) -> None:
+    columns = list(label_keys) + [
+        "concurrency", "ok", "requests", "throughput_rps", "output_tokens_per_s",
+        "ttft_p50_ms", "ttft_p95_ms", "ttft_p99_ms", "latency_p50_ms", "latency_p95_ms", "latency_p99_ms", "errors",
+    ]
+    widths = {c: max(len(c), *(len(str(r.get(c, ""))) for r in rows)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    for row in rows:
+        print("  ".join(str(row.get(c, "")).ljust(widths[c]) for c in columns))
+
+
+async def sweep(args) -> List[Dict]:
+    rows = []
+    for concurrency in args.concurrency:
+        summary = await run_level(args.base_url, args.api_key, args.model, concurrency, args.duration,
+                                  args.requests, not args.no_stream, args.max_tokens, args.timeout)
+        row = summary.as_dict()
+        rows.append(row)
+        if not args.json:
+            print(f"[INFO] concurrency={concurrency}: {row['ok']}/{row['requests']} ok, "
+                  f"{row['throughput_rps']} req/s, ttft p95 {row['ttft_p95_ms']} ms", file=sys.stderr)
+    return rows
+
+
+def parse_levels(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Closed-loop load generator for the LiteLLM proxy")
+    parser.add_argument("--base-url", default="http://localhost:4001", help="Proxy URL (bench profile: 4001)")
+    parser.add_argument("--api-key", default="sk-bench", help="Bearer token for the proxy")
+    parser.add_argument("--model", default="bench-chat", help="Model group to request")
+    parser.add_argument("--concurrency", type=parse_levels, default=[1, 8, 32], help="Comma-separated levels")
+    parser.add_argument("--duration", type=float, default=60, help="Seconds per level (ignored with --requests)")
+    parser.add_argument("--requests", type=int, default=None, help="Stop each level after this many requests")
+    parser.add_argument("--max-tokens", type=int, default=128)
+    parser.add_argument("--timeout", type=float, default=120, help="Per-request timeout in seconds")
+    parser.add_argument("--no-stream", action="store_true", help="Non-streaming requests (no TTFT)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    if args.requests:
+        args.duration = None
+    rows = asyncio.run(sweep(args))
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print_table(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Prefix Cache Layout Benchmark
+
+Replays multi-turn Lusobot chats against a llama.cpp endpoint (normally the
+`llamacpp` stub profile) in three layouts and reports how much of the prompt
+had to be prefilled:
+
+    openwebui   what OpenWebUI sends today: RAG/web context prepended to the
+                system prompt, no slot pinning
+    canonical   hooks/prompt_layout.py order (static system prompt, context,
+                history) with cache_prompt
+    pinned      canonical + id_slot per chat, as hooks/prefix_cache.py sends it
+    pinned-history
+                pinned with context_position=last_user: the context moves
+                after the history, so earlier turns stay cached too
+
+Every turn gets fresh retrieved context, as with RAG or web search on. Prefill
+and cache numbers come from the llama.cpp "timings" of each response.
+
+Usage:
+    python stub_provider.py --profile llamacpp --port 8080 &
+    python prefix_cache_bench.py --base-url http://localhost:8080 --chats 8 --turns 4
+    python prefix_cache_bench.py --system-prompt \\
+        ../../lusochat-openwebui/openwebui-functions/lusobot-prompts/lusobot_system_prompt_qn3_8b.md
+"""
+
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+from pathlib import Path
+from typing import Dict, List
+
+import aiohttp
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from hooks.prompt_layout import canonical_layout, compile_patterns, slot_for  # noqa: E402
+from loadgen import QUESTIONS, RunSummary  # noqa: E402
+
+# OpenWebUI's default RAG template, filled with a made-up source
+RAG_TEMPLATE = """### Task:
+Respond to the user query using the provided context, incorporating inline citations in the format [id].
+
+<context>
+{context}
+</context>
+"""
+
+LAYOUTS = ["openwebui", "canonical", "pinned", "pinned-history"]
+
+
+def fake_system_prompt() -> str:
+    lines = [f"- Regra {i}: responde em PT-PT, com links oficiais da Universidade Lusófona quando existirem."
+             for i in range(60)]
+    return "# LusoBot (System Prompt)\n\n" + "\n".join(lines)
+
+
+def fake_context(rng: random.Random) -> str:
+    sources = []
+    for i in range(3):
+        words = " ".join(rng.choice(["propinas", "candidatura", "prazo", "regulamento", "curso", "mestrado",
+                                     "secretaria", "bolsa", "matrícula", "calendário"]) for _ in range(80))
+        sources.append(f'<source id="{i + 1}" name="https://www.ulusofona.pt/p{rng.randint(1, 999)}">{words}</source>')
+    return "\n".join(sources)
+
+
+def build_messages(layout: str, system_prompt: str, history: List[Dict], question: str, context: str,
+                   patterns) -> List[Dict]:
+    rag = RAG_TEMPLATE.format(context=context)
+    # OpenWebUI with RAG in the system message prepends the filled template
+    messages = [{"role": "system", "content": f"{rag}\n{system_prompt}"}] + history + [
+        {"role": "user", "content": question}
+    ]
+    if layout == "openwebui":
+        return messages
+    position = "last_user" if layout == "pinned-history" else "system"
+    return canonical_layout(messages, patterns, position)[0]
+
+
+async def chat(session, url: str, layout: str, chat_index: int, turns: int, system_prompt: str,
+               max_tokens: int, slots: int, patterns, results: list, seed: int) -> None:
+    rng = random.Random(seed * 1000 + chat_index)
+    history: List[Dict] = []
+    for _turn in range(turns):
+        question = rng.choice(QUESTIONS)
+        messages = build_messages(layout, system_prompt, history, question, fake_context(rng), patterns)
+        payload = {"model": "bench", "messages": messages, "max_tokens": max_tokens, "stream": True}
+        if layout != "openwebui":
+            payload["cache_prompt"] = True  # what extra_body adds on the wire
+        if layout.startswith("pinned"):
+            payload["id_slot"] = slot_for(f"chat-{chat_index}", slots)
+
+        started = time.perf_counter()
+        ttft, answer, timings = None, [], {}
+        async with session.post(url, json=payload) as response:
+            async for raw in response.content:
+                line = raw.decode("utf-8", "ignore").strip()
+                if not line.startswith("data:") or line == "data: [DONE]":
+                    continue
+                event = json.loads(line[5:])
+                timings = event.get("timings") or timings
+                for choice in event.get("choices") or []:
+                    content = (choice.get("delta") or {}).get("content")
+                    if content:
+                        ttft = ttft if ttft is not None else time.perf_counter() - started
+                        answer.append(content)
+        results.append((ttft, time.perf_counter() - started, timings))
+        history += [{"role": "user", "content": question}, {"role": "assistant", "content": "".join(answer)}]
+
+
+async def run_layout(base_url: str, layout: str, chats: int, turns: int, system_prompt: str,
+                     max_tokens: int, slots: int, seed: int) -> Dict:
+    url = base_url.rstrip("/") + "/v1/chat/completions"
+    patterns = compile_patterns()
+    results: list = []
+    async with aiohttp.ClientSession() as session:
+        async with session.post(base_url.rstrip("/") + "/stub/state", json={"reset_cache": True}) as response:
+            if response.status != 200:
+                print("[WARNING] Not a stub provider: slot caches were not reset between layouts", file=sys.stderr)
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            chat(session, url, layout, i, turns, system_prompt, max_tokens, slots, patterns, results, seed)
+            for i in range(chats)
+        ))
+        duration = time.perf_counter() - started
+
+    prefilled = sum(t.get("prompt_n", 0) for _, _, t in results)
+    cached = sum(t.get("cache_n", 0) for _, _, t in results)
+    ttfts = [ttft for ttft, _, _ in results if ttft is not None]
+    p50, p95 = RunSummary._percentile(ttfts, 50), RunSummary._percentile(ttfts, 95)
+    return {
+        "layout": layout,
+        "requests": len(results),
+        "prefilled_tokens": prefilled,
+        "cached_tokens": cached,
+        "cache_ratio": round(cached / (prefilled + cached), 3) if prefilled + cached else 0.0,
+        "ttft_p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+        "ttft_p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+        "duration_s": round(duration, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare prompt layouts for llama.cpp prefix caching")
+    parser.add_argument("--base-url", default="http://localhost:8080", help="llama.cpp server or llamacpp stub")
+    parser.add_argument("--system-prompt", type=Path, default=None, help="System prompt file (default: ~5 KB filler)")
+    parser.add_argument("--chats", type=int, default=8, help="Concurrent chats")
+    parser.add_argument("--turns", type=int, default=4, help="Turns per chat")
+    parser.add_argument("--slots", type=int, default=4, help="llama-server --parallel")
+    parser.add_argument("--max-tokens", type=int, default=64)
+    parser.add_argument("--layouts", default=",".join(LAYOUTS))
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    system_prompt = args.system_prompt.read_text(encoding="utf-8") if args.system_prompt else fake_system_prompt()
+    rows = [
+        asyncio.run(run_layout(args.base_url, layout.strip(), args.chats, args.turns, system_prompt,
+                               args.max_tokens, args.slots, args.seed))
+        for layout in args.layouts.split(",") if layout.strip()
+    ]
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+    columns = list(rows[0])
+    widths = {c: max(len(c), *(len(str(r[c])) for r in rows)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    for row in rows:
+        print("  ".join(str(row[c]).ljust(widths[c]) for c in columns))
+
+
+if __name__ == "__main__":
+    main()
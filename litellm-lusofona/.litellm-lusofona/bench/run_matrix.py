@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Routing Strategy x Replica Benchmark
+
+Runs loadgen.py against the `bench` compose profile once per combination of
+LiteLLM routing strategy and proxy worker count, restarting the proxy and the
+stub providers in between so every run starts with empty rate-limit windows.
+
+For each combination:
+1. Write generated/router.yaml with the routing strategy
+2. Recreate litellm-bench with BENCH_NUM_WORKERS=<workers>
+3. Wait for /health/liveliness, then sweep the concurrency levels
+
+Results are printed as one table and saved to results/matrix-<timestamp>.json.
+
+--scenario fallbacks measures the chains from generate_fallbacks.py instead:
+stub-groq is throttled to --throttle-rpm (BENCH_GROQ_RPM), and --fallback-model
+is loaded once without fallbacks and once with the chain generated from
+bench/models/ (same policy as production). The table reports the served rpm
+of both runs and which stub served the requests.
+
+Usage (from the directory with docker-compose.yml, or pass --compose-dir):
+    python bench/run_matrix.py --strategies simple-shuffle,least-busy --workers 1,4
+    python bench/run_matrix.py --render-only --strategies least-busy   # just write the router file
+    python bench/run_matrix.py --scenario fallbacks --throttle-rpm 10 --concurrency 4,16 --duration 120 \
+        --compose-dir ../litellm-upstream      # from .litellm-lusofona: needs generate_fallbacks.py
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import subprocess
+import urllib.request
+from dataclasses import replace
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import yaml
+
+from loadgen import parse_levels, print_table, run_level
+
+BENCH_DIR = Path(__file__).resolve().parent
+ROUTER_FILE = BENCH_DIR / "generated" / "router.yaml"
+RESULTS_DIR = BENCH_DIR / "results"
+STUB_SERVICES = ["stub-groq", "stub-sambanova", "stub-ollama"]
+
+STRATEGIES = ["simple-shuffle", "least-busy", "latency-based-routing", "usage-based-routing-v2"]
+
+
+def render_router(strategy: str, fallbacks: Optional[Dict[str, List[str]]] = None) -> None:
+    """Write the router settings for one run (shared Redis so workers agree on usage)."""
+    ROUTER_FILE.parent.mkdir(parents=True, exist_ok=True)
+    settings = {"router_settings": {
+        "routing_strategy": strategy,
+        "redis_host": "redis",
+        "redis_port": 6379,
+        "redis_password": os.environ.get("REDIS_PASSWORD", "your_redis_password"),
+        "timeout": 30,
+        "num_retries": 2,
+    }}
+    if fallbacks:
+        settings["router_settings"]["fallbacks"] = [{name: chain} for name, chain in sorted(fallbacks.items())]
+    header = f"# Generated by run_matrix.py for routing strategy {strategy} - do not edit\n"
+    ROUTER_FILE.write_text(header + yaml.safe_dump(settings, sort_keys=False), encoding="utf-8")
+
+
+def compose(compose_dir: Path, *args: str, env=None) -> None:
+    command = ["docker", "compose", "--profile", "bench", *args]
+    print(f"[INFO] Running: {' '.join(command)}", file=sys.stderr)
+    result = subprocess.run(command, cwd=compose_dir, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"[ERROR] {result.stderr.strip()}", file=sys.stderr)
+        sys.exit(1)
+
+
+def bench_fallbacks() -> Dict[str, List[str]]:
+    """Chains generate_fallbacks.py builds for the single-provider bench groups."""
+    sys.path.insert(0, str(BENCH_DIR.parent))
+    try:
+        from generate_fallbacks import POLICY_FILE, FallbackPolicy, build_fallbacks, chat_candidates
+        from model_catalog import load_model_catalog
+    except ImportError as e:
+        print(f"[ERROR] {e}: run the fallbacks scenario from the .litellm-lusofona checkout "
+              f"(--compose-dir ../litellm-upstream)", file=sys.stderr)
+        sys.exit(1)
+    policy = FallbackPolicy.load(POLICY_FILE)
+    policy = replace(policy, exclude_patterns=policy.exclude_patterns + ("bench-chat",), pinned=None)
+    return build_fallbacks(chat_candidates(load_model_catalog(BENCH_DIR / "models"), policy), policy)
+
+
+def stub_stats(compose_dir: Path, service: str) -> Dict:
+    """GET /stats of a stub from inside its container (the stubs publish no ports)."""
+    script = "import urllib.request; print(urllib.request.urlopen('http://localhost:8000/stats').read().decode())"
+    result = subprocess.run(["docker", "compose", "--profile", "bench", "exec", "-T", service, "python", "-c", script],
+                            cwd=compose_dir, capture_output=True, text=True)
+    try:
+        return json.loads(result.stdout)
+    except ValueError:
+        return {}
+
+
+def run_fallback_scenario(args) -> List[Dict]:
+    chains = bench_fallbacks()
+    chain = chains.get(args.fallback_model)
+    if not chain:
+        print(f"[ERROR] No generated chain for {args.fallback_model}", file=sys.stderr)
+        sys.exit(1)
+    print(f"[INFO] Chain: {' -> '.join([args.fallback_model] + chain)}", file=sys.stderr)
+    env = {**os.environ, "BENCH_GROQ_RPM": str(args.throttle_rpm), "BENCH_NUM_WORKERS": "1"}
+
+    rows = []
+    for label, fallbacks in (("no fallbacks", None), ("generated chain", chains)):
+        render_router("simple-shuffle", fallbacks)
+        for concurrency in args.concurrency:
+            # Fresh stubs (empty rpm windows and counters) and a proxy that re-reads the router file
+            compose(args.compose_dir, "up", "-d", "--force-recreate", *STUB_SERVICES, env=env)
+            compose(args.compose_dir, "up", "-d", "--force-recreate", "--no-deps", "litellm-bench", env=env)
+            wait_healthy(args.base_url)
+            summary = asyncio.run(run_level(args.base_url, args.api_key, args.fallback_model, concurrency,
+                                            args.duration, None, True, args.max_tokens, 120))
+            result = summary.as_dict()
+            row = {
+                "scenario": label,
+                "concurrency": concurrency,
+                "ok": result["ok"],
+                "requests": result["requests"],
+                "served_rpm": round(result["ok"] / result["duration_s"] * 60, 1) if result["duration_s"] else 0.0,
+                "latency_p95_ms": result["latency_p95_ms"],
+                "errors": result["errors"],
+            }
+            for service in STUB_SERVICES:
+                row[service] = stub_stats(args.compose_dir, service).get("served", "?")
+            rows.append(row)
+            print(f"[INFO] {label} @ {concurrency}: {row['served_rpm']} rpm served, errors {row['errors']}",
+                  file=sys.stderr)
+    return rows
+
+
+def wait_healthy(base_url: str, timeout: float = 180) -> None:
+    url = base_url.rstrip("/") + "/health/liveliness"
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=5) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            pass
+        time.sleep(2)
+    print(f"[ERROR] litellm-bench not healthy after {timeout:.0f}s ({url})", file=sys.stderr)
+    sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark LiteLLM routing strategies and worker counts")
+    parser.add_argument("--strategies", default="simple-shuffle,least-busy,latency-based-routing",
+                        help=f"Comma-separated, from: {', '.join(STRATEGIES)}")
+    parser.add_argument("--workers", type=parse_levels, default=[1, 4], help="Comma-separated proxy worker counts")
+    parser.add_argument("--concurrency", type=parse_levels, default=[8, 32, 64])
+    parser.add_argument("--duration", type=float, default=60, help="Seconds per concurrency level")
+    parser.add_argument("--model", default="bench-chat")
+    parser.add_argument("--max-tokens", type=int, default=128)
+    parser.add_argument("--base-url", default="http://localhost:4001")
+    parser.add_argument("--api-key", default="sk-bench")
+    parser.add_argument("--compose-dir", type=Path, default=BENCH_DIR.parent,
+                        help="Directory with docker-compose.yml")
+    parser.add_argument("--render-only", action="store_true", help="Write generated/router.yaml and exit")
+    parser.add_argument("--scenario", choices=["routing", "fallbacks"], default="routing")
+    parser.add_argument("--fallback-model", default="bench-groq-8b", help="Fallbacks scenario: model group to load")
+    parser.add_argument("--throttle-rpm", type=int, default=10, help="Fallbacks scenario: stub-groq rpm limit")
+    args = parser.parse_args()
+
+    if args.scenario == "fallbacks":
+        compose(args.compose_dir, "build", *STUB_SERVICES)
+        rows = run_fallback_scenario(args)
+        columns = ["scenario", "concurrency", "ok", "requests", "served_rpm", "latency_p95_ms", "errors",
+                   *STUB_SERVICES]
+        widths = {c: max(len(c), *(len(str(r.get(c, ""))) for r in rows)) for c in columns}
+        print("  ".join(c.ljust(widths[c]) for c in columns))
+        for row in rows:
+            print("  ".join(str(row.get(c, "")).ljust(widths[c]) for c in columns))
+        RESULTS_DIR.mkdir(exist_ok=True)
+        out = RESULTS_DIR / f"fallbacks-{datetime.now():%Y%m%d-%H%M%S}.json"
+        out.write_text(json.dumps(rows, indent=2), encoding="utf-8")
+        print(f"\n[SUCCESS] Results saved to {out}")
+        return
+
+    strategies = [s.strip() for s in args.strategies.split(",") if s.strip()]
+    unknown = [s for s in strategies if s not in STRATEGIES]
+    if unknown:
+        parser.error(f"unknown routing strategy: {', '.join(unknown)}")
+
+    if args.render_only:
+        render_router(strategies[0])
+        print(f"[SUCCESS] Wrote {ROUTER_FILE}")
+        return
+
+    compose(args.compose_dir, "up", "-d", "--build", "redis", *STUB_SERVICES)
+    rows = []
+    for strategy in strategies:
+        render_router(strategy)
+        for workers in args.workers:
+            env = {**os.environ, "BENCH_NUM_WORKERS": str(workers)}
+            compose(args.compose_dir, "restart", *STUB_SERVICES)
+            compose(args.compose_dir, "up", "-d", "--force-recreate", "--no-deps", "litellm-bench", env=env)
+            wait_healthy(args.base_url)
+            for concurrency in args.concurrency:
+                summary = asyncio.run(run_level(args.base_url, args.api_key, args.model, concurrency,
+                                                args.duration, None, True, args.max_tokens, 120))
+                row = {"strategy": strategy, "workers": workers, **summary.as_dict()}
+                rows.append(row)
+                print(f"[INFO] {strategy} x{workers} @ {concurrency}: {row['throughput_rps']} req/s, "
+                      f"ttft p95 {row['ttft_p95_ms']} ms, errors {row['errors']}", file=sys.stderr)
+
+    print_table(rows, ["strategy", "workers"])
+    RESULTS_DIR.mkdir(exist_ok=True)
+    out = RESULTS_DIR / f"matrix-{datetime.now():%Y%m%d-%H%M%S}.json"
+    out.write_text(json.dumps(rows, indent=2), encoding="utf-8")
+    print(f"\n[SUCCESS] Results saved to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+"""
+Stub Upstream Provider for Load Tests
+
+An OpenAI-compatible server that behaves like one of our upstream providers
+without spending real tokens or GPU time. Latency, token rate, rate limits and
+queueing follow a provider profile, so the LiteLLM proxy under test sees the
+same shape of traffic it sees in production.
+
+Profiles (override any value with the STUB_* environment variables):
+    groq       fast prefill and decode, 30 rpm free-tier limit -> 429s
+    sambanova  slower first token, 20 rpm limit -> 429s
+    ollama     on-prem GPU box: no rate limit, but only a few requests run
+               at once; the rest queue and their TTFT grows
+    llamacpp   llama-server with --parallel slots and a per-slot prompt (KV)
+               cache: only the part of the prompt after the longest common
+               prefix with the slot's previous sequence is prefilled.
+               Honours cache_prompt and id_slot like llama.cpp; without
+               id_slot an idle slot is picked by prompt similarity (>= 0.5)
+               or least recently used
+
+Endpoints:
+    POST /v1/chat/completions   streaming (SSE) and non-streaming
+    POST /v1/embeddings         deterministic vectors (Ollama profile dims)
+    GET  /v1/models, /health    liveness (llama.cpp-style /health, 503 when down)
+    GET  /metrics               llama.cpp gauges (requests_processing/deferred)
+    GET  /api/ps                Ollama-style loaded models (health prober)
+    GET  /stats                 counters since start (served, 429s, queue)
+    POST /stub/state            {"down": true} or {"extra_latency_ms": 3000} to
+                                simulate a dead or busy box; {"reset_cache": true}
+                                empties the llamacpp slot caches
+
+Chat responses carry llama.cpp-style "timings" (prompt_n = prefilled tokens,
+cache_n = tokens reused from the slot cache).
+
+Usage:
+    python stub_provider.py --profile groq --port 8000
+    STUB_RPM=0 STUB_TTFT_MS=50 python stub_provider.py --profile ollama
+"""
+
+import os
+import json
+import time
+import uuid
+import random
+import asyncio
+import hashlib
+import argparse
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, fields
+
+from aiohttp import web
+
+
+@dataclass
+class StubProfile:
+    ttft_ms: float                    # first token latency for an empty prompt
+    prefill_tokens_per_second: float  # prompt processing speed (adds to TTFT)
+    tokens_per_second: float          # decode speed
+    output_tokens: int                # completion length when max_tokens is not set
+    rpm: int                          # 0 = unlimited
+    max_concurrency: int              # 0 = unlimited; excess requests queue
+    jitter: float = 0.2               # +/- fraction applied to every delay
+    embedding_dims: int = 1024
+    prefix_cache: bool = False        # llama.cpp slots: max_concurrency = --parallel
+    embed_overhead_ms: float = 0.0    # fixed cost of one embedding call; 0 = ttft_ms
+    embed_tokens_per_second: float = 0.0  # embedding model speed; 0 = prefill_tokens_per_second
+
+
+PROFILES = {
+    "groq": StubProfile(ttft_ms=150, prefill_tokens_per_second=20000, tokens_per_second=500,
+                        output_tokens=256, rpm=30, max_concurrency=0),
+    "sambanova": StubProfile(ttft_ms=350, prefill_tokens_per_second=8000, tokens_per_second=250,
+                             output_tokens=256, rpm=20, max_concurrency=0),
+    "ollama": StubProfile(ttft_ms=250, prefill_tokens_per_second=1500, tokens_per_second=40,
+                          output_tokens=256, rpm=0, max_concurrency=2,
+                          embed_overhead_ms=25, embed_tokens_per_second=10000),
+    "llamacpp": StubProfile(ttft_ms=40, prefill_tokens_per_second=1500, tokens_per_second=45,
+                            output_tokens=256, rpm=0, max_concurrency=4, prefix_cache=True),
+}
+
+
+def load_profile(name: str) -> StubProfile:
+    """Return the named profile with STUB_<FIELD> environment overrides applied."""
+    profile = PROFILES[name]
+    overrides = {}
+    for f in fields(StubProfile):
+        value = os.environ.get(f"STUB_{f.name.upper()}")
+        if value is None:
+            continue
+        current = getattr(profile, f.name)
+        if isinstance(current, bool):
+            overrides[f.name] = value.strip().lower() in ("1", "true", "yes")
+        else:
+            overrides[f.name] = type(current)(value)
+    return StubProfile(**{**profile.__dict__, **overrides})
+
+
+def estimate_tokens(text: str) -> int:
+    # Close enough to a BPE tokenizer for sizing delays
+    return max(1, len(text) // 4)
+
+
+def prompt_text(messages) -> str:
+    parts = []
+    for message in messages or []:
+        content = message.get("content")
+        if isinstance(content, str):
+            parts.append(content)
+        elif isinstance(content, list):
+            parts.extend(p.get("text", "") for p in content if isinstance(p, dict))
+    return "\n".join(parts)
+
+
+def render_prompt(messages) -> str:
+    """Flatten messages the way a chat template does, ending with the
+    generation prompt, so prefix comparisons behave like real KV reuse."""
+    rendered = []
+    for message in messages or []:
+        rendered.append(f"<|{message.get('role', 'user')}|>{prompt_text([message])}\n")
+    return "".join(rendered) + "<|assistant|>"
+
+
+def common_prefix(a: str, b: str) -> int:
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+class StubProvider:
+    def __init__(self, name: str, profile: StubProfile):
+        self.name = name
+        self.profile = profile
+        self.window = deque()  # request timestamps in the last 60s
+        self.slots = asyncio.Semaphore(profile.max_concurrency) if profile.max_concurrency else None
+        self.kv_slots = []
+        if profile.prefix_cache:
+            self.slots = None
+            self.kv_slots = [{"id": i, "lock": asyncio.Lock(), "sequence": "", "last_used": 0.0}
+                             for i in range(max(1, profile.max_concurrency))]
+        self.stats = {"requests": 0, "served": 0, "rate_limited": 0, "queued": 0, "in_flight": 0, "waiting": 0,
+                      "prompt_tokens": 0, "prefilled_tokens": 0, "cached_tokens": 0, "embed_inputs": 0}
+        self.state = {"down": False, "extra_latency_ms": 0}
+
+    def _delay(self, seconds: float) -> float:
+        spread = self.profile.jitter
+        return max(0.0, seconds * random.uniform(1 - spread, 1 + spread))
+
+    def _rate_limited(self) -> bool:
+        if not self.profile.rpm:
+            return False
+        now = time.monotonic()
+        while self.window and now - self.window[0] > 60:
+            self.window.popleft()
+        if len(self.window) >= self.profile.rpm:
+            return True
+        self.window.append(now)
+        return False
+
+    def _too_many_requests(self) -> web.Response:
+        self.stats["rate_limited"] += 1
+        retry_after = max(1, int(60 - (time.monotonic() - self.window[0]))) if self.window else 1
+        body = {"error": {
+            "message": f"Rate limit reached for requests per minute (RPM): Limit {self.profile.rpm}",
+            "type": "requests", "code": "rate_limit_exceeded",
+        }}
+        return web.json_response(body, status=429, headers={"retry-after": str(retry_after)})
+
+    async def _degraded(self) -> bool:
+        """Apply the simulated state: True if the box should look dead."""
+        if self.state["extra_latency_ms"]:
+            await asyncio.sleep(self.state["extra_latency_ms"] / 1000)
+        return self.state["down"]
+
+    def _pick_kv_slot(self, body: dict, rendered: str) -> dict:
+        requested = body.get("id_slot", -1)
+        if isinstance(requested, int) and 0 <= requested < len(self.kv_slots):
+            return self.kv_slots[requested]
+        idle = [slot for slot in self.kv_slots if not slot["lock"].locked()] or self.kv_slots
+        best = max(idle, key=lambda slot: common_prefix(slot["sequence"], rendered))
+        if common_prefix(best["sequence"], rendered) >= 0.5 * len(rendered):
+            return best
+        return min(idle, key=lambda slot: slot["last_used"])
+
+    @asynccontextmanager
+    async def _acquire(self, body: dict, rendered: str):
+        """Wait for capacity. Yields the llama.cpp slot (or None) and the
+        number of prompt characters already in that slot's cache."""
+        if self.kv_slots:
+            slot = self._pick_kv_slot(body, rendered)
+            lock = slot["lock"]
+        else:
+            slot, lock = None, self.slots
+        if lock is not None and lock.locked():
+            self.stats["queued"] += 1
+        self.stats["waiting"] += 1
+        try:
+            if lock is not None:
+                await lock.acquire()
+        finally:
+            self.stats["waiting"] -= 1
+        self.stats["in_flight"] += 1
+        try:
+            cached = 0
+            if slot is not None and body.get("cache_prompt", True):
+                cached = common_prefix(slot["sequence"], rendered)
+            yield slot, cached
+        finally:
+            self.stats["in_flight"] -= 1
+            if slot is not None:
+                slot["last_used"] = time.monotonic()
+            if lock is not None:
+                lock.release()
+
+    # ---- handlers ----
+    async def chat_completions(self, request: web.Request) -> web.StreamResponse:
+        self.stats["requests"] += 1
+        body = await request.json()
+        if await self._degraded():
+            return web.json_response({"error": {"message": "stub is down", "code": 503}}, status=503)
+        if self._rate_limited():
+            return self._too_many_requests()
+
+        rendered = render_prompt(body.get("messages"))
+        prompt_tokens = estimate_tokens(rendered)
+        output_tokens = int(body.get("max_tokens") or body.get("max_completion_tokens") or self.profile.output_tokens)
+        output_tokens = min(output_tokens, self.profile.output_tokens)
+        model = body.get("model", self.name)
+        answer = "lorem " * output_tokens
+
+        async with self._acquire(body, rendered) as (slot, cached_chars):
+            cached_tokens = min(prompt_tokens, cached_chars // 4)
+            prefill_tokens = prompt_tokens - cached_tokens
+            self.stats["prompt_tokens"] += prompt_tokens
+            self.stats["prefilled_tokens"] += prefill_tokens
+            self.stats["cached_tokens"] += cached_tokens
+            timings = {"prompt_n": prefill_tokens, "cache_n": cached_tokens, "id_slot": slot["id"] if slot else None}
+
+            ttft = self.profile.ttft_ms / 1000 + prefill_tokens / self.profile.prefill_tokens_per_second
+            await asyncio.sleep(self._delay(ttft))
+            if slot is not None:
+                # The slot now holds the prompt plus the generated answer
+                slot["sequence"] = rendered + answer + "\n"
+            if body.get("stream"):
+                return await self._stream(request, body, model, prompt_tokens, output_tokens, timings)
+            await asyncio.sleep(self._delay(output_tokens / self.profile.tokens_per_second))
+            self.stats["served"] += 1
+            return web.json_response({
+                "id": f"chatcmpl-{uuid.uuid4().hex}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": answer},
+                    "finish_reason": "length" if output_tokens < self.profile.output_tokens else "stop",
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": output_tokens,
+                    "total_tokens": prompt_tokens + output_tokens,
+                    "prompt_tokens_details": {"cached_tokens": cached_tokens},
+                },
+                "timings": timings,
+            })
+
+    async def _stream(self, request, body, model, prompt_tokens, output_tokens, timings) -> web.StreamResponse:
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+
+        def chunk(delta, finish_reason=None, usage=None):
+            payload = {
+                "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            if usage is not None:
+                payload["usage"] = usage
+            if finish_reason is not None:
+                payload["timings"] = timings
+            return f"data: {json.dumps(payload)}\n\n".encode()
+
+        await response.write(chunk({"role": "assistant", "content": ""}))
+        per_token = 1 / self.profile.tokens_per_second
+        for _ in range(output_tokens):
+            await response.write(chunk({"content": "lorem "}))
+            await asyncio.sleep(self._delay(per_token))
+        usage = None
+        if (body.get("stream_options") or {}).get("include_usage"):
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": output_tokens,
+                     "total_tokens": prompt_tokens + output_tokens,
+                     "prompt_tokens_details": {"cached_tokens": timings["cache_n"]}}
+        finish = "length" if output_tokens < self.profile.output_tokens else "stop"
+        await response.write(chunk({}, finish_reason=finish, usage=usage))
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        self.stats["served"] += 1
+        return response
+
+    async def _embed(self, inputs: list) -> tuple:
+        """Deterministic vectors plus prompt tokens. One call costs a fixed
+        overhead plus prefill time and holds a slot, so batching pays off."""
+        dims = self.profile.embedding_dims
+        vectors = []
+        for text in inputs:
+            # Same text -> same vector, so caches and dedup behave as with a real model
+            seed = int.from_bytes(hashlib.sha256(str(text).encode()).digest()[:8], "big")
+            rng = random.Random(seed)
+            vectors.append([rng.uniform(-1, 1) for _ in range(dims)])
+        tokens = sum(estimate_tokens(str(t)) for t in inputs)
+        overhead_ms = self.profile.embed_overhead_ms or self.profile.ttft_ms
+        speed = self.profile.embed_tokens_per_second or self.profile.prefill_tokens_per_second
+        if self.slots is not None:
+            if self.slots.locked():
+                self.stats["queued"] += 1
+            await self.slots.acquire()
+        self.stats["in_flight"] += 1
+        try:
+            await asyncio.sleep(self._delay(overhead_ms / 1000 + tokens / speed))
+        finally:
+            self.stats["in_flight"] -= 1
+            if self.slots is not None:
+                self.slots.release()
+        self.stats["served"] += 1
+        return vectors, tokens
+
+    async def _embed_request(self, request: web.Request):
+        """Shared checks; returns (body, None) or (None, error response)."""
+        self.stats["requests"] += 1
+        body = await request.json()
+        if await self._degraded():
+            return None, web.json_response({"error": {"message": "stub is down", "code": 503}}, status=503)
+        if self._rate_limited():
+            return None, self._too_many_requests()
+        return body, None
+
+    async def embeddings(self, request: web.Request) -> web.Response:
+        body, failure = await self._embed_request(request)
+        if failure is not None:
+            return failure
+        inputs = body.get("input")
+        inputs = [inputs] if isinstance(inputs, str) else list(inputs or [])
+        self.stats["embed_inputs"] += len(inputs)
+        vectors, tokens = await self._embed(inputs)
+        return web.json_response({
+            "object": "list",
+            "data": [{"object": "embedding", "index": i, "embedding": v} for i, v in enumerate(vectors)],
+            "model": body.get("model", self.name),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        })
+
+    async def ollama_embed(self, request: web.Request) -> web.Response:
+        body, failure = await self._embed_request(request)
+        if failure is not None:
+            return failure
+        inputs = body.get("input")
+        inputs = [inputs] if isinstance(inputs, str) else list(inputs or [])
+        self.stats["embed_inputs"] += len(inputs)
+        vectors, tokens = await self._embed(inputs)
+        return web.json_response({"model": body.get("model", self.name), "embeddings": vectors,
+                                  "prompt_eval_count": tokens})
+
+    async def ollama_embeddings_legacy(self, request: web.Request) -> web.Response:
+        body, failure = await self._embed_request(request)
+        if failure is not None:
+            return failure
+        self.stats["embed_inputs"] += 1
+        vectors, _ = await self._embed([body.get("prompt", "")])
+        return web.json_response({"embedding": vectors[0]})
+
+    async def models(self, request: web.Request) -> web.Response:
+        return web.json_response({"object": "list", "data": [{"id": self.name, "object": "model", "owned_by": "stub"}]})
+
+    async def health(self, request: web.Request) -> web.Response:
+        if await self._degraded():
+            return web.json_response({"error": {"message": "Loading model", "code": 503}}, status=503)
+        return web.json_response({"status": "ok", "profile": self.name})
+
+    async def metrics(self, request: web.Request) -> web.Response:
+        if await self._degraded():
+            return web.Response(status=503)
+        lines = [
+            "# TYPE llamacpp:requests_processing gauge",
+            f"llamacpp:requests_processing {self.stats['in_flight']}",
+            "# TYPE llamacpp:requests_deferred gauge",
+            f"llamacpp:requests_deferred {self.stats['waiting']}",
+        ]
+        return web.Response(text="\n".join(lines) + "\n")
+
+    async def ollama_ps(self, request: web.Request) -> web.Response:
+        if await self._degraded():
+            return web.Response(status=503)
+        return web.json_response({"models": [{"name": self.name, "model": self.name}]})
+
+    async def set_state(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        self.state["down"] = bool(body.get("down", self.state["down"]))
+        self.state["extra_latency_ms"] = float(body.get("extra_latency_ms", self.state["extra_latency_ms"]))
+        if body.get("reset_cache"):
+            for slot in self.kv_slots:
+                slot["sequence"], slot["last_used"] = "", 0.0
+        print(f"[INFO] Stub state: {self.state}")
+        return web.json_response(self.state)
+
+    async def get_stats(self, request: web.Request) -> web.Response:
+        return web.json_response({"profile": self.name, **self.profile.__dict__, **self.stats})
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=32 * 1024 * 1024)
+        app.router.add_post("/v1/chat/completions", self.chat_completions)
+        app.router.add_post("/chat/completions", self.chat_completions)
+        app.router.add_post("/v1/embeddings", self.embeddings)
+        app.router.add_post("/embeddings", self.embeddings)
+        app.router.add_get("/v1/models", self.models)
+        app.router.add_get("/health", self.health)
+        app.router.add_get("/metrics", self.metrics)
+        app.router.add_get("/api/ps", self.ollama_ps)
+        app.router.add_post("/api/embed", self.ollama_embed)
+        app.router.add_post("/api/embeddings", self.ollama_embeddings_legacy)
+        app.router.add_get("/stats", self.get_stats)
+        app.router.add_post("/stub/state", self.set_state)
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stub provider for load tests")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default=os.environ.get("STUB_PROFILE", "groq"))
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("STUB_PORT", "8000")))
+    args = parser.parse_args()
+
+    profile = load_profile(args.profile)
+    print(f"[INFO] Stub provider '{args.profile}' on {args.host}:{args.port}: {profile}")
+    web.run_app(StubProvider(args.profile, profile).app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
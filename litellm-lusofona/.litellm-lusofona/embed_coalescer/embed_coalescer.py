@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+"""
+Lusochat Embedding Coalescer (sidecar)
+
+Sits between LiteLLM and the on-prem Ollama box (models/on-premise.yaml points
+the embedding models' api_base here). OpenWebUI embeds documents one chunk per
+request, so the GPU would otherwise see thousands of tiny calls, each paying
+the full per-call overhead.
+
+How it works:
+    Requests for the same model (and options) that arrive within
+    COALESCE_WINDOW_MS are merged into one upstream /api/embed call with a
+    list input, up to COALESCE_MAX_BATCH inputs; the vectors are split back
+    per request. A request that already carries COALESCE_PASSTHROUGH inputs
+    or more goes upstream on its own, without waiting. At most
+    COALESCE_MAX_CONCURRENCY upstream calls run at once (like
+    OLLAMA_NUM_PARALLEL); while they are busy, batches keep filling.
+    An upstream error fails every request in the batch with that error.
+
+Endpoints:
+    POST /api/embed         Ollama (what LiteLLM's ollama/ provider calls)
+    POST /api/embeddings    Ollama legacy, single prompt
+    POST /v1/embeddings     OpenAI-compatible (float or base64)
+    GET  /api/ps, /api/tags proxied to Ollama (health prober, model list)
+    GET  /health            liveness
+    GET  /metrics           Prometheus: requests, inputs, batches, batch size,
+                            queue wait and upstream latency histograms
+    GET  /stats             the same as JSON
+
+Usage:
+    python embed_coalescer.py                           # OLLAMA_URL, port 8090
+    python embed_coalescer.py --upstream http://localhost:11434 --window-ms 3
+"""
+
+import os
+import sys
+import json
+import time
+import base64
+import struct
+import asyncio
+import argparse
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+from aiohttp import web
+
+
+@dataclass
+class CoalescerSettings:
+    upstream: str = os.environ.get("OLLAMA_URL", "http://192.168.80.6:11434")
+    window_ms: float = float(os.environ.get("COALESCE_WINDOW_MS", "5"))
+    max_batch: int = int(os.environ.get("COALESCE_MAX_BATCH", "64"))
+    passthrough: int = int(os.environ.get("COALESCE_PASSTHROUGH", "32"))
+    max_concurrency: int = int(os.environ.get("COALESCE_MAX_CONCURRENCY", "2"))
+    timeout: float = float(os.environ.get("COALESCE_TIMEOUT", "120"))
+
+
+class UpstreamError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class Histogram:
+    """Prometheus-style cumulative histogram."""
+
+    def __init__(self, buckets: List[float]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.total += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    def snapshot(self) -> Dict:
+        return {
+            "count": self.total,
+            "mean": round(self.sum / self.total, 2) if self.total else None,
+            "buckets": {str(b): c for b, c in zip(self.buckets, self.counts)},
+        }
+
+
+@dataclass
+class Pending:
+    inputs: List[str]
+    future: asyncio.Future
+    enqueued: float = field(default_factory=time.perf_counter)
+
+
+@dataclass
+class Batch:
+    model: str
+    options: Dict
+    requests: List[Pending] = field(default_factory=list)
+    size: int = 0
+    timer: Optional[asyncio.TimerHandle] = None
+
+
+class Coalescer:
+    def __init__(self, settings: CoalescerSettings):
+        self.settings = settings
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.slots = asyncio.Semaphore(max(1, settings.max_concurrency))
+        self.in_flight = 0
+        self.open_batches: Dict[Tuple[str, str], Batch] = {}
+        self.tasks: set = set()
+        self.counters = {"requests": 0, "inputs": 0, "batches": 0, "passthrough": 0, "errors": 0}
+        self.per_model: Dict[str, Dict[str, int]] = {}
+        self.batch_size = Histogram([1, 2, 4, 8, 16, 32, 64, 128, 256])
+        self.queue_wait_ms = Histogram([1, 2, 5, 10, 25, 50, 100, 250, 1000])
+        self.upstream_ms = Histogram([10, 25, 50, 100, 250, 500, 1000, 2500, 10000])
+
+    async def start(self, app: web.Application) -> None:
+        self.session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=self.settings.timeout),
+            connector=aiohttp.TCPConnector(limit=max(4, self.settings.max_concurrency * 2)),
+        )
+
+    async def stop(self, app: web.Application) -> None:
+        if self.session is not None:
+            await self.session.close()
+
+    # ---- batching ----
+
+    async def embed(self, model: str, inputs: List[str], options: Dict) -> Tuple[List[List[float]], int]:
+        """Vectors for inputs (in order) and the prompt tokens attributed to them."""
+        self.counters["requests"] += 1
+        self.counters["inputs"] += len(inputs)
+        stats = self.per_model.setdefault(model, {"requests": 0, "inputs": 0, "batches": 0})
+        stats["requests"] += 1
+        stats["inputs"] += len(inputs)
+        loop = asyncio.get_running_loop()
+        pending = Pending(inputs=inputs, future=loop.create_future())
+
+        if len(inputs) >= self.settings.passthrough:
+            # Already a batch: coalescing would only add latency
+            self.counters["passthrough"] += 1
+            self._dispatch(None, Batch(model=model, options=options, requests=[pending], size=len(inputs)))
+            return await pending.future
+
+        key = (model, json.dumps(options, sort_keys=True))
+        batch = self.open_batches.get(key)
+        if batch is not None and batch.size + len(inputs) > self.settings.max_batch:
+            self._seal(key)
+            batch = None
+        if batch is None:
+            batch = Batch(model=model, options=options)
+            self.open_batches[key] = batch
+            batch.timer = loop.call_later(self.settings.window_ms / 1000, self._window_elapsed, key, batch)
+        batch.requests.append(pending)
+        batch.size += len(inputs)
+        if batch.size >= self.settings.max_batch:
+            self._seal(key)
+        return await pending.future
+
+    def _window_elapsed(self, key: Tuple[str, str], batch: Batch) -> None:
+        # Start waiting for an upstream slot. The batch stays open until it
+        # gets one, so batches grow while Ollama is busy and stay small when idle.
+        batch.timer = None
+        self._dispatch(key, batch)
+
+    def _seal(self, key: Tuple[str, str]) -> None:
+        """Stop a batch from taking more requests (it is full)."""
+        batch = self.open_batches.pop(key, None)
+        if batch is not None and batch.timer is not None:
+            batch.timer.cancel()
+            batch.timer = None
+            self._dispatch(key, batch)
+
+    def _dispatch(self, key: Optional[Tuple[str, str]], batch: Batch) -> None:
+        task = asyncio.ensure_future(self._run(key, batch))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _run(self, key: Optional[Tuple[str, str]], batch: Batch) -> None:
+        try:
+            async with self.slots:
+                if key is not None and self.open_batches.get(key) is batch:
+                    del self.open_batches[key]
+                self._spread(batch)
+                inputs = [text for request in batch.requests for text in request.inputs]
+                started = time.perf_counter()
+                for request in batch.requests:
+                    self.queue_wait_ms.observe((started - request.enqueued) * 1000)
+                self.in_flight += 1
+                try:
+                    vectors, tokens = await self._upstream(batch.model, inputs, batch.options)
+                finally:
+                    self.in_flight -= 1
+                self.upstream_ms.observe((time.perf_counter() - started) * 1000)
+        except Exception as e:
+            if key is not None and self.open_batches.get(key) is batch:
+                del self.open_batches[key]
+            self.counters["errors"] += 1
+            for request in batch.requests:
+                if not request.future.done():
+                    request.future.set_exception(e)
+            return
+
+        self.counters["batches"] += 1
+        self.per_model[batch.model]["batches"] += 1
+        self.batch_size.observe(len(inputs))
+        total_chars = sum(len(t) for t in inputs) or 1
+        offset = 0
+        for request in batch.requests:
+            n = len(request.inputs)
+            share = round(tokens * sum(len(t) for t in request.inputs) / total_chars)
+            if not request.future.done():
+                request.future.set_result((vectors[offset:offset + n], share))
+            offset += n
+
+    def _spread(self, batch: Batch) -> None:
+        """Split a batch over the upstream slots that are idle right now:
+        two half batches finish sooner than one full batch on one slot."""
+        idle = self.settings.max_concurrency - self.in_flight - 1
+        parts = min(idle + 1, len(batch.requests))
+        if parts <= 1:
+            return
+        share = -(-batch.size // parts)
+        keep, size = [], 0
+        for request in batch.requests:
+            if keep and size + len(request.inputs) > share:
+                break
+            keep.append(request)
+            size += len(request.inputs)
+        rest = batch.requests[len(keep):]
+        batch.requests, batch.size = keep, size
+        if rest:
+            # The remainder is dispatched at once; it spreads again if slots are still idle
+            self._dispatch(None, Batch(model=batch.model, options=batch.options, requests=rest,
+                                       size=sum(len(r.inputs) for r in rest)))
+
+    async def _upstream(self, model: str, inputs: List[str], options: Dict) -> Tuple[List[List[float]], int]:
+        payload = {"model": model, "input": inputs, **options}
+        async with self.session.post(f"{self.settings.upstream.rstrip('/')}/api/embed", json=payload) as resp:
+            if resp.status != 200:
+                raise UpstreamError(resp.status, (await resp.text())[:500])
+            data = await resp.json(content_type=None)
+        vectors = data.get("embeddings") or []
+        if len(vectors) != len(inputs):
+            raise UpstreamError(502, f"upstream returned {len(vectors)} vectors for {len(inputs)} inputs")
+        return vectors, int(data.get("prompt_eval_count") or 0)
+
+    # ---- metrics ----
+
+    def stats(self) -> Dict:
+        return {
+            **self.counters,
+            "inputs_per_batch": round(self.counters["inputs"] / self.counters["batches"], 2)
+            if self.counters["batches"] else None,
+            "models": self.per_model,
+            "batch_size": self.batch_size.snapshot(),
+            "queue_wait_ms": self.queue_wait_ms.snapshot(),
+            "upstream_ms": self.upstream_ms.snapshot(),
+            "settings": self.settings.__dict__,
+        }
+
+    def prometheus(self) -> str:
+        lines = []
+        for name, value in self.counters.items():
+            lines.append(f"# TYPE lusochat_embed_{name}_total counter")
+            lines.append(f"lusochat_embed_{name}_total {value}")
+        for model, stats in self.per_model.items():
+            for name, value in stats.items():
+                lines.append(f'lusochat_embed_model_{name}_total{{model="{model}"}} {value}')
+        for name, hist in (("batch_size", self.batch_size), ("queue_wait_ms", self.queue_wait_ms),
+                           ("upstream_ms", self.upstream_ms)):
+            lines.append(f"# TYPE lusochat_embed_{name} histogram")
+            for bound, count in zip(hist.buckets, hist.counts):
+                lines.append(f'lusochat_embed_{name}_bucket{{le="{bound}"}} {count}')
+            lines.append(f'lusochat_embed_{name}_bucket{{le="+Inf"}} {hist.total}')
+            lines.append(f"lusochat_embed_{name}_sum {hist.sum}")
+            lines.append(f"lusochat_embed_{name}_count {hist.total}")
+        return "\n".join(lines) + "\n"
+
+
+# ---- HTTP handlers ----
+
+OLLAMA_OPTION_KEYS = ("options", "truncate", "keep_alive", "dimensions")
+
+
+def _error(status: int, message: str) -> web.Response:
+    return web.json_response({"error": message}, status=status)
+
+
+def _texts(value) -> Optional[List[str]]:
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, list) and all(isinstance(v, str) for v in value):
+        return value
+    return None  # token arrays are not supported
+
+
+def make_app(coalescer: Coalescer) -> web.Application:
+    async def read_json(request: web.Request) -> Optional[Dict]:
+        try:
+            body = await request.json()
+        except Exception:
+            return None
+        return body if isinstance(body, dict) else None
+
+    async def ollama_embed(request: web.Request) -> web.Response:
+        body = await read_json(request)
+        inputs = _texts((body or {}).get("input"))
+        if not body or not body.get("model") or inputs is None:
+            return _error(400, "expected {model, input: string | [string]}")
+        options = {k: body[k] for k in OLLAMA_OPTION_KEYS if k in body}
+        started = time.perf_counter()
+        try:
+            vectors, tokens = await coalescer.embed(body["model"], inputs, options)
+        except UpstreamError as e:
+            return _error(e.status, str(e))
+        except Exception as e:
+            return _error(502, f"{type(e).__name__}: {e}")
+        return web.json_response({
+            "model": body["model"],
+            "embeddings": vectors,
+            "total_duration": int((time.perf_counter() - started) * 1e9),
+            "prompt_eval_count": tokens,
+        })
+
+    async def ollama_embeddings_legacy(request: web.Request) -> web.Response:
+        body = await read_json(request)
+        if not body or not body.get("model") or not isinstance(body.get("prompt"), str):
+            return _error(400, "expected {model, prompt}")
+        options = {k: body[k] for k in OLLAMA_OPTION_KEYS if k in body}
+        try:
+            vectors, _ = await coalescer.embed(body["model"], [body["prompt"]], options)
+        except UpstreamError as e:
+            return _error(e.status, str(e))
+        except Exception as e:
+            return _error(502, f"{type(e).__name__}: {e}")
+        return web.json_response({"embedding": vectors[0]})
+
+    async def openai_embeddings(request: web.Request) -> web.Response:
+        body = await read_json(request)
+        inputs = _texts((body or {}).get("input"))
+        if not body or not body.get("model") or inputs is None:
+            return web.json_response(
+                {"error": {"message": "expected {model, input: string | [string]}", "type": "invalid_request_error"}},
+                status=400,
+            )
+        options = {"dimensions": body["dimensions"]} if "dimensions" in body else {}
+        try:
+            vectors, tokens = await coalescer.embed(body["model"], inputs, options)
+        except Exception as e:
+            status = e.status if isinstance(e, UpstreamError) else 502
+            return web.json_response({"error": {"message": str(e), "type": "upstream_error"}}, status=status)
+        as_base64 = body.get("encoding_format") == "base64"
+        data = []
+        for i, vector in enumerate(vectors):
+            embedding = (
+                base64.b64encode(struct.pack(f"<{len(vector)}f", *vector)).decode("ascii") if as_base64 else vector
+            )
+            data.append({"object": "embedding", "index": i, "embedding": embedding})
+        return web.json_response({
+            "object": "list",
+            "data": data,
+            "model": body["model"],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        })
+
+    async def proxy_get(request: web.Request) -> web.Response:
+        try:
+            async with coalescer.session.get(
+                f"{coalescer.settings.upstream.rstrip('/')}{request.path}", timeout=aiohttp.ClientTimeout(total=5)
+            ) as resp:
+                return web.Response(status=resp.status, body=await resp.read(), content_type="application/json")
+        except Exception as e:
+            return _error(502, f"{type(e).__name__}: {e}")
+
+    async def health(request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok"})
+
+    async def metrics(request: web.Request) -> web.Response:
+        return web.Response(text=coalescer.prometheus(), content_type="text/plain")
+
+    async def stats(request: web.Request) -> web.Response:
+        return web.json_response(coalescer.stats())
+
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app.on_startup.append(coalescer.start)
+    app.on_cleanup.append(coalescer.stop)
+    app.router.add_post("/api/embed", ollama_embed)
+    app.router.add_post("/api/embeddings", ollama_embeddings_legacy)
+    app.router.add_post("/v1/embeddings", openai_embeddings)
+    app.router.add_post("/embeddings", openai_embeddings)
+    app.router.add_get("/api/ps", proxy_get)
+    app.router.add_get("/api/tags", proxy_get)
+    app.router.add_get("/health", health)
+    app.router.add_get("/metrics", metrics)
+    app.router.add_get("/stats", stats)
+    return app
+
+
+def main():
+    defaults = CoalescerSettings()
+    parser = argparse.ArgumentParser(description="Micro-batching embedding proxy in front of Ollama")
+    parser.add_argument("--upstream", default=defaults.upstream, help="Ollama base URL (OLLAMA_URL)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("COALESCE_PORT", "8090")))
+    parser.add_argument("--window-ms", type=float, default=defaults.window_ms)
+    parser.add_argument("--max-batch", type=int, default=defaults.max_batch)
+    parser.add_argument("--passthrough", type=int, default=defaults.passthrough)
+    parser.add_argument("--max-concurrency", type=int, default=defaults.max_concurrency)
+    args = parser.parse_args()
+
+    settings = CoalescerSettings(
+        upstream=args.upstream,
+        window_ms=args.window_ms,
+        max_batch=args.max_batch,
+        passthrough=args.passthrough,
+        max_concurrency=args.max_concurrency,
+    )
+    print(
+        f"Embedding coalescer on :{args.port} -> {settings.upstream} "
+        f"(window {settings.window_ms}ms, batch <= {settings.max_batch}, {settings.max_concurrency} upstream calls)",
+        flush=True,
+    )
+    web.run_app(make_app(Coalescer(settings)), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Grafana Dashboard Generator
+
+Builds provisioned Grafana dashboards from the model catalog (models/*.yaml),
+so per-model panels are regenerated on every deploy instead of being built
+by hand in the UI and lost with the Grafana volume.
+
+Generated files (picked up by grafana/provisioning/dashboards/lusochat.yml):
+    grafana/dashboards/overview.json               capacity headroom for every model
+    grafana/dashboards/<provider>.json             one row per model in models/<provider>.yaml
+
+Each model row shows request rate, p50/p95/p99 latency, time to first token
+and output tokens/sec (chat models), rpm/tpm against the configured limits,
+cost per hour and (when model_info.semantic_cache is enabled) the semantic
+cache hit rate.
+
+Usage:
+    python generate_dashboards.py                # Regenerate into grafana/
+    python generate_dashboards.py --check        # Exit 1 if the files are stale
+"""
+
+import re
+import sys
+import json
+import argparse
+from pathlib import Path
+from typing import Any, Dict, List
+
+from model_catalog import ModelEntry, load_model_catalog
+
+BASE_DIR = Path(__file__).resolve().parent
+DASHBOARDS_DIR = BASE_DIR / "grafana" / "dashboards"
+
+DATASOURCE = {"type": "prometheus", "uid": "DS_PROMETHEUS"}
+
+# Modes that go through the chat/embedding request path and have meaningful
+# latency/token metrics. Audio, image and moderation models are skipped.
+DASHBOARD_MODES = {"chat", "completion", "embedding", "rerank", "responses"}
+
+PROVIDER_TITLES = {
+    "on-premise": "On-Premise",
+    "groq": "Groq",
+    "sambanova": "SambaNova",
+    "openai": "OpenAI",
+    "gemini": "Gemini",
+}
+
+
+def requested(entry: ModelEntry) -> str:
+    """Label selector for metrics labelled with the requested model group."""
+    return f'requested_model="{entry.model_name}"'
+
+
+def upstream(entry: ModelEntry) -> str:
+    """Label selector for metrics labelled with the upstream model name.
+
+    LiteLLM reports deployment-level metrics (TTFT, tokens) with the
+    provider model, with or without the provider prefix depending on version.
+    """
+    model = str(entry.litellm_params.get("model", entry.model_name)).split("/", 1)[-1]
+    return f'model=~"(.*/)?{re.escape(model)}"'
+
+
+def slug(text: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")
+
+
+def target(expr: str, legend: str, ref: str) -> Dict[str, Any]:
+    return {"datasource": DATASOURCE, "expr": expr, "legendFormat": legend, "refId": ref}
+
+
+def timeseries(title: str, targets: List[Dict[str, Any]], unit: str, grid: Dict[str, int],
+               limit: float = None) -> Dict[str, Any]:
+    """A timeseries panel; `limit` draws a red threshold line at the configured limit."""
+    steps = [{"color": "green", "value": None}]
+    if limit:
+        steps += [{"color": "orange", "value": limit * 0.8}, {"color": "red", "value": limit}]
+    return {
+        "type": "timeseries",
+        "title": title,
+        "datasource": DATASOURCE,
+        "gridPos": grid,
+        "targets": targets,
+        "fieldConfig": {
+            "defaults": {
+                "unit": unit,
+                "thresholds": {"mode": "absolute", "steps": steps},
+                "custom": {"thresholdsStyle": {"mode": "line" if limit else "off"}},
+            },
+            "overrides": [],
+        },
+        "options": {"legend": {"displayMode": "list", "placement": "bottom"}},
+    }
+
+
+def model_row(entry: ModelEntry, y: int, panel_id: int) -> List[Dict[str, Any]]:
+    """Row header plus the panels for one model. Returns panels in layout order."""
+    req, up = requested(entry), upstream(entry)
+    rpm_expr = f"sum(rate(litellm_proxy_total_requests_metric_total{{{req}}}[1m])) * 60"
+    panels = [{
+        "type": "row",
+        "title": f"{entry.model_name}  (rpm={entry.rpm or '-'}, tpm={entry.tpm or '-'}, max_tokens={entry.max_tokens or '-'})",
+        "collapsed": False,
+        "gridPos": {"h": 1, "w": 24, "x": 0, "y": y},
+        "panels": [],
+    }]
+    is_chat = entry.mode in ("chat", "completion", "responses")
+    charts = [
+        timeseries("Request rate", [
+            target(f"sum(rate(litellm_proxy_total_requests_metric_total{{{req}}}[1m]))", "requests", "A"),
+            target(f"sum(rate(litellm_proxy_failed_requests_metric_total{{{req}}}[1m]))", "failed", "B"),
+            target(
+                f'sum(rate(litellm_deployment_failure_responses_total{{{req.replace("requested_model", "model_group")}, exception_status="429"}}[1m]))',
+                "429 throttled", "C",
+            ),
+        ], "reqps", {}),
+        timeseries("Latency p50 / p95 / p99", [
+            target(
+                f"histogram_quantile({q}, sum by (le) (rate(litellm_request_total_latency_metric_bucket{{{req}}}[5m])))",
+                f"p{int(q * 100)}", ref,
+            )
+            for q, ref in ((0.5, "A"), (0.95, "B"), (0.99, "C"))
+        ], "s", {}),
+    ]
+    if is_chat:
+        charts.append(timeseries("Time to first token p50 / p95", [
+            target(
+                f"histogram_quantile({q}, sum by (le) (rate(litellm_llm_api_time_to_first_token_metric_bucket{{{up}}}[5m])))",
+                f"p{int(q * 100)}", ref,
+            )
+            for q, ref in ((0.5, "A"), (0.95, "B"))
+        ], "s", {}))
+        charts.append(timeseries("Output tokens / sec", [
+            target(f"sum(rate(litellm_output_tokens_metric_total{{{up}}}[1m]))", "tokens/s", "A"),
+        ], "short", {}))
+    charts += [
+        timeseries("Requests / min vs rpm limit", [target(rpm_expr, "rpm", "A")], "short", {}, limit=entry.rpm),
+        timeseries("Tokens / min vs tpm limit", [
+            target(f"sum(rate(litellm_total_tokens_metric_total{{{up}}}[1m])) * 60", "tpm", "A"),
+        ], "short", {}, limit=entry.tpm),
+        timeseries("Cost per hour", [
+            target(f"sum(increase(litellm_spend_metric_total{{{up}}}[1h]))", "cost / h", "A"),
+        ], "currencyUSD", {}),
+    ]
+    if (entry.model_info.get("semantic_cache") or {}).get("enabled"):
+        name = f'model="{entry.model_name}"'
+        charts.append(timeseries("Semantic cache hit rate", [
+            target(
+                f'sum(rate(litellm_semantic_cache_requests_total{{{name}, result="hit"}}[5m])) / '
+                f'sum(rate(litellm_semantic_cache_requests_total{{{name}, result=~"hit|miss"}}[5m]))',
+                "hit rate", "A",
+            ),
+        ], "percentunit", {}))
+
+    for i, chart in enumerate(charts):
+        chart["gridPos"] = {"h": 8, "w": 6, "x": (i % 4) * 6, "y": y + 1 + (i // 4) * 8}
+        chart["id"] = panel_id + i
+        panels.append(chart)
+    panels[0]["id"] = panel_id + len(charts)
+    return panels
+
+
+def dashboard(title: str, uid: str, panels: List[Dict[str, Any]], tags: List[str]) -> Dict[str, Any]:
+    return {
+        "uid": uid,
+        "title": title,
+        "tags": ["lusochat", "generated"] + tags,
+        "timezone": "browser",
+        "schemaVersion": 39,
+        "version": 1,
+        "editable": False,
+        "refresh": "30s",
+        "time": {"from": "now-6h", "to": "now"},
+        "panels": panels,
+        "templating": {"list": []},
+        "annotations": {"list": []},
+    }
+
+
+def provider_dashboard(provider: str, entries: List[ModelEntry]) -> Dict[str, Any]:
+    panels, y, panel_id = [], 0, 1
+    for entry in entries:
+        row = model_row(entry, y, panel_id)
+        panels.extend(row)
+        panel_id += len(row)
+        y = max(p["gridPos"]["y"] + p["gridPos"]["h"] for p in row)
+    title = PROVIDER_TITLES.get(provider, provider.title())
+    return dashboard(f"Lusochat / {title} models", f"lusochat-{slug(provider)}", panels, [provider])
+
+
+def overview_dashboard(entries: List[ModelEntry]) -> Dict[str, Any]:
+    """Bar gauges of rpm/tpm usage as a fraction of the configured limit."""
+    def usage_gauge(title, targets, grid, panel_id):
+        return {
+            "type": "bargauge",
+            "title": title,
+            "id": panel_id,
+            "datasource": DATASOURCE,
+            "gridPos": grid,
+            "targets": targets,
+            "options": {"displayMode": "gradient", "orientation": "horizontal", "showUnfilled": True},
+            "fieldConfig": {
+                "defaults": {
+                    "unit": "percentunit", "min": 0, "max": 1,
+                    "thresholds": {"mode": "absolute", "steps": [
+                        {"color": "green", "value": None},
+                        {"color": "orange", "value": 0.8},
+                        {"color": "red", "value": 1.0},
+                    ]},
+                },
+                "overrides": [],
+            },
+        }
+
+    rpm_targets, tpm_targets = [], []
+    for i, entry in enumerate(e for e in entries if e.rpm):
+        rpm_targets.append(target(
+            f"sum(rate(litellm_proxy_total_requests_metric_total{{{requested(entry)}}}[5m])) * 60 / {entry.rpm}",
+            entry.model_name, f"R{i}",
+        ))
+    for i, entry in enumerate(e for e in entries if e.tpm):
+        tpm_targets.append(target(
+            f"sum(rate(litellm_total_tokens_metric_total{{{upstream(entry)}}}[5m])) * 60 / {entry.tpm}",
+            entry.model_name, f"T{i}",
+        ))
+
+    panels = [
+        usage_gauge("RPM usage vs configured limit", rpm_targets,
+                    {"h": max(8, len(rpm_targets)), "w": 12, "x": 0, "y": 0}, 1),
+        usage_gauge("TPM usage vs configured limit", tpm_targets,
+                    {"h": max(8, len(tpm_targets)), "w": 12, "x": 12, "y": 0}, 2),
+    ]
+    y = max(p["gridPos"]["h"] for p in panels)
+    panels.append(timeseries("Throttled (429) and cooled-down deployments", [
+        target('sum by (model_group) (rate(litellm_deployment_failure_responses_total{exception_status="429"}[5m]))',
+               "429 {{model_group}}", "A"),
+        target("sum by (litellm_model_name) (increase(litellm_deployment_cooled_down_total[5m]))",
+               "cooldown {{litellm_model_name}}", "B"),
+    ], "short", {"h": 8, "w": 12, "x": 0, "y": y}))
+    panels.append(timeseries("Cost per hour by model", [
+        target("sum by (model) (increase(litellm_spend_metric_total[1h]))", "{{model}}", "A"),
+    ], "currencyUSD", {"h": 8, "w": 12, "x": 12, "y": y}))
+    panels[2]["id"], panels[3]["id"] = 3, 4
+    return dashboard("Lusochat / Capacity overview", "lusochat-overview", panels, ["overview"])
+
+
+def render(entries: List[ModelEntry]) -> Dict[Path, str]:
+    """Return {path: content} for every generated file."""
+    entries = [e for e in entries if e.mode in DASHBOARD_MODES]
+    files = {DASHBOARDS_DIR / "overview.json": json.dumps(overview_dashboard(entries), indent=2) + "\n"}
+    providers: Dict[str, List[ModelEntry]] = {}
+    for entry in entries:
+        providers.setdefault(entry.provider, []).append(entry)
+    for provider, provider_entries in providers.items():
+        files[DASHBOARDS_DIR / f"{slug(provider)}.json"] = (
+            json.dumps(provider_dashboard(provider, provider_entries), indent=2) + "\n"
+        )
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate Grafana dashboards from the model catalog")
+    parser.add_argument("--models-dir", type=Path, default=None, help="Directory with provider YAML files")
+    parser.add_argument("--check", action="store_true", help="Only check that generated files are up to date")
+    args = parser.parse_args()
+
+    files = render(load_model_catalog(args.models_dir))
+
+    stale = [p for p, content in files.items() if not p.exists() or p.read_text(encoding="utf-8") != content]
+    if args.check:
+        for path in stale:
+            print(f"[WARNING] Stale: {path.relative_to(BASE_DIR)}")
+        sys.exit(1 if stale else 0)
+
+    # Remove dashboards for providers that no longer exist
+    for old in DASHBOARDS_DIR.glob("*.json") if DASHBOARDS_DIR.exists() else []:
+        if old not in files:
+            old.unlink()
+            print(f"[INFO] Removed {old.relative_to(BASE_DIR)}")
+
+    for path in stale:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(files[path], encoding="utf-8")
+        print(f"[SUCCESS] Wrote {path.relative_to(BASE_DIR)}")
+    print(f"[INFO] {len(files)} files, {len(stale)} updated")
+
+
+if __name__ == "__main__":
+    main()
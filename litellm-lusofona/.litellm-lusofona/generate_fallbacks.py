@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Fallback Chain Generator
+
+Builds LiteLLM `fallbacks` and `context_window_fallbacks` for every chat model
+group from the model catalog (models/*.yaml) and the policy in
+fallback_policy.yaml, and writes them into settings/router.yaml between the
+"BEGIN/END generated fallbacks" markers. Everything outside the markers is
+left untouched.
+
+Ranking for `fallbacks` (the model was throttled or failed):
+1. Targets on another provider first (independent rate limits)
+2. Closest blended per-token cost (a proxy for model capability)
+3. Highest configured rpm (most headroom)
+The closest on-prem model is then appended as a last resort, because its
+capacity is already paid for.
+
+`context_window_fallbacks` (the prompt did not fit) only contains targets with
+a strictly larger max_tokens, smallest window first.
+
+Usage:
+    python generate_fallbacks.py                   # Write settings/router.yaml
+    python generate_fallbacks.py --dry-run         # Print the generated section
+    python generate_fallbacks.py --simulate Groq-Llama-3.1-8B-Instant --offered-rpm 120
+"""
+
+import sys
+import math
+import argparse
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import yaml
+
+from model_catalog import ModelEntry, group_by_model_name, load_model_catalog
+
+BASE_DIR = Path(__file__).resolve().parent
+POLICY_FILE = BASE_DIR / "fallback_policy.yaml"
+ROUTER_FILE = BASE_DIR / "settings" / "router.yaml"
+
+BEGIN_MARKER = "  # BEGIN generated fallbacks (generate_fallbacks.py - do not edit by hand)"
+END_MARKER = "  # END generated fallbacks"
+
+
+@dataclass
+class FallbackPolicy:
+    max_fallbacks: int = 3
+    min_context_tokens: int = 8192
+    default_context_tokens: int = 8192
+    max_cost_ratio: float = 4.0
+    cost_exempt_providers: Tuple[str, ...] = ("on-premise",)
+    sunk_cost_last_resort: bool = True
+    prefer_other_providers: bool = True
+    exclude_patterns: Tuple[str, ...] = ()
+    pinned: Optional[Dict[str, List[str]]] = None
+
+    @classmethod
+    def load(cls, path: Path) -> "FallbackPolicy":
+        if not path.exists():
+            return cls()
+        with open(path, "r", encoding="utf-8") as f:
+            raw = yaml.safe_load(f) or {}
+        known = {k: v for k, v in raw.items() if k in cls.__dataclass_fields__}
+        for key in ("cost_exempt_providers", "exclude_patterns"):
+            if key in known:
+                known[key] = tuple(known[key] or ())
+        return cls(**known)
+
+
+@dataclass
+class Candidate:
+    """A chat model group as seen by the fallback planner."""
+    name: str
+    provider: str
+    context: int
+    cost: Optional[float]  # blended input+output cost per token, None if unknown
+    rpm: int
+
+    @classmethod
+    def from_entries(cls, entries: List[ModelEntry], policy: FallbackPolicy) -> "Candidate":
+        first = entries[0]
+        costs = [e.input_cost_per_token + e.output_cost_per_token for e in entries]
+        return cls(
+            name=first.model_name,
+            provider=first.provider,
+            context=first.max_tokens or policy.default_context_tokens,
+            cost=(sum(costs) / len(costs)) or None,
+            rpm=sum(e.rpm or 0 for e in entries),
+        )
+
+
+def chat_candidates(entries: List[ModelEntry], policy: FallbackPolicy) -> List[Candidate]:
+    candidates = []
+    for name, group in group_by_model_name(entries).items():
+        if group[0].mode != "chat":
+            continue
+        if any(pattern.lower() in name.lower() for pattern in policy.exclude_patterns):
+            continue
+        candidates.append(Candidate.from_entries(group, policy))
+    return candidates
+
+
+def cost_distance(source: Candidate, target: Candidate) -> float:
+    """Distance in orders of magnitude between blended costs (0 = same price)."""
+    if not source.cost or not target.cost:
+        return 1.0
+    return abs(math.log10(target.cost / source.cost))
+
+
+def within_budget(source: Candidate, target: Candidate, policy: FallbackPolicy) -> bool:
+    if target.provider in policy.cost_exempt_providers:
+        return True
+    if not source.cost or not target.cost:
+        return True
+    return target.cost <= source.cost * policy.max_cost_ratio
+
+
+def build_fallbacks(candidates: List[Candidate], policy: FallbackPolicy) -> Dict[str, List[str]]:
+    chains = {}
+    for source in candidates:
+        needed_context = min(source.context, policy.min_context_tokens)
+        targets = [
+            t for t in candidates
+            if t.name != source.name and t.context >= needed_context and within_budget(source, t, policy)
+        ]
+        targets.sort(key=lambda t: (
+            policy.prefer_other_providers and t.provider == source.provider,
+            round(cost_distance(source, t), 2),
+            -t.rpm,
+            t.name,
+        ))
+        chain = targets[:policy.max_fallbacks]
+        if policy.sunk_cost_last_resort and not any(t.provider in policy.cost_exempt_providers for t in chain):
+            sunk = [t for t in targets if t.provider in policy.cost_exempt_providers]
+            chain += sunk[:1]
+        if chain:
+            chains[source.name] = [t.name for t in chain]
+    for name, pinned in (policy.pinned or {}).items():
+        chains[name] = list(pinned)
+    return chains
+
+
+def build_context_window_fallbacks(candidates: List[Candidate], policy: FallbackPolicy) -> Dict[str, List[str]]:
+    chains = {}
+    for source in candidates:
+        targets = [
+            t for t in candidates
+            if t.context > source.context and within_budget(source, t, policy)
+        ]
+        targets.sort(key=lambda t: (t.context, round(cost_distance(source, t), 2), -t.rpm, t.name))
+        if targets:
+            chains[source.name] = [t.name for t in targets[:policy.max_fallbacks]]
+    return chains
+
+
+def render_section(fallbacks: Dict[str, List[str]], context_fallbacks: Dict[str, List[str]]) -> str:
+    def block(key: str, chains: Dict[str, List[str]]) -> List[str]:
+        if not chains:
+            return [f"  {key}: []"]
+        lines = [f"  {key}:"]
+        for name in sorted(chains):
+            lines.append(f"    - {name}: [{', '.join(chains[name])}]")
+        return lines
+
+    lines = [BEGIN_MARKER]
+    lines += block("fallbacks", fallbacks)
+    lines += block("context_window_fallbacks", context_fallbacks)
+    lines.append(END_MARKER)
+    return "\n".join(lines) + "\n"
+
+
+def write_section(router_file: Path, section: str) -> bool:
+    """Replace (or append) the generated section. Returns True if the file changed."""
+    content = router_file.read_text(encoding="utf-8")
+    if BEGIN_MARKER in content and END_MARKER in content:
+        head, rest = content.split(BEGIN_MARKER, 1)
+        _old, tail = rest.split(END_MARKER, 1)
+        new_content = head + section.rstrip("\n") + tail
+    else:
+        new_content = content.rstrip("\n") + "\n\n  # Fallback chains generated from the model catalog\n" + section
+    if new_content == content:
+        return False
+    router_file.write_text(new_content, encoding="utf-8")
+    return True
+
+
+def simulate(source: str, chains: Dict[str, List[str]], candidates: List[Candidate],
+             offered_rpm: int, minutes: int, background: float) -> None:
+    """Fixed-window rpm simulation of one throttled model, with and without its chain.
+
+    Every model group gets `background` of its rpm limit as existing traffic;
+    the requested model receives `offered_rpm` on top of that.
+    """
+    by_name = {c.name: c for c in candidates}
+    if source not in by_name:
+        print(f"[ERROR] Unknown chat model group: {source}")
+        sys.exit(1)
+    chain = [source] + chains.get(source, [])
+
+    def run(use_chain: bool) -> Dict[str, int]:
+        served = {name: 0 for name in chain}
+        served["rejected"] = 0
+        for _minute in range(minutes):
+            remaining = {name: int(by_name[name].rpm * (1 - background)) for name in chain}
+            for _request in range(offered_rpm):
+                for name in (chain if use_chain else chain[:1]):
+                    if remaining[name] > 0:
+                        remaining[name] -= 1
+                        served[name] += 1
+                        break
+                else:
+                    served["rejected"] += 1
+        return served
+
+    total = offered_rpm * minutes
+    print(f"Simulating {offered_rpm} rpm for {minutes} min on {source} "
+          f"(rpm limit {by_name[source].rpm}, background load {background:.0%})")
+    print(f"Chain: {' -> '.join(chain)}\n")
+    for label, use_chain in (("without fallbacks", False), ("with fallbacks", True)):
+        served = run(use_chain)
+        ok = total - served["rejected"]
+        print(f"{label:<18} served {ok / minutes:7.1f} rpm ({ok / total:6.1%}), "
+              f"rejected {served['rejected'] / minutes:7.1f} rpm")
+        if use_chain:
+            for name in chain:
+                print(f"    {name:<60} {served[name] / minutes:7.1f} rpm")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate LiteLLM fallback chains from the model catalog")
+    parser.add_argument("--models-dir", type=Path, default=None, help="Directory with provider YAML files")
+    parser.add_argument("--policy", type=Path, default=POLICY_FILE, help="Fallback policy YAML")
+    parser.add_argument("--router-file", type=Path, default=ROUTER_FILE, help="router.yaml to update")
+    parser.add_argument("--dry-run", action="store_true", help="Print the generated section only")
+    parser.add_argument("--simulate", metavar="MODEL", help="Simulate throttling of MODEL with the generated chain")
+    parser.add_argument("--offered-rpm", type=int, default=120, help="Simulation: offered requests per minute")
+    parser.add_argument("--minutes", type=int, default=10, help="Simulation: duration in minutes")
+    parser.add_argument("--background-load", type=float, default=0.5,
+                        help="Simulation: fraction of every model's rpm already in use")
+    args = parser.parse_args()
+
+    policy = FallbackPolicy.load(args.policy)
+    candidates = chat_candidates(load_model_catalog(args.models_dir), policy)
+    fallbacks = build_fallbacks(candidates, policy)
+    context_fallbacks = build_context_window_fallbacks(candidates, policy)
+
+    if args.simulate:
+        simulate(args.simulate, fallbacks, candidates, args.offered_rpm, args.minutes, args.background_load)
+        return
+
+    section = render_section(fallbacks, context_fallbacks)
+    if args.dry_run:
+        print(section, end="")
+        return
+
+    if write_section(args.router_file, section):
+        print(f"[SUCCESS] Updated {args.router_file} "
+              f"({len(fallbacks)} fallback chains, {len(context_fallbacks)} context window chains)")
+    else:
+        print(f"[INFO] {args.router_file} already up to date")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Lusochat On-Prem Health Prober (sidecar)
+
+Actively probes every on-prem endpoint in models/on-premise.yaml and publishes
+its state to Redis, where hooks/health_router.py reads it to take slow or dead
+endpoints out of rotation within a few seconds. Without it LiteLLM only learns
+that a box is busy or down after request_timeout (30s) times num_retries.
+
+Probes, per unique api_base:
+    llama.cpp  GET /health   200 = ready, 503 = loading / no free slot
+               GET /metrics  llamacpp:requests_processing / requests_deferred
+                             (needs llama-server --metrics; skipped if absent)
+    Ollama     GET /api/ps   loaded models (no queue metric is exposed)
+
+Each endpoint is classified with hysteresis:
+    down  fail_threshold consecutive probe failures
+    slow  latency EWMA above slow_ms, or queue depth (deferred requests)
+          at least max_queue
+    up    otherwise, after recover_threshold consecutive good probes
+
+Redis key per endpoint (expires after 3 intervals, so a dead prober fails open):
+    lusochat:health:<api_base> = {"status": "up|slow|down", "latency_ms", "ewma_ms",
+                                  "queue_depth", "processing", "reason", "checked_at"}
+
+Usage:
+    python health_prober.py                 # Probe forever, publish to Redis
+    python health_prober.py --once          # One round, print a table, no Redis
+    PROBE_SLOW_MS=1500 python health_prober.py --interval 2
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import aiohttp
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from model_catalog import load_model_catalog  # noqa: E402
+
+KEY_PREFIX = "lusochat:health:"
+
+
+@dataclass
+class ProbeSettings:
+    interval: float = float(os.environ.get("PROBE_INTERVAL", "5"))
+    timeout: float = float(os.environ.get("PROBE_TIMEOUT", "3"))
+    slow_ms: float = float(os.environ.get("PROBE_SLOW_MS", "2000"))
+    max_queue: int = int(os.environ.get("PROBE_MAX_QUEUE", "4"))
+    fail_threshold: int = int(os.environ.get("PROBE_FAIL_THRESHOLD", "2"))
+    recover_threshold: int = int(os.environ.get("PROBE_RECOVER_THRESHOLD", "2"))
+    ewma_alpha: float = 0.3
+
+
+@dataclass
+class Endpoint:
+    api_base: str
+    kind: str  # "llama.cpp" or "ollama"
+    models: List[str] = field(default_factory=list)
+    status: str = "up"
+    ewma_ms: Optional[float] = None
+    failures: int = 0
+    successes: int = 0
+    last: Dict = field(default_factory=dict)
+
+
+def discover_endpoints(models_dir: Optional[Path] = None) -> Dict[str, Endpoint]:
+    """One Endpoint per on-prem api_base, with the model groups served there."""
+    endpoints: Dict[str, Endpoint] = {}
+    for entry in load_model_catalog(models_dir):
+        if not entry.is_on_premise or not entry.api_base:
+            continue
+        api_base = entry.api_base.rstrip("/")
+        kind = "ollama" if str(entry.litellm_params.get("model", "")).startswith("ollama/") else "llama.cpp"
+        endpoint = endpoints.setdefault(api_base, Endpoint(api_base, kind))
+        if entry.model_name not in endpoint.models:
+            endpoint.models.append(entry.model_name)
+    return endpoints
+
+
+def parse_llamacpp_metrics(text: str) -> Dict[str, float]:
+    """Pick the queue gauges out of llama-server's Prometheus text output."""
+    values = {}
+    for line in text.splitlines():
+        if line.startswith("#") or " " not in line:
+            continue
+        name, _, value = line.partition(" ")
+        if name in ("llamacpp:requests_processing", "llamacpp:requests_deferred"):
+            try:
+                values[name.split(":", 1)[1]] = float(value)
+            except ValueError:
+                pass
+    return values
+
+
+async def probe(session: aiohttp.ClientSession, endpoint: Endpoint, settings: ProbeSettings) -> Dict:
+    """Probe one endpoint. Returns the raw observation (ok, latency_ms, queue...)."""
+    timeout = aiohttp.ClientTimeout(total=settings.timeout)
+    path = "/api/ps" if endpoint.kind == "ollama" else "/health"
+    started = time.perf_counter()
+    try:
+        async with session.get(endpoint.api_base + path, timeout=timeout) as response:
+            await response.read()
+            latency_ms = (time.perf_counter() - started) * 1000
+            if response.status != 200:
+                return {"ok": False, "latency_ms": latency_ms, "reason": f"{path} returned {response.status}"}
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        return {"ok": False, "latency_ms": None, "reason": f"{path} {type(e).__name__}"}
+
+    observation = {"ok": True, "latency_ms": latency_ms, "queue_depth": None, "processing": None, "reason": ""}
+    if endpoint.kind == "llama.cpp":
+        try:
+            async with session.get(endpoint.api_base + "/metrics", timeout=timeout) as response:
+                if response.status == 200:
+                    gauges = parse_llamacpp_metrics(await response.text())
+                    observation["queue_depth"] = gauges.get("requests_deferred")
+                    observation["processing"] = gauges.get("requests_processing")
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            pass  # /metrics is optional; /health already answered
+    return observation
+
+
+def classify(endpoint: Endpoint, observation: Dict, settings: ProbeSettings) -> None:
+    """Update the endpoint state from one observation (with hysteresis)."""
+    if observation["latency_ms"] is not None:
+        if endpoint.ewma_ms is None:
+            endpoint.ewma_ms = observation["latency_ms"]
+        else:
+            endpoint.ewma_ms += settings.ewma_alpha * (observation["latency_ms"] - endpoint.ewma_ms)
+
+    if not observation["ok"]:
+        endpoint.failures += 1
+        endpoint.successes = 0
+        if endpoint.failures >= settings.fail_threshold:
+            endpoint.status = "down"
+        reason = observation["reason"]
+    else:
+        endpoint.failures = 0
+        endpoint.successes += 1
+        queue = observation.get("queue_depth")
+        if queue is not None and queue >= settings.max_queue:
+            endpoint.status, reason = "slow", f"{queue:.0f} requests deferred"
+            endpoint.successes = 0
+        elif endpoint.ewma_ms is not None and endpoint.ewma_ms > settings.slow_ms:
+            endpoint.status, reason = "slow", f"latency {endpoint.ewma_ms:.0f} ms"
+            endpoint.successes = 0
+        elif endpoint.status == "up" or endpoint.successes >= settings.recover_threshold:
+            endpoint.status, reason = "up", ""
+        else:
+            reason = f"recovering ({endpoint.successes}/{settings.recover_threshold})"
+
+    endpoint.last = {
+        "api_base": endpoint.api_base,
+        "kind": endpoint.kind,
+        "models": endpoint.models,
+        "status": endpoint.status,
+        "latency_ms": round(observation["latency_ms"], 1) if observation["latency_ms"] is not None else None,
+        "ewma_ms": round(endpoint.ewma_ms, 1) if endpoint.ewma_ms is not None else None,
+        "queue_depth": observation.get("queue_depth"),
+        "processing": observation.get("processing"),
+        "reason": reason,
+        "checked_at": time.time(),
+    }
+
+
+async def probe_round(session, endpoints: Dict[str, Endpoint], settings: ProbeSettings) -> None:
+    observations = await asyncio.gather(*(probe(session, e, settings) for e in endpoints.values()))
+    for endpoint, observation in zip(endpoints.values(), observations):
+        previous = endpoint.status
+        classify(endpoint, observation, settings)
+        if endpoint.status != previous:
+            print(f"[WARNING] {endpoint.api_base} ({', '.join(endpoint.models)}): "
+                  f"{previous} -> {endpoint.status} {endpoint.last['reason']}", flush=True)
+
+
+async def publish(redis_client, endpoints: Dict[str, Endpoint], settings: ProbeSettings) -> None:
+    ttl = max(1, int(settings.interval * 3))
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for endpoint in endpoints.values():
+            pipe.set(KEY_PREFIX + endpoint.api_base, json.dumps(endpoint.last), ex=ttl)
+        await pipe.execute()
+
+
+def print_table(endpoints: Dict[str, Endpoint]) -> None:
+    for endpoint in endpoints.values():
+        last = endpoint.last
+        print(f"{endpoint.api_base:<30} {endpoint.kind:<10} {last['status']:<5} "
+              f"latency={last['latency_ms']} queue={last['queue_depth']} {last['reason']}")
+
+
+async def run(args) -> None:
+    settings = ProbeSettings(interval=args.interval)
+    endpoints = discover_endpoints(args.models_dir)
+    if not endpoints:
+        print("[ERROR] No on-prem endpoints found in the model catalog")
+        sys.exit(1)
+
+    async with aiohttp.ClientSession() as session:
+        if args.once:
+            # No hysteresis history in a single round: report the raw observation
+            settings.fail_threshold = settings.recover_threshold = 1
+            await probe_round(session, endpoints, settings)
+            print_table(endpoints)
+            return
+
+        import redis.asyncio as redis
+
+        redis_client = redis.Redis(
+            host=os.environ.get("REDIS_HOST", "redis"),
+            port=int(os.environ.get("REDIS_PORT", "6379")),
+            password=os.environ.get("REDIS_PASSWORD") or None,
+        )
+        print(f"[INFO] Probing {len(endpoints)} on-prem endpoints every {settings.interval:g}s", flush=True)
+        while True:
+            started = time.monotonic()
+            await probe_round(session, endpoints, settings)
+            try:
+                await publish(redis_client, endpoints, settings)
+            except Exception as e:  # keep probing; keys expire and the hook fails open
+                print(f"[WARNING] Could not publish to Redis: {e}", flush=True)
+            await asyncio.sleep(max(0.0, settings.interval - (time.monotonic() - started)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Probe on-prem model endpoints and publish health to Redis")
+    parser.add_argument("--models-dir", type=Path, default=None, help="Directory with provider YAML files")
+    parser.add_argument("--interval", type=float, default=ProbeSettings.interval, help="Seconds between rounds")
+    parser.add_argument("--once", action="store_true", help="Probe once and print, without Redis")
+    args = parser.parse_args()
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
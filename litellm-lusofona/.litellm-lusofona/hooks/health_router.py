@@ -0,0 +1,183 @@
+"""
+Lusochat Health Router (LiteLLM proxy hook)
+
+Takes on-prem deployments out of rotation while the health prober sidecar
+(health_prober/health_prober.py) reports them as slow or down, so requests go
+to another deployment of the group, or straight to the group's fallbacks,
+instead of waiting request_timeout x num_retries on a busy box.
+
+How it works:
+1. The prober writes lusochat:health:<api_base> to Redis every few seconds.
+2. async_filter_deployments (called by the router before picking a
+   deployment) drops every deployment whose api_base is "slow" or "down".
+3. If that drops every deployment of a group with a fallback chain in
+   settings/router.yaml (every on-prem chat group has one, and most of them
+   have a single api_base), the empty list makes LiteLLM raise its
+   no-deployments error and move on to the fallbacks without calling the box.
+4. Groups without fallbacks (the embedding groups behind embed-coalescer) get
+   the list back untouched: a slow box still beats none.
+
+Missing keys (prober stopped, endpoint not probed) and Redis errors also leave
+the deployment list untouched: the hook fails open.
+
+Enable it in settings/litellm.yaml:
+
+    callbacks: ["prometheus", ..., "hooks.health_router.proxy_handler_instance"]
+
+Metrics (exported on the proxy's /metrics through prometheus_client):
+    litellm_health_router_filtered_total{model, api_base, status}
+    litellm_health_router_fail_open_total{model}
+"""
+
+import os
+import json
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+import yaml
+from litellm.integrations.custom_logger import CustomLogger
+
+try:
+    from prometheus_client import Counter
+except ImportError:  # pragma: no cover
+    Counter = None
+
+
+if Counter is not None:
+    FILTERED = Counter(
+        "litellm_health_router_filtered",
+        "Deployments removed from rotation by the health router",
+        ["model", "api_base", "status"],
+    )
+    FAIL_OPEN = Counter(
+        "litellm_health_router_fail_open",
+        "Requests where every deployment was unhealthy, the group had no fallbacks and none was removed",
+        ["model"],
+    )
+else:  # pragma: no cover
+    FILTERED = FAIL_OPEN = None
+
+KEY_PREFIX = "lusochat:health:"  # must match health_prober.py
+UNHEALTHY = ("slow", "down")
+
+# Health is re-read from Redis at most this often per endpoint
+CACHE_SECONDS = 1.0
+# Redis errors are logged at most this often
+ERROR_LOG_SECONDS = 60.0
+
+# settings/ next to hooks/ (/app/settings in the container)
+ROUTER_SETTINGS = Path(
+    os.environ.get("LUSOCHAT_ROUTER_SETTINGS", Path(__file__).resolve().parent.parent / "settings" / "router.yaml")
+)
+
+
+def load_fallback_groups(path: Optional[Path] = None) -> Set[str]:
+    """Model groups with a non-empty regular fallback chain in settings/router.yaml."""
+    path = Path(path) if path else ROUTER_SETTINGS
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = yaml.safe_load(f) or {}
+    except (OSError, yaml.YAMLError) as e:
+        print(f"[Health Router] Cannot read fallbacks from {path}, failing open for every group: {e}")
+        return set()
+    groups = set()
+    for item in (data.get("router_settings") or {}).get("fallbacks") or []:
+        if isinstance(item, dict):
+            groups.update(name for name, chain in item.items() if chain)
+    return groups
+
+
+class HealthRouter(CustomLogger):
+    """LiteLLM callback filtering deployments by prober-reported health."""
+
+    def __init__(self, router_settings: Optional[Path] = None):
+        super().__init__()
+        self._fallback_groups = load_fallback_groups(router_settings)
+        self._redis = None
+        self._cache: Dict[str, tuple] = {}  # api_base -> (fetched_at, status or None)
+        self._last_error = 0.0
+
+    def _client(self):
+        if self._redis is None:
+            import redis.asyncio as redis
+
+            self._redis = redis.Redis(
+                host=os.environ.get("REDIS_HOST", "redis"),
+                port=int(os.environ.get("REDIS_PORT", "6379")),
+                password=os.environ.get("REDIS_PASSWORD") or None,
+                socket_timeout=0.2,
+                socket_connect_timeout=0.2,
+            )
+        return self._redis
+
+    async def _statuses(self, api_bases: List[str]) -> Dict[str, Optional[str]]:
+        now = time.monotonic()
+        statuses = {}
+        stale = []
+        for api_base in api_bases:
+            cached = self._cache.get(api_base)
+            if cached and now - cached[0] < CACHE_SECONDS:
+                statuses[api_base] = cached[1]
+            else:
+                stale.append(api_base)
+        if not stale:
+            return statuses
+
+        try:
+            raw = await self._client().mget([KEY_PREFIX + api_base for api_base in stale])
+        except Exception as e:
+            if now - self._last_error > ERROR_LOG_SECONDS:
+                print(f"[Health Router] Redis unavailable, not filtering: {e}")
+                self._last_error = now
+            return statuses
+
+        for api_base, value in zip(stale, raw):
+            status = None
+            if value:
+                try:
+                    status = json.loads(value).get("status")
+                except (ValueError, AttributeError):
+                    pass
+            self._cache[api_base] = (now, status)
+            statuses[api_base] = status
+        return statuses
+
+    # ---- LiteLLM hooks ----
+    async def async_filter_deployments(
+        self,
+        model: str,
+        healthy_deployments: List,
+        messages: Optional[List] = None,
+        request_kwargs: Optional[dict] = None,
+        parent_otel_span=None,
+    ) -> List[dict]:
+        api_bases = {}
+        for deployment in healthy_deployments:
+            api_base = ((deployment.get("litellm_params") or {}).get("api_base") or "").rstrip("/")
+            if api_base:
+                api_bases[id(deployment)] = api_base
+        if not api_bases:
+            return healthy_deployments
+
+        statuses = await self._statuses(sorted(set(api_bases.values())))
+        kept, removed = [], []
+        for deployment in healthy_deployments:
+            api_base = api_bases.get(id(deployment))
+            status = statuses.get(api_base) if api_base else None
+            if status in UNHEALTHY:
+                removed.append((api_base, status))
+            else:
+                kept.append(deployment)
+        has_fallbacks = model in self._fallback_groups or "*" in self._fallback_groups
+        if not kept and not has_fallbacks:
+            if FAIL_OPEN is not None:
+                FAIL_OPEN.labels(model).inc()
+            return healthy_deployments
+        if FILTERED is not None:
+            for api_base, status in removed:
+                FILTERED.labels(model, api_base, status).inc()
+        return kept
+
+
+proxy_handler_instance = HealthRouter()
@@ -0,0 +1,134 @@
+"""
+Lusochat Prefix Cache Layout (LiteLLM proxy hook)
+
+Makes requests to the on-prem llama.cpp chat models reuse the KV cache of the
+Lusobot system prompt and of earlier turns instead of prefilling ~5 KB of
+prompt on every request.
+
+How it works:
+1. async_pre_call_hook rewrites the messages with hooks/prompt_layout.py:
+   static system prompt first (byte-identical across users), then the RAG /
+   web search context OpenWebUI injected, then the history.
+2. It adds llama.cpp options through extra_body:
+       cache_prompt: true   reuse the slot's KV cache for the common prefix
+       id_slot: <n>         same chat -> same slot, so history stays cached
+   id_slot is only sent with pin_slots; the chat id comes from the
+   X-OpenWebUI-Chat-Id header (OpenWebUI with
+   ENABLE_FORWARD_USER_INFO_HEADERS=true). Unpinned requests let llama.cpp
+   pick a slot by prompt similarity.
+
+Configuration lives per model entry in models/*.yaml under model_info:
+
+    model_info:
+      prefix_cache:
+        enabled: true
+        slots: 4                    # must match llama-server --parallel
+        pin_slots: false            # id_slot per chat (see below)
+        context_position: system    # or last_user: context after the history
+
+Pinning only pays off when earlier turns are a large share of the prompt and
+there are more slots than active chats: a pinned request waits for its slot
+even when others are idle. Measure with bench/prefix_cache_bench.py first.
+
+Enable it in settings/litellm.yaml:
+
+    callbacks: [..., "hooks.prefix_cache.proxy_handler_instance"]
+
+Metrics (exported on the proxy's /metrics through prometheus_client):
+    litellm_prefix_cache_requests_total{model, layout=reordered|unchanged, pinned=true|false}
+"""
+
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from model_catalog import load_model_catalog  # noqa: E402
+from hooks.prompt_layout import canonical_layout, compile_patterns, slot_for  # noqa: E402
+
+from litellm.integrations.custom_logger import CustomLogger  # noqa: E402
+
+try:
+    from prometheus_client import Counter
+except ImportError:  # pragma: no cover
+    Counter = None
+
+
+if Counter is not None:
+    LAYOUT_REQUESTS = Counter(
+        "litellm_prefix_cache_requests",
+        "Requests laid out for prefix caching",
+        ["model", "layout", "pinned"],
+    )
+else:  # pragma: no cover
+    LAYOUT_REQUESTS = None
+
+CHAT_ID_HEADER = "x-openwebui-chat-id"
+
+
+@dataclass
+class PrefixCacheSettings:
+    """Per-model settings read from model_info.prefix_cache."""
+    slots: int = 1
+    pin_slots: bool = False
+    context_position: str = "system"
+    context_patterns: Optional[List[str]] = None
+
+    @classmethod
+    def from_model_info(cls, raw: Dict[str, Any]) -> Optional["PrefixCacheSettings"]:
+        if not raw or not raw.get("enabled", False):
+            return None
+        known = {k: v for k, v in raw.items() if k in cls.__dataclass_fields__}
+        return cls(**known)
+
+
+def _chat_id(data: dict) -> Optional[str]:
+    headers = (data.get("proxy_server_request") or {}).get("headers") or {}
+    for key, value in headers.items():
+        if key.lower() == CHAT_ID_HEADER and value:
+            return str(value)
+    metadata = data.get("metadata") or {}
+    return metadata.get("chat_id") or None
+
+
+class PrefixCacheLayout(CustomLogger):
+    """LiteLLM callback laying out prompts for llama.cpp prefix caching."""
+
+    def __init__(self, models_dir: Optional[Path] = None):
+        super().__init__()
+        self.settings: Dict[str, PrefixCacheSettings] = {}
+        for entry in load_model_catalog(models_dir):
+            settings = PrefixCacheSettings.from_model_info(entry.model_info.get("prefix_cache"))
+            if settings and entry.mode == "chat":
+                self.settings[entry.model_name] = settings
+        self.patterns = {name: compile_patterns(s.context_patterns) for name, s in self.settings.items()}
+        if self.settings:
+            print(f"[Prefix Cache] Enabled for: {', '.join(sorted(self.settings))}")
+
+    async def async_pre_call_hook(self, user_api_key_dict, cache, data: dict, call_type):
+        model = data.get("model")
+        if call_type != "completion" or model not in self.settings:
+            return data
+        settings = self.settings[model]
+
+        changed = False
+        messages = data.get("messages")
+        if messages:
+            data["messages"], changed = canonical_layout(messages, self.patterns[model], settings.context_position)
+
+        extra_body = dict(data.get("extra_body") or {})
+        extra_body.setdefault("cache_prompt", True)
+        chat_id = _chat_id(data) if settings.pin_slots else None
+        if chat_id and "id_slot" not in extra_body:
+            extra_body["id_slot"] = slot_for(chat_id, settings.slots)
+        data["extra_body"] = extra_body
+
+        if LAYOUT_REQUESTS is not None:
+            LAYOUT_REQUESTS.labels(
+                model, "reordered" if changed else "unchanged", "true" if "id_slot" in extra_body else "false"
+            ).inc()
+        return data
+
+
+proxy_handler_instance = PrefixCacheLayout()
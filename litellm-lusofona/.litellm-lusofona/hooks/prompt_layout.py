@@ -0,0 +1,93 @@
+"""
+Prefix-cache-friendly message layout
+
+llama.cpp (and any server with prompt caching) only reuses the KV cache for the
+longest common token prefix between requests. OpenWebUI builds the Lusobot
+prompt as
+
+    system: <RAG / web search context for this turn> + <Lusobot system prompt>
+    ...history...
+
+so the ~5 KB system prompt sits behind text that changes every turn and is
+prefilled again on every request. canonical_layout() rewrites it as
+
+    system: <Lusobot system prompt, byte-identical for every user and turn>
+            + <RAG / web search context>
+    ...history (unchanged order)...
+
+keeping a single system message, since several chat templates (Qwen among them)
+reject a system message that is not the first one.
+
+With context_position="last_user" the context goes in front of the final user
+message instead, after the history. Combined with slot pinning that also keeps
+earlier turns cached, at the cost of the context no longer being system text.
+
+No LiteLLM imports here: hooks/prefix_cache.py and bench/prefix_cache_bench.py
+both use this module.
+"""
+
+import re
+import hashlib
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# Context blocks OpenWebUI (and our filters) put in the system message. The
+# first one matches OpenWebUI's default RAG template ("### Task: ... <context>
+# ... </context>", optionally followed by <user_query>); the others catch
+# custom templates that only keep the tags.
+DEFAULT_CONTEXT_PATTERNS = (
+    r"### Task:.*?</context>\s*(?:<user_query>.*?</user_query>\s*)?",
+    r"<context>.*?</context>\s*",
+    r"<source\b[^>]*>.*?</source>\s*",
+)
+
+
+def compile_patterns(patterns: Optional[Sequence[str]] = None) -> List["re.Pattern"]:
+    return [re.compile(p, re.DOTALL) for p in (patterns or DEFAULT_CONTEXT_PATTERNS)]
+
+
+def split_context(text: str, patterns: List["re.Pattern"]) -> Tuple[str, List[str]]:
+    """Split a system message into (static text, [context blocks])."""
+    contexts = []
+    for pattern in patterns:
+        def take(match):
+            contexts.append(match.group(0).strip())
+            return ""
+        text = pattern.sub(take, text)
+    return text.strip(), contexts
+
+
+def canonical_layout(messages: List[Dict[str, Any]], patterns: List["re.Pattern"],
+                     context_position: str = "system") -> Tuple[List[Dict[str, Any]], bool]:
+    """Return (messages, changed). System messages are merged into one leading
+    message with the static text first; the context blocks follow it, or open
+    the last user message when context_position is "last_user"."""
+    system = [m for m in messages if m.get("role") == "system"]
+    if not system or any(not isinstance(m.get("content"), str) for m in system):
+        return messages, False
+
+    static_parts, context_parts = [], []
+    for message in system:
+        static, contexts = split_context(message["content"], patterns)
+        if static:
+            static_parts.append(static)
+        context_parts.extend(contexts)
+
+    content = "\n\n".join(static_parts)
+    rest = [m for m in messages if m.get("role") != "system"]
+    context = "\n\n".join(context_parts)
+    last_user = rest[-1] if rest and rest[-1].get("role") == "user" else None
+    if context and context_position == "last_user" and last_user and isinstance(last_user.get("content"), str):
+        rest[-1] = {**last_user, "content": f"{context}\n\n{last_user['content']}"}
+    elif context:
+        content = (content + "\n\n" if content else "") + context
+
+    layout = [{**system[0], "content": content}] + rest
+    changed = (len(system) > 1 or messages[0] is not system[0] or system[0]["content"] != content
+               or bool(rest) and rest[-1] is not last_user)
+    return layout, changed
+
+
+def slot_for(chat_id: str, slots: int) -> int:
+    """Stable llama.cpp slot for a chat (same chat -> same slot -> warm KV cache)."""
+    digest = hashlib.sha256(chat_id.encode("utf-8")).digest()
+    return int.from_bytes(digest[:4], "big") % max(1, slots)
@@ -0,0 +1,334 @@
+"""
+Lusochat Semantic Cache (LiteLLM proxy hook)
+
+Answers repeated chat questions (Lusobot admissions FAQs) from a local vector
+index instead of spending GPU time on the on-prem chat models.
+
+How it works:
+1. async_pre_call_hook embeds the final user message with an on-prem embedding
+   model (through the proxy's own router) and looks it up in a per-model flat
+   cosine index, filtered by a hash of the system prompt.
+2. On a hit above the configured threshold the cached answer is returned by
+   returning a string from the hook; LiteLLM sends it back as the assistant
+   message (streaming and non-streaming).
+3. On a miss the embedding is parked by litellm_call_id and
+   async_log_success_event stores (embedding, system hash, response) once the
+   upstream answer is complete.
+
+Configuration lives per model entry in models/*.yaml under model_info:
+
+    model_info:
+      semantic_cache:
+        enabled: true
+        embedding_model: embeddings-bge-m3-Lusofona-On-Premise
+        similarity_threshold: 0.93
+        max_entries: 5000
+        ttl_seconds: 86400
+
+Enable it in settings/litellm.yaml:
+
+    callbacks: ["prometheus", "hooks.semantic_cache.proxy_handler_instance"]
+
+Metrics (exported on the proxy's /metrics through prometheus_client):
+    litellm_semantic_cache_requests_total{model, result=hit|miss|skip}
+    litellm_semantic_cache_evictions_total{model, reason=capacity|ttl}
+    litellm_semantic_cache_entries{model}
+    litellm_semantic_cache_lookup_seconds{model}
+"""
+
+import sys
+import time
+import uuid
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# model_catalog.py lives one level up (/app in the container)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from model_catalog import load_model_catalog  # noqa: E402
+
+from litellm.integrations.custom_logger import CustomLogger  # noqa: E402
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+try:
+    from prometheus_client import Counter, Gauge, Histogram
+except ImportError:  # pragma: no cover
+    Counter = Gauge = Histogram = None
+
+
+if Counter is not None:
+    CACHE_REQUESTS = Counter(
+        "litellm_semantic_cache_requests",
+        "Semantic cache lookups by result",
+        ["model", "result"],
+    )
+    CACHE_EVICTIONS = Counter(
+        "litellm_semantic_cache_evictions",
+        "Semantic cache entries evicted",
+        ["model", "reason"],
+    )
+    CACHE_ENTRIES = Gauge(
+        "litellm_semantic_cache_entries",
+        "Semantic cache entries currently stored",
+        ["model"],
+    )
+    CACHE_LOOKUP_SECONDS = Histogram(
+        "litellm_semantic_cache_lookup_seconds",
+        "Time spent embedding and searching the semantic cache",
+        ["model"],
+        buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+    )
+else:  # pragma: no cover
+    CACHE_REQUESTS = CACHE_EVICTIONS = CACHE_ENTRIES = CACHE_LOOKUP_SECONDS = None
+
+# Embeddings parked between pre-call and success callbacks
+MAX_PENDING = 1024
+PENDING_TTL_SECONDS = 600
+
+
+@dataclass
+class SemanticCacheSettings:
+    """Per-model settings read from model_info.semantic_cache."""
+    embedding_model: str
+    similarity_threshold: float = 0.93
+    max_entries: int = 5000
+    ttl_seconds: int = 86400
+    min_query_chars: int = 8
+    max_query_chars: int = 2000
+    # Only cache conversations with at most this many earlier user turns;
+    # answers deeper in a chat depend on the history, not just the question.
+    max_history_turns: int = 0
+
+    @classmethod
+    def from_model_info(cls, raw: Dict[str, Any]) -> Optional["SemanticCacheSettings"]:
+        if not raw or not raw.get("enabled", False) or not raw.get("embedding_model"):
+            return None
+        known = {k: v for k, v in raw.items() if k in cls.__dataclass_fields__}
+        return cls(**known)
+
+
+class FlatVectorIndex:
+    """Brute-force cosine index with TTL and least-recently-used eviction.
+
+    Vectors are L2-normalised on insert so a lookup is one matrix-vector
+    product. For a few thousand FAQ answers this stays well under a
+    millisecond, so no approximate (HNSW) structure is needed.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._vectors: List[Any] = []
+        self._matrix = None  # stacked copy of _vectors, rebuilt lazily
+        self._system_hashes: List[str] = []
+        self._responses: List[str] = []
+        self._created_at: List[float] = []
+        self._last_used: List[float] = []
+
+    def __len__(self):
+        return len(self._responses)
+
+    @staticmethod
+    def _normalise(vector):
+        if np is not None:
+            v = np.asarray(vector, dtype=np.float32)
+            norm = float(np.linalg.norm(v))
+            return v / norm if norm else v
+        norm = sum(x * x for x in vector) ** 0.5
+        return [x / norm for x in vector] if norm else list(vector)
+
+    def _remove(self, position: int):
+        for column in (self._vectors, self._system_hashes, self._responses,
+                       self._created_at, self._last_used):
+            del column[position]
+        self._matrix = None
+
+    def expire(self, now: float) -> int:
+        """Drop entries older than the TTL. Returns how many were removed."""
+        expired = [i for i, t in enumerate(self._created_at) if now - t > self.ttl_seconds]
+        for position in reversed(expired):
+            self._remove(position)
+        return len(expired)
+
+    def search(self, vector, system_hash: str, threshold: float) -> Tuple[float, Optional[str]]:
+        """Return (similarity, response) of the best entry with the same system
+        hash. The response is None unless the similarity reaches the threshold."""
+        if not self._responses:
+            return 0.0, None
+        query = self._normalise(vector)
+        if np is not None:
+            if self._matrix is None:
+                self._matrix = np.vstack(self._vectors)
+            scores = self._matrix @ query
+            scores = np.where(np.array(self._system_hashes) == system_hash, scores, -1.0)
+            best = int(np.argmax(scores))
+            best_score = float(scores[best])
+        else:
+            best, best_score = -1, -1.0
+            for i, stored in enumerate(self._vectors):
+                if self._system_hashes[i] != system_hash:
+                    continue
+                score = sum(a * b for a, b in zip(stored, query))
+                if score > best_score:
+                    best, best_score = i, score
+        if best < 0 or best_score < threshold:
+            return max(best_score, 0.0), None
+        self._last_used[best] = time.time()
+        return best_score, self._responses[best]
+
+    def add(self, vector, system_hash: str, response: str) -> int:
+        """Insert an entry, evicting the least recently used ones if full.
+        Returns the number of evicted entries."""
+        evicted = 0
+        while len(self._responses) >= self.max_entries:
+            lru = min(range(len(self._last_used)), key=self._last_used.__getitem__)
+            self._remove(lru)
+            evicted += 1
+        now = time.time()
+        self._vectors.append(self._normalise(vector))
+        self._system_hashes.append(system_hash)
+        self._responses.append(response)
+        self._created_at.append(now)
+        self._last_used.append(now)
+        self._matrix = None
+        return evicted
+
+
+def _message_text(message: Dict[str, Any]) -> str:
+    content = message.get("content")
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "\n".join(
+            part.get("text", "") for part in content
+            if isinstance(part, dict) and part.get("type") == "text"
+        )
+    return ""
+
+
+def _system_hash(messages: List[Dict[str, Any]]) -> str:
+    system = "\n".join(_message_text(m) for m in messages if m.get("role") == "system")
+    return hashlib.sha256(system.encode("utf-8")).hexdigest()
+
+
+def _inc(metric, *labels, amount=1):
+    if metric is not None and amount:
+        metric.labels(*labels).inc(amount)
+
+
+class SemanticCache(CustomLogger):
+    """LiteLLM callback serving chat completions from a semantic cache."""
+
+    def __init__(self, models_dir: Optional[Path] = None):
+        super().__init__()
+        self.settings: Dict[str, SemanticCacheSettings] = {}
+        for entry in load_model_catalog(models_dir):
+            settings = SemanticCacheSettings.from_model_info(entry.model_info.get("semantic_cache"))
+            if settings and entry.mode == "chat":
+                self.settings[entry.model_name] = settings
+        self.indexes: Dict[str, FlatVectorIndex] = {
+            name: FlatVectorIndex(s.max_entries, s.ttl_seconds) for name, s in self.settings.items()
+        }
+        self._pending: "OrderedDict[str, Tuple[float, str, Any, str]]" = OrderedDict()
+        if self.settings:
+            print(f"[Semantic Cache] Enabled for: {', '.join(sorted(self.settings))}")
+
+    # ---- helpers ----
+    def _cache_key(self, model: str, data: dict) -> Optional[Tuple[str, str]]:
+        """Return (query, system_hash) if this request is cacheable."""
+        settings = self.settings[model]
+        messages = data.get("messages") or []
+        if not messages or messages[-1].get("role") != "user":
+            return None
+        if data.get("tools") or (data.get("n") or 1) != 1:
+            return None
+        earlier_turns = sum(1 for m in messages[:-1] if m.get("role") == "user")
+        if earlier_turns > settings.max_history_turns:
+            return None
+        query = _message_text(messages[-1]).strip()
+        if not (settings.min_query_chars <= len(query) <= settings.max_query_chars):
+            return None
+        return query, _system_hash(messages)
+
+    async def _embed(self, embedding_model: str, text: str):
+        from litellm.proxy.proxy_server import llm_router
+
+        response = await llm_router.aembedding(model=embedding_model, input=[text])
+        item = response.data[0]
+        return item["embedding"] if isinstance(item, dict) else item.embedding
+
+    def _park(self, call_id: str, model: str, vector, system_hash: str):
+        now = time.time()
+        while self._pending:
+            oldest_id, (parked_at, *_rest) = next(iter(self._pending.items()))
+            if len(self._pending) < MAX_PENDING and now - parked_at < PENDING_TTL_SECONDS:
+                break
+            self._pending.pop(oldest_id)
+        self._pending[call_id] = (now, model, vector, system_hash)
+
+    # ---- LiteLLM hooks ----
+    async def async_pre_call_hook(self, user_api_key_dict, cache, data: dict, call_type):
+        model = data.get("model")
+        if call_type != "completion" or model not in self.settings:
+            return data
+
+        key = self._cache_key(model, data)
+        if key is None:
+            _inc(CACHE_REQUESTS, model, "skip")
+            return data
+        query, system_hash = key
+
+        settings = self.settings[model]
+        index = self.indexes[model]
+        started = time.perf_counter()
+        try:
+            vector = await self._embed(settings.embedding_model, query)
+        except Exception as e:
+            print(f"[Semantic Cache] Embedding failed for {model}: {e}")
+            _inc(CACHE_REQUESTS, model, "skip")
+            return data
+
+        _inc(CACHE_EVICTIONS, model, "ttl", amount=index.expire(time.time()))
+        _similarity, response = index.search(vector, system_hash, settings.similarity_threshold)
+        if CACHE_LOOKUP_SECONDS is not None:
+            CACHE_LOOKUP_SECONDS.labels(model).observe(time.perf_counter() - started)
+        if CACHE_ENTRIES is not None:
+            CACHE_ENTRIES.labels(model).set(len(index))
+
+        if response is not None:
+            _inc(CACHE_REQUESTS, model, "hit")
+            return response
+
+        _inc(CACHE_REQUESTS, model, "miss")
+        call_id = data.setdefault("litellm_call_id", str(uuid.uuid4()))
+        self._park(call_id, model, vector, system_hash)
+        return data
+
+    async def async_log_success_event(self, kwargs, response_obj, start_time, end_time):
+        parked = self._pending.pop(kwargs.get("litellm_call_id"), None)
+        if parked is None:
+            return
+        _parked_at, model, vector, system_hash = parked
+        try:
+            choice = response_obj.choices[0]
+            answer = choice.message.content
+            if choice.finish_reason != "stop" or not answer:
+                return
+        except (AttributeError, IndexError):
+            return
+        index = self.indexes[model]
+        _inc(CACHE_EVICTIONS, model, "capacity", amount=index.add(vector, system_hash, answer))
+        if CACHE_ENTRIES is not None:
+            CACHE_ENTRIES.labels(model).set(len(index))
+
+    async def async_log_failure_event(self, kwargs, response_obj, start_time, end_time):
+        self._pending.pop(kwargs.get("litellm_call_id"), None)
+
+
+proxy_handler_instance = SemanticCache()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Lusochat Model Catalog Reader
+
+Loads the provider files in models/*.yaml (the same files config.yaml
+includes) into a flat list of deployments. The proxy hooks in hooks/ and the
+generator scripts all read the catalog through here so they agree on model
+names, limits and pricing.
+
+Provider files are not consistent about where values live: Groq and SambaNova
+keep rpm/tpm and pricing in litellm_params, Gemini and OpenAI keep pricing in
+model_info. ModelEntry.get() hides that difference.
+
+Usage:
+    python model_catalog.py              # Print a summary of the catalog
+    python model_catalog.py --json       # Dump the flattened catalog as JSON
+"""
+
+import os
+import sys
+import json
+import argparse
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import yaml
+
+# models/ next to this file, both in the repo and inside the container (/app)
+DEFAULT_MODELS_DIR = Path(
+    os.environ.get("LUSOCHAT_MODELS_DIR", Path(__file__).resolve().parent / "models")
+)
+
+
+@dataclass
+class ModelEntry:
+    """A single deployment from the model catalog."""
+    model_name: str
+    provider: str  # provider file stem, e.g. "on-premise", "groq"
+    litellm_params: Dict[str, Any] = field(default_factory=dict)
+    model_info: Dict[str, Any] = field(default_factory=dict)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Look a key up in model_info first, then in litellm_params."""
+        if self.model_info.get(key) is not None:
+            return self.model_info[key]
+        if self.litellm_params.get(key) is not None:
+            return self.litellm_params[key]
+        return default
+
+    @property
+    def mode(self) -> str:
+        return str(self.get("mode", "chat"))
+
+    @property
+    def api_base(self) -> Optional[str]:
+        return self.litellm_params.get("api_base")
+
+    @property
+    def rpm(self) -> Optional[int]:
+        value = self.get("rpm")
+        return int(value) if value is not None else None
+
+    @property
+    def tpm(self) -> Optional[int]:
+        value = self.get("tpm")
+        return int(value) if value is not None else None
+
+    @property
+    def max_tokens(self) -> Optional[int]:
+        value = self.get("max_tokens")
+        return int(value) if value is not None else None
+
+    @property
+    def input_cost_per_token(self) -> float:
+        return float(self.get("input_cost_per_token", 0.0) or 0.0)
+
+    @property
+    def output_cost_per_token(self) -> float:
+        return float(self.get("output_cost_per_token", 0.0) or 0.0)
+
+    @property
+    def is_on_premise(self) -> bool:
+        return self.provider == "on-premise"
+
+
+def load_model_catalog(models_dir: Optional[Path] = None) -> List[ModelEntry]:
+    """Load every model_list entry from models/*.yaml, in file order."""
+    models_dir = Path(models_dir) if models_dir else DEFAULT_MODELS_DIR
+    entries = []
+    for path in sorted(models_dir.glob("*.yaml")):
+        with open(path, "r", encoding="utf-8") as f:
+            data = yaml.safe_load(f) or {}
+        for item in data.get("model_list") or []:
+            if not item or "model_name" not in item:
+                continue
+            entries.append(ModelEntry(
+                model_name=item["model_name"],
+                provider=path.stem,
+                litellm_params=dict(item.get("litellm_params") or {}),
+                model_info=dict(item.get("model_info") or {}),
+            ))
+    return entries
+
+
+def group_by_model_name(entries: List[ModelEntry]) -> Dict[str, List[ModelEntry]]:
+    """Group deployments by model_name (a LiteLLM model group)."""
+    groups: Dict[str, List[ModelEntry]] = {}
+    for entry in entries:
+        groups.setdefault(entry.model_name, []).append(entry)
+    return groups
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the Lusochat model catalog")
+    parser.add_argument("--models-dir", type=Path, default=None, help="Directory with provider YAML files")
+    parser.add_argument("--json", action="store_true", help="Dump the flattened catalog as JSON")
+    args = parser.parse_args()
+
+    entries = load_model_catalog(args.models_dir)
+    if not entries:
+        print(f"No models found in {args.models_dir or DEFAULT_MODELS_DIR}")
+        sys.exit(1)
+
+    if args.json:
+        print(json.dumps([entry.__dict__ for entry in entries], indent=2, default=str))
+        return
+
+    for entry in entries:
+        print(
+            f"{entry.provider:<12} {entry.mode:<16} {entry.model_name:<60} "
+            f"rpm={entry.rpm} tpm={entry.tpm} max_tokens={entry.max_tokens}"
+        )
+    print(f"\n{len(entries)} deployments in {len(group_by_model_name(entries))} model groups")
+
+
+if __name__ == "__main__":
+    main()
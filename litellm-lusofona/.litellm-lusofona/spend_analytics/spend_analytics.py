@@ -0,0 +1,501 @@
+#!/usr/bin/env python3
+"""
+Lusochat Spend Analytics
+
+Incrementally copies LiteLLM's spend log table ("LiteLLM_SpendLogs" in the
+proxy's Postgres) into Parquet and keeps per-day rollups next to it, so cost
+reports per user, team and model read a few small files instead of scanning
+the whole spend table.
+
+Layout of the data directory:
+
+    state.json                          high-water mark + batch counter
+    spend/day=2025-10-01/model_group=<group>/part-000042-0.parquet
+                                        raw rows, one part per batch
+    rollups/by_user/day=2025-10-01.parquet
+    rollups/by_team/day=2025-10-01.parquet
+    rollups/by_model/day=2025-10-01.parquet
+
+How a run works:
+1. extract reads rows after the high-water mark ("startTime", request_id)
+   with keyset pagination, leaving out the last --settle-seconds because
+   LiteLLM writes spend logs in batches. Each batch becomes Parquet parts
+   named after the batch number, so a crashed run that is repeated
+   overwrites its own files instead of duplicating rows.
+2. Only the days touched by the new rows are re-aggregated (vectorised
+   pyarrow group-bys over that day's parts); older days are never read again.
+3. state.json is replaced atomically once the parts and rollups are written.
+
+Users are the OpenWebUI user ids LiteLLM records as end_user when
+general_settings.user_header_name is X-OpenWebUI-User-Id (falls back to the
+"user" field). Teams are LiteLLM team_ids (one per department).
+
+On-prem GPU-second amortisation: a request's GPU seconds are its wall time
+(endTime - startTime) on an on-prem api_base. Each on-prem box costs
+gpu_cost_per_day (model_info.gpu_cost_per_day in models/on-premise.yaml, or
+--gpu-cost-per-day), split across that day's requests in proportion to their
+GPU seconds, so an idle day still shows up in the per-request cost.
+
+Sources: Postgres through DATABASE_URL (psycopg2), or a SQLite file with the
+same table for local runs (--sqlite). SQLite timestamps must be stored as
+"YYYY-MM-DD HH:MM:SS[.fff]" text, as LiteLLM's Prisma schema writes them.
+
+Usage:
+    python spend_analytics.py extract                      # DATABASE_URL from env
+    python spend_analytics.py extract --sqlite spend.db --data-dir ./data
+    python spend_analytics.py rollup --all                 # Rebuild every day (e.g. new GPU rate)
+    python spend_analytics.py report --by user --since 2025-10-01
+    python spend_analytics.py report --by model --since 2025-10-01 --format csv
+"""
+
+import os
+import sys
+import json
+import sqlite3
+import argparse
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from model_catalog import load_model_catalog  # noqa: E402
+
+TABLE = '"LiteLLM_SpendLogs"'
+DEFAULT_DATA_DIR = Path(os.environ.get("SPEND_DATA_DIR", Path(__file__).resolve().parent / "data"))
+
+# Spend log columns we keep, in the table's own names. Columns missing in the
+# installed LiteLLM version are read as nulls.
+SOURCE_COLUMNS = [
+    "request_id", "startTime", "endTime", "model", "model_group", "custom_llm_provider", "api_base",
+    "spend", "prompt_tokens", "completion_tokens", "total_tokens", "user", "end_user", "team_id",
+    "cache_hit", "status",
+]
+
+SCHEMA = pa.schema([
+    ("request_id", pa.string()),
+    ("start_time", pa.timestamp("ms")),
+    ("end_time", pa.timestamp("ms")),
+    ("litellm_model", pa.string()),
+    ("model_group", pa.string()),
+    ("provider", pa.string()),
+    ("api_base", pa.string()),
+    ("spend", pa.float64()),
+    ("prompt_tokens", pa.int64()),
+    ("completion_tokens", pa.int64()),
+    ("total_tokens", pa.int64()),
+    ("user_id", pa.string()),
+    ("team_id", pa.string()),
+    ("cache_hit", pa.bool_()),
+    ("failed", pa.bool_()),
+    ("duration_s", pa.float64()),
+])
+
+ROLLUPS = {
+    "by_user": ["user_id"],
+    "by_team": ["team_id"],
+    "by_model": ["model_group", "gpu_host"],
+}
+
+METRICS = [
+    ("requests", "sum"), ("prompt_tokens", "sum"), ("completion_tokens", "sum"), ("total_tokens", "sum"),
+    ("spend", "sum"), ("gpu_seconds", "sum"), ("gpu_cost", "sum"), ("cache_hits", "sum"), ("failures", "sum"),
+]
+
+
+def info(msg: str) -> None:
+    print(f"[INFO] {msg}")
+
+
+def success(msg: str) -> None:
+    print(f"[SUCCESS] {msg}")
+
+
+def warning(msg: str) -> None:
+    print(f"[WARNING] {msg}", file=sys.stderr)
+
+
+def error(msg: str) -> None:
+    print(f"[ERROR] {msg}", file=sys.stderr)
+
+
+# ---- sources -----------------------------------------------------------------
+
+class SpendSource:
+    """Keyset-paginated reads of the spend table (Postgres or SQLite)."""
+
+    placeholder = "%s"
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.columns = [c for c in SOURCE_COLUMNS if c in self.table_columns()]
+        if "request_id" not in self.columns or "startTime" not in self.columns:
+            raise RuntimeError(f"{TABLE} not found or missing request_id/startTime")
+
+    def table_columns(self) -> List[str]:
+        cursor = self.connection.cursor()
+        cursor.execute(
+            "SELECT column_name FROM information_schema.columns WHERE table_name = %s", ("LiteLLM_SpendLogs",)
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+    def time_param(self, value: datetime):
+        return value
+
+    def batches(self, after: Tuple[Optional[str], str], until: datetime,
+                batch_size: int) -> Iterator[List[tuple]]:
+        """Yield lists of rows ordered by ("startTime", request_id), after the given mark."""
+        p = self.placeholder
+        select = ", ".join(f'"{c}"' for c in self.columns)
+        start, request_id = after
+        while True:
+            params: list = [self.time_param(until)]
+            where = f'"startTime" < {p}'
+            if start is not None:
+                where += f' AND ("startTime", request_id) > ({p}, {p})'
+                params += [start, request_id]
+            cursor = self.connection.cursor()
+            cursor.execute(
+                f'SELECT {select} FROM {TABLE} WHERE {where} ORDER BY "startTime", request_id LIMIT {int(batch_size)}',
+                params,
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                return
+            yield rows
+            last = dict(zip(self.columns, rows[-1]))
+            start, request_id = last["startTime"], last["request_id"]
+            if len(rows) < batch_size:
+                return
+
+
+class SQLiteSpendSource(SpendSource):
+    placeholder = "?"
+
+    def table_columns(self) -> List[str]:
+        return [row[1] for row in self.connection.execute(f"PRAGMA table_info({TABLE})")]
+
+    def time_param(self, value: datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+
+
+def open_source(args) -> SpendSource:
+    if args.sqlite:
+        return SQLiteSpendSource(sqlite3.connect(args.sqlite))
+    database_url = args.database_url or os.environ.get("DATABASE_URL")
+    if not database_url:
+        raise RuntimeError("Set DATABASE_URL or pass --database-url / --sqlite")
+    import psycopg2
+
+    connection = psycopg2.connect(database_url)
+    connection.set_session(readonly=True, autocommit=True)
+    return SpendSource(connection)
+
+
+# ---- batches -> Arrow ----------------------------------------------------------
+
+def _column(rows: List[tuple], columns: List[str], name: str) -> list:
+    if name not in columns:
+        return [None] * len(rows)
+    index = columns.index(name)
+    return [row[index] for row in rows]
+
+
+def _timestamps(values: list) -> pa.Array:
+    if values and any(isinstance(v, str) for v in values):
+        return pc.cast(pc.cast(pa.array(values, pa.string()), pa.timestamp("us")), pa.timestamp("ms"))
+    return pa.array(values, pa.timestamp("ms"))
+
+
+def _flag(values: list) -> pa.Array:
+    """cache_hit is a "True"/"False" string column in LiteLLM's schema."""
+    text = pc.utf8_lower(pc.cast(pa.array(values), pa.string()))
+    return pc.fill_null(pc.is_in(text, pa.array(["true", "1", "t"])), False)
+
+
+def rows_to_table(rows: List[tuple], columns: List[str]) -> pa.Table:
+    col = lambda name: _column(rows, columns, name)  # noqa: E731
+    start, end = _timestamps(col("startTime")), _timestamps(col("endTime"))
+    end_user = pa.array(col("end_user"), pa.string())
+    user = pa.array(col("user"), pa.string())
+    empty_to_null = lambda a: pc.if_else(pc.equal(a, ""), pa.scalar(None, pa.string()), a)  # noqa: E731
+    duration = pc.divide(pc.cast(pc.subtract(end, start), pa.int64()), 1000.0)
+    status = pc.utf8_lower(pa.array(col("status"), pa.string()))
+    model_group = pa.array(col("model_group"), pa.string())
+    model = pa.array(col("model"), pa.string())
+    return pa.Table.from_arrays([
+        pa.array(col("request_id"), pa.string()),
+        start,
+        end,
+        model,
+        pc.coalesce(empty_to_null(model_group), model, pa.scalar("unknown")),
+        pa.array(col("custom_llm_provider"), pa.string()),
+        pa.array([(v or "").rstrip("/") or None for v in col("api_base")], pa.string()),
+        pc.fill_null(pa.array(col("spend"), pa.float64()), 0.0),
+        pc.fill_null(pa.array(col("prompt_tokens"), pa.int64()), 0),
+        pc.fill_null(pa.array(col("completion_tokens"), pa.int64()), 0),
+        pc.fill_null(pa.array(col("total_tokens"), pa.int64()), 0),
+        pc.coalesce(empty_to_null(end_user), empty_to_null(user), pa.scalar("unknown")),
+        pc.coalesce(empty_to_null(pa.array(col("team_id"), pa.string())), pa.scalar("none")),
+        _flag(col("cache_hit")),
+        pc.fill_null(pc.equal(status, "failure"), False),
+        pc.max_element_wise(pc.fill_null(duration, 0.0), 0.0),
+    ], schema=SCHEMA)
+
+
+
+
+# ---- raw partitions ------------------------------------------------------------
+
+SPEND_PARTITIONING = ds.partitioning(pa.schema([("day", pa.string()), ("model_group", pa.string())]), flavor="hive")
+
+
+def write_batch(table: pa.Table, data_dir: Path, batch_number: int) -> List[str]:
+    """Write one batch under spend/day=/model_group=; returns the days it touched."""
+    days = pc.strftime(table["start_time"], format="%Y-%m-%d")
+    ds.write_dataset(
+        table.append_column("day", days),
+        data_dir / "spend",
+        format="parquet",
+        partitioning=SPEND_PARTITIONING,
+        basename_template=f"part-{batch_number:06d}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+    )
+    return sorted(set(days.to_pylist()))
+
+
+def read_day(data_dir: Path, day: str) -> pa.Table:
+    day_dir = data_dir / "spend" / f"day={day}"
+    if not day_dir.exists():
+        return SCHEMA.empty_table()
+    dataset = ds.dataset(day_dir, format="parquet",
+                         partitioning=ds.partitioning(pa.schema([("model_group", pa.string())]), flavor="hive"))
+    return dataset.to_table(columns=[f.name for f in SCHEMA])
+
+
+# ---- GPU amortisation ------------------------------------------------------------
+
+def gpu_hosts(default_cost_per_day: float, models_dir: Optional[Path] = None) -> Tuple[Dict[str, str], Dict[str, float]]:
+    """Return ({on-prem model_group: api_base}, {api_base: cost per day})."""
+    group_host: Dict[str, str] = {}
+    host_cost: Dict[str, float] = {}
+    for entry in load_model_catalog(models_dir):
+        if not entry.is_on_premise or not entry.api_base:
+            continue
+        api_base = entry.api_base.rstrip("/")
+        group_host.setdefault(entry.model_name, api_base)
+        cost = entry.model_info.get("gpu_cost_per_day")
+        if cost is not None or api_base not in host_cost:
+            host_cost[api_base] = float(cost if cost is not None else default_cost_per_day)
+    return group_host, host_cost
+
+
+def with_gpu_cost(table: pa.Table, group_host: Dict[str, str], host_cost: Dict[str, float]) -> pa.Table:
+    """Add gpu_host, gpu_seconds and gpu_cost (the host's day cost split by GPU seconds).
+
+    The table must hold a single day of rows."""
+    hosts = pa.array(sorted(host_cost), pa.string())
+    by_group = pc.take(
+        pa.array(list(group_host.values()), pa.string()),
+        pc.index_in(table["model_group"], pa.array(list(group_host), pa.string())),
+    ) if group_host else pa.nulls(len(table), pa.string())
+    # The logged api_base wins when it is an on-prem box; otherwise map the model group
+    gpu_host = pc.if_else(pc.is_in(table["api_base"], hosts), table["api_base"], by_group)
+    gpu_seconds = pc.if_else(pc.is_valid(gpu_host), table["duration_s"], 0.0)
+    table = table.append_column("gpu_host", gpu_host).append_column("gpu_seconds", gpu_seconds)
+
+    busy = table.group_by("gpu_host").aggregate([("gpu_seconds", "sum")])
+    busy = busy.filter(pc.is_valid(busy["gpu_host"]))
+    position = pc.index_in(table["gpu_host"], busy["gpu_host"])
+    day_cost = pc.take(pa.array([host_cost[h] for h in busy["gpu_host"].to_pylist()], pa.float64()), position)
+    host_seconds = pc.take(busy["gpu_seconds_sum"], position)
+    share = pc.if_else(pc.greater(host_seconds, 0.0), pc.divide(gpu_seconds, host_seconds), 0.0)
+    return table.append_column("gpu_cost", pc.fill_null(pc.multiply(share, day_cost), 0.0))
+
+
+# ---- rollups ---------------------------------------------------------------------
+
+def _write_atomic(table: pa.Table, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    pq.write_table(table, tmp)
+    os.replace(tmp, path)
+
+
+def rollup_day(data_dir: Path, day: str, group_host: Dict[str, str], host_cost: Dict[str, float]) -> int:
+    """Recompute every rollup of one day from its raw parts; returns the row count."""
+    table = with_gpu_cost(read_day(data_dir, day), group_host, host_cost)
+    table = (
+        table.append_column("requests", pa.array([1] * len(table), pa.int64()))
+        .append_column("cache_hits", pc.cast(table["cache_hit"], pa.int64()))
+        .append_column("failures", pc.cast(table["failed"], pa.int64()))
+    )
+    for name, keys in ROLLUPS.items():
+        rollup = table.group_by(keys).aggregate(METRICS)
+        rollup = rollup.rename_columns([c[: -len("_sum")] if c.endswith("_sum") else c for c in rollup.column_names])
+        rollup = rollup.append_column("day", pa.array([day] * len(rollup), pa.string()))
+        _write_atomic(rollup, data_dir / "rollups" / name / f"day={day}.parquet")
+    return len(table)
+
+
+def spend_days(data_dir: Path) -> List[str]:
+    return sorted(p.name[len("day="):] for p in (data_dir / "spend").glob("day=*") if p.is_dir())
+
+
+# ---- state -----------------------------------------------------------------------
+
+def load_state(data_dir: Path) -> Dict:
+    path = data_dir / "state.json"
+    if not path.exists():
+        return {"start_time": None, "request_id": "", "batches": 0, "rows": 0}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(data_dir: Path, state: Dict) -> None:
+    path = data_dir / "state.json"
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, path)
+
+
+# ---- commands --------------------------------------------------------------------
+
+def cmd_extract(args) -> None:
+    data_dir = args.data_dir
+    data_dir.mkdir(parents=True, exist_ok=True)
+    state = load_state(data_dir)
+    source = open_source(args)
+    group_host, host_cost = gpu_hosts(args.gpu_cost_per_day, args.models_dir)
+    until = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=args.settle_seconds)
+    info(f"Extracting after {state['start_time'] or 'the beginning'} up to {until:%Y-%m-%d %H:%M:%S} UTC")
+
+    total = 0
+    for rows in source.batches((state["start_time"], state["request_id"]), until, args.batch_size):
+        batch_number = state["batches"] + 1
+        table = rows_to_table(rows, source.columns)
+        days = write_batch(table, data_dir, batch_number)
+        for day in days:
+            rollup_day(data_dir, day, group_host, host_cost)
+        last = dict(zip(source.columns, rows[-1]))
+        state.update(
+            start_time=str(last["startTime"]),
+            request_id=last["request_id"],
+            batches=batch_number,
+            rows=state["rows"] + len(rows),
+            updated_at=datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        )
+        save_state(data_dir, state)
+        total += len(rows)
+        info(f"Batch {batch_number}: {len(rows)} rows, days {', '.join(days)}")
+
+    if total:
+        success(f"Extracted {total} rows ({state['rows']} in total)")
+    else:
+        info("No new spend logs")
+
+
+def cmd_rollup(args) -> None:
+    group_host, host_cost = gpu_hosts(args.gpu_cost_per_day, args.models_dir)
+    days = spend_days(args.data_dir) if args.all else args.days
+    if not days:
+        warning("No days to roll up (pass days or --all)")
+        return
+    for day in days:
+        rows = rollup_day(args.data_dir, day, group_host, host_cost)
+        info(f"{day}: {rows} rows")
+    success(f"Rolled up {len(days)} days")
+
+
+def load_rollup(data_dir: Path, name: str, since: Optional[str], until: Optional[str]) -> Optional[pa.Table]:
+    files = []
+    for path in sorted((data_dir / "rollups" / name).glob("day=*.parquet")):
+        day = path.stem[len("day="):]
+        if (since and day < since) or (until and day > until):
+            continue
+        files.append(str(path))
+    if not files:
+        return None
+    return ds.dataset(files, format="parquet").to_table()
+
+
+def cmd_report(args) -> None:
+    name = f"by_{args.by}"
+    table = load_rollup(args.data_dir, name, args.since, args.until)
+    if table is None:
+        warning(f"No rollups in {args.data_dir / 'rollups' / name} for that range")
+        return
+    keys = ROLLUPS[name]
+    report = table.group_by(keys).aggregate(METRICS)
+    report = report.rename_columns([c[: -len("_sum")] if c.endswith("_sum") else c for c in report.column_names])
+    report = report.append_column("total_cost", pc.add(report["spend"], report["gpu_cost"]))
+    report = report.sort_by([("total_cost", "descending")])
+    if args.top:
+        report = report.slice(0, args.top)
+    columns = keys + ["requests", "total_tokens", "spend", "gpu_seconds", "gpu_cost", "total_cost",
+                      "cache_hits", "failures"]
+    report = report.select(columns)
+
+    if args.format == "csv":
+        import pyarrow.csv as pacsv
+
+        pacsv.write_csv(report, sys.stdout.buffer)
+        return
+    rows = report.to_pylist()
+    if args.format == "json":
+        print(json.dumps(rows, indent=2))
+        return
+    cells = [[_fmt(row[c]) for c in columns] for row in rows]
+    widths = [max(len(c), *(len(r[i]) for r in cells)) if cells else len(c) for i, c in enumerate(columns)]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for r in cells:
+        print("  ".join(v.ljust(w) for v, w in zip(r, widths)))
+
+
+def _fmt(value) -> str:
+    if isinstance(value, float):
+        return f"{value:.4f}"
+    return "-" if value is None else str(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incremental spend analytics over LiteLLM spend logs")
+    parser.add_argument("--data-dir", type=Path, default=DEFAULT_DATA_DIR, help="Parquet + state directory")
+    parser.add_argument("--models-dir", type=Path, default=None, help="Model catalog (for on-prem GPU hosts)")
+    parser.add_argument("--gpu-cost-per-day", type=float, default=float(os.environ.get("GPU_COST_PER_DAY", "25")),
+                        help="Cost of one on-prem box per day when model_info.gpu_cost_per_day is not set")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    extract = sub.add_parser("extract", help="Copy new spend logs and update the rollups of the days touched")
+    extract.add_argument("--database-url", default=None, help="Postgres URL (default: DATABASE_URL)")
+    extract.add_argument("--sqlite", type=Path, default=None, help="Read a SQLite copy of the spend table instead")
+    extract.add_argument("--batch-size", type=int, default=50000)
+    extract.add_argument("--settle-seconds", type=int, default=300,
+                         help="Leave the most recent rows for the next run (spend logs are written in batches)")
+
+    rollup = sub.add_parser("rollup", help="Recompute rollups from the raw partitions")
+    rollup.add_argument("days", nargs="*", help="Days (YYYY-MM-DD) to recompute")
+    rollup.add_argument("--all", action="store_true", help="Every day in spend/")
+
+    report = sub.add_parser("report", help="Print totals from the rollups")
+    report.add_argument("--by", choices=["user", "team", "model"], default="model")
+    report.add_argument("--since", default=(date.today() - timedelta(days=30)).isoformat(), help="First day (YYYY-MM-DD)")
+    report.add_argument("--until", default=None, help="Last day (YYYY-MM-DD)")
+    report.add_argument("--top", type=int, default=0, help="Only the N most expensive rows")
+    report.add_argument("--format", choices=["table", "csv", "json"], default="table")
+
+    args = parser.parse_args()
+    try:
+        {"extract": cmd_extract, "rollup": cmd_rollup, "report": cmd_report}[args.command](args)
+    except Exception as e:
+        error(str(e))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Health prober state transitions against the bench stub."""
+
+import asyncio
+
+import aiohttp
+from aiohttp.test_utils import TestServer
+
+from stub_provider import StubProvider, load_profile
+from health_prober.health_prober import Endpoint, ProbeSettings, classify, probe
+
+
+SETTINGS = ProbeSettings(interval=1, timeout=1, slow_ms=150, max_queue=4,
+                         fail_threshold=2, recover_threshold=2, ewma_alpha=1.0)
+
+
+def run_probes(steps):
+    """Probe an in-process llama.cpp stub; steps is a list of (stub state, rounds)."""
+
+    async def go():
+        stub = StubProvider("onprem", load_profile("llamacpp"))
+        server = TestServer(stub.app())
+        await server.start_server()
+        endpoint = Endpoint(str(server.make_url("")).rstrip("/"), "llama.cpp", ["bench-chat"])
+        seen = []
+        try:
+            async with aiohttp.ClientSession() as session:
+                for state, rounds in steps:
+                    async with session.post(endpoint.api_base + "/stub/state", json=state) as response:
+                        assert response.status == 200
+                    for _ in range(rounds):
+                        classify(endpoint, await probe(session, endpoint, SETTINGS), SETTINGS)
+                        seen.append(endpoint.status)
+        finally:
+            await server.close()
+        return endpoint, seen
+
+    return asyncio.run(go())
+
+
+def test_down_after_fail_threshold_then_recovers_with_hysteresis():
+    endpoint, seen = run_probes([
+        ({"down": False}, 1),
+        ({"down": True}, 3),
+        ({"down": False}, 3),
+    ])
+    # One failure is tolerated, the second marks it down; recovery needs 2 good probes
+    assert seen == ["up", "up", "down", "down", "down", "up", "up"]
+    assert endpoint.last["reason"] == ""
+
+
+def test_slow_while_latency_is_above_threshold():
+    endpoint, seen = run_probes([
+        ({"extra_latency_ms": 300}, 2),
+        ({"extra_latency_ms": 0}, 3),
+    ])
+    assert seen == ["slow", "slow", "slow", "up", "up"]
+    assert endpoint.last["queue_depth"] == 0
+
+
+def test_failure_reason_is_recorded():
+    endpoint, _ = run_probes([({"down": True}, 2)])
+    assert endpoint.status == "down"
+    assert endpoint.last["reason"] == "/health returned 503"
+
+
+def test_deferred_requests_mark_endpoint_slow():
+    endpoint = Endpoint("http://onprem:8080", "llama.cpp")
+    ok = {"ok": True, "latency_ms": 10.0, "processing": 1, "reason": ""}
+    classify(endpoint, {**ok, "queue_depth": 4}, SETTINGS)
+    assert (endpoint.status, endpoint.last["reason"]) == ("slow", "4 requests deferred")
+    classify(endpoint, {**ok, "queue_depth": 0}, SETTINGS)
+    assert endpoint.status == "slow"
+    assert endpoint.last["reason"] == "recovering (1/2)"
+    classify(endpoint, {**ok, "queue_depth": 0}, SETTINGS)
+    assert endpoint.status == "up"
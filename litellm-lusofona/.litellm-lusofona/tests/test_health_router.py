@@ -0,0 +1,128 @@
+"""Health router hook: filtering on prober keys, fallbacks and failing open."""
+
+import json
+import asyncio
+
+import pytest
+from aiohttp.test_utils import TestServer
+
+from stub_provider import StubProvider, load_profile
+from model_catalog import group_by_model_name, load_model_catalog
+
+litellm = pytest.importorskip("litellm")
+from hooks.health_router import KEY_PREFIX, HealthRouter  # noqa: E402
+
+
+class FakeRedis:
+    """The one call the hook makes, over a dict of prober keys."""
+
+    def __init__(self, statuses=None, error=None):
+        self.values = {KEY_PREFIX + k: json.dumps({"status": v}) for k, v in (statuses or {}).items()}
+        self.error = error
+        self.calls = 0
+
+    async def mget(self, keys):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return [self.values.get(key) for key in keys]
+
+
+def deployment(api_base):
+    return {"model_name": "bench-chat", "litellm_params": {"model": "openai/chat", "api_base": api_base}}
+
+
+def filter_with(redis_client, deployments):
+    router = HealthRouter()
+    router._redis = redis_client
+    return asyncio.run(router.async_filter_deployments("bench-chat", deployments)), router
+
+
+def test_filter_drops_slow_and_down_deployments():
+    deployments = [deployment("http://a:8080/"), deployment("http://b:8080"), deployment("http://c:8080")]
+    redis_client = FakeRedis({"http://a:8080": "slow", "http://b:8080": "up", "http://c:8080": "down"})
+    kept, _ = filter_with(redis_client, deployments)
+    assert kept == [deployments[1]]
+
+
+def test_filter_keeps_deployments_without_health_or_api_base():
+    deployments = [deployment("http://a:8080"), deployment("http://new:8080"),
+                   {"model_name": "bench-chat", "litellm_params": {"model": "groq/llama-3.1-8b-instant"}}]
+    kept, _ = filter_with(FakeRedis({"http://a:8080": "down"}), deployments)
+    assert kept == deployments[1:]
+
+
+def test_filter_fails_open_when_every_deployment_is_unhealthy():
+    deployments = [deployment("http://a:8080"), deployment("http://b:8080")]
+    kept, _ = filter_with(FakeRedis({"http://a:8080": "down", "http://b:8080": "slow"}), deployments)
+    assert kept == deployments
+
+
+def test_filter_fails_open_on_redis_error():
+    deployments = [deployment("http://a:8080"), deployment("http://b:8080")]
+    kept, _ = filter_with(FakeRedis(error=ConnectionError("refused")), deployments)
+    assert kept == deployments
+
+
+def test_statuses_are_cached_between_requests():
+    redis_client = FakeRedis({"http://a:8080": "down"})
+    router = HealthRouter()
+    router._redis = redis_client
+    deployments = [deployment("http://a:8080"), deployment("http://b:8080")]
+    for _ in range(3):
+        kept = asyncio.run(router.async_filter_deployments("bench-chat", deployments))
+        assert kept == [deployments[1]]
+    assert redis_client.calls == 1
+
+
+def test_catalog_groups_with_fallbacks_skip_a_down_box():
+    # The real shape: one api_base per on-prem chat group, one embed-coalescer for every embedding group
+    groups = group_by_model_name([entry for entry in load_model_catalog() if entry.is_on_premise])
+    router = HealthRouter()
+    router._redis = FakeRedis({entry.api_base: "down" for entries in groups.values() for entry in entries})
+    for model_name, entries in groups.items():
+        deployments = [{"model_name": model_name, "litellm_params": dict(entry.litellm_params)} for entry in entries]
+        kept = asyncio.run(router.async_filter_deployments(model_name, deployments))
+        if entries[0].mode == "chat":
+            assert len(deployments) == 1
+            assert kept == [], model_name
+        else:
+            assert kept == deployments, model_name
+
+
+def test_router_sends_requests_for_a_down_single_deployment_group_to_its_fallback(tmp_path):
+    settings = tmp_path / "router.yaml"
+    settings.write_text("router_settings:\n  fallbacks:\n    - onprem-chat: [cloud-chat]\n")
+
+    async def go():
+        onprem, cloud = StubProvider("onprem", load_profile("llamacpp")), StubProvider("cloud", load_profile("groq"))
+        servers = [TestServer(onprem.app()), TestServer(cloud.app())]
+        for server in servers:
+            await server.start_server()
+        onprem_base, cloud_base = (str(server.make_url("/v1")) for server in servers)
+        hook = HealthRouter(router_settings=settings)
+        hook._redis = FakeRedis({onprem_base: "down"})
+        callbacks = litellm.callbacks
+        litellm.callbacks = [hook]
+        try:
+            router = litellm.Router(
+                model_list=[
+                    {"model_name": "onprem-chat",
+                     "litellm_params": {"model": "openai/onprem", "api_base": onprem_base, "api_key": "none"}},
+                    {"model_name": "cloud-chat",
+                     "litellm_params": {"model": "openai/cloud", "api_base": cloud_base, "api_key": "none"}},
+                ],
+                fallbacks=[{"onprem-chat": ["cloud-chat"]}],
+                num_retries=0,
+                timeout=30,
+            )
+            response = await router.acompletion(model="onprem-chat", messages=[{"role": "user", "content": "Olá"}])
+        finally:
+            litellm.callbacks = callbacks
+            for server in servers:
+                await server.close()
+        return response, onprem.stats["requests"], cloud.stats["requests"]
+
+    response, onprem_requests, cloud_requests = asyncio.run(go())
+    assert response.choices[0].message.content
+    assert (onprem_requests, cloud_requests) == (0, 1)
@@ -0,0 +1,141 @@
+"""Incremental extract and daily rollups over a SQLite copy of the spend table."""
+
+import sqlite3
+import argparse
+
+import pytest
+import pyarrow.dataset as ds
+
+from spend_analytics import spend_analytics as sa
+
+
+COLUMNS = ["request_id", "startTime", "endTime", "model", "model_group", "custom_llm_provider", "api_base",
+           "spend", "prompt_tokens", "completion_tokens", "total_tokens", "user", "end_user", "team_id",
+           "cache_hit", "status"]
+
+ON_PREM = """\
+model_list:
+  - model_name: onprem-chat
+    litellm_params:
+      model: openai/llama-3.1-8b
+      api_base: http://gpu1:8080/v1
+    model_info:
+      gpu_cost_per_day: 10
+"""
+
+
+def log(request_id, start, seconds, group, user, team, spend=0.0, tokens=(10, 5), cache_hit="False",
+        status="success"):
+    end = start[:-2] + f"{int(start[-2:]) + seconds:02d}"
+    api_base = "http://gpu1:8080/v1/" if group == "onprem-chat" else "https://api.groq.com/openai/v1"
+    return (request_id, start, end, group, group, "openai", api_base, spend, tokens[0], tokens[1],
+            sum(tokens), "", user, team, cache_hit, status)
+
+
+@pytest.fixture
+def env(tmp_path):
+    models_dir = tmp_path / "models"
+    models_dir.mkdir()
+    (models_dir / "on-premise.yaml").write_text(ON_PREM)
+    db = tmp_path / "spend.db"
+    with sqlite3.connect(db) as connection:
+        quoted = ", ".join(f'"{c}"' for c in COLUMNS)
+        connection.execute(f'CREATE TABLE "LiteLLM_SpendLogs" ({quoted})')
+
+    def insert(*rows):
+        with sqlite3.connect(db) as connection:
+            connection.executemany(f'INSERT INTO "LiteLLM_SpendLogs" VALUES ({", ".join("?" * len(COLUMNS))})',
+                                   rows)
+
+    def extract(batch_size=2):
+        sa.cmd_extract(argparse.Namespace(
+            data_dir=tmp_path / "data", sqlite=db, database_url=None, models_dir=models_dir,
+            gpu_cost_per_day=25.0, batch_size=batch_size, settle_seconds=300,
+        ))
+        return sa.load_state(tmp_path / "data")
+
+    return tmp_path / "data", insert, extract
+
+
+def raw_ids(data_dir):
+    return ds.dataset(data_dir / "spend", format="parquet").to_table(columns=["request_id"])["request_id"].to_pylist()
+
+
+def rollup(data_dir, name, day):
+    rows = ds.dataset(data_dir / "rollups" / name / f"day={day}.parquet", format="parquet").to_table().to_pylist()
+    return {tuple(row[k] for k in sa.ROLLUPS[name]): row for row in rows}
+
+
+def test_rerun_is_incremental(env):
+    data_dir, insert, extract = env
+    insert(
+        log("a1", "2025-10-01 09:00:00", 2, "onprem-chat", "u1", "eng"),
+        log("a2", "2025-10-01 09:00:00", 1, "groq-8b", "u2", "eng", spend=0.01),
+        log("a3", "2025-10-01 10:00:00", 3, "onprem-chat", "u1", "law"),
+        log("a4", "2025-10-02 08:00:00", 1, "groq-8b", "u1", "law", spend=0.02),
+        log("a5", "2025-10-02 08:30:00", 1, "groq-8b", "u2", "eng", spend=0.03),
+    )
+    state = extract()
+    assert (state["rows"], state["batches"]) == (5, 3)
+    assert (state["start_time"], state["request_id"]) == ("2025-10-02 08:30:00", "a5")
+
+    # Nothing new: no batch, no rows, nothing rewritten
+    assert extract() == state
+    assert sorted(raw_ids(data_dir)) == ["a1", "a2", "a3", "a4", "a5"]
+
+    # Same startTime as the watermark but a later request_id, a later row that day and a new day
+    insert(
+        log("a6", "2025-10-02 08:30:00", 1, "groq-8b", "u3", "eng", spend=0.04),
+        log("a7", "2025-10-02 09:00:00", 4, "onprem-chat", "u3", "eng"),
+        log("a8", "2025-10-03 07:00:00", 1, "groq-8b", "u1", "eng", spend=0.05),
+    )
+    state = extract()
+    assert (state["rows"], state["batches"]) == (8, 5)
+    assert sorted(raw_ids(data_dir)) == ["a1", "a2", "a3", "a4", "a5", "a6", "a7", "a8"]
+    assert rollup(data_dir, "by_user", "2025-10-02")[("u2",)]["requests"] == 1
+
+
+def test_rerun_after_crash_overwrites_its_own_batch(env):
+    data_dir, insert, extract = env
+    insert(log("b1", "2025-10-01 09:00:00", 1, "groq-8b", "u1", "eng", spend=0.01))
+    state = extract()
+    # A crash after the parts were written but before state.json: the same batch number is reused
+    sa.save_state(data_dir, {"start_time": None, "request_id": "", "batches": 0, "rows": 0})
+    extract()
+    assert raw_ids(data_dir) == ["b1"]
+    assert rollup(data_dir, "by_user", "2025-10-01")[("u1",)]["requests"] == 1
+    assert sa.load_state(data_dir)["batches"] == state["batches"]
+
+
+def test_daily_rollups(env):
+    data_dir, insert, extract = env
+    insert(
+        log("c1", "2025-10-01 09:00:00", 2, "onprem-chat", "u1", "eng", tokens=(100, 20)),
+        log("c2", "2025-10-01 09:10:00", 6, "onprem-chat", "u2", "eng", tokens=(300, 40), cache_hit="True"),
+        log("c3", "2025-10-01 09:20:00", 1, "groq-8b", "u1", "law", spend=0.25, tokens=(50, 10)),
+        log("c4", "2025-10-01 09:30:00", 1, "groq-8b", "u1", "law", spend=0.0, status="failure"),
+        log("c5", "2025-10-02 09:00:00", 5, "groq-8b", "u2", "", spend=0.5),
+    )
+    extract(batch_size=3)
+
+    by_user = rollup(data_dir, "by_user", "2025-10-01")
+    assert set(by_user) == {("u1",), ("u2",)}
+    u1, u2 = by_user[("u1",)], by_user[("u2",)]
+    assert (u1["requests"], u1["prompt_tokens"], u1["completion_tokens"]) == (3, 160, 35)
+    assert u1["spend"] == pytest.approx(0.25)
+    assert u1["failures"] == 1
+    assert (u2["requests"], u2["cache_hits"], u2["total_tokens"]) == (1, 1, 340)
+
+    # The box's 10/day is split 2:6 by GPU seconds; cloud rows carry no GPU cost
+    assert u1["gpu_seconds"] == pytest.approx(2.0)
+    assert u1["gpu_cost"] == pytest.approx(2.5)
+    assert u2["gpu_cost"] == pytest.approx(7.5)
+    by_model = rollup(data_dir, "by_model", "2025-10-01")
+    assert by_model[("onprem-chat", "http://gpu1:8080/v1")]["gpu_cost"] == pytest.approx(10.0)
+    assert by_model[("groq-8b", None)]["gpu_cost"] == 0.0
+    assert sum(row["requests"] for row in by_model.values()) == 4
+
+    by_team = rollup(data_dir, "by_team", "2025-10-01")
+    assert by_team[("eng",)]["requests"] == 2 and by_team[("law",)]["requests"] == 2
+    # An empty team_id is reported as "none"
+    assert rollup(data_dir, "by_team", "2025-10-02")[("none",)]["spend"] == pytest.approx(0.5)
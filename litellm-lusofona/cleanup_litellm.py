@@ -12,13 +12,32 @@ The script preserves:
 - The cloned litellm-upstream repository (can be reused)
 - Custom configuration files in .litellm-lusofona/
 - Any persistent data volumes (if configured)
+
+How it works:
+Talks to the Docker Engine API directly over the unix socket (DOCKER_HOST or
+/var/run/docker.sock) instead of one `docker` subprocess per step. All project
+resources are found by the com.docker.compose.project=lusochat-litellm label
+(containers, networks and images queried concurrently), containers are
+stopped and removed in parallel, then networks and images in parallel. A JSON
+summary of what was removed and freed is printed at the end (--summary FILE
+also writes it to a file).
+
+Usage:
+    python3 cleanup_litellm.py                          # Interactive
+    python3 cleanup_litellm.py --force --keep-repo      # No confirmation, keep the clone
+    python3 cleanup_litellm.py --deep-clean --summary cleanup.json
 """
 
 import os
 import sys
-import subprocess
+import time
 import shutil
+import socket
+import threading
+import http.client
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from urllib.parse import quote, urlencode
 import argparse
 import json
 
@@ -26,6 +45,10 @@ import json
 LITELLM_DIR = "litellm-upstream"
 CUSTOM_CONFIG_DIR = ".litellm-lusofona"
 PROJECT_NAME = "lusochat-litellm"
+PROJECT_LABEL = f"com.docker.compose.project={PROJECT_NAME}"
+# Images the project pulls or builds without a compose label (matches the old name-based cleanup)
+IMAGE_REFERENCES = [f"*{PROJECT_NAME}*", "*litellm*"]
+STOP_TIMEOUT = 10
 
 def info(message):
     print(f"[INFO] {message}")
@@ -45,185 +68,214 @@ def prompt_user(message, default="n"):
     response = response if response else default
     return response in ['y', 'yes']
 
-def run_command(command, cwd=None, capture_output=True, check=False):
-    """Run a command and handle errors gracefully."""
-    if capture_output:
-        info(f"Running: {' '.join(command)}")
+def human_size(num_bytes):
+    for unit in ["B", "KB", "MB", "GB"]:
+        if abs(num_bytes) < 1024 or unit == "GB":
+            return f"{num_bytes:.1f} {unit}" if unit != "B" else f"{num_bytes} B"
+        num_bytes /= 1024
+
+class DockerAPIError(Exception):
+    def __init__(self, status, message):
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path, timeout):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+class DockerClient:
+    """Minimal Docker Engine API client; one keep-alive connection per thread."""
+
+    def __init__(self, socket_path=None, timeout=STOP_TIMEOUT + 30):
+        docker_host = os.environ.get("DOCKER_HOST", "")
+        if socket_path is None and docker_host and not docker_host.startswith("unix://"):
+            raise RuntimeError(f"DOCKER_HOST={docker_host} is not a unix socket; run the cleanup on the Docker host")
+        self.socket_path = socket_path or (docker_host[len("unix://"):] if docker_host else "/var/run/docker.sock")
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        if getattr(self._local, "connection", None) is None:
+            self._local.connection = UnixHTTPConnection(self.socket_path, self.timeout)
+        return self._local.connection
+
+    def request(self, method, path, params=None):
+        if params:
+            path = f"{path}?{urlencode(params)}"
+        for attempt in range(2):
+            connection = self._connection()
+            try:
+                connection.request(method, path, headers={"Content-Type": "application/json"})
+                response = connection.getresponse()
+                body = response.read()
+                break
+            except (http.client.HTTPException, ConnectionError):
+                # Keep-alive connection closed by the daemon: reconnect once
+                connection.close()
+                self._local.connection = None
+                if attempt:
+                    raise
+        if response.status >= 400:
+            try:
+                message = json.loads(body).get("message", "")
+            except ValueError:
+                message = body.decode(errors="replace")
+            raise DockerAPIError(response.status, message.strip())
+        return json.loads(body) if body else None
+
+    def containers(self, labels):
+        return self.request("GET", "/containers/json",
+                            {"all": "1", "size": "1", "filters": json.dumps({"label": labels})})
+
+    def networks(self, labels):
+        return self.request("GET", "/networks", {"filters": json.dumps({"label": labels})})
+
+    def volumes(self, labels):
+        return (self.request("GET", "/volumes", {"filters": json.dumps({"label": labels})}) or {}).get("Volumes") or []
+
+    def images(self, filters):
+        return self.request("GET", "/images/json", {"filters": json.dumps(filters)})
+
+    def stop_container(self, container_id):
+        try:
+            self.request("POST", f"/containers/{container_id}/stop", {"t": str(STOP_TIMEOUT)})
+        except DockerAPIError as e:
+            if e.status != 304:  # 304: already stopped
+                raise
+
+    def remove_container(self, container_id):
+        self.request("DELETE", f"/containers/{container_id}", {"force": "1"})
+
+    def remove_network(self, network_id):
+        self.request("DELETE", f"/networks/{network_id}")
+
+    def remove_image(self, image_id):
+        return self.request("DELETE", f"/images/{quote(image_id, safe='')}", {"force": "1"})
+
+    def prune(self, kind):
+        return self.request("POST", f"/{kind}/prune") or {}
+
+def check_docker(client):
+    """Check that the Docker daemon answers on the socket."""
     try:
-        result = subprocess.run(command, cwd=cwd, check=check, capture_output=capture_output, text=True)
-        return result
-    except subprocess.CalledProcessError as e:
-        if check:
-            error(f"Command failed with exit code {e.returncode}")
-            if e.stdout:
-                print(f"STDOUT: {e.stdout}")
-            if e.stderr:
-                print(f"STDERR: {e.stderr}")
-        return e
-    except FileNotFoundError:
-        if check:
-            error(f"Command not found: {command[0]}")
-        return None
-
-def check_docker():
-    """Check if Docker is available."""
-    result = run_command(["docker", "--version"])
-    if result is None or result.returncode != 0:
-        error("Docker is not installed or not accessible")
-    
-    # Check if Docker daemon is running
-    result = run_command(["docker", "info"])
-    if result.returncode != 0:
-        error("Docker daemon is not running")
-    
-    success("Docker is available and running")
-
-def get_compose_cmd():
-    """Get the appropriate docker compose command."""
-    # Try docker compose first, then docker-compose
-    result = run_command(["docker", "compose", "--version"])
-    if result and result.returncode == 0:
-        return ["docker", "compose"]
-    
-    result = run_command(["docker-compose", "--version"])
-    if result and result.returncode == 0:
-        return ["docker-compose"]
-    
-    error("Neither 'docker compose' nor 'docker-compose' is available")
+        client.request("GET", "/_ping")
+    except (OSError, DockerAPIError) as e:
+        error(f"Docker daemon is not reachable at {client.socket_path}: {e}")
+        sys.exit(1)
+    success(f"Docker is available and running ({client.socket_path})")
 
-def stop_services():
-    """Stop all running services."""
-    info("Stopping LiteLLM services...")
-    
-    compose_cmd = get_compose_cmd()
-    litellm_dir = Path(LITELLM_DIR)
-    
-    if not litellm_dir.exists():
-        warning(f"LiteLLM directory not found: {LITELLM_DIR}")
-        return
-    
-    # Stop services
-    result = run_command(
-        compose_cmd + ["-p", PROJECT_NAME, "stop"],
-        cwd=litellm_dir,
-        capture_output=False
-    )
-    
-    if result and result.returncode == 0:
-        success("Services stopped successfully")
-    else:
-        warning("Some services may not have been running or failed to stop")
+def discover_resources(client, jobs):
+    """All project containers, networks, volumes and images, queried concurrently."""
+    labels = [PROJECT_LABEL]
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        containers = pool.submit(client.containers, labels)
+        networks = pool.submit(client.networks, labels)
+        volumes = pool.submit(client.volumes, labels)
+        labelled_images = pool.submit(client.images, {"label": labels})
+        named_images = [pool.submit(client.images, {"reference": [ref]}) for ref in IMAGE_REFERENCES]
+        images = {}
+        for image in labelled_images.result() + [i for f in named_images for i in f.result()]:
+            images[image["Id"]] = image
+        return {
+            "containers": containers.result(),
+            "networks": networks.result(),
+            "volumes": volumes.result(),
+            "images": list(images.values()),
+        }
 
-def remove_containers():
-    """Remove all containers from the project."""
-    info("Removing containers...")
-    
-    compose_cmd = get_compose_cmd()
-    litellm_dir = Path(LITELLM_DIR)
-    
-    if not litellm_dir.exists():
-        warning(f"LiteLLM directory not found: {LITELLM_DIR}")
-        info("Attempting to remove containers by project name...")
-        
-        # Try to remove containers by project name even without compose file
-        result = run_command(["docker", "ps", "-a", "--filter", f"label=com.docker.compose.project={PROJECT_NAME}", "-q"])
-        if result and result.stdout.strip():
-            container_ids = result.stdout.strip().split('\n')
-            info(f"Found {len(container_ids)} containers to remove")
-            
-            for container_id in container_ids:
-                run_command(["docker", "rm", "-f", container_id], capture_output=False)
-            success("Containers removed by project label")
-        else:
-            info("No containers found with project label")
-        return
-    
-    # Remove containers using docker-compose
-    result = run_command(
-        compose_cmd + ["-p", PROJECT_NAME, "rm", "-f"],
-        cwd=litellm_dir,
-        capture_output=False
-    )
-    
-    if result and result.returncode == 0:
-        success("Containers removed successfully")
-    else:
-        warning("Some containers may not exist or failed to remove")
+def run_parallel(jobs, action, items, describe):
+    """Run action on every item concurrently; returns (done, failed) lists of descriptions."""
+    done, failed = [], []
+    if not items:
+        return done, failed
 
-def remove_networks():
-    """Remove Docker networks created by the project."""
-    info("Removing Docker networks...")
-    
-    # Get networks with the project name
-    result = run_command(["docker", "network", "ls", "--filter", f"name={PROJECT_NAME}", "-q"])
-    
-    if result and result.stdout.strip():
-        network_ids = result.stdout.strip().split('\n')
-        info(f"Found {len(network_ids)} networks to remove")
-        
-        for network_id in network_ids:
-            result = run_command(["docker", "network", "rm", network_id])
-            if result and result.returncode == 0:
-                info(f"Removed network: {network_id}")
+    def attempt(item):
+        try:
+            action(item)
+            return True, describe(item), None
+        except DockerAPIError as e:
+            if e.status == 404:
+                return True, describe(item), None  # already gone
+            return False, describe(item), str(e)
+        except OSError as e:
+            return False, describe(item), str(e)
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        for ok, name, reason in pool.map(attempt, items):
+            if ok:
+                done.append(name)
             else:
-                warning(f"Failed to remove network: {network_id} (may be in use)")
-        
-        success("Network cleanup completed")
-    else:
-        info("No project networks found to remove")
+                failed.append({"name": name, "error": reason})
+                warning(f"Failed: {name} ({reason})")
+    return done, failed
 
-def remove_images():
-    """Remove Docker images built by the project."""
-    info("Checking for project-built images...")
-    
-    # Look for images with the project name or litellm tags
-    patterns = [f"{PROJECT_NAME}", "litellm", "lusochat-litellm"]
-    images_to_remove = set()
-    
-    for pattern in patterns:
-        result = run_command(["docker", "images", "--filter", f"reference=*{pattern}*", "-q"])
-        if result and result.stdout.strip():
-            image_ids = result.stdout.strip().split('\n')
-            images_to_remove.update(image_ids)
-    
-    if images_to_remove:
-        info(f"Found {len(images_to_remove)} images to remove")
-        
-        if prompt_user("Do you want to remove locally built images? This will free up disk space"):
-            for image_id in images_to_remove:
-                result = run_command(["docker", "rmi", "-f", image_id])
-                if result and result.returncode == 0:
-                    info(f"Removed image: {image_id}")
-                else:
-                    warning(f"Failed to remove image: {image_id}")
-            success("Image cleanup completed")
-        else:
-            info("Skipping image removal")
-    else:
-        info("No project-specific images found")
+def container_name(container):
+    return (container.get("Names") or [container["Id"][:12]])[0].lstrip("/")
 
-def cleanup_docker_system():
-    """Clean up Docker system (dangling images, unused networks, etc.)."""
-    if prompt_user("Do you want to run Docker system cleanup? This will remove dangling images and unused networks"):
-        info("Running Docker system cleanup...")
-        
-        # Remove dangling images
-        run_command(["docker", "image", "prune", "-f"], capture_output=False)
-        
-        # Remove unused networks
-        run_command(["docker", "network", "prune", "-f"], capture_output=False)
-        
-        # Remove unused volumes (be careful with this one)
-        if prompt_user("Do you want to remove unused Docker volumes? (This could remove data)"):
-            run_command(["docker", "volume", "prune", "-f"], capture_output=False)
-        
-        success("Docker system cleanup completed")
+def image_name(image):
+    return (image.get("RepoTags") or [None])[0] or image["Id"].split(":")[-1][:12]
+
+def remove_containers(client, containers, jobs):
+    """Stop (gracefully, so Postgres can shut down cleanly) and remove each container, all in parallel."""
+    def stop_and_remove(container):
+        if container.get("State") == "running":
+            client.stop_container(container["Id"])
+        client.remove_container(container["Id"])
+
+    info(f"Stopping and removing {len(containers)} containers...")
+    done, failed = run_parallel(jobs, stop_and_remove, containers, container_name)
+    freed = sum(c.get("SizeRw") or 0 for c in containers if container_name(c) in done)
+    if done:
+        success(f"Removed {len(done)} containers ({human_size(freed)} writable layers)")
+    return {"removed": done, "failed": failed, "bytes_freed": freed}
+
+def remove_networks_and_images(client, networks, images, jobs):
+    """Networks and images do not depend on each other: remove both concurrently."""
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        network_future = pool.submit(run_parallel, jobs, lambda n: client.remove_network(n["Id"]),
+                                     networks, lambda n: n["Name"])
+        image_future = pool.submit(run_parallel, jobs, lambda i: client.remove_image(i["Id"]),
+                                   images, image_name)
+        networks_done, networks_failed = network_future.result()
+        images_done, images_failed = image_future.result()
+    # Shared layers are counted once per image: an upper bound of what was freed
+    image_bytes = sum(i.get("Size") or 0 for i in images if image_name(i) in images_done)
+    if networks_done:
+        success(f"Removed {len(networks_done)} networks")
+    if images_done:
+        success(f"Removed {len(images_done)} images (up to {human_size(image_bytes)})")
+    return (
+        {"removed": networks_done, "failed": networks_failed},
+        {"removed": images_done, "failed": images_failed, "bytes_freed": image_bytes},
+    )
+
+def cleanup_docker_system(client, prune_volumes):
+    """Prune dangling images, unused networks and (optionally) unused volumes."""
+    info("Running Docker system cleanup...")
+    kinds = ["images", "networks"] + (["volumes"] if prune_volumes else [])
+    with ThreadPoolExecutor(max_workers=len(kinds)) as pool:
+        results = dict(zip(kinds, pool.map(client.prune, kinds)))
+    freed = sum(r.get("SpaceReclaimed") or 0 for r in results.values())
+    success(f"Docker system cleanup completed ({human_size(freed)} reclaimed)")
+    return {
+        "images_deleted": len(results["images"].get("ImagesDeleted") or []),
+        "networks_deleted": len(results["networks"].get("NetworksDeleted") or []),
+        "volumes_deleted": len((results.get("volumes") or {}).get("VolumesDeleted") or []),
+        "bytes_freed": freed,
+    }
 
 def cleanup_temp_files():
     """Clean up temporary files and caches."""
     info("Cleaning up temporary files...")
     
     litellm_dir = Path(LITELLM_DIR)
+    cleaned = []
     
     # Clean up files that might have been copied during deployment
     if litellm_dir.exists():
@@ -233,15 +285,14 @@ def cleanup_temp_files():
             litellm_dir / ".env"
         ]
         
-        cleaned = 0
         for temp_file in temp_files:
             if temp_file.exists():
                 info(f"Removing copied config: {temp_file.name}")
                 temp_file.unlink()
-                cleaned += 1
+                cleaned.append(str(temp_file))
         
-        if cleaned > 0:
-            success(f"Cleaned up {cleaned} temporary config files")
+        if cleaned:
+            success(f"Cleaned up {len(cleaned)} temporary config files")
         else:
             info("No temporary config files found")
     
@@ -255,8 +306,10 @@ def cleanup_temp_files():
                     shutil.rmtree(logs_dir)
                     logs_dir.mkdir(exist_ok=True)  # Recreate empty logs directory
                     success("Log files cleaned up")
+                    cleaned.append(str(logs_dir))
                 except Exception as e:
                     warning(f"Failed to clean logs: {e}")
+    return cleaned
 
 def remove_repository():
     """Remove the cloned upstream repository."""
@@ -268,12 +321,14 @@ def remove_repository():
             try:
                 shutil.rmtree(litellm_dir)
                 success("Repository removed successfully")
+                return True
             except Exception as e:
                 error(f"Failed to remove repository: {e}")
         else:
             info("Keeping LiteLLM repository")
     else:
         info("LiteLLM repository not found (already clean)")
+    return False
 
 def show_cleanup_summary():
     """Show summary of cleanup actions."""
@@ -304,38 +359,92 @@ def main():
     parser.add_argument("--keep-images", action="store_true", help="Keep Docker images")
     parser.add_argument("--keep-repo", action="store_true", help="Keep cloned repository")
     parser.add_argument("--deep-clean", action="store_true", help="Perform deep cleanup including Docker system")
+    parser.add_argument("--jobs", type=int, default=8, help="Concurrent Docker API requests (default: 8)")
+    parser.add_argument("--summary", type=Path, help="Also write the JSON summary to this file")
     args = parser.parse_args()
     
-    # Check Docker availability
-    check_docker()
+    started = time.perf_counter()
+    timings = {}
+    try:
+        client = DockerClient()
+    except RuntimeError as e:
+        error(str(e))
+        sys.exit(1)
+    check_docker(client)
+    
+    # Discover everything first (one labelled query per resource type, concurrently)
+    step = time.perf_counter()
+    resources = discover_resources(client, args.jobs)
+    timings["discover"] = time.perf_counter() - step
+    info(f"Found {len(resources['containers'])} containers, {len(resources['networks'])} networks, "
+         f"{len(resources['images'])} images and {len(resources['volumes'])} volumes "
+         f"for project {PROJECT_NAME} ({timings['discover'] * 1000:.0f} ms)")
     
+    # Ask every question up front, so the removals below can run unattended and in parallel
     if not args.force:
         if not prompt_user("This will stop and remove all LiteLLM Docker resources. Continue?"):
             info("Cleanup cancelled")
             return
+    images = resources["images"]
+    if args.keep_images:
+        info("Skipping image removal (--keep-images)")
+        images = []
+    elif images:
+        for image in images:
+            info(f"  {image_name(image)} ({human_size(image.get('Size') or 0)})")
+        if not prompt_user("Do you want to remove locally built images? This will free up disk space"):
+            info("Skipping image removal")
+            images = []
+    deep_clean = prune_volumes = False
+    if args.deep_clean:
+        deep_clean = prompt_user("Do you want to run Docker system cleanup? This will remove dangling images and unused networks")
+        if deep_clean:
+            prune_volumes = prompt_user("Do you want to remove unused Docker volumes? (This could remove data)")
     
-    # Core cleanup steps
-    stop_services()
-    remove_containers()
-    remove_networks()
+    # Containers first: networks and images cannot be removed while in use
+    summary = {"project": PROJECT_NAME}
+    step = time.perf_counter()
+    summary["containers"] = remove_containers(client, resources["containers"], args.jobs)
+    timings["containers"] = time.perf_counter() - step
     
-    if not args.keep_images:
-        remove_images()
-    else:
-        info("Skipping image removal (--keep-images)")
+    step = time.perf_counter()
+    summary["networks"], summary["images"] = remove_networks_and_images(
+        client, resources["networks"], images, args.jobs
+    )
+    timings["networks_and_images"] = time.perf_counter() - step
     
-    cleanup_temp_files()
+    if deep_clean:
+        step = time.perf_counter()
+        summary["system_prune"] = cleanup_docker_system(client, prune_volumes)
+        timings["system_prune"] = time.perf_counter() - step
+    
+    summary["volumes_kept"] = [v["Name"] for v in resources["volumes"]]
+    summary["temp_files"] = cleanup_temp_files()
     
     if not args.keep_repo:
-        remove_repository()
+        summary["repository_removed"] = remove_repository()
     else:
         info("Keeping repository (--keep-repo)")
+        summary["repository_removed"] = False
     
-    if args.deep_clean:
-        cleanup_docker_system()
+    summary["bytes_freed"] = sum(
+        (summary.get(key) or {}).get("bytes_freed", 0) for key in ("containers", "images", "system_prune")
+    )
+    timings["total"] = time.perf_counter() - started
+    summary["seconds"] = {k: round(v, 3) for k, v in timings.items()}
     
     show_cleanup_summary()
-    success("Cleanup completed successfully!")
+    print(json.dumps(summary, indent=2))
+    if args.summary:
+        with open(args.summary, "w") as f:
+            json.dump(summary, f, indent=2)
+        info(f"Summary written to {args.summary}")
+    
+    failures = sum(len((summary.get(k) or {}).get("failed", [])) for k in ("containers", "networks", "images"))
+    if failures:
+        warning(f"Cleanup finished with {failures} failures (see summary)")
+        sys.exit(1)
+    success(f"Cleanup completed successfully! {human_size(summary['bytes_freed'])} freed")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
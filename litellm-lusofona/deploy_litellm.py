@@ -7,14 +7,36 @@ LiteLLM with custom Lusófona configurations.
 
 The approach:
 1. Clone upstream LiteLLM repo (like the shell script clones Open WebUI)
-2. Copy our custom configs from .litellm-lusofona/
-3. Build and deploy with Docker
+2. Sync our custom configs from .litellm-lusofona/ (only changed files are copied)
+3. Plan: compare each service's desired state (resolved compose config, mounted
+   config files, build context) with the state recorded by the last deploy, and
+   each running container's image with the local image of its tag
+4. Pull images and build changed contexts in parallel, then start/recreate/restart
+   only the services that changed; Postgres, Redis, Prometheus and Grafana keep
+   running when nothing of theirs changed
+5. Print a per-step timing report
+
+--plan resolves the same desired state from a temporary copy of the files a
+deploy would sync (including the generated .env), so it clones, patches, syncs
+and regenerates nothing; dashboards and fallbacks are taken as last generated.
+
+Usage:
+    python3 deploy_litellm.py                  # Full deploy
+    python3 deploy_litellm.py --plan           # Show what would change, touch nothing
+    python3 deploy_litellm.py --no-pull        # Skip pulling images
+    python3 deploy_litellm.py --update-config  # Sync configs and restart LiteLLM only
 """
 
 import os
 import sys
+import json
+import time
+import hashlib
 import subprocess
 import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
 import argparse
 
@@ -22,6 +44,15 @@ import argparse
 LITELLM_GIT_URL = "https://github.com/BerriAI/litellm.git"
 LITELLM_DIR = "litellm-upstream"
 CUSTOM_CONFIG_DIR = ".litellm-lusofona"
+COMPOSE_PROJECT = "lusochat-litellm"
+CONFIG_FILES = ["config.yaml", "docker-compose.yml", ".env", "model_catalog.py"]
+CONFIG_DIRECTORIES = ["models", "settings", "hooks", "grafana", "bench", "health_prober", "spend_analytics", "embed_coalescer"]
+# Per-service hashes of the last successful deploy (lives in LITELLM_DIR)
+DEPLOY_STATE_FILE = ".deploy-state.json"
+# Bind mounts that are part of the deployed configuration (runtime mounts such as ./logs are not)
+MANAGED_MOUNTS = set(CONFIG_FILES + CONFIG_DIRECTORIES + ["prometheus.yml"])
+
+STEP_TIMINGS = []
 
 def info(message):
     print(f"[INFO] {message}")
@@ -56,6 +87,28 @@ def run_command(command, cwd=None):
             print(f"STDERR: {e.stderr}")
         sys.exit(1)
 
+@contextmanager
+def timed_step(name):
+    """Record how long a deploy step takes for the timing report."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STEP_TIMINGS.append((name, time.perf_counter() - started))
+
+def print_timing_report():
+    """Print the per-step timings of this run."""
+    if not STEP_TIMINGS:
+        return
+    total = sum(seconds for _, seconds in STEP_TIMINGS)
+    width = max(len(name) for name, _ in STEP_TIMINGS)
+    info("")
+    info("Deploy timings:")
+    for name, seconds in STEP_TIMINGS:
+        share = 100 * seconds / total if total else 0
+        info(f"  {name:<{width}}  {seconds:7.1f}s  {share:5.1f}%")
+    info(f"  {'total':<{width}}  {total:7.1f}s")
+
 def check_tool(tool):
     """Check if a tool is available."""
     try:
@@ -109,15 +162,14 @@ def generate_docs_description():
 
 def cleanup_and_clone():
     """Handle existing directory and clone fresh LiteLLM."""
-    # Stop and remove existing containers
-    info("Stopping existing containers...")
-    subprocess.run(["docker", "compose", "-p", "lusochat-litellm", "down"], 
-                    capture_output=True, check=False)
-    
     clone = False
     if Path(LITELLM_DIR).exists():
         warning(f"LiteLLM directory already exists: {LITELLM_DIR}")
         if prompt_user("Do you want to remove it and clone fresh?"):
+            # The running containers mount files from this directory
+            info("Stopping existing containers...")
+            subprocess.run(["docker", "compose", "-p", COMPOSE_PROJECT, "down"],
+                           cwd=LITELLM_DIR, capture_output=True, check=False)
             info("Removing existing LiteLLM directory...")
             try:
                 shutil.rmtree(LITELLM_DIR)
@@ -154,6 +206,152 @@ def cleanup_and_clone():
 
     
 
+def run_generator(script, what):
+    """Run one of the catalog generator scripts in the custom config dir."""
+    info(f"Generating {what} from the model catalog...")
+    result = subprocess.run(
+        ["python3", script],
+        cwd=CUSTOM_CONFIG_DIR, capture_output=True, text=True
+    )
+    if result.returncode == 0:
+        success(f"{what[0].upper()}{what[1:]} generated")
+    else:
+        # Needs PyYAML on the host; the stack still deploys with the last committed output
+        reason = (result.stderr.strip().splitlines() or ["unknown error"])[-1]
+        warning(f"Could not generate {what}: {reason}")
+
+def generate_catalog_outputs():
+    """Regenerate everything derived from models/*.yaml."""
+    run_generator("generate_dashboards.py", "Grafana dashboards")
+    run_generator("generate_fallbacks.py", "fallback chains")
+
+def file_digest(path):
+    """SHA256 of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def tree_digest(path):
+    """SHA256 over the relative names and contents of every file below path."""
+    path = Path(path)
+    if path.is_file():
+        return file_digest(path)
+    digest = hashlib.sha256()
+    for file in sorted(p for p in path.rglob("*") if p.is_file() and "__pycache__" not in p.parts):
+        digest.update(f"{file.relative_to(path).as_posix()}\0{file_digest(file)}\n".encode())
+    return digest.hexdigest()
+
+def sync_tree(source_dir, dest_dir):
+    """rsync-style sync: copy new/changed files (size + mtime), delete files gone from the source.
+
+    Returns (copied, deleted, unchanged) file counts.
+    """
+    source_dir, dest_dir = Path(source_dir), Path(dest_dir)
+    copied = deleted = unchanged = 0
+    wanted = set()
+    for source in source_dir.rglob("*"):
+        if "__pycache__" in source.parts:
+            continue
+        relative = source.relative_to(source_dir)
+        dest = dest_dir / relative
+        wanted.add(relative)
+        if source.is_dir():
+            if dest.exists() and not dest.is_dir():
+                dest.unlink()
+            dest.mkdir(parents=True, exist_ok=True)
+            continue
+        if dest.is_dir():
+            shutil.rmtree(dest)
+        elif dest.exists():
+            src_stat, dest_stat = source.stat(), dest.stat()
+            if src_stat.st_size == dest_stat.st_size and int(src_stat.st_mtime) == int(dest_stat.st_mtime):
+                unchanged += 1
+                continue
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(source, dest)  # keeps the mtime, so the next sync can skip the file
+        copied += 1
+    # Deepest paths first, so directories are empty by the time they are removed
+    for dest in sorted(dest_dir.rglob("*"), key=lambda p: len(p.parts), reverse=True):
+        relative = dest.relative_to(dest_dir)
+        if relative in wanted or "__pycache__" in relative.parts:
+            continue
+        if dest.is_dir():
+            shutil.rmtree(dest, ignore_errors=True)
+        else:
+            dest.unlink()
+            deleted += 1
+    return copied, deleted, unchanged
+
+def sync_config_directories(custom_dir, litellm_dir):
+    """Sync the modular configuration directories; returns the number of directories synced."""
+    synced = 0
+    for dir_name in CONFIG_DIRECTORIES:
+        source_dir = custom_dir / dir_name
+        dest_dir = litellm_dir / dir_name
+
+        if source_dir.exists() and source_dir.is_dir():
+            copied, deleted, unchanged = sync_tree(source_dir, dest_dir)
+            if copied or deleted:
+                success(f"Synced {dir_name}/ ({copied} copied, {deleted} deleted, {unchanged} unchanged)")
+            else:
+                info(f"{dir_name}/ unchanged ({unchanged} files)")
+            synced += 1
+        else:
+            warning(f"Directory not found: {dir_name}/ (skipping)")
+    return synced
+
+def deployed_env_content(env_file):
+    """The .env to deploy when DOCS_DESCRIPTION needs the dynamic host URL, else None (use the file as is)."""
+    if not env_file.exists():
+        return None
+    try:
+        with open(env_file, 'r') as f:
+            env_content = f.read()
+        
+        # Check if LITELLM_LICENSE is set to LOCAL_ENTERPRISE_UNLOCK
+        if "LITELLM_LICENSE=LOCAL_ENTERPRISE_UNLOCK" not in env_content and "LITELLM_LICENSE=\"LOCAL_ENTERPRISE_UNLOCK\"" not in env_content:
+            return None
+        info("LITELLM_LICENSE=LOCAL_ENTERPRISE_UNLOCK detected, checking DOCS_DESCRIPTION...")
+        
+        if "DOCS_DESCRIPTION=" not in env_content:
+            # No DOCS_DESCRIPTION found, add it
+            info("No DOCS_DESCRIPTION found, adding dynamic one...")
+            dynamic_description = generate_docs_description()
+            return env_content + f'\n# Auto-generated dynamic description\nDOCS_DESCRIPTION="{dynamic_description}"\n'
+        
+        lines = env_content.split('\n')
+        new_lines = []
+        replaced = False
+        for line in lines:
+            if line.strip().startswith('DOCS_DESCRIPTION='):
+                # Replace if empty or static
+                if (
+                    line.strip() == "DOCS_DESCRIPTION=" or
+                    line.strip() == 'DOCS_DESCRIPTION=""' or
+                    line.strip() == 'DOCS_DESCRIPTION= ""' or
+                    line.strip() == 'DOCS_DESCRIPTION= ' or
+                    line.strip().startswith('DOCS_DESCRIPTION=') and len(line.strip()) == len('DOCS_DESCRIPTION=') or
+                    line.strip().startswith('DOCS_DESCRIPTION=') and line.strip().endswith('""') or  # Your exact case
+                    "Lusófona University" in line or
+                    "LiteLLM proxy server for Lusófona University" in line
+                ):
+                    dynamic_description = generate_docs_description()
+                    new_lines.append(f'DOCS_DESCRIPTION="{dynamic_description}"')
+                    replaced = True
+                    info("Replaced DOCS_DESCRIPTION with dynamic one.")
+                else:
+                    new_lines.append(line)
+            else:
+                new_lines.append(line)
+        if replaced:
+            return '\n'.join(new_lines)
+        info("DOCS_DESCRIPTION exists and appears to be custom, using original file")
+    except Exception as e:
+        warning(f"Could not process .env file for dynamic description: {e}")
+    return None
+
 def copy_custom_configs():
     """Copy our custom configurations to the LiteLLM directory."""
     info("Copying custom configurations...")
@@ -176,73 +374,20 @@ def copy_custom_configs():
             warning(".env and env.example not found - deployment may fail")
     
     # Handle dynamic DOCS_DESCRIPTION generation BEFORE copying files
-    env_file = custom_dir / ".env"
     temp_env_file = None
+    env_content = deployed_env_content(env_file)
+    if env_content is not None:
+        # Create temporary file with modified content
+        temp_env_file = custom_dir / ".env.temp"
+        with open(temp_env_file, 'w') as f:
+            f.write(env_content)
+        success("Created temporary .env file with dynamic description")
+        info(f"Generated URL: http://{get_host_ip()}:{os.environ.get('LITELLM_PORT', '4000')}")
     
-    if env_file.exists():
-        try:
-            with open(env_file, 'r') as f:
-                env_content = f.read()
-            
-            # Check if LITELLM_LICENSE is set to LOCAL_ENTERPRISE_UNLOCK
-            if "LITELLM_LICENSE=LOCAL_ENTERPRISE_UNLOCK" in env_content or "LITELLM_LICENSE=\"LOCAL_ENTERPRISE_UNLOCK\"" in env_content:
-                info("LITELLM_LICENSE=LOCAL_ENTERPRISE_UNLOCK detected, checking DOCS_DESCRIPTION...")
-                
-                if "DOCS_DESCRIPTION=" in env_content:
-                    lines = env_content.split('\n')
-                    new_lines = []
-                    replaced = False
-                    for line in lines:
-                        if line.strip().startswith('DOCS_DESCRIPTION='):
-                            # Replace if empty or static
-                            if (
-                                line.strip() == "DOCS_DESCRIPTION=" or
-                                line.strip() == 'DOCS_DESCRIPTION=""' or
-                                line.strip() == 'DOCS_DESCRIPTION= ""' or
-                                line.strip() == 'DOCS_DESCRIPTION= ' or
-                                line.strip().startswith('DOCS_DESCRIPTION=') and len(line.strip()) == len('DOCS_DESCRIPTION=') or
-                                line.strip().startswith('DOCS_DESCRIPTION=') and line.strip().endswith('""') or  # Your exact case
-                                "Lusófona University" in line or
-                                "LiteLLM proxy server for Lusófona University" in line
-                            ):
-                                dynamic_description = generate_docs_description()
-                                new_lines.append(f'DOCS_DESCRIPTION="{dynamic_description}"')
-                                replaced = True
-                                info("Replaced DOCS_DESCRIPTION with dynamic one.")
-                            else:
-                                new_lines.append(line)
-                        else:
-                            new_lines.append(line)
-                    if replaced:
-                        # Create temporary file with modified content
-                        temp_env_file = custom_dir / ".env.temp"
-                        with open(temp_env_file, 'w') as f:
-                            f.write('\n'.join(new_lines))
-                        success("Created temporary .env file with dynamic description")
-                        info(f"Generated URL: http://{get_host_ip()}:{os.environ.get('LITELLM_PORT', '4000')}")
-                    else:
-                        info("DOCS_DESCRIPTION exists and appears to be custom, using original file")
-                else:
-                    # No DOCS_DESCRIPTION found, add it
-                    info("No DOCS_DESCRIPTION found, adding dynamic one...")
-                    dynamic_description = generate_docs_description()
-                    
-                    # Create temporary file with added content
-                    temp_env_file = custom_dir / ".env.temp"
-                    with open(temp_env_file, 'w') as f:
-                        f.write(env_content)
-                        f.write(f'\n# Auto-generated dynamic description\nDOCS_DESCRIPTION="{dynamic_description}"\n')
-                    
-                    success("Created temporary .env file with dynamic description")
-                    info(f"Generated URL: http://{get_host_ip()}:{os.environ.get('LITELLM_PORT', '4000')}")
-        except Exception as e:
-            warning(f"Could not process .env file for dynamic description: {e}")
-    
-    # Files to copy from custom config
-    config_files = ["config.yaml", "docker-compose.yml", ".env"]
-    
+    generate_catalog_outputs()
+
     copied = 0
-    for file_name in config_files:
+    for file_name in CONFIG_FILES:
         # Use temporary .env file if it exists, otherwise use original
         if file_name == ".env" and temp_env_file and temp_env_file.exists():
             source = temp_env_file
@@ -263,29 +408,17 @@ def copy_custom_configs():
                 if "grafana:" not in existing_content and "grafana:" in custom_content:
                     info(f"Replacing {file_name} to restore missing services (Grafana, Redis)")
             
-            shutil.copy2(source, dest)
-            success(f"Copied {file_name}")
+            if dest.exists() and file_digest(source) == file_digest(dest):
+                info(f"{file_name} unchanged")
+            else:
+                shutil.copy2(source, dest)
+                success(f"Copied {file_name}")
             copied += 1
         else:
             warning(f"File not found: {file_name} (skipping)")
     
-    # Copy directory structures for modular configuration
-    directories_to_copy = ["models", "settings"]
-    
-    for dir_name in directories_to_copy:
-        source_dir = custom_dir / dir_name
-        dest_dir = litellm_dir / dir_name
-        
-        if source_dir.exists() and source_dir.is_dir():
-            # Remove destination directory if it exists
-            if dest_dir.exists():
-                shutil.rmtree(dest_dir)
-            # Copy the entire directory
-            shutil.copytree(source_dir, dest_dir)
-            success(f"Copied {dir_name}/ directory")
-            copied += 1
-        else:
-            warning(f"Directory not found: {dir_name}/ (skipping)")
+    # Sync directory structures for modular configuration (changed files only)
+    copied += sync_config_directories(custom_dir, litellm_dir)
     
     # Also copy prometheus.yml from upstream repo to the same directory as docker-compose.yml
     prometheus_source = litellm_dir / "prometheus.yml" 
@@ -296,7 +429,7 @@ def copy_custom_configs():
     else:
         warning("prometheus.yml not found in upstream repo")
     
-    info(f"Configuration copying complete: {copied} files/directories copied")
+    info(f"Configuration sync complete: {copied} files/directories checked")
     
     # Clean up temporary file if it was created
     if temp_env_file and temp_env_file.exists():
@@ -306,8 +439,201 @@ def copy_custom_configs():
         except Exception as e:
             warning(f"Could not clean up temporary file: {e}")
 
-def build_and_deploy():
-    """Build Docker image and deploy services."""
+def compose_command():
+    """docker compose if available, else docker-compose."""
+    try:
+        subprocess.run(["docker", "compose", "version"], check=True, capture_output=True)
+        return ["docker", "compose", "-p", COMPOSE_PROJECT]
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return ["docker-compose", "-p", COMPOSE_PROJECT]
+
+def compose_config(compose_cmd, litellm_dir):
+    """The fully resolved compose configuration (.env applied, paths absolute)."""
+    result = run_command(compose_cmd + ["config", "--format", "json"], cwd=litellm_dir)
+    return json.loads(result.stdout)
+
+def running_services(compose_cmd, litellm_dir):
+    """{service: container id} for the services with a running container."""
+    result = subprocess.run(compose_cmd + ["ps", "--format", "json"], cwd=litellm_dir,
+                            capture_output=True, text=True, check=False)
+    output = result.stdout.strip()
+    if result.returncode != 0 or not output:
+        return {}
+    # Older compose versions print one JSON array, newer ones one object per line
+    try:
+        containers = json.loads(output)
+    except json.JSONDecodeError:
+        containers = [json.loads(line) for line in output.splitlines() if line.strip()]
+    if isinstance(containers, dict):
+        containers = [containers]
+    return {c.get("Service"): c.get("ID") for c in containers if c.get("State") == "running"}
+
+def container_images(container_ids):
+    """{container id: image id} the containers were created from."""
+    ids = [c for c in container_ids if c]
+    if not ids:
+        return {}
+    result = subprocess.run(["docker", "inspect", "--format", "{{.Id}} {{.Image}}"] + ids,
+                            capture_output=True, text=True, check=False)
+    images = {}
+    for line in result.stdout.splitlines():
+        container, _, image = line.partition(" ")
+        for short in ids:
+            if container.startswith(short):
+                images[short] = image
+    return images
+
+def desired_state(config, litellm_dir, deployed_dir=None):
+    """Per-service hashes of everything a deploy would change.
+
+    When config was resolved in a staging copy (--plan), deployed_dir is where it
+    would run from: paths in the compose config are hashed as deployed there."""
+    root = Path(litellm_dir).resolve()
+    deployed_root = Path(deployed_dir).resolve() if deployed_dir else root
+    state = {}
+    for name, service in config.get("services", {}).items():
+        mounts = hashlib.sha256()
+        for volume in service.get("volumes", []):
+            if volume.get("type") != "bind":
+                continue
+            source = Path(volume["source"])
+            try:
+                relative = source.resolve().relative_to(root)
+            except ValueError:
+                continue
+            if relative.parts and relative.parts[0] in MANAGED_MOUNTS and source.exists():
+                mounts.update(f"{relative.as_posix()}\0{tree_digest(source)}\n".encode())
+        build = service.get("build")
+        state[name] = {
+            "config": hashlib.sha256(
+                json.dumps(service, sort_keys=True).replace(str(root), str(deployed_root)).encode()
+            ).hexdigest(),
+            "mounts": mounts.hexdigest(),
+            "build": tree_digest(build["context"]) if build else None,
+            "image": None if build else service.get("image"),
+        }
+    return state
+
+def load_deploy_state(litellm_dir):
+    state_file = Path(litellm_dir) / DEPLOY_STATE_FILE
+    if not state_file.exists():
+        return {}
+    try:
+        with open(state_file, 'r') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+def save_deploy_state(litellm_dir, state):
+    state_file = Path(litellm_dir) / DEPLOY_STATE_FILE
+    temp_file = state_file.with_suffix(".tmp")
+    with open(temp_file, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(temp_file, state_file)
+
+def image_id(image):
+    result = subprocess.run(["docker", "image", "inspect", "--format", "{{.Id}}", image],
+                            capture_output=True, text=True, check=False)
+    return result.stdout.strip() if result.returncode == 0 else None
+
+def pull_image(image):
+    """Pull one image; returns (image, changed, seconds)."""
+    started = time.perf_counter()
+    before = image_id(image)
+    result = subprocess.run(["docker", "pull", "-q", image], capture_output=True, text=True, check=False)
+    if result.returncode != 0:
+        warning(f"Could not pull {image}: {(result.stderr.strip().splitlines() or ['unknown error'])[-1]}")
+        return image, False, time.perf_counter() - started
+    return image, image_id(image) != before, time.perf_counter() - started
+
+def stale_images(desired, running):
+    """Running services whose container is not on the local image of their tag.
+
+    Compares image IDs rather than "did this run's pull change anything", so an
+    image pulled by a failed deploy, by hand or before --no-pull still rolls out."""
+    containers = container_images(running.values())
+    local = {}
+    stale = {}
+    for name, want in desired.items():
+        if not want["image"] or name not in running:
+            continue
+        if want["image"] not in local:
+            local[want["image"]] = image_id(want["image"])
+        current = containers.get(running[name])
+        if local[want["image"]] and current and current != local[want["image"]]:
+            stale[name] = want["image"]
+    return stale
+
+def plan_deployment(desired, previous, running, stale):
+    """Decide per service: start, rebuild, recreate, restart, update or unchanged."""
+    plan = []
+    for name, want in desired.items():
+        had = previous.get(name)
+        if want["build"] and (not had or had.get("build") != want["build"]):
+            action, reason = "rebuild", "build context changed" if had else "no recorded build"
+        elif name not in running:
+            action, reason = "start", "not running"
+        elif name in stale:
+            action, reason = "update", f"running an older {stale[name]} image"
+        elif not had:
+            # Compose compares its own config hash; only mounted files are unknown
+            action, reason = ("restart", "no recorded state") if want["mounts"] != hashlib.sha256().hexdigest() \
+                else ("recreate", "no recorded state (compose decides)")
+        elif had.get("config") != want["config"]:
+            action, reason = "recreate", "compose config changed"
+        elif had.get("mounts") != want["mounts"]:
+            action, reason = "restart", "mounted config files changed"
+        else:
+            action, reason = "unchanged", ""
+        plan.append((name, action, reason))
+    return plan
+
+def print_plan(plan):
+    info("Deployment plan:")
+    width = max((len(name) for name, _, _ in plan), default=0)
+    for name, action, reason in plan:
+        marker = "  " if action == "unchanged" else "->"
+        info(f"  {marker} {name:<{width}}  {action:<9} {reason}")
+
+def stage_configs(custom_dir, litellm_dir, staging_dir):
+    """Copy the managed files a deploy would sync into staging_dir, leaving LITELLM_DIR alone."""
+    for file_name in CONFIG_FILES:
+        source = custom_dir / file_name
+        env_content = deployed_env_content(source) if file_name == ".env" else None
+        if env_content is not None:
+            with open(staging_dir / file_name, 'w') as f:
+                f.write(env_content)
+        elif source.exists():
+            shutil.copy2(source, staging_dir / file_name)
+    for dir_name in CONFIG_DIRECTORIES:
+        if (custom_dir / dir_name).is_dir():
+            shutil.copytree(custom_dir / dir_name, staging_dir / dir_name,
+                            ignore=shutil.ignore_patterns("__pycache__"))
+    if (litellm_dir / "prometheus.yml").exists():
+        shutil.copy2(litellm_dir / "prometheus.yml", staging_dir / "prometheus.yml")
+
+def show_plan():
+    """Print the deployment plan for .litellm-lusofona/ as it is now, changing nothing."""
+    custom_dir = Path(CUSTOM_CONFIG_DIR)
+    litellm_dir = Path(LITELLM_DIR)
+    if not custom_dir.exists():
+        error(f"Custom config directory not found: {CUSTOM_CONFIG_DIR}")
+    if not (litellm_dir / "docker-compose.yml").exists():
+        info("Nothing deployed yet: a deploy would clone LiteLLM and start every service")
+        return
+
+    compose_cmd = compose_command()
+    with timed_step("Plan"), tempfile.TemporaryDirectory(prefix="litellm-plan-") as staging:
+        staging_dir = Path(staging).resolve()
+        stage_configs(custom_dir, litellm_dir, staging_dir)
+        config = compose_config(compose_cmd, staging_dir)
+        desired = desired_state(config, staging_dir, deployed_dir=litellm_dir)
+        running = running_services(compose_cmd, litellm_dir)
+        plan = plan_deployment(desired, load_deploy_state(litellm_dir), running, stale_images(desired, running))
+    print_plan(plan)
+
+def build_and_deploy(pull=True):
+    """Pull/build what changed and (re)start only the affected services."""
     litellm_dir = Path(LITELLM_DIR)
     
     # Check if docker-compose.yml exists
@@ -315,25 +641,61 @@ def build_and_deploy():
     if not compose_file.exists():
         error("docker-compose.yml not found in LiteLLM directory")
     
-    info("Building and deploying services...")
-    
-    # Try docker compose first, then docker-compose
-    compose_cmd = ["docker", "compose"]
-    try:
-        subprocess.run(compose_cmd + ["--version"], cwd=litellm_dir, check=True, capture_output=True)
-    except:
-        compose_cmd = ["docker-compose"]
-        subprocess.run(compose_cmd + ["--version"], cwd=litellm_dir, check=True, capture_output=True)
-    
-    # Deploy with project name - let output stream to console
-    deploy_command = compose_cmd + ["-p", "lusochat-litellm", "up", "-d", "--build"]
-    info(f"Running: {' '.join(deploy_command)}")
-    
-    result = subprocess.run(deploy_command, cwd=litellm_dir)
-    if result.returncode != 0:
-        error(f"Docker deployment failed with exit code {result.returncode}")
-    
-    success("Services deployed successfully!")
+    compose_cmd = compose_command()
+
+    with timed_step("Plan"):
+        config = compose_config(compose_cmd, litellm_dir)
+        desired = desired_state(config, litellm_dir)
+        previous = load_deploy_state(litellm_dir)
+        running = running_services(compose_cmd, litellm_dir)
+
+    images = sorted({want["image"] for want in desired.values() if want["image"]})
+    if pull and images:
+        with timed_step("Pull images"):
+            info(f"Pulling {len(images)} images in parallel...")
+            # Building the changed contexts does not depend on the pulls; overlap them
+            to_build = [name for name, want in desired.items()
+                        if want["build"] and previous.get(name, {}).get("build") != want["build"]]
+            with ThreadPoolExecutor(max_workers=len(images) + 1) as pool:
+                build_future = pool.submit(
+                    subprocess.run, compose_cmd + ["build"] + to_build, cwd=litellm_dir
+                ) if to_build else None
+                for image, changed, seconds in pool.map(pull_image, images):
+                    info(f"  {image}: {'updated' if changed else 'up to date'} ({seconds:.1f}s)")
+                if build_future and build_future.result().returncode != 0:
+                    error(f"Building {', '.join(to_build)} failed")
+        prebuilt = True
+    else:
+        prebuilt = False
+
+    plan = plan_deployment(desired, previous, running, stale_images(desired, running))
+    print_plan(plan)
+
+    rebuild = [name for name, action, _ in plan if action == "rebuild"]
+    if rebuild and not prebuilt:
+        with timed_step("Build"):
+            result = subprocess.run(compose_cmd + ["build"] + rebuild, cwd=litellm_dir)
+            if result.returncode != 0:
+                error(f"Building {', '.join(rebuild)} failed")
+
+    up = [name for name, action, _ in plan if action in ("rebuild", "start", "update", "recreate")]
+    restart = [name for name, action, _ in plan if action == "restart"]
+    if up:
+        with timed_step("Start/recreate"):
+            deploy_command = compose_cmd + ["up", "-d", "--no-build"] + up
+            info(f"Running: {' '.join(deploy_command)}")
+            if subprocess.run(deploy_command, cwd=litellm_dir).returncode != 0:
+                error("Docker deployment failed")
+    if restart:
+        with timed_step("Restart"):
+            restart_command = compose_cmd + ["restart"] + restart
+            info(f"Running: {' '.join(restart_command)}")
+            if subprocess.run(restart_command, cwd=litellm_dir).returncode != 0:
+                error("Restarting services failed")
+
+    save_deploy_state(litellm_dir, desired)
+    unchanged = sum(1 for _, action, _ in plan if action == "unchanged")
+    success(f"Services deployed: {len(up)} started/recreated, {len(restart)} restarted, {unchanged} untouched")
 
 def show_deployment_info():
     """Show information about deployed services."""
@@ -386,26 +748,12 @@ def update_config():
         source_config = Path(CUSTOM_CONFIG_DIR) / "config.yaml"
         target_config = Path(LITELLM_DIR) / "config.yaml"
         shutil.copy2(source_config, target_config)
+        shutil.copy2(Path(CUSTOM_CONFIG_DIR) / "model_catalog.py", Path(LITELLM_DIR) / "model_catalog.py")
         success("Main configuration file updated")
         
-        # Copy modular directories
-        custom_dir = Path(CUSTOM_CONFIG_DIR)
-        litellm_dir = Path(LITELLM_DIR)
-        
-        directories_to_copy = ["models", "settings"]
-        for dir_name in directories_to_copy:
-            source_dir = custom_dir / dir_name
-            dest_dir = litellm_dir / dir_name
-            
-            if source_dir.exists() and source_dir.is_dir():
-                # Remove destination directory if it exists
-                if dest_dir.exists():
-                    shutil.rmtree(dest_dir)
-                # Copy the entire directory
-                shutil.copytree(source_dir, dest_dir)
-                success(f"Updated {dir_name}/ directory")
-            else:
-                warning(f"Directory not found: {dir_name}/ (skipping)")
+        # Sync modular directories (dashboards and fallbacks follow the model catalog)
+        generate_catalog_outputs()
+        sync_config_directories(Path(CUSTOM_CONFIG_DIR), Path(LITELLM_DIR))
 
         # Start the litellm service again
         info("Starting LiteLLM service...")
@@ -447,23 +795,36 @@ def main():
     # Parse command line arguments
     parser = argparse.ArgumentParser(description="Lusochat LiteLLM Deployment Script")
     parser.add_argument("--update-config", action="store_true", help="Only update configuration without full redeployment")
+    parser.add_argument("--plan", action="store_true",
+                        help="Show what a deploy of .litellm-lusofona/ would change; clones, patches and syncs nothing")
+    parser.add_argument("--no-pull", action="store_true", help="Do not pull newer images")
     args = parser.parse_args()
     
     if args.update_config:
-        update_config()
+        with timed_step("Update config"):
+            update_config()
+        print_timing_report()
+        return
+
+    if args.plan:
+        show_plan()
+        print_timing_report()
         return
     
     # Main deployment steps
-    cleanup_and_clone()
-    copy_custom_configs()
+    with timed_step("Clone/pull + patch"):
+        cleanup_and_clone()
+    with timed_step("Sync configs"):
+        copy_custom_configs()
     
     if prompt_user("Do you want to build and deploy now?", "y"):
-        build_and_deploy()
+        build_and_deploy(pull=not args.no_pull)
         show_deployment_info()
     else:
         info("Skipping deployment. To deploy later, run:")
-        info(f"  cd {LITELLM_DIR}")
-        info("  docker compose -p lusochat-litellm up -d --build")
+        info("  python3 deploy_litellm.py --plan     # see what would change")
+        info("  python3 deploy_litellm.py")
+    print_timing_report()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -13,6 +13,12 @@ ENV_FILE=".env"
 ENV_EXAMPLE="env.example"
 COMPOSE_FILE="docker-compose.yml"
 SERVICE_NAME="lusochat-openwebui"
+DATA_VOLUME="lusochat_data"
+BACKUP_DIR="backups"
+BACKUP_BASE_IMAGE="python:3.11-slim"
+BACKUP_ZSTANDARD="zstandard==0.23.0"
+BACKUP_IMAGE="lusochat-backup:py3.11-zstd0.23"
+BACKUP_TOOL="lusochat_backup.py"
 
 # Colors for output
 RED='\033[0;31m'
@@ -226,6 +232,7 @@ deploy_lusochat() {
     check_requirements
     setup_environment
     pull_image
+    ensure_backup_image
     deploy_services
     show_deployment_info
 }
@@ -235,6 +242,7 @@ update_lusochat() {
     echo_step "Updating Lusochat to latest version..."
     
     pull_image
+    ensure_backup_image
     
     echo_info "Restarting services with new image..."
     docker compose down
@@ -272,57 +280,64 @@ show_status() {
     fi
 }
 
-# Backup function
+# Build the local backup image (python + zstandard) once, so backups and
+# restores never need Docker Hub or PyPI afterwards
+ensure_backup_image() {
+    if docker image inspect "$BACKUP_IMAGE" >/dev/null 2>&1; then
+        return 0
+    fi
+    echo_info "Building $BACKUP_IMAGE (one time, needs Docker Hub and PyPI)..."
+    if ! printf 'FROM %s\nRUN pip install --no-cache-dir --disable-pip-version-check --root-user-action=ignore "%s"\n' \
+        "$BACKUP_BASE_IMAGE" "$BACKUP_ZSTANDARD" | docker build -q -t "$BACKUP_IMAGE" - >/dev/null; then
+        echo_error "Could not build $BACKUP_IMAGE"
+        echo_info "On an offline host, copy it from another machine:"
+        echo_info "  docker save $BACKUP_IMAGE | ssh <host> docker load"
+        exit 1
+    fi
+    echo_success "Built $BACKUP_IMAGE"
+}
+
+# Run lusochat_backup.py in a throwaway container with the data volume at /data
+run_backup_tool() {
+    if [ ! -f "$BACKUP_TOOL" ]; then
+        echo_error "$BACKUP_TOOL not found next to deploy.sh"
+        exit 1
+    fi
+    ensure_backup_image
+    docker run --rm \
+        -v "$DATA_VOLUME":/data \
+        -v "$(pwd)/$BACKUP_DIR":/backups \
+        -v "$(pwd)/$BACKUP_TOOL":/lusochat_backup.py:ro \
+        "$BACKUP_IMAGE" \
+        python /lusochat_backup.py --repo /backups "$@"
+}
+
+# Backup function (incremental snapshot, service keeps running)
 backup_data() {
     echo_step "Creating backup of Lusochat data..."
     
-    local backup_dir="backups"
     local timestamp=$(date +"%Y%m%d_%H%M%S")
-    local backup_file="${backup_dir}/lusochat_backup_${timestamp}.tar.gz"
-    
-    mkdir -p "$backup_dir"
-    
-    echo_info "Creating backup: $backup_file"
     
-    # Create backup of volumes
-    docker run --rm \
-        -v lusochat_data:/source:ro \
-        -v "$(pwd)/$backup_dir":/backup \
-        alpine tar czf "/backup/lusochat_backup_${timestamp}.tar.gz" -C /source .
+    run_backup_tool snapshot --source /data
     
     # Include environment file
-    cp "$ENV_FILE" "${backup_dir}/.env_${timestamp}"
+    cp "$ENV_FILE" "${BACKUP_DIR}/.env_${timestamp}"
     
-    echo_success "✅ Backup created: $backup_file"
-    echo_info "Environment file backed up as: ${backup_dir}/.env_${timestamp}"
+    echo_success "✅ Backup created in $BACKUP_DIR/ (list with: ./deploy.sh backups)"
+    echo_info "Environment file backed up as: ${BACKUP_DIR}/.env_${timestamp}"
 }
 
-# Restore function
-restore_data() {
+# Restore from a legacy full tar.gz backup (stops the stack)
+restore_tarball() {
     local backup_file="$1"
     
-    if [ -z "$backup_file" ]; then
-        echo_error "Please specify backup file"
-        echo_info "Usage: ./deploy.sh restore <backup_file>"
-        echo_info "Available backups:"
-        ls -la backups/*.tar.gz 2>/dev/null || echo_info "No backups found"
-        exit 1
-    fi
-    
-    if [ ! -f "$backup_file" ]; then
-        echo_error "Backup file not found: $backup_file"
-        exit 1
-    fi
-    
-    echo_step "Restoring Lusochat data from: $backup_file"
-    
     if prompt_user "This will overwrite current data. Continue?" "N"; then
         # Stop services
         docker compose down
         
         # Restore data
         docker run --rm \
-            -v lusochat_data:/target \
+            -v "$DATA_VOLUME":/target \
             -v "$(pwd)/$(dirname "$backup_file")":/backup \
             alpine sh -c "cd /target && tar xzf /backup/$(basename "$backup_file")"
         
@@ -335,6 +350,61 @@ restore_data() {
     fi
 }
 
+# Restore function: snapshot name (or "latest"), optionally limited to paths
+restore_data() {
+    local snapshot="$1"
+    shift || true
+    
+    if [ -z "$snapshot" ]; then
+        echo_error "Please specify a snapshot"
+        echo_info "Usage: ./deploy.sh restore <snapshot|latest> [path or pattern ...]"
+        echo_info "Example: ./deploy.sh restore latest 'uploads/*'"
+        echo_info "Available backups:"
+        run_backup_tool list 2>/dev/null || echo_info "No snapshots found"
+        ls -la "$BACKUP_DIR"/*.tar.gz 2>/dev/null || true
+        exit 1
+    fi
+    
+    if [[ "$snapshot" == *.tar.gz ]]; then
+        if [ ! -f "$snapshot" ]; then
+            echo_error "Backup file not found: $snapshot"
+            exit 1
+        fi
+        echo_step "Restoring Lusochat data from: $snapshot"
+        restore_tarball "$snapshot"
+        return
+    fi
+    
+    echo_step "Restoring Lusochat data from snapshot: $snapshot ${*:+($*)}"
+    
+    if prompt_user "This will overwrite the selected data. Continue?" "N"; then
+        # Only databases need the service stopped; uploads and other files are swapped in place
+        local stopped=false
+        if run_backup_tool restore --check-sqlite "$snapshot" "$@"; then
+            echo_info "Restore includes databases, stopping $SERVICE_NAME..."
+            docker compose stop "$SERVICE_NAME"
+            stopped=true
+        fi
+        
+        local delete_flag=""
+        if [ $# -eq 0 ]; then
+            delete_flag="--delete"
+        fi
+        if ! run_backup_tool restore --target /data $delete_flag "$snapshot" "$@"; then
+            echo_error "Restore failed"
+            [ "$stopped" = true ] && docker compose start "$SERVICE_NAME"
+            exit 1
+        fi
+        
+        if [ "$stopped" = true ]; then
+            docker compose start "$SERVICE_NAME"
+        fi
+        echo_success "✅ Data restored successfully"
+    else
+        echo_info "Restore cancelled"
+    fi
+}
+
 # Main script logic
 case "${1:-deploy}" in
     "deploy"|"start")
@@ -369,7 +439,14 @@ case "${1:-deploy}" in
         backup_data
         ;;
     "restore")
-        restore_data "$2"
+        shift
+        restore_data "$@"
+        ;;
+    "backups")
+        run_backup_tool list ${2:+--files "$2"}
+        ;;
+    "prune")
+        run_backup_tool prune --keep "${2:-14}"
         ;;
     "clean")
         echo_step "Cleaning up Lusochat deployment..."
@@ -394,8 +471,10 @@ case "${1:-deploy}" in
         echo -e "  ${CYAN}status${NC}   Show service status and health"
         echo -e "  ${CYAN}logs${NC}     Show and follow service logs"
         echo -e "  ${CYAN}shell${NC}    Open shell in Lusochat container"
-        echo -e "  ${CYAN}backup${NC}   Create backup of data"
-        echo -e "  ${CYAN}restore${NC}  Restore from backup file"
+        echo -e "  ${CYAN}backup${NC}   Create incremental backup of data (online)"
+        echo -e "  ${CYAN}backups${NC}  List backups (or the files of one)"
+        echo -e "  ${CYAN}restore${NC}  Restore a backup, or only some paths of it"
+        echo -e "  ${CYAN}prune${NC}    Keep the newest N backups (default 14)"
         echo -e "  ${CYAN}clean${NC}    Remove all containers and data"
         echo -e "  ${CYAN}help${NC}     Show this help message"
         echo ""
@@ -404,7 +483,8 @@ case "${1:-deploy}" in
         echo -e "  $0 update           # Update to latest version"
         echo -e "  $0 logs             # View logs"
         echo -e "  $0 backup           # Create backup"
-        echo -e "  $0 restore backup.tar.gz  # Restore from backup"
+        echo -e "  $0 restore latest   # Restore the latest backup"
+        echo -e "  $0 restore latest 'uploads/*'  # Restore only uploads"
         echo ""
         ;;
     *)
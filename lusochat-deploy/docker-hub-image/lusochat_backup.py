@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+"""
+Lusochat Incremental Backup
+
+Content-addressed, zstd-compressed snapshots of the OpenWebUI data volume
+(webui.db, uploads/, vector_db/, cache/) that can be taken while the service
+keeps running. deploy.sh runs it in a throwaway python container with the
+volume mounted at /data and ./backups at /backups.
+
+Repository layout (./backups):
+
+    objects/ab/ab12...ef.zst     one file per unique content (sha256 of the
+                                 uncompressed bytes), zstd-compressed
+    snapshots/20251019_120000.json
+                                 manifest: path, size, mode, mtime, sha256
+
+How a snapshot works:
+1. Walk the data directory. Files whose size and mtime match the previous
+   snapshot reuse its hash without being read again.
+2. SQLite databases (webui.db, chroma.sqlite3, ...) are copied with the
+   SQLite online backup API into a temporary file first, so the snapshot is
+   consistent even while OpenWebUI writes to them.
+3. New content is compressed with multi-threaded zstd, several files at a
+   time, and stored once; unchanged content costs nothing.
+
+Restore streams objects straight into the target directory, skips files that
+already match, and can be limited to paths or glob patterns (partial restore).
+
+Usage:
+    python lusochat_backup.py --repo /backups snapshot --source /data
+    python lusochat_backup.py --repo /backups list
+    python lusochat_backup.py --repo /backups restore --target /data latest
+    python lusochat_backup.py restore --target /data 20251019_120000 "uploads/*" webui.db
+    python lusochat_backup.py --repo /backups prune --keep 14
+"""
+
+import os
+import sys
+import json
+import stat
+import fnmatch
+import sqlite3
+import hashlib
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import zstandard
+
+CHUNK_SIZE = 1024 * 1024
+SQLITE_MAGIC = b"SQLite format 3\x00"
+# SQLite side files are never copied: the backup API snapshot already holds their content
+SQLITE_SIDE_SUFFIXES = ("-wal", "-shm", "-journal")
+# Files above this size are compressed with zstd's own worker threads as well
+LARGE_FILE = 64 * 1024 * 1024
+
+
+def info(msg: str) -> None:
+    print(f"[INFO] {msg}", flush=True)
+
+
+def success(msg: str) -> None:
+    print(f"[SUCCESS] {msg}", flush=True)
+
+
+def warning(msg: str) -> None:
+    print(f"[WARNING] {msg}", file=sys.stderr, flush=True)
+
+
+def error(msg: str) -> None:
+    print(f"[ERROR] {msg}", file=sys.stderr, flush=True)
+
+
+def human(size: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+# ---- repository ----------------------------------------------------------------
+
+class Repository:
+    """Object store + snapshot manifests under one directory."""
+
+    def __init__(self, root: Path, level: int = 6, threads: int = 0):
+        self.root = root
+        self.objects = root / "objects"
+        self.snapshots = root / "snapshots"
+        self.level = level
+        self.threads = threads or os.cpu_count() or 1
+
+    def object_path(self, digest: str) -> Path:
+        return self.objects / digest[:2] / f"{digest}.zst"
+
+    def has(self, digest: str) -> bool:
+        return self.object_path(digest).exists()
+
+    def put(self, path: Path, digest: str) -> int:
+        """Compress a file into the store (no-op if the content is there); returns bytes written."""
+        target = self.object_path(digest)
+        if target.exists():
+            return 0
+        target.parent.mkdir(parents=True, exist_ok=True)
+        threads = self.threads if path.stat().st_size >= LARGE_FILE else 0
+        compressor = zstandard.ZstdCompressor(level=self.level, threads=threads)
+        fd, tmp = tempfile.mkstemp(dir=target.parent, suffix=".tmp")
+        try:
+            with open(path, "rb") as src, os.fdopen(fd, "wb") as dst:
+                compressor.copy_stream(src, dst, read_size=CHUNK_SIZE, write_size=CHUNK_SIZE)
+            os.replace(tmp, target)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        return target.stat().st_size
+
+    def stream_to(self, digest: str, target: Path) -> None:
+        """Decompress an object into target through a temporary file next to it."""
+        target.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=target.parent, prefix=f".{target.name}.", suffix=".restore")
+        try:
+            with open(self.object_path(digest), "rb") as src, os.fdopen(fd, "wb") as dst:
+                zstandard.ZstdDecompressor().copy_stream(src, dst, read_size=CHUNK_SIZE, write_size=CHUNK_SIZE)
+            os.replace(tmp, target)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+    def snapshot_names(self) -> List[str]:
+        return sorted(p.stem for p in self.snapshots.glob("*.json"))
+
+    def load(self, name: str) -> Dict:
+        if name == "latest":
+            names = self.snapshot_names()
+            if not names:
+                raise FileNotFoundError(f"No snapshots in {self.snapshots}")
+            name = names[-1]
+        with open(self.snapshots / f"{name}.json", "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def save(self, manifest: Dict) -> Path:
+        self.snapshots.mkdir(parents=True, exist_ok=True)
+        path = self.snapshots / f"{manifest['name']}.json"
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(tmp, path)
+        return path
+
+
+# ---- snapshot ------------------------------------------------------------------
+
+def sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def is_sqlite(path: Path) -> bool:
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(SQLITE_MAGIC)) == SQLITE_MAGIC
+    except OSError:
+        return False
+
+
+def sqlite_snapshot(path: Path, tmp_dir: Path) -> Path:
+    """Consistent copy of a live SQLite database through the online backup API."""
+    copy = tmp_dir / (hashlib.sha1(str(path).encode("utf-8")).hexdigest() + ".sqlite")
+    source = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=30)
+    target = sqlite3.connect(copy)
+    try:
+        source.backup(target, pages=4096)
+    finally:
+        target.close()
+        source.close()
+    return copy
+
+
+def walk(source: Path) -> Iterable[Path]:
+    for root, dirs, files in os.walk(source):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith(SQLITE_SIDE_SUFFIXES) or name.endswith(".restore"):
+                continue
+            yield Path(root) / name
+
+
+def cmd_snapshot(args) -> None:
+    repo = Repository(args.repo, args.level, args.threads)
+    source = args.source
+    if not source.is_dir():
+        raise FileNotFoundError(f"Source directory not found: {source}")
+    names = repo.snapshot_names()
+    previous = {f["path"]: f for f in repo.load(names[-1])["files"]} if names else {}
+    name = datetime.now().strftime("%Y%m%d_%H%M%S")
+    info(f"Snapshot {name} of {source}" + (f" (incremental on {names[-1]})" if names else ""))
+
+    written = {"bytes": 0, "new": 0, "sqlite": 0}
+    lock = threading.Lock()
+
+    def process(path: Path, tmp_dir: Path) -> Optional[Dict]:
+        rel = path.relative_to(source).as_posix()
+        try:
+            st = path.stat()
+        except FileNotFoundError:  # removed while walking
+            return None
+        entry = {"path": rel, "size": st.st_size, "mode": stat.S_IMODE(st.st_mode), "mtime": st.st_mtime}
+        old = previous.get(rel)
+        if is_sqlite(path):
+            data_path = sqlite_snapshot(path, tmp_dir)
+            entry["size"] = data_path.stat().st_size
+            entry["sqlite"] = True
+            with lock:
+                written["sqlite"] += 1
+        elif old and old["size"] == st.st_size and old["mtime"] == st.st_mtime and repo.has(old["sha256"]):
+            entry["sha256"] = old["sha256"]
+            return entry
+        else:
+            data_path = path
+        try:
+            entry["sha256"] = sha256_file(data_path)
+            stored = repo.put(data_path, entry["sha256"])
+        finally:
+            if data_path is not path:
+                data_path.unlink()
+        if stored:
+            with lock:
+                written["bytes"] += stored
+                written["new"] += 1
+        return entry
+
+    args.repo.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=args.repo) as tmp:
+        with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+            files = [f for f in pool.map(lambda p: process(p, Path(tmp)), walk(source)) if f]
+
+    manifest = {
+        "name": name,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "source": str(source),
+        "files": files,
+    }
+    repo.save(manifest)
+    total = sum(f["size"] for f in files)
+    success(
+        f"Snapshot {name}: {len(files)} files ({human(total)}), {written['new']} new objects "
+        f"({human(written['bytes'])} compressed), {written['sqlite']} SQLite databases copied online"
+    )
+
+
+# ---- restore -------------------------------------------------------------------
+
+def select(files: List[Dict], patterns: List[str]) -> List[Dict]:
+    if not patterns:
+        return files
+    chosen = []
+    for f in files:
+        for pattern in patterns:
+            pattern = pattern.rstrip("/")
+            if fnmatch.fnmatch(f["path"], pattern) or f["path"].startswith(pattern + "/"):
+                chosen.append(f)
+                break
+    return chosen
+
+
+def cmd_restore(args) -> None:
+    repo = Repository(args.repo)
+    manifest = repo.load(args.snapshot)
+    files = select(manifest["files"], args.paths)
+    if not files:
+        raise FileNotFoundError(f"Nothing in snapshot {manifest['name']} matches {args.paths}")
+    if args.check_sqlite:
+        # Exit status only: 0 when the selection holds SQLite databases (stop the service first)
+        sys.exit(0 if any(f.get("sqlite") for f in files) else 3)
+    target = args.target
+    info(f"Restoring {len(files)} files from {manifest['name']} into {target}")
+
+    def restore(f: Dict) -> str:
+        path = target / f["path"]
+        if path.exists() and not f.get("sqlite") and path.stat().st_size == f["size"] \
+                and sha256_file(path) == f["sha256"]:
+            return "unchanged"
+        if args.dry_run:
+            return "restored"
+        repo.stream_to(f["sha256"], path)
+        if f.get("sqlite"):
+            for suffix in SQLITE_SIDE_SUFFIXES:
+                side = path.with_name(path.name + suffix)
+                if side.exists():
+                    side.unlink()  # stale WAL/SHM from the database we just replaced
+        os.chmod(path, f["mode"])
+        os.utime(path, (f["mtime"], f["mtime"]))
+        return "restored"
+
+    with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        results = list(pool.map(restore, files))
+
+    removed = 0
+    if args.delete and not args.paths:
+        keep = {f["path"] for f in files}
+        for path in list(walk(target)):
+            if path.relative_to(target).as_posix() not in keep:
+                if not args.dry_run:
+                    path.unlink()
+                removed += 1
+
+    prefix = "[dry run] " if args.dry_run else ""
+    success(f"{prefix}{results.count('restored')} files restored, {results.count('unchanged')} unchanged, "
+            f"{removed} removed")
+
+
+# ---- list / prune --------------------------------------------------------------
+
+def cmd_list(args) -> None:
+    repo = Repository(args.repo)
+    names = repo.snapshot_names()
+    if not names:
+        info(f"No snapshots in {repo.snapshots}")
+        return
+    for name in names:
+        manifest = repo.load(name)
+        total = sum(f["size"] for f in manifest["files"])
+        print(f"{name}  {len(manifest['files']):>6} files  {human(total):>10}")
+        if (args.files is True and name == names[-1]) or args.files == name:
+            for f in manifest["files"]:
+                print(f"  {f['path']:<70} {human(f['size']):>10}{'  (sqlite)' if f.get('sqlite') else ''}")
+
+
+def cmd_prune(args) -> None:
+    repo = Repository(args.repo)
+    names = repo.snapshot_names()
+    drop = names[:-args.keep] if args.keep > 0 else []
+    for name in drop:
+        (repo.snapshots / f"{name}.json").unlink()
+    referenced = {f["sha256"] for name in repo.snapshot_names() for f in repo.load(name)["files"]}
+    freed, removed = 0, 0
+    for path in repo.objects.glob("*/*.zst"):
+        if path.stem not in referenced:
+            freed += path.stat().st_size
+            path.unlink()
+            removed += 1
+    success(f"Removed {len(drop)} snapshots and {removed} unreferenced objects ({human(freed)})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incremental, content-addressed Lusochat backups")
+    parser.add_argument("--repo", type=Path, default=Path("/backups"), help="Backup repository directory")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 2, help="Files processed in parallel")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    snapshot = sub.add_parser("snapshot", help="Store a new snapshot of the data directory")
+    snapshot.add_argument("--source", type=Path, default=Path("/data"))
+    snapshot.add_argument("--level", type=int, default=6, help="zstd level (1-19)")
+    snapshot.add_argument("--threads", type=int, default=0, help="zstd threads for large files (0 = all CPUs)")
+
+    restore = sub.add_parser("restore", help="Restore a snapshot (or some paths of it)")
+    restore.add_argument("snapshot", help="Snapshot name or 'latest'")
+    restore.add_argument("paths", nargs="*",
+                         help="Paths or glob patterns to restore (default: everything); put options before them")
+    restore.add_argument("--target", type=Path, default=Path("/data"))
+    restore.add_argument("--delete", action="store_true", help="Full restore only: remove files not in the snapshot")
+    restore.add_argument("--dry-run", action="store_true")
+    restore.add_argument("--check-sqlite", action="store_true",
+                         help="Only exit 0 if the selection contains SQLite databases, 3 otherwise")
+
+    listing = sub.add_parser("list", help="List snapshots")
+    listing.add_argument("--files", nargs="?", const=True, default=None,
+                         help="Also list the files of a snapshot (default: the latest)")
+
+    prune = sub.add_parser("prune", help="Keep the newest snapshots and drop unreferenced objects")
+    prune.add_argument("--keep", type=int, default=14)
+
+    args = parser.parse_args()
+    try:
+        {"snapshot": cmd_snapshot, "restore": cmd_restore, "list": cmd_list, "prune": cmd_prune}[args.command](args)
+    except Exception as e:
+        error(str(e))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Lusochat Asset Pipeline
+
+Builds the Lusochat icons, favicons and splash images for an Open WebUI
+checkout from the asset manifest (lusochat_assets.yaml). Replaces the plain
+`cp` of copy_custom_icons in deploy_and_apply_lusochat_customizations.sh, which
+put the same 163x167 PNG everywhere regardless of the size the file name
+promised (and a PNG into favicon.ico).
+
+How it works:
+1. Every asset is rendered from its source: padded to a square and resized
+   (LANCZOS), packed into a multi-size ICO, or wrapped in an SVG.
+2. PNGs are optimized losslessly: Pillow's optimizer, a palette version when
+   it decodes to exactly the same pixels, and oxipng/optipng when installed.
+   The smallest candidate wins, never larger than the source.
+3. Results are cached by sha256(source bytes + recipe) in
+   ~/.cache/lusochat/assets (LUSOCHAT_CACHE_DIR), so an unchanged asset is a
+   file copy on the next deploy.
+4. Each output is written under its usual name and as <name>.<hash8>.<ext>;
+   references in src/app.html and the web app manifests are rewritten to the
+   fingerprinted URLs and static/static/lusochat-assets.json maps one to the other.
+   Fingerprinted URLs never change content; the /static patch in
+   patches/lusochat_patches.yaml serves them with
+   "Cache-Control: public, max-age=31536000, immutable".
+
+Usage:
+    python build_assets.py --root open-webui                   # Build, fingerprint, rewrite references
+    python build_assets.py --root open-webui --no-fingerprint  # Only the usual file names
+    python build_assets.py --root open-webui --source-dir ../.lusochat-ldap/edited-files --jobs 4
+"""
+
+import io
+import os
+import re
+import sys
+import json
+import time
+import base64
+import shutil
+import hashlib
+import argparse
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+DEFAULT_MANIFEST = Path(__file__).resolve().parent / "lusochat_assets.yaml"
+CACHE_DIR = Path(os.environ.get("LUSOCHAT_CACHE_DIR", Path.home() / ".cache" / "lusochat")) / "assets"
+ASSET_MAP = "static/static/lusochat-assets.json"
+# Bump when rendering or optimization changes, so cached results are rebuilt
+PIPELINE_VERSION = 1
+FINGERPRINT = re.compile(r"\.[0-9a-f]{8}$")
+
+
+def info(msg: str) -> None:
+    print(f"[INFO] {msg}")
+
+
+def success(msg: str) -> None:
+    print(f"[SUCCESS] {msg}")
+
+
+def warning(msg: str) -> None:
+    print(f"[WARNING] {msg}")
+
+
+def error(msg: str) -> None:
+    print(f"[ERROR] {msg}", file=sys.stderr)
+
+
+@dataclass
+class Asset:
+    output: str
+    source: str
+    size: Optional[int] = None
+    sizes: Optional[List[int]] = None
+
+
+@dataclass
+class Result:
+    asset: Asset
+    status: str = "missing"  # generated, cached, missing
+    source_bytes: int = 0
+    output_bytes: int = 0
+    fingerprinted: Optional[str] = None
+    seconds: float = 0.0
+
+
+# ---- manifest ------------------------------------------------------------------
+
+def load_manifest(path: Path) -> Dict:
+    with open(path, "r", encoding="utf-8") as f:
+        if path.suffix == ".json":
+            data = json.load(f)
+        else:
+            import yaml
+
+            data = yaml.safe_load(f)
+    data = data or {}
+    data["assets"] = [Asset(**a) for a in data.get("assets") or []]
+    for asset in data["assets"]:
+        if asset.sizes and not asset.output.endswith(".ico"):
+            raise ValueError(f"{asset.output}: 'sizes' is only valid for .ico outputs")
+    return data
+
+
+# ---- rendering -----------------------------------------------------------------
+
+def square(img, size: Optional[int] = None):
+    """Pad to a transparent square (centered), then resize to size if given."""
+    from PIL import Image
+
+    img = img.convert("RGBA")
+    side = max(img.size)
+    if img.size != (side, side):
+        canvas = Image.new("RGBA", (side, side), (0, 0, 0, 0))
+        canvas.paste(img, ((side - img.width) // 2, (side - img.height) // 2))
+        img = canvas
+    if size and size != side:
+        img = img.resize((size, size), Image.LANCZOS)
+    return img
+
+
+def external_png_optimizer(data: bytes) -> bytes:
+    """Run oxipng or optipng (both lossless) when one is installed."""
+    if shutil.which("oxipng"):
+        cmd = ["oxipng", "-o", "4", "--strip", "safe", "-q"]
+    elif shutil.which("optipng"):
+        cmd = ["optipng", "-o2", "-quiet"]
+    else:
+        return data
+    fd, tmp = tempfile.mkstemp(suffix=".png")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        subprocess.run(cmd + [tmp], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        with open(tmp, "rb") as f:
+            return f.read()
+    except (OSError, subprocess.CalledProcessError):
+        return data
+    finally:
+        os.unlink(tmp)
+
+
+def encode_png(img) -> bytes:
+    """Smallest lossless PNG encoding of img."""
+    from PIL import Image
+
+    candidates = []
+    buf = io.BytesIO()
+    img.save(buf, format="PNG", optimize=True)
+    candidates.append(buf.getvalue())
+    if img.getcolors(256) is not None:
+        palette = img.quantize(colors=256, method=Image.Quantize.FASTOCTREE)
+        # Only keep the palette version if it decodes to exactly the same pixels
+        if palette.convert("RGBA").tobytes() == img.convert("RGBA").tobytes():
+            buf = io.BytesIO()
+            palette.save(buf, format="PNG", optimize=True)
+            candidates.append(buf.getvalue())
+    best = min(candidates, key=len)
+    return min((best, external_png_optimizer(best)), key=len)
+
+
+def optimize_svg(text: str) -> str:
+    """Lossless SVG minification: comments, metadata and whitespace between tags."""
+    text = re.sub(r"<!--.*?-->", "", text, flags=re.S)
+    text = re.sub(r"<metadata\b.*?</metadata>", "", text, flags=re.S)
+    text = re.sub(r">\s+<", "><", text)
+    return text.strip()
+
+
+def render(asset: Asset, data: bytes) -> bytes:
+    from PIL import Image
+
+    suffix = Path(asset.output).suffix.lower()
+    if Path(asset.source).suffix.lower() == ".svg":
+        if suffix != ".svg":
+            raise ValueError(f"{asset.output}: SVG sources can only produce SVG outputs")
+        return optimize_svg(data.decode("utf-8")).encode("utf-8")
+
+    img = Image.open(io.BytesIO(data))
+    img.load()
+    if asset.size and max(img.size) < asset.size:
+        warning(f"{asset.output}: upscaling {asset.source} {img.width}x{img.height} to {asset.size}px")
+
+    if suffix == ".ico":
+        sizes = [(s, s) for s in (asset.sizes or [16, 32, 48])]
+        buf = io.BytesIO()
+        square(img).save(buf, format="ICO", sizes=sizes)
+        return buf.getvalue()
+    if suffix == ".svg":
+        img = square(img, asset.size)
+        side = img.width
+        png = base64.b64encode(encode_png(img)).decode("ascii")
+        return (
+            f'<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" '
+            f'width="{side}" height="{side}" viewBox="0 0 {side} {side}">'
+            f'<image width="{side}" height="{side}" xlink:href="data:image/png;base64,{png}"/></svg>'
+        ).encode("ascii")
+    if suffix == ".png":
+        if asset.size:
+            img = square(img, asset.size)
+        encoded = encode_png(img)
+        # A lossless re-encode that is not smaller is pointless: keep the source bytes
+        if not asset.size and img.format == "PNG" and len(encoded) >= len(data):
+            return data
+        return encoded
+    raise ValueError(f"{asset.output}: unsupported output type {suffix}")
+
+
+# ---- build ---------------------------------------------------------------------
+
+def cache_key(asset: Asset, data: bytes) -> str:
+    recipe = {k: v for k, v in asdict(asset).items() if k != "source"}
+    recipe["suffix"] = Path(asset.output).suffix.lower()
+    digest = hashlib.sha256(f"v{PIPELINE_VERSION}:{json.dumps(recipe, sort_keys=True)}\n".encode())
+    digest.update(data)
+    return digest.hexdigest()
+
+
+def write_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def fingerprint(path: Path, data: bytes) -> Path:
+    """Write <stem>.<hash8><suffix> next to path and remove older fingerprints."""
+    stem = FINGERPRINT.sub("", path.stem)
+    target = path.with_name(f"{stem}.{hashlib.sha256(data).hexdigest()[:8]}{path.suffix}")
+    for old in path.parent.glob(f"{glob_escape(stem)}.*{path.suffix}"):
+        if old != target and FINGERPRINT.search(old.stem) and FINGERPRINT.sub("", old.stem) == stem:
+            old.unlink()
+    if not target.exists():
+        write_atomic(target, data)
+    return target
+
+
+def glob_escape(text: str) -> str:
+    return re.sub(r"([*?\[])", r"[\1]", text)
+
+
+def build(asset: Asset, source_dir: Path, root: Path, cache_dir: Path, fingerprinted: bool) -> Result:
+    started = time.perf_counter()
+    result = Result(asset=asset)
+    source = source_dir / asset.source
+    if not source.is_file():
+        return result
+    data = source.read_bytes()
+    result.source_bytes = len(data)
+    cached = cache_dir / f"{cache_key(asset, data)}{Path(asset.output).suffix.lower()}"
+    if cached.exists():
+        output = cached.read_bytes()
+        result.status = "cached"
+    else:
+        output = render(asset, data)
+        write_atomic(cached, output)
+        result.status = "generated"
+    result.output_bytes = len(output)
+    destination = root / asset.output
+    if not destination.exists() or destination.read_bytes() != output:
+        write_atomic(destination, output)
+    if fingerprinted:
+        result.fingerprinted = fingerprint(destination, output).relative_to(root).as_posix()
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+# ---- references ----------------------------------------------------------------
+
+def url_for(output: str) -> str:
+    """static/<path> in the checkout is served at /<path>."""
+    return "/" + output.split("static/", 1)[1] if output.startswith("static/") else "/" + output
+
+
+def rewrite_references(root: Path, files: List[str], urls: Dict[str, str]) -> List[str]:
+    """Point references to the plain or an older fingerprinted URL at the current one."""
+    patterns = []
+    for url, new_url in urls.items():
+        stem, suffix = os.path.splitext(url)
+        patterns.append((
+            re.compile(r"(?<![\w./-])" + re.escape(stem) + r"(?:\.[0-9a-f]{8})?" + re.escape(suffix) + r"(?![\w.-])"),
+            new_url,
+        ))
+    changed = []
+    for name in files:
+        path = root / name
+        if not path.is_file():
+            continue
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            original = f.read()
+        text = original
+        for pattern, new_url in patterns:
+            text = pattern.sub(new_url, text)
+        if text != original:
+            write_atomic(path, text.encode("utf-8"))
+            changed.append(name)
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the Lusochat branding assets into an Open WebUI checkout")
+    parser.add_argument("--root", type=Path, default=Path("."), help="Open WebUI checkout")
+    parser.add_argument("--manifest", type=Path, default=DEFAULT_MANIFEST, help="Asset manifest (YAML or JSON)")
+    parser.add_argument("--source-dir", type=Path, help="Override source_dir of the manifest")
+    parser.add_argument("--cache-dir", type=Path, default=CACHE_DIR)
+    parser.add_argument("--jobs", type=int, default=min(8, os.cpu_count() or 2))
+    parser.add_argument("--no-fingerprint", action="store_true", help="Skip fingerprinted copies and reference rewrites")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    try:
+        manifest = load_manifest(args.manifest)
+        import PIL  # noqa: F401
+    except Exception as e:
+        error(f"Cannot load {args.manifest}: {e}")
+        sys.exit(1)
+    source_dir = args.source_dir or (args.manifest.parent / manifest.get("source_dir", "."))
+    if not source_dir.is_dir():
+        error(f"Source directory not found: {source_dir}")
+        sys.exit(1)
+
+    try:
+        with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+            results = list(pool.map(
+                lambda a: build(a, source_dir, args.root, args.cache_dir, not args.no_fingerprint),
+                manifest["assets"],
+            ))
+    except Exception as e:
+        error(f"Asset build failed: {e}")
+        sys.exit(1)
+
+    for r in results:
+        if r.status == "missing":
+            warning(f"Source not found: {r.asset.source} (skipping {r.asset.output})")
+            continue
+        change = 100 * (r.output_bytes / r.source_bytes - 1) if r.source_bytes else 0
+        target = f" → {r.fingerprinted}" if r.fingerprinted else ""
+        success(f"{r.asset.output}{target} ({r.status}, {r.source_bytes} → {r.output_bytes} bytes, {change:+.0f}%)")
+
+    built = [r for r in results if r.status != "missing"]
+    if built and not args.no_fingerprint:
+        urls = {url_for(r.asset.output): url_for(r.fingerprinted) for r in built}
+        write_atomic(args.root / ASSET_MAP, (json.dumps(urls, indent=2) + "\n").encode("utf-8"))
+        for name in rewrite_references(args.root, manifest.get("references") or [], urls):
+            success(f"Rewrote asset references in {name}")
+
+    counts = {s: sum(1 for r in results if r.status == s) for s in ("generated", "cached", "missing")}
+    source_total = sum(r.source_bytes for r in built)
+    output_total = sum(r.output_bytes for r in built)
+    success(
+        f"{len(built)} assets ({counts['generated']} generated, {counts['cached']} cached, {counts['missing']} missing), "
+        f"{source_total} → {output_total} bytes in {(time.perf_counter() - started) * 1000:.0f} ms"
+    )
+    if not built:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
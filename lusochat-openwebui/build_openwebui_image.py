@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Lusochat Open WebUI Image Builder
+
+Checks out Open WebUI from a persistent local git mirror and builds the
+Lusochat image only when something that goes into it changed. Used by
+deploy_and_apply_lusochat_customizations.sh instead of a fresh
+`git clone --depth 1` and an unconditional `docker build` on every run.
+
+Build hash (sha256, first 12 hex chars) over:
+    - the upstream Open WebUI commit that was checked out
+    - patches/lusochat_patches.yaml and patches/apply_patches.py
+    - assets/lusochat_assets.yaml and assets/build_assets.py
+    - deploy_and_apply_lusochat_customizations.sh
+    - every file under .lusochat-ldap/edited-files/ (icons, logos)
+
+The image is tagged <image>:build-<hash> as well as <image>:<tag>. When the
+build tag already exists the build is skipped and <tag> is pointed at it.
+Otherwise the build runs with BuildKit, so the npm and pip cache mounts added
+to the upstream Dockerfile by the patch manifest survive between builds.
+
+Cache directory (LUSOCHAT_CACHE_DIR, default ~/.cache/lusochat):
+    open-webui.git    bare mirror, fetched on every checkout
+    builds.json       build history (hash, commit, duration) for the time-saved report
+
+Usage:
+    python build_openwebui_image.py checkout --dir open-webui              # main
+    python build_openwebui_image.py checkout --dir open-webui --ref v0.6.22
+    python build_openwebui_image.py hash --dir open-webui
+    python build_openwebui_image.py build --dir open-webui --image lusochat-openwebui --tag latest
+    python build_openwebui_image.py history
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import subprocess
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+OPENWEBUI_GIT_URL = "https://github.com/open-webui/open-webui.git"
+CACHE_DIR = Path(os.environ.get("LUSOCHAT_CACHE_DIR", Path.home() / ".cache" / "lusochat"))
+MIRROR_DIR = CACHE_DIR / "open-webui.git"
+HISTORY_FILE = CACHE_DIR / "builds.json"
+
+# Everything besides the upstream commit that ends up in the image
+HASH_INPUTS = [
+    SCRIPT_DIR / "patches" / "lusochat_patches.yaml",
+    SCRIPT_DIR / "patches" / "apply_patches.py",
+    SCRIPT_DIR / "assets" / "lusochat_assets.yaml",
+    SCRIPT_DIR / "assets" / "build_assets.py",
+    SCRIPT_DIR / "deploy_and_apply_lusochat_customizations.sh",
+    SCRIPT_DIR / ".lusochat-ldap" / "edited-files",
+]
+
+
+def info(msg: str) -> None:
+    print(f"[INFO] {msg}", flush=True)
+
+
+def success(msg: str) -> None:
+    print(f"[SUCCESS] {msg}", flush=True)
+
+
+def warning(msg: str) -> None:
+    print(f"[WARNING] {msg}", flush=True)
+
+
+def error(msg: str) -> None:
+    print(f"[ERROR] {msg}", file=sys.stderr, flush=True)
+
+
+def git(*args: str, cwd: Path = None, capture: bool = False) -> str:
+    result = subprocess.run(["git", *args], cwd=cwd, check=True, text=True,
+                            stdout=subprocess.PIPE if capture else None)
+    return (result.stdout or "").strip()
+
+
+def format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    return f"{minutes}m{seconds:02d}s" if minutes else f"{seconds}s"
+
+
+# ---- mirror / checkout ---------------------------------------------------------
+
+def update_mirror(url: str) -> None:
+    if (MIRROR_DIR / "HEAD").exists():
+        info(f"Fetching upstream into mirror {MIRROR_DIR}...")
+        git("--git-dir", str(MIRROR_DIR), "fetch", "--prune", "--tags", "origin")
+    else:
+        info(f"Creating mirror {MIRROR_DIR} (first run only)...")
+        MIRROR_DIR.parent.mkdir(parents=True, exist_ok=True)
+        git("clone", "--mirror", url, str(MIRROR_DIR))
+
+
+def resolve(ref: str) -> str:
+    return git("--git-dir", str(MIRROR_DIR), "rev-parse", "--verify", f"{ref}^{{commit}}", capture=True)
+
+
+def cmd_checkout(args) -> None:
+    started = time.perf_counter()
+    update_mirror(args.url)
+    commit = resolve(args.ref)
+    target = args.dir
+    if target.exists():
+        shutil.rmtree(target)
+    # --shared borrows the mirror's objects: no network, no object copies
+    git("clone", "--quiet", "--shared", "--no-checkout", str(MIRROR_DIR), str(target))
+    git("checkout", "--quiet", "--detach", commit, cwd=target)
+    success(f"Checked out Open WebUI {args.ref} ({commit[:12]}) into {target} "
+            f"in {format_duration(time.perf_counter() - started)}")
+
+
+# ---- hash ----------------------------------------------------------------------
+
+def upstream_commit(source: Path) -> str:
+    if not (source / ".git").exists():
+        raise FileNotFoundError(f"{source} is not a git checkout (run the checkout command first)")
+    return git("rev-parse", "HEAD", cwd=source, capture=True)
+
+
+def build_hash(source: Path) -> str:
+    digest = hashlib.sha256()
+    digest.update(f"upstream:{upstream_commit(source)}\n".encode())
+    for root in HASH_INPUTS:
+        files = sorted(p for p in root.rglob("*") if p.is_file()) if root.is_dir() else [root]
+        for path in files:
+            if not path.exists():
+                continue
+            digest.update(f"{path.relative_to(SCRIPT_DIR).as_posix()}\n".encode())
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def cmd_hash(args) -> None:
+    print(build_hash(args.dir))
+
+
+# ---- build ---------------------------------------------------------------------
+
+def load_history() -> List[Dict]:
+    if not HISTORY_FILE.exists():
+        return []
+    with open(HISTORY_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_history(history: List[Dict]) -> None:
+    HISTORY_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp = HISTORY_FILE.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(history[-200:], f, indent=2)
+    os.replace(tmp, HISTORY_FILE)
+
+
+def image_exists(ref: str) -> bool:
+    return subprocess.run(["docker", "image", "inspect", ref], stdout=subprocess.DEVNULL,
+                          stderr=subprocess.DEVNULL).returncode == 0
+
+
+def cmd_build(args) -> None:
+    started = time.perf_counter()
+    source = args.dir
+    commit = upstream_commit(source)
+    build_id = build_hash(source)
+    build_ref = f"{args.image}:build-{build_id}"
+    final_ref = f"{args.image}:{args.tag}"
+    history = load_history()
+    built = [b for b in history if b.get("action") == "build"]
+    typical = sum(b["seconds"] for b in built[-5:]) / len(built[-5:]) if built else None
+    info(f"Build hash {build_id} (upstream {commit[:12]})")
+
+    if image_exists(build_ref) and not args.force:
+        subprocess.run(["docker", "tag", build_ref, final_ref], check=True)
+        elapsed = time.perf_counter() - started
+        history.append({"action": "reuse", "hash": build_id, "commit": commit, "seconds": round(elapsed, 1),
+                        "at": datetime.now().isoformat(timespec="seconds")})
+        save_history(history)
+        saved = f", saved ~{format_duration(typical - elapsed)}" if typical else ""
+        success(f"{build_ref} is up to date - build skipped, tagged {final_ref}{saved}")
+        return
+
+    cmd = [
+        "docker", "build",
+        "--label", f"org.lusochat.build-hash={build_id}",
+        "--label", f"org.lusochat.upstream-commit={commit}",
+        "-t", build_ref, "-t", final_ref,
+        str(source),
+    ]
+    if args.no_cache:
+        cmd.insert(2, "--no-cache")
+    info("Running: " + " ".join(cmd))
+    subprocess.run(cmd, check=True, env={**os.environ, "DOCKER_BUILDKIT": "1"})
+    elapsed = time.perf_counter() - started
+    history.append({"action": "build", "hash": build_id, "commit": commit, "seconds": round(elapsed, 1),
+                    "at": datetime.now().isoformat(timespec="seconds")})
+    save_history(history)
+    comparison = ""
+    if typical:
+        delta = typical - elapsed
+        comparison = f" ({format_duration(abs(delta))} {'faster' if delta >= 0 else 'slower'} than the recent average)"
+    success(f"Built {build_ref} in {format_duration(elapsed)}{comparison}")
+
+
+def cmd_history(args) -> None:
+    history = load_history()
+    if not history:
+        info(f"No builds recorded in {HISTORY_FILE}")
+        return
+    for entry in history[-args.last:]:
+        print(f"{entry['at']}  {entry['action']:<6} {entry['hash']}  {entry['commit'][:12]}  "
+              f"{format_duration(entry['seconds']):>8}")
+    reused = [e for e in history if e["action"] == "reuse"]
+    built = [e for e in history if e["action"] == "build"]
+    if reused and built:
+        typical = sum(b["seconds"] for b in built) / len(built)
+        saved = sum(max(0.0, typical - e["seconds"]) for e in reused)
+        print(f"\n{len(built)} builds, {len(reused)} skipped; ~{format_duration(saved)} of build time saved")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cached, incremental Lusochat Open WebUI image builds")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    checkout = sub.add_parser("checkout", help="Check out Open WebUI from the local mirror")
+    checkout.add_argument("--dir", type=Path, default=Path("open-webui"))
+    checkout.add_argument("--ref", default=os.environ.get("OPENWEBUI_REF", "main"),
+                          help="Branch, tag or commit (default: main, or OPENWEBUI_REF)")
+    checkout.add_argument("--url", default=OPENWEBUI_GIT_URL)
+
+    hash_parser = sub.add_parser("hash", help="Print the build hash of a checkout")
+    hash_parser.add_argument("--dir", type=Path, default=Path("open-webui"))
+
+    build = sub.add_parser("build", help="Build the image unless the build hash was built before")
+    build.add_argument("--dir", type=Path, default=Path("open-webui"))
+    build.add_argument("--image", default="lusochat-openwebui")
+    build.add_argument("--tag", default="latest")
+    build.add_argument("--force", action="store_true", help="Build even if the build tag exists")
+    build.add_argument("--no-cache", action="store_true", help="Also bypass the Docker layer cache")
+
+    history = sub.add_parser("history", help="Show recent builds and the time saved")
+    history.add_argument("--last", type=int, default=20)
+
+    args = parser.parse_args()
+    try:
+        {"checkout": cmd_checkout, "hash": cmd_hash, "build": cmd_build, "history": cmd_history}[args.command](args)
+    except subprocess.CalledProcessError as e:
+        error(f"Command failed ({e.returncode}): {' '.join(map(str, e.cmd))}")
+        sys.exit(1)
+    except Exception as e:
+        error(str(e))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
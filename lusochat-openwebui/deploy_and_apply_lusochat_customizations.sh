@@ -10,9 +10,15 @@ set -o pipefail
 # --- Configuration ---
 OPENWEBUI_GIT_URL="https://github.com/open-webui/open-webui.git"
 OPENWEBUI_DIR="open-webui"
+OPENWEBUI_REF="${OPENWEBUI_REF:-main}"
 CUSTOM_DOCKER_IMAGE_NAME="lusochat-openwebui"
 CUSTOM_DOCKER_IMAGE_TAG="latest"
 CUSTOM_ICONS_DIR="../.lusochat-ldap/edited-files"
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+PATCH_ENGINE="$SCRIPT_DIR/patches/apply_patches.py"
+PATCH_MANIFEST="$SCRIPT_DIR/patches/lusochat_patches.yaml"
+BUILD_TOOL="$SCRIPT_DIR/build_openwebui_image.py"
+ASSET_PIPELINE="$SCRIPT_DIR/assets/build_assets.py"
 
 # --- Helper Functions ---
 echo_info() {
@@ -61,7 +67,7 @@ prompt_user() {
 cleanup_openwebui() {
     if [ -d "$OPENWEBUI_DIR" ]; then
         echo_warning "Open WebUI directory already exists: $OPENWEBUI_DIR"
-        if prompt_user "Do you want to remove it and clone fresh?" "n"; then
+        if prompt_user "Do you want to replace it with a fresh checkout?" "n"; then
             echo_info "Removing existing Open WebUI directory..."
             rm -rf "$OPENWEBUI_DIR"
             echo_success "Cleanup complete."
@@ -74,69 +80,19 @@ cleanup_openwebui() {
     return 0
 }
 
+# Check out $OPENWEBUI_REF from the persistent mirror in ~/.cache/lusochat
+# (only new upstream objects are fetched; the checkout itself is local)
 clone_openwebui() {
-    echo_info "Cloning Open WebUI..."
-    git clone --depth 1 "$OPENWEBUI_GIT_URL" "$OPENWEBUI_DIR"
-    echo_success "Open WebUI cloned successfully."
+    echo_info "Checking out Open WebUI ($OPENWEBUI_REF)..."
+    python3 "$BUILD_TOOL" checkout --dir "$OPENWEBUI_DIR" --ref "$OPENWEBUI_REF" --url "$OPENWEBUI_GIT_URL"
+    echo_success "Open WebUI checked out successfully."
 }
 
-# Function to safely replace text in a file
-safe_replace() {
-    local file="$1"
-    local search="$2"
-    local replace="$3"
-    local description="$4"
-    
-    if [ ! -f "$file" ]; then
-        echo_error "File not found: $file"
-        return 1
-    fi
-    
-    # Check if the search string exists
-    if ! grep -F "$search" "$file" > /dev/null; then
-        echo_error "Search string not found in $file: $search"
-        echo_error "Skipping: $description"
-        return 1
-    fi
-    
-    # Escape special characters for sed - use a different delimiter
-    local delimiter='|'
-    # Make sure our delimiter doesn't appear in the strings
-    while [[ "$search" == *"$delimiter"* ]] || [[ "$replace" == *"$delimiter"* ]]; do
-        delimiter="${delimiter}${delimiter}"
-    done
-    
-    # Perform the replacement
-    sed -i "s${delimiter}${search}${delimiter}${replace}${delimiter}g" "$file"
-    
-    # Verify the replacement was successful by checking that old content is gone
-    if ! grep -F "$search" "$file" > /dev/null; then
-        echo_success "$description"
-    else
-        echo_error "Failed to apply: $description"
-        return 1
-    fi
-}
-
-# Function to safely replace text in a file (with confirmation)
-safe_replace_with_backup() {
-    local file="$1"
-    local search="$2"
-    local replace="$3"
-    local description="$4"
-    
-    # Create backup
-    cp "$file" "$file.backup"
-    
-    if safe_replace "$file" "$search" "$replace" "$description"; then
-        rm "$file.backup"
-        return 0
-    else
-        # Restore backup on failure but continue
-        mv "$file.backup" "$file"
-        echo_warning "Skipping failed replacement: $description"
-        return 1
-    fi
+# Apply patches/lusochat_patches.yaml to the current directory (the Open WebUI checkout).
+# All edits of a file are applied in one read and one atomic write; extra arguments
+# go to the engine (--check, --dry-run, --quiet).
+apply_lusochat_patches() {
+    python3 "$PATCH_ENGINE" --root . --manifest "$PATCH_MANIFEST" "$@"
 }
 
 # Function to check if custom icons directory exists and has the expected structure
@@ -214,7 +170,7 @@ verify_openwebui_icon_structure() {
         fi
     done
     
-    # Check if favicon references in app.html are still the same
+    # Check if favicon references in app.html are still the same (plain or fingerprinted)
     if [ -f "src/app.html" ]; then
         local expected_refs=(
             "/static/favicon.png"
@@ -224,7 +180,7 @@ verify_openwebui_icon_structure() {
         )
         
         for ref in "${expected_refs[@]}"; do
-            if ! grep -q "$ref" "src/app.html"; then
+            if ! grep -Eq "${ref%.*}(\.[0-9a-f]{8})?\.${ref##*.}" "src/app.html"; then
                 echo_warning "Icon reference not found in app.html: $ref"
                 structure_ok=false
             fi
@@ -240,409 +196,13 @@ verify_openwebui_icon_structure() {
     fi
 }
 
-# Function to copy custom icons with verification
+# Build the custom icons into the checkout with the asset pipeline (assets/lusochat_assets.yaml):
+# every icon at the size its name promises, a real multi-size favicon.ico, lossless PNG
+# optimization, results cached by source hash, and fingerprinted copies that
+# app.html and manifest.json are pointed at
 copy_custom_icons() {
-    local icons_copied=0
-    local failed_copies=0
-    
-    echo_info "Copying custom icons..."
-    
-    # Define icon mappings: source_path:destination_path:description
-    local icon_mappings=(
-        "app/build/favicon.png:static/favicon.png:Root favicon"
-        "app/build/static/favicon.png:static/static/favicon.png:Static favicon"
-        "app/build/static/splash.png:static/static/splash.png:Splash screen image"
-        "app/build/static/splash-dark.png:static/static/splash-dark.png:Dark mode splash screen"
-        "app/backend/static/favicon.png:static/static/favicon-96x96.png:96x96 favicon"
-        "app/backend/static/logo.png:static/static/apple-touch-icon.png:Apple touch icon"
-        "app/backend/static/splash.png:static/static/web-app-manifest-192x192.png:Web app manifest 192x192"
-    )
-    
-    # Additional mappings for comprehensive coverage
-    local additional_mappings=(
-        "app/backend/static/favicon.png:static/static/favicon.ico:Favicon ICO (fallback)"
-        "app/backend/static/logo.png:static/static/web-app-manifest-512x512.png:Web app manifest 512x512"
-        "app/backend/static/favicon.png:static/static/favicon-dark.png:Dark mode favicon"
-    )
-    
-    # Combine all mappings
-    local all_mappings=("${icon_mappings[@]}" "${additional_mappings[@]}")
-    
-    for mapping in "${all_mappings[@]}"; do
-        IFS=':' read -r source_path dest_path description <<< "$mapping"
-        local full_source_path="$CUSTOM_ICONS_DIR/$source_path"
-        
-        if [ -f "$full_source_path" ]; then
-            # Create destination directory if it doesn't exist
-            mkdir -p "$(dirname "$dest_path")"
-            
-            # Copy the file
-            if cp "$full_source_path" "$dest_path"; then
-                echo_success "Copied $description: $source_path → $dest_path"
-                icons_copied=$((icons_copied + 1))
-            else
-                echo_warning "Failed to copy $description: $source_path → $dest_path"
-                failed_copies=$((failed_copies + 1))
-            fi
-        else
-            echo_warning "Source icon not found: $source_path (skipping $description)"
-        fi
-    done
-    
-    # CRITICAL FIX: Update SVG favicon with our custom icon
-    echo_info "Updating SVG favicon with custom icon (browsers prioritize SVG)..."
-    if [ -f "static/favicon.png" ]; then
-        # Convert PNG to base64 and embed in SVG
-        local base64_content=$(base64 "static/favicon.png" | tr -d '\n')
-        cat > "static/static/favicon.svg" << EOF
-<svg xmlns="http://www.w3.org/2000/svg" version="1.1" xmlns:xlink="http://www.w3.org/1999/xlink" xmlns:svgjs="http://svgjs.dev/svgjs" width="500" height="500" viewBox="0 0 500 500"><image width="500" height="500" xlink:href="data:image/png;base64,${base64_content}"></image><style>
-@media (prefers-color-scheme: light) { :root { filter: none; } }
-@media (prefers-color-scheme: dark) { :root { filter: none; } }
-</style></svg>
-EOF
-        echo_success "Updated SVG favicon with custom Lusochat icon (fixes browser tab icon)"
-        icons_copied=$((icons_copied + 1))
-    else
-        echo_warning "Could not update SVG favicon - static/favicon.png not found"
-        failed_copies=$((failed_copies + 1))
-    fi
-    
-    echo_info "Icon copying complete: $icons_copied copied, $failed_copies failed"
-    
-    if [ $icons_copied -gt 0 ]; then
-        return 0
-    else
-        return 1
-    fi
-}
-
-# Function to update manifest files with new app name
-update_manifest_files() {
-    echo_info "Updating manifest files..."
-    
-    # Update site.webmanifest
-    if [ -f "static/static/site.webmanifest" ]; then
-        # Check if already customized for name
-        if grep -q '"name": "Lusochat"' "static/static/site.webmanifest"; then
-            echo_success "Site.webmanifest name already set to 'Lusochat' - skipping"
-        elif grep -q '"name": "Open WebUI"' "static/static/site.webmanifest"; then
-            safe_replace_with_backup \
-                "static/static/site.webmanifest" \
-                '"name": "Open WebUI"' \
-                '"name": "Lusochat"' \
-                "Updated app name in site.webmanifest" || true
-        else
-            echo_warning "Expected name pattern not found in site.webmanifest - skipping name update"
-        fi
-        
-        # Check if already customized for short_name  
-        if grep -q '"short_name": "Lusochat"' "static/static/site.webmanifest"; then
-            echo_success "Site.webmanifest short_name already set to 'Lusochat' - skipping"
-        elif grep -q '"short_name": "WebUI"' "static/static/site.webmanifest"; then
-            safe_replace_with_backup \
-                "static/static/site.webmanifest" \
-                '"short_name": "WebUI"' \
-                '"short_name": "Lusochat"' \
-                "Updated short name in site.webmanifest" || true
-        else
-            echo_warning "Expected short_name pattern not found in site.webmanifest - skipping short_name update"
-        fi
-    fi
-    
-    # Update opensearch.xml if it exists
-    if [ -f "static/opensearch.xml" ]; then
-        # Check if already customized
-        if grep -q "Lusochat" "static/opensearch.xml"; then
-            echo_success "Opensearch.xml already customized with 'Lusochat' - skipping"
-        elif grep -q "Open WebUI" "static/opensearch.xml"; then
-            safe_replace_with_backup \
-                "static/opensearch.xml" \
-                "Open WebUI" \
-                "Lusochat" \
-                "Updated opensearch.xml app name" || true
-        else
-            echo_warning "Expected pattern not found in opensearch.xml - skipping opensearch update"
-        fi
-    fi
-}
-
-# Function to customize login form placeholders across all languages
-customize_login_placeholders() {
-    echo_info "Customizing login form placeholders for Lusófona University..."
-    
-    local updated_files=0
-    local failed_files=0
-    
-    # Language-specific username placeholders
-    declare -A username_placeholders=(
-        ["pt-PT"]="Estudante (aXXXXXXXX) / Docente (pXXXX) / Colaborador (fXXXX)"
-        ["pt-BR"]="Estudante (aXXXXXXXX) / Docente (pXXXX) / Colaborador (fXXXX)"
-        ["en-US"]="Student (aXXXXXXXX) / Teacher (pXXXX) / Staff (fXXXX)"
-        ["en-GB"]="Student (aXXXXXXXX) / Teacher (pXXXX) / Staff (fXXXX)"
-        ["es-ES"]="Estudiante (aXXXXXXXX) / Profesor (pXXXX) / Personal (fXXXX)"
-        ["fr-FR"]="Étudiant (aXXXXXXXX) / Professeur (pXXXX) / Personnel (fXXXX)"
-        ["de-DE"]="Student (aXXXXXXXX) / Lehrer (pXXXX) / Personal (fXXXX)"
-        ["it-IT"]="Studente (aXXXXXXXX) / Professore (pXXXX) / Personale (fXXXX)"
-    )
-    
-    # Language-specific sign-in titles (without "with LDAP")
-    declare -A signin_titles=(
-        ["pt-PT"]="Iniciar sessão em {{WEBUI_NAME}}"
-        ["pt-BR"]="Faça login em {{WEBUI_NAME}}"
-        ["en-US"]="Sign in to {{WEBUI_NAME}}"
-        ["en-GB"]="Sign in to {{WEBUI_NAME}}"
-        ["es-ES"]="Iniciar sesión en {{WEBUI_NAME}}"
-        ["fr-FR"]="Se connecter à {{WEBUI_NAME}}"
-        ["de-DE"]="Bei {{WEBUI_NAME}} anmelden"
-        ["it-IT"]="Accedi a {{WEBUI_NAME}}"
-    )
-    
-    # Default fallback for other languages
-    local default_placeholder="Student (aXXXXXXXX) / Teacher (pXXXX) / Staff (fXXXX)"
-    local default_signin_title="Sign in to {{WEBUI_NAME}}"
-    
-    # Process all translation files
-    for locale_dir in src/lib/i18n/locales/*/; do
-        if [ -d "$locale_dir" ]; then
-            local locale=$(basename "$locale_dir")
-            local translation_file="$locale_dir/translation.json"
-            
-            if [ -f "$translation_file" ]; then
-                local placeholder="${username_placeholders[$locale]:-$default_placeholder}"
-                local signin_title="${signin_titles[$locale]:-$default_signin_title}"
-                
-                # Update empty username placeholders
-                if grep -q '"Enter Your Username": ""' "$translation_file"; then
-                    if safe_replace_with_backup \
-                        "$translation_file" \
-                        '"Enter Your Username": ""' \
-                        "\"Enter Your Username\": \"$placeholder\"" \
-                        "Updated $locale username placeholder"; then
-                        updated_files=$((updated_files + 1))
-                    else
-                        failed_files=$((failed_files + 1))
-                    fi
-                elif grep -q '"Enter Your Username":' "$translation_file"; then
-                    # Update existing non-empty placeholders
-                    local current_line=$(grep '"Enter Your Username":' "$translation_file")
-                    if safe_replace_with_backup \
-                        "$translation_file" \
-                        "$current_line" \
-                        "    \"Enter Your Username\": \"$placeholder\"," \
-                        "Updated $locale username placeholder (replaced existing)"; then
-                        updated_files=$((updated_files + 1))
-                    else
-                        failed_files=$((failed_files + 1))
-                    fi
-                fi
-                
-                # Remove "with LDAP" from sign-in titles
-                if grep -q '"Sign in to {{WEBUI_NAME}} with LDAP":' "$translation_file"; then
-                    local current_signin_line=$(grep '"Sign in to {{WEBUI_NAME}} with LDAP":' "$translation_file")
-                    if safe_replace_with_backup \
-                        "$translation_file" \
-                        "$current_signin_line" \
-                        "    \"Sign in to {{WEBUI_NAME}} with LDAP\": \"$signin_title\"," \
-                        "Updated $locale sign-in title (removed 'with LDAP')"; then
-                        echo_success "Removed 'with LDAP' from $locale sign-in title"
-                    fi
-                fi
-            fi
-        fi
-    done
-    
-    echo_info "Login placeholder customization complete: $updated_files updated, $failed_files failed"
-    
-    if [ $updated_files -gt 0 ]; then
-        echo_success "Login form placeholders customized for Lusófona University context"
-    fi
-}
-
-# Function to customize the Authenticate button text for LDAP
-customize_authenticate_button_text() {
-    echo_info "Customizing Authenticate button text for multiple languages..."
-    
-    local updated_files=0
-    local failed_files=0
-    
-    # Language-specific translations for the Authenticate button
-    declare -A authenticate_translations=(
-        ["pt-PT"]="Aceder com dados Institucionais"
-        ["pt-BR"]="Aceder com dados Institucionais"
-        ["en-US"]="Access with Institutional Credentials"
-        ["en-GB"]="Access with Institutional Credentials"
-        ["es-ES"]="Acceder con credenciales institucionales"
-        ["fr-FR"]="Accéder avec les identifiants institutionnels"
-        ["de-DE"]="Mit institutionellen Anmeldedaten zugreifen"
-        ["it-IT"]="Accedi con credenziali istituzionali"
-    )
-    
-    # Default fallback for other languages
-    local default_authenticate="Access with Institutional Credentials"
-    
-    # Process all translation files
-    for locale_dir in src/lib/i18n/locales/*/; do
-        if [ -d "$locale_dir" ]; then
-            local locale=$(basename "$locale_dir")
-            local translation_file="$locale_dir/translation.json"
-            
-            if [ -f "$translation_file" ]; then
-                local authenticate_text="${authenticate_translations[$locale]:-$default_authenticate}"
-                
-                # Update empty Authenticate entries
-                if grep -q '"Authenticate": ""' "$translation_file"; then
-                    if safe_replace_with_backup \
-                        "$translation_file" \
-                        '"Authenticate": ""' \
-                        "\"Authenticate\": \"$authenticate_text\"" \
-                        "Updated $locale Authenticate button text"; then
-                        updated_files=$((updated_files + 1))
-                    else
-                        failed_files=$((failed_files + 1))
-                    fi
-                elif grep -q '"Authenticate":' "$translation_file"; then
-                    # Update existing non-empty entries
-                    local current_line=$(grep '"Authenticate":' "$translation_file")
-                    if safe_replace_with_backup \
-                        "$translation_file" \
-                        "$current_line" \
-                        "    \"Authenticate\": \"$authenticate_text\"," \
-                        "Updated $locale Authenticate button text (replaced existing)"; then
-                        updated_files=$((updated_files + 1))
-                    else
-                        failed_files=$((failed_files + 1))
-                    fi
-                fi
-            fi
-        fi
-    done
-    
-    echo_info "Authenticate button customization complete: $updated_files updated, $failed_files failed"
-    
-    if [ $updated_files -gt 0 ]; then
-        echo_success "Authenticate button text customized for multiple languages"
-    fi
-}
-
-# Function to customize "Continue with Email" text to be more discrete
-customize_continue_with_email_text() {
-    echo_info "Customizing 'Continue with Email' text to be more discrete..."
-    
-    local updated_files=0
-    local failed_files=0
-    
-    # Use a discrete emoji for all languages to avoid confusion
-    # ⚙️ suggests admin/settings functionality without being too obvious
-    local discrete_text="⚙️"
-    
-    # Process all translation files
-    for locale_dir in src/lib/i18n/locales/*/; do
-        if [ -d "$locale_dir" ]; then
-            local locale=$(basename "$locale_dir")
-            local translation_file="$locale_dir/translation.json"
-            
-            if [ -f "$translation_file" ]; then
-                # Update empty "Continue with Email" entries
-                if grep -q '"Continue with Email": ""' "$translation_file"; then
-                    if safe_replace_with_backup \
-                        "$translation_file" \
-                        '"Continue with Email": ""' \
-                        "\"Continue with Email\": \"$discrete_text\"" \
-                        "Updated $locale Continue with Email text"; then
-                        updated_files=$((updated_files + 1))
-                    else
-                        failed_files=$((failed_files + 1))
-                    fi
-                elif grep -q '"Continue with Email":' "$translation_file"; then
-                    # Update existing non-empty entries
-                    local current_line=$(grep '"Continue with Email":' "$translation_file")
-                    if safe_replace_with_backup \
-                        "$translation_file" \
-                        "$current_line" \
-                        "    \"Continue with Email\": \"$discrete_text\"," \
-                        "Updated $locale Continue with Email text (replaced existing)"; then
-                        updated_files=$((updated_files + 1))
-                    else
-                        failed_files=$((failed_files + 1))
-                    fi
-                fi
-            fi
-        fi
-    done
-    
-    echo_info "Continue with Email customization complete: $updated_files updated, $failed_files failed"
-    
-    if [ $updated_files -gt 0 ]; then
-        echo_success "'Continue with Email' text replaced with discrete emoji (⚙️) across all languages"
-    fi
-}
-
-# Function to customize "Continue with LDAP" text for consistency
-customize_continue_with_ldap_text() {
-    echo_info "Customizing 'Continue with LDAP' text for consistency with main button..."
-    
-    local updated_files=0
-    local failed_files=0
-    
-    # Language-specific translations for consistency with Authenticate button
-    declare -A ldap_translations=(
-        ["pt-PT"]="Aceder com dados Institucionais"
-        ["pt-BR"]="Acessar com dados Institucionais"
-        ["en-US"]="Access with Institutional Credentials"
-        ["en-GB"]="Access with Institutional Credentials"
-        ["es-ES"]="Acceder con credenciales institucionales"
-        ["fr-FR"]="Accéder avec les identifiants institutionnels"
-        ["de-DE"]="Mit institutionellen Anmeldedaten anmelden"
-        ["it-IT"]="Accedi con le credenziali istituzionali"
-    )
-    
-    # Default fallback for other languages
-    local default_ldap_text="Access with Institutional Credentials"
-    
-    # Process all translation files
-    for locale_dir in src/lib/i18n/locales/*/; do
-        if [ -d "$locale_dir" ]; then
-            local locale=$(basename "$locale_dir")
-            local translation_file="${locale_dir}translation.json"
-            
-            if [ -f "$translation_file" ]; then
-                # Get the appropriate translation or use default
-                local ldap_text="${ldap_translations[$locale]:-$default_ldap_text}"
-                
-                # Check if already customized
-                if grep -q '"Continue with LDAP": "'"$ldap_text"'"' "$translation_file"; then
-                    echo_success "Updated $locale Continue with LDAP text (already customized)"
-                    updated_files=$((updated_files + 1))
-                elif grep -q '"Continue with LDAP":' "$translation_file"; then
-                    if safe_replace_with_backup \
-                        "$translation_file" \
-                        '"Continue with LDAP": "Continue with LDAP"' \
-                        '"Continue with LDAP": "'"$ldap_text"'"' \
-                        "Updated $locale Continue with LDAP text (replaced existing)"; then
-                        updated_files=$((updated_files + 1))
-                    else
-                        # Try alternative format without quotes
-                        if grep -q '"Continue with LDAP":[[:space:]]*"[^"]*"' "$translation_file"; then
-                            # Use sed for more flexible replacement
-                            sed -i 's/"Continue with LDAP":[[:space:]]*"[^"]*"/"Continue with LDAP": "'"$ldap_text"'"/g' "$translation_file"
-                            echo_success "Updated $locale Continue with LDAP text (sed replacement)"
-                            updated_files=$((updated_files + 1))
-                        else
-                            failed_files=$((failed_files + 1))
-                        fi
-                    fi
-                else
-                    echo_info "Continue with LDAP key not found in $locale - may not exist in this version"
-                fi
-            fi
-        fi
-    done
-    
-    echo_info "Continue with LDAP customization complete: $updated_files updated, $failed_files failed"
-    
-    if [ $updated_files -gt 0 ]; then
-        echo_success "'Continue with LDAP' text updated for consistency across all languages"
-    fi
+    echo_info "Building custom icons with $(basename "$ASSET_PIPELINE")..."
+    python3 "$ASSET_PIPELINE" --root . --source-dir "$CUSTOM_ICONS_DIR"
 }
 
 # --- VALIDATION SYSTEM ---
@@ -730,52 +290,15 @@ validate_file_structure() {
 validate_customization_targets() {
     echo_info "=== PHASE 2: CONTENT PATTERN VALIDATION ==="
     
-    # Frontend constants.ts validation
-    if [ -f "src/lib/constants.ts" ]; then
-        echo_info "Validating constants.ts patterns..."
-        if grep -q "export const APP_NAME = 'Open WebUI';" "src/lib/constants.ts"; then
-            echo_success "Found expected APP_NAME pattern in constants.ts"
-        elif grep -q "export const APP_NAME = 'Lusochat';" "src/lib/constants.ts"; then
-            echo_success "Found APP_NAME already customized to 'Lusochat' in constants.ts"
-        else
-            # Check for variations
-            if grep -q "APP_NAME.*Open WebUI\|APP_NAME.*Lusochat" "src/lib/constants.ts"; then
-                log_validation_result "WARNING" "APP_NAME pattern in constants.ts has changed format" "Frontend customization may fail - manual review needed"
-                echo_info "Current APP_NAME line:"
-                grep "APP_NAME.*Open WebUI\|APP_NAME.*Lusochat" "src/lib/constants.ts" || echo "  (not found)"
-            else
-                log_validation_result "ERROR" "No APP_NAME with expected values found in constants.ts" "Frontend customization will fail"
-            fi
-        fi
-    fi
-    
-    # Backend env.py validation
-    if [ -f "backend/open_webui/env.py" ]; then
-        echo_info "Validating env.py patterns..."
-        if grep -q 'WEBUI_NAME += " (Open WebUI)"' "backend/open_webui/env.py"; then
-            echo_success "Found expected WEBUI_NAME appending pattern in env.py"
-            
-            # Validate surrounding context for safety
-            local context_lines=$(grep -A2 -B2 'WEBUI_NAME += " (Open WebUI)"' "backend/open_webui/env.py")
-            if echo "$context_lines" | grep -q "if WEBUI_NAME"; then
-                echo_success "WEBUI_NAME pattern has safe context (if block)"
-            else
-                log_validation_result "WARNING" "WEBUI_NAME pattern context has changed" "Backend fix may cause syntax errors"
-            fi
-        elif grep -q '# WEBUI_NAME += " (Open WebUI)".*Commented out' "backend/open_webui/env.py"; then
-            echo_success "Found WEBUI_NAME appending pattern already customized (commented out) in env.py"
-        else
-            # Check for variations
-            if grep -q "WEBUI_NAME.*Open WebUI" "backend/open_webui/env.py"; then
-                log_validation_result "WARNING" "WEBUI_NAME pattern in env.py has changed format" "Backend customization may fail - manual review needed"
-                echo_info "Current WEBUI_NAME lines:"
-                grep -n "WEBUI_NAME.*Open WebUI" "backend/open_webui/env.py" || echo "  (not found)"
-            else
-                log_validation_result "ERROR" "No WEBUI_NAME with expected patterns found in env.py" "Backend customization will fail"
-            fi
-        fi
+    # Every anchor in the patch manifest, checked in one pass without writing anything
+    echo_info "Validating patch anchors in $(basename "$PATCH_MANIFEST")..."
+    if apply_lusochat_patches --check --quiet; then
+        echo_success "All required patch anchors found (or already applied)"
+    else
+        log_validation_result "ERROR" "Required patch anchors not found" "Customizations would fail - update patches/lusochat_patches.yaml"
     fi
     
+
     # Icon system validation
     echo_info "Validating icon system integrity..."
     local icon_references_ok=true
@@ -789,7 +312,7 @@ validate_customization_targets() {
         )
         
         for ref in "${expected_icon_refs[@]}"; do
-            if ! grep -q "$ref" "src/app.html"; then
+            if ! grep -Eq "${ref%.*}(\.[0-9a-f]{8})?\.${ref##*.}" "src/app.html"; then
                 log_validation_result "WARNING" "Icon reference missing in app.html: $ref" "Icon replacement may be incomplete"
                 icon_references_ok=false
             fi
@@ -799,17 +322,6 @@ validate_customization_targets() {
             echo_success "All expected icon references found in app.html"
         fi
     fi
-    
-    # Manifest validation
-    if [ -f "static/static/site.webmanifest" ]; then
-        if grep -q '"name": "Open WebUI"' "static/static/site.webmanifest"; then
-            echo_success "Found expected app name pattern in site.webmanifest"
-        elif grep -q '"name": "Lusochat"' "static/static/site.webmanifest"; then
-            echo_success "Found app name already customized to 'Lusochat' in site.webmanifest"
-        else
-            log_validation_result "WARNING" "App name pattern in site.webmanifest has changed" "Manifest customization may fail"
-        fi
-    fi
 }
 
 # Phase 3: Python Syntax Safety Validation
@@ -902,6 +414,13 @@ echo_info "Starting Lusochat Open WebUI Customization..."
 echo_info "Checking required tools..."
 check_tool "git"
 check_tool "docker"
+check_tool "python3"
+if ! python3 -c "import yaml" &> /dev/null; then
+    echo_error "PyYAML is required by the patch engine (pip install pyyaml, or apt install python3-yaml)"
+fi
+if ! python3 -c "import PIL" &> /dev/null; then
+    echo_error "Pillow is required by the asset pipeline (pip install pillow, or apt install python3-pil)"
+fi
 
 # 2. Handle existing open-webui directory
 if cleanup_openwebui; then
@@ -923,134 +442,6 @@ fi
 
 echo_info "Applying customizations..."
 
-# 1. Update app title in constants.ts (if it exists)
-echo_info "Checking for constants.ts customizations..."
-if [ -f "src/lib/constants.ts" ]; then
-    echo_info "Updating APP_NAME in constants.ts..."
-    
-    # Check if already customized
-    if grep -q "export const APP_NAME = 'Lusochat';" "src/lib/constants.ts"; then
-        echo_success "APP_NAME already set to 'Lusochat' - skipping"
-    elif grep -q "export const APP_NAME = 'Open WebUI';" "src/lib/constants.ts"; then
-        safe_replace_with_backup \
-            "src/lib/constants.ts" \
-            "export const APP_NAME = 'Open WebUI';" \
-            "export const APP_NAME = 'Lusochat';" \
-            "Updated APP_NAME to Lusochat" || true
-    else
-        echo_warning "APP_NAME pattern not found in expected format - skipping constants.ts customization"
-    fi
-else
-    echo_info "constants.ts not found - skipping frontend title updates"
-fi
-
-# 2. Fix backend WEBUI_NAME logic in env.py
-echo_info "Updating WEBUI_NAME logic in backend env.py..."
-if [ -f "backend/open_webui/env.py" ]; then
-    # Check if already customized
-    if grep -q "# WEBUI_NAME.*Commented out to prevent appending" "backend/open_webui/env.py"; then
-        echo_success "WEBUI_NAME appending logic already commented out - skipping"
-    elif grep -q 'WEBUI_NAME += " (Open WebUI)"' "backend/open_webui/env.py"; then
-        # Comment out the line that appends "(Open WebUI)" to custom names
-        safe_replace_with_backup \
-            "backend/open_webui/env.py" \
-            '    WEBUI_NAME += " (Open WebUI)"' \
-            '    # WEBUI_NAME += " (Open WebUI)"  # Commented out to prevent appending' \
-            "Commented out WEBUI_NAME appending logic" || true
-        
-        # Add pass statement after the if block to prevent Python syntax error
-        if grep -q "# WEBUI_NAME.*Commented out" backend/open_webui/env.py; then
-            # Find the line number and add pass after it
-            line_num=$(grep -n "# WEBUI_NAME.*Commented out" backend/open_webui/env.py | cut -d: -f1)
-            # Check if pass is not already there
-            if ! sed -n "$((line_num + 1))p" backend/open_webui/env.py | grep -q "pass"; then
-                sed -i "${line_num}a\\    pass" backend/open_webui/env.py
-                echo_success "Added pass statement to fix Python syntax"
-            else
-                echo_success "Pass statement already exists"
-            fi
-        fi
-    else
-        echo_warning "WEBUI_NAME pattern not found in expected format - skipping env.py customization"
-    fi
-else
-    echo_info "backend/open_webui/env.py not found - skipping backend WEBUI_NAME fix"
-fi
-
-# 3. Icon replacement system
-echo_info ""
-echo_info "===== ICON REPLACEMENT SYSTEM ====="
-
-# Check if custom icons are available
-if check_custom_icons; then
-    # Verify Open WebUI structure
-    if verify_openwebui_icon_structure; then
-        # Copy custom icons
-        if copy_custom_icons; then
-            echo_success "Custom icons applied successfully!"
-            
-            # Update manifest files
-            update_manifest_files
-        else
-            echo_warning "Some icon copying failed, but continuing..."
-        fi
-    else
-        echo_warning "Open WebUI icon structure has changed!"
-        echo_warning "Icon replacement may not work correctly."
-        echo_warning "Manual verification recommended after deployment."
-        
-        if prompt_user "Do you want to attempt icon copying anyway?" "n"; then
-            copy_custom_icons || true
-            update_manifest_files || true
-        else
-            echo_info "Skipping icon replacement."
-        fi
-    fi
-else
-    echo_info "No custom icons found - skipping icon replacement."
-fi
-
-echo_info "====================================="
-echo_info ""
-
-# 3.5. Complete app.html metadata customization for browser tab and PWA
-echo_info "===== COMPLETE METADATA CUSTOMIZATION ====="
-if [ -f "src/app.html" ]; then
-    echo_info "Updating remaining Open WebUI references in app.html..."
-    
-    # Update apple-mobile-web-app-title (REMOVED - tag no longer exists in current OpenWebUI)
-    # safe_replace_with_backup \
-    #     "src/app.html" \
-    #     '<meta name="apple-mobile-web-app-title" content="Open WebUI" />' \
-    #     '<meta name="apple-mobile-web-app-title" content="Lusochat" />' \
-    #     "Updated apple-mobile-web-app-title to Lusochat" || true
-    
-    # Update meta description (REMOVED - tag no longer exists in current OpenWebUI)
-    # safe_replace_with_backup \
-    #     "src/app.html" \
-    #     '<meta name="description" content="Open WebUI" />' \
-    #     '<meta name="description" content="Lusochat - Lusófona University AI Chat Interface" />' \
-    #     "Updated meta description to Lusochat" || true
-    
-    # Update opensearch title (REMOVED - tag no longer exists in current OpenWebUI)
-    # safe_replace_with_backup \
-    #     "src/app.html" \
-    #     'title="Open WebUI"' \
-    #     'title="Lusochat"' \
-    #     "Updated opensearch title to Lusochat" || true
-    
-    # Update page title (most important for browser tab) - THIS ONE WORKS
-    safe_replace_with_backup \
-        "src/app.html" \
-        '<title>Open WebUI</title>' \
-        '<title>Lusochat</title>' \
-        "Updated page title to Lusochat (fixes browser tab title)" || true
-    
-    echo_success "App.html metadata customization complete!"
-else
-    echo_warning "src/app.html not found - skipping metadata updates"
-fi
-
 # Update manifest.json to ensure it's not empty and has correct app info
 echo_info "Updating manifest.json..."
 if [ -f "static/manifest.json" ]; then
@@ -1096,22 +487,7 @@ if [ -f "static/manifest.json" ]; then
 EOF
         echo_success "Created comprehensive manifest.json with Lusochat branding"
     else
-        echo_info "manifest.json already has content - updating names only"
-        safe_replace_with_backup \
-            "static/manifest.json" \
-            '"name": "Open WebUI"' \
-            '"name": "Lusochat"' \
-            "Updated manifest.json name" || true
-        safe_replace_with_backup \
-            "static/manifest.json" \
-            '"short_name": "WebUI"' \
-            '"short_name": "Lusochat"' \
-            "Updated manifest.json short_name" || true
-        safe_replace_with_backup \
-            "static/manifest.json" \
-            '"short_name": "Open WebUI"' \
-            '"short_name": "Lusochat"' \
-            "Updated manifest.json short_name (alternative pattern)" || true
+        echo_info "manifest.json already has content - names are updated by the patch manifest"
     fi
 else
     echo_warning "static/manifest.json not found - creating new one"
@@ -1159,17 +535,49 @@ fi
 echo_info "================================================"
 echo_info ""
 
-# 4. Customize login form placeholders for all languages
-customize_login_placeholders
+# 3. Icon replacement system (after manifest.json exists: its icon references get fingerprinted)
+echo_info ""
+echo_info "===== ICON REPLACEMENT SYSTEM ====="
 
-# 4.1. Customize Authenticate button text for multiple languages
-customize_authenticate_button_text
+# Check if custom icons are available
+if check_custom_icons; then
+    # Verify Open WebUI structure
+    if verify_openwebui_icon_structure; then
+        # Build custom icons
+        if copy_custom_icons; then
+            echo_success "Custom icons applied successfully!"
+        else
+            echo_warning "Icon build failed, but continuing..."
+        fi
+    else
+        echo_warning "Open WebUI icon structure has changed!"
+        echo_warning "Icon replacement may not work correctly."
+        echo_warning "Manual verification recommended after deployment."
+        
+        if prompt_user "Do you want to attempt icon copying anyway?" "n"; then
+            copy_custom_icons || true
+        else
+            echo_info "Skipping icon replacement."
+        fi
+    fi
+else
+    echo_info "No custom icons found - skipping icon replacement."
+fi
 
-# 4.2. Customize "Continue with Email" text to be discrete
-customize_continue_with_email_text
+echo_info "====================================="
+echo_info ""
 
-# 4.3. Customize "Continue with LDAP" text for consistency
-customize_continue_with_ldap_text
+# 4. Apply the patch manifest: APP_NAME, env.py WEBUI_NAME fix, page title, manifests
+#    and the login form texts of every locale (patches/lusochat_patches.yaml)
+echo_info "===== APPLYING PATCH MANIFEST ====="
+if ! apply_lusochat_patches; then
+    echo_error "Patch manifest could not be applied - no file was modified"
+fi
+if [ -f "backend/open_webui/env.py" ] && ! python3 -m py_compile "backend/open_webui/env.py" 2>/dev/null; then
+    echo_error "env.py no longer compiles after patching - check patches/lusochat_patches.yaml"
+fi
+echo_info "====================================="
+echo_info ""
 
 # 5. Copy custom .env file if it exists
 if [ -f "../.lusochat-ldap/.env" ]; then
@@ -1219,16 +627,16 @@ echo_info ""
 
 # Ask if user wants to build and deploy
 if prompt_user "Do you want to build the Docker image now?" "y"; then
-    echo_info "Building Docker image..."
+    echo_info "Building Docker image (skipped if this upstream commit + customizations was built before)..."
+    python3 "$BUILD_TOOL" build --dir "$OPENWEBUI_DIR" --image "$CUSTOM_DOCKER_IMAGE_NAME" --tag "$CUSTOM_DOCKER_IMAGE_TAG"
     cd "$OPENWEBUI_DIR"
-    docker build -t "$CUSTOM_DOCKER_IMAGE_NAME:$CUSTOM_DOCKER_IMAGE_TAG" .
     
     # Update docker-compose to use our custom image
     echo_info "Updating docker-compose to use custom image..."
     sed -i '/build:/,/dockerfile: Dockerfile/d' docker-compose.yaml
     sed -i "s|image: ghcr.io/open-webui/open-webui:.*|image: $CUSTOM_DOCKER_IMAGE_NAME:$CUSTOM_DOCKER_IMAGE_TAG|g" docker-compose.yaml
     
-    echo_success "Docker image built successfully!"
+    echo_success "Docker image ready!"
     
     if prompt_user "Do you want to start the services now?" "y"; then
         echo_info "Starting services..."
@@ -1245,8 +653,8 @@ if prompt_user "Do you want to build the Docker image now?" "y"; then
     cd ..
 else
     echo_info "To build and deploy later:"
+    echo_info "  python3 $BUILD_TOOL build --dir $OPENWEBUI_DIR --image $CUSTOM_DOCKER_IMAGE_NAME --tag $CUSTOM_DOCKER_IMAGE_TAG"
     echo_info "  cd $OPENWEBUI_DIR"
-    echo_info "  docker build -t $CUSTOM_DOCKER_IMAGE_NAME:$CUSTOM_DOCKER_IMAGE_TAG ."
     echo_info "  docker compose up -d"
 fi
 
@@ -2,7 +2,7 @@
 id: always_on_google_pse_web_search
 title: Always_On_Google_PSE_Web_Search
 author: LusoChat
-version: 1.0.0
+version: 1.1.0
 license: MIT
 description: Force-enable Web Search for every request and route through the configured Google PSE engine. Overrides the UI toggle and emits a status event ("Web search automatically enabled").
 requirements:
@@ -15,6 +15,9 @@ Notes:
 - Relies on OpenWebUI's built-in web search handler and your pre-configured Google PSE keys in Admin > Settings > Web Search.
 - Works regardless of the UI toggle; it sets web_search on for every request.
 - Emits a small status event so you can see it's active in the chat stream ("Web search automatically enabled").
+- With quota on (needs lusochat_search, mounted by .lusochat-ldap/docker-compose.yaml), every search is
+  charged to a per-user token bucket and a daily budget shared with the smart filter; once either is
+  spent, search is skipped for the request instead of failing slowly against an exhausted PSE quota.
 
 Tested against OpenWebUI 0.3x APIs; adjust imports if upstream API changes.
 """
@@ -29,6 +32,7 @@ DESCRIPTION = (
 
 from typing import Any, Awaitable, Callable, Optional
 from pydantic import BaseModel, Field
+import os
 
 try:
     # open-webui >= 0.3.8
@@ -39,6 +43,11 @@ except Exception:  # pragma: no cover
     chat_web_search_handler = None
     UserModel = None
 
+try:
+    import lusochat_search
+except Exception:  # pragma: no cover
+    lusochat_search = None
+
 
 class Filter:
     # Explicit metadata for OpenWebUI
@@ -59,6 +68,22 @@ class Filter:
             default=True,
             description="Force web search for every query regardless of content",
         )
+        quota: bool = Field(
+            default=True,
+            description="Ration Google PSE queries per user and per day (same settings as the smart filter share one budget)",
+        )
+        quota_daily_budget: int = Field(
+            default=100, description="Quota: PSE queries per day for all users"
+        )
+        quota_user_capacity: int = Field(
+            default=10, description="Quota: PSE queries a user can burst"
+        )
+        quota_user_refill_per_hour: float = Field(
+            default=5.0, description="Quota: PSE queries a user gets back per hour"
+        )
+        quota_redis_url: str = Field(
+            default="", description="Quota: Redis shared by all workers (blank = REDIS_URL, else per-process counters)"
+        )
 
     def __init__(self):
         self.valves = self.Valves()
@@ -94,8 +119,33 @@ class Filter:
         OpenWebUI's built-in web search pipeline. Returns (possibly) modified body.
         """
         try:
-            # Always force-enable the web_search flag so downstream respects search context
             features = body.get("features") or {}
+
+            # Quota first: a denied search costs nothing instead of failing slowly upstream
+            if self.valves.quota and lusochat_search is not None:
+                governor = lusochat_search.get_governor(
+                    daily_budget=int(self.valves.quota_daily_budget),
+                    user_capacity=int(self.valves.quota_user_capacity),
+                    user_refill_per_hour=float(self.valves.quota_user_refill_per_hour),
+                    redis_url=self.valves.quota_redis_url or os.environ.get("REDIS_URL", ""),
+                )
+                allowed, why = await governor.acquire(str((__user__ or {}).get("id") or "anonymous"))
+                if not allowed:
+                    features["web_search"] = False
+                    body["features"] = features
+                    await self.emit_status(
+                        __event_emitter__,
+                        level="info",
+                        message=(
+                            "Web search skipped: daily search budget used up"
+                            if why == "daily_budget"
+                            else "Web search skipped: your search quota is used up for now"
+                        ),
+                        done=True,
+                    )
+                    return body
+
+            # Always force-enable the web_search flag so downstream respects search context
             features["web_search"] = True
             body["features"] = features
 
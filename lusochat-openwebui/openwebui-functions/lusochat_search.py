@@ -0,0 +1,1590 @@
+"""
+Lusochat web search fan-out: Google PSE + the bundled SearXNG.
+
+Not a Function itself: a module the filters import. .lusochat-ldap/docker-compose.yaml
+mounts it into the OpenWebUI container at /app/backend/lusochat_search.py, which is on
+the backend's import path, so a Filter can simply `import lusochat_search`.
+
+How it works:
+- The primary backend (PSE) is queried first. In "hedge" mode the secondary backend
+  (SearXNG) is only queried when PSE has not answered sufficiently within the hedge
+  delay, which by default follows PSE's observed p95 latency; in "parallel" mode both
+  are queried at once.
+- The first sufficient answer (at least min_results results) wins. If neither is
+  sufficient on its own, the results are merged and deduplicated by normalized URL.
+- A losing request is not cancelled: it is already paid for, and its real latency keeps
+  the p95 (and so the hedge delay) honest. Its results are discarded.
+- Per-backend calls, errors, wins and p50/p95 latency are available from metrics().
+- PageFetcher fetches the result pages over one shared HTTP/2 keep-alive pool (httpx),
+  at most per_host requests per host and a hard deadline per page that includes the
+  wait for a host slot. The extracted text is cached by URL; after fresh_s the page is
+  revalidated with If-None-Match / If-Modified-Since, so the popular pages cost a 304
+  or nothing at all. Concurrent requests for the same URL share one fetch, and a
+  failed revalidation serves the cached text.
+- Every fetched page carries a 64-bit SimHash of its text, computed once and cached with
+  the page. dedup_pages() drops results whose page is a near-duplicate of a better-ranked
+  one (Hamming distance within the similarity budget) or the same page under a language
+  or print-view URL (/en/, ?lang=, ?print=1), which text similarity cannot catch.
+- With result_ttl_s set, SearchFanout also caches whole answers per (query, count).
+  DecisionLog records the searches the filter runs (query, category, count) and
+  Prewarmer re-runs the most frequent ones per category on a schedule, searches and
+  page fetches, so the caches are hot before a deadline-driven peak.
+- QuotaGovernor rations PSE queries: a token bucket per user and a daily budget shared
+  by every filter (in Redis when configured, else in this process). As the budget
+  drains, or is spent faster than Lisbon business hours (pace_hours) pass, penalty()
+  grows and the smart filter lowers its effective aggressiveness, so only the
+  highest-scoring queries still search.
+- normalize_tokens() folds accents and case and applies light Portuguese stemming
+  ("admissões", "admissao" -> one stem; "inscrevi-me", "inscrição" -> "inscri"), memoized
+  per text. Words whose stem would hit an unrelated keyword ("prazer" vs "prazo") are
+  left whole. compile_keywords() normalizes a keyword list once (deduplicating forms that
+  normalize alike), and its count() matches a query on normalized tokens.
+- QueryRewriter turns follow-ups ("e quando?", "e as propinas desse curso?") into a
+  standalone query by carrying the course and topic words of the previous turns forward,
+  optionally through a small model behind an OpenAI-compatible endpoint (LiteLLM) with a
+  strict timeout. Rewrites are memoized per chat; the result is both the search query
+  and the cache key.
+- TopicTracker keeps a rolling vector per chat (hashed bag of words, or embeddings from
+  an OpenAI-compatible endpoint when configured) and flags a topic shift when a turn
+  stops resembling it. Within a topic the filter reuses the sources it already fetched;
+  only a shift triggers a new search. Chat states live in a bounded LRU.
+
+Usage (manual check from a shell with network access to the backends):
+    python lusochat_search.py "propinas 2025 lusófona" --searxng-url http://localhost:8083
+    python lusochat_search.py "calendário escolar" --pse-key KEY --pse-cx CX --mode parallel
+    python lusochat_search.py "propinas" --searxng-url http://localhost:8083 --fetch
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import math
+import os
+import re
+import time
+import unicodedata
+from collections import Counter, OrderedDict, deque
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from functools import lru_cache
+from html.parser import HTMLParser
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+try:
+    import aiohttp
+except Exception:  # pragma: no cover
+    aiohttp = None
+
+try:
+    import httpx
+except Exception:  # pragma: no cover
+    httpx = None
+
+try:
+    import redis.asyncio as aioredis
+except Exception:  # pragma: no cover
+    aioredis = None
+
+try:
+    from zoneinfo import ZoneInfo
+except Exception:  # pragma: no cover
+    ZoneInfo = None
+
+
+@dataclass
+class SearchResult:
+    url: str
+    title: str
+    snippet: str
+    backend: str
+    rank: int
+
+
+@dataclass
+class SearchResponse:
+    query: str
+    results: List[SearchResult]
+    winner: str                # backend whose answer was used, or "merged" / "none"
+    latency_ms: float
+    hedged: bool = False       # the secondary backend was queried
+    cached: bool = False       # served from the result cache
+    backend_ms: Dict[str, Optional[float]] = field(default_factory=dict)
+    errors: Dict[str, str] = field(default_factory=dict)
+
+
+def normalize_url(url: str) -> str:
+    """Key for deduplication: no scheme/www/fragment/tracking parameters, no trailing slash."""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query) if not k.lower().startswith("utm_")))
+    return urlunsplit(("", host, parts.path.rstrip("/") or "/", query, ""))
+
+
+def normalize_query(query: str) -> str:
+    """Key for the result cache and the decision log."""
+    return " ".join(query.lower().split())
+
+
+def merge_results(result_sets: List[List[SearchResult]], limit: int) -> List[SearchResult]:
+    """Interleave the result sets by rank, keeping the first occurrence of every URL."""
+    merged: List[SearchResult] = []
+    seen = set()
+    for rank in range(max((len(r) for r in result_sets), default=0)):
+        for results in result_sets:
+            if rank < len(results):
+                key = normalize_url(results[rank].url)
+                if key not in seen:
+                    seen.add(key)
+                    merged.append(results[rank])
+    return merged[:limit]
+
+
+# ---- backends ------------------------------------------------------------------
+
+class GooglePSE:
+    name = "pse"
+    endpoint = "https://www.googleapis.com/customsearch/v1"
+
+    def __init__(self, api_key: str, engine_id: str, endpoint: Optional[str] = None):
+        self.api_key = api_key
+        self.engine_id = engine_id
+        self.endpoint = endpoint or self.endpoint
+
+    async def search(self, session, query: str, count: int) -> List[SearchResult]:
+        params = {"key": self.api_key, "cx": self.engine_id, "q": query, "num": max(1, min(count, 10))}
+        async with session.get(self.endpoint, params=params) as resp:
+            resp.raise_for_status()
+            data = await resp.json(content_type=None)
+        return [
+            SearchResult(url=item.get("link", ""), title=item.get("title", ""),
+                         snippet=item.get("snippet", ""), backend=self.name, rank=i)
+            for i, item in enumerate(data.get("items") or []) if item.get("link")
+        ]
+
+
+class SearXNG:
+    name = "searxng"
+
+    def __init__(self, base_url: str, language: str = ""):
+        self.base_url = base_url.rstrip("/")
+        self.language = language
+
+    async def search(self, session, query: str, count: int) -> List[SearchResult]:
+        params = {"q": query, "format": "json", "categories": "general"}
+        if self.language:
+            params["language"] = self.language
+        async with session.get(f"{self.base_url}/search", params=params) as resp:
+            resp.raise_for_status()
+            data = await resp.json(content_type=None)
+        return [
+            SearchResult(url=item.get("url", ""), title=item.get("title", ""),
+                         snippet=item.get("content", ""), backend=self.name, rank=i)
+            for i, item in enumerate(data.get("results") or []) if item.get("url")
+        ][:count]
+
+
+# ---- metrics -------------------------------------------------------------------
+
+class BackendStats:
+    """Latency window and counters of one backend."""
+
+    def __init__(self, window: int = 200):
+        self.latencies_ms: Deque[float] = deque(maxlen=window)
+        self.calls = 0
+        self.errors = 0
+        self.wins = 0
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self.latencies_ms:
+            return None
+        ordered = sorted(self.latencies_ms)
+        return ordered[min(len(ordered) - 1, int(round(p * (len(ordered) - 1))))]
+
+    def snapshot(self) -> dict:
+        p50, p95 = self.percentile(0.5), self.percentile(0.95)
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "wins": self.wins,
+            "win_rate": round(self.wins / self.calls, 3) if self.calls else None,
+            "p50_ms": round(p50, 1) if p50 is not None else None,
+            "p95_ms": round(p95, 1) if p95 is not None else None,
+        }
+
+
+# ---- fan-out -------------------------------------------------------------------
+
+class SearchFanout:
+    """Hedged (or parallel) search over a primary and an optional secondary backend."""
+
+    def __init__(
+        self,
+        primary,
+        secondary=None,
+        mode: str = "hedge",
+        hedge_delay_ms: Optional[float] = None,
+        default_hedge_delay_ms: float = 800.0,
+        min_hedge_delay_ms: float = 150.0,
+        min_samples: int = 20,
+        min_results: int = 3,
+        timeout_s: float = 6.0,
+        result_ttl_s: float = 0.0,
+        max_cached_results: int = 256,
+    ):
+        if aiohttp is None:
+            raise RuntimeError("aiohttp is required for lusochat_search")
+        self.primary = primary
+        self.secondary = secondary
+        self.mode = mode
+        self.hedge_delay_ms = hedge_delay_ms
+        self.default_hedge_delay_ms = default_hedge_delay_ms
+        self.min_hedge_delay_ms = min_hedge_delay_ms
+        self.min_samples = min_samples
+        self.min_results = min_results
+        self.timeout_s = timeout_s
+        self.stats: Dict[str, BackendStats] = {b.name: BackendStats() for b in (primary, secondary) if b}
+        self.searches = 0
+        self.hedges = 0
+        self.merges = 0
+        self.cache_hits = 0
+        self.result_ttl_s = result_ttl_s
+        self.max_cached_results = max_cached_results
+        self._results: "OrderedDict[tuple, Tuple[float, SearchResponse]]" = OrderedDict()
+        self._session = None
+        self._background: set = set()
+
+    def _get_session(self):
+        # One pooled session per fan-out (the filter keeps it across requests)
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=self.timeout_s),
+                connector=aiohttp.TCPConnector(limit=32, ttl_dns_cache=300),
+            )
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    def current_hedge_delay_ms(self) -> float:
+        """Explicit delay, else the primary's p95 once there are enough samples."""
+        if self.hedge_delay_ms:
+            return float(self.hedge_delay_ms)
+        stats = self.stats[self.primary.name]
+        if len(stats.latencies_ms) < self.min_samples:
+            return self.default_hedge_delay_ms
+        return max(self.min_hedge_delay_ms, stats.percentile(0.95))
+
+    async def _timed(self, backend, query: str, count: int):
+        """Run one backend; returns (backend, results or None, elapsed ms, error)."""
+        stats = self.stats[backend.name]
+        stats.calls += 1
+        started = time.perf_counter()
+        try:
+            results = await backend.search(self._get_session(), query, count)
+            elapsed = (time.perf_counter() - started) * 1000
+            stats.latencies_ms.append(elapsed)
+            return backend, results, elapsed, None
+        except Exception as e:
+            stats.errors += 1
+            return backend, None, (time.perf_counter() - started) * 1000, f"{type(e).__name__}: {e}"
+
+    def _sufficient(self, results) -> bool:
+        return results is not None and len(results) >= self.min_results
+
+    def _detach(self, tasks) -> None:
+        # Let losing requests finish in the background so their latency is recorded
+        for task in tasks:
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+
+    def is_cached(self, query: str, count: int) -> bool:
+        entry = self._results.get((normalize_query(query), count))
+        return bool(self.result_ttl_s) and entry is not None and time.time() - entry[0] < self.result_ttl_s
+
+    async def search(
+        self, query: str, count: int = 5, refresh: bool = False, use_primary: bool = True
+    ) -> SearchResponse:
+        """Cached answer when fresh (unless refresh), else a search of the backends.
+
+        use_primary=False searches the secondary backend only (e.g. the PSE quota is spent).
+        """
+        key = (normalize_query(query), count)
+        if self.result_ttl_s and not refresh:
+            entry = self._results.get(key)
+            if entry is not None and time.time() - entry[0] < self.result_ttl_s:
+                self._results.move_to_end(key)
+                self.cache_hits += 1
+                cached = entry[1]
+                return SearchResponse(
+                    query=query, results=list(cached.results), winner=cached.winner,
+                    latency_ms=0.0, hedged=False, cached=True,
+                )
+        if use_primary:
+            response = await self._search_backends(query, count, self.primary, self.secondary)
+        elif self.secondary is not None:
+            response = await self._search_backends(query, count, self.secondary, None)
+        else:
+            return SearchResponse(query=query, results=[], winner="none", latency_ms=0.0)
+        if self.result_ttl_s and response.results:
+            self._results[key] = (time.time(), response)
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_cached_results:
+                self._results.popitem(last=False)
+        return response
+
+    async def _search_backends(self, query: str, count: int, primary, secondary) -> SearchResponse:
+        self.searches += 1
+        started = time.perf_counter()
+        response = SearchResponse(query=query, results=[], winner="none", latency_ms=0.0)
+        done: Dict[str, tuple] = {}
+        pending = {asyncio.ensure_future(self._timed(primary, query, count))}
+
+        def collect(finished):
+            for task in finished:
+                backend, results, elapsed, err = task.result()
+                done[backend.name] = (backend, results)
+                response.backend_ms[backend.name] = round(elapsed, 1)
+                if err:
+                    response.errors[backend.name] = err
+
+        if secondary is not None:
+            if self.mode == "parallel":
+                pending.add(asyncio.ensure_future(self._timed(secondary, query, count)))
+                response.hedged = True
+            else:
+                finished, pending = await asyncio.wait(pending, timeout=self.current_hedge_delay_ms() / 1000)
+                collect(finished)
+                primary_results = done.get(primary.name, (None, None))[1]
+                if not self._sufficient(primary_results):
+                    # Slow, failed or thin primary answer: ask the secondary too
+                    pending.add(asyncio.ensure_future(self._timed(secondary, query, count)))
+                    response.hedged = True
+                    self.hedges += 1
+
+        deadline = started + self.timeout_s
+        while pending and not any(self._sufficient(r) for _, r in done.values()):
+            finished, pending = await asyncio.wait(
+                pending, timeout=max(0.0, deadline - time.perf_counter()), return_when=asyncio.FIRST_COMPLETED
+            )
+            if not finished:
+                break
+            collect(finished)
+        self._detach(pending)
+
+        winners = [(b, r) for b, r in done.values() if self._sufficient(r)]
+        if winners:
+            backend, results = winners[0]
+            response.results = results[:count]
+            response.winner = backend.name
+            self.stats[backend.name].wins += 1
+        else:
+            result_sets = [r for _, r in done.values() if r]
+            if len(result_sets) > 1:
+                response.results = merge_results(result_sets, count)
+                response.winner = "merged"
+                self.merges += 1
+            elif result_sets:
+                backend = next(b for b, r in done.values() if r)
+                response.results = result_sets[0][:count]
+                response.winner = backend.name
+                self.stats[backend.name].wins += 1
+        response.latency_ms = round((time.perf_counter() - started) * 1000, 1)
+        return response
+
+    def metrics(self) -> dict:
+        return {
+            "searches": self.searches,
+            "hedges": self.hedges,
+            "merges": self.merges,
+            "cache_hits": self.cache_hits,
+            "hedge_delay_ms": round(self.current_hedge_delay_ms(), 1),
+            "backends": {name: stats.snapshot() for name, stats in self.stats.items()},
+        }
+
+
+# ---- page fetcher --------------------------------------------------------------
+
+class _TextExtractor(HTMLParser):
+    """Visible text and <title> of an HTML page (no scripts, styles or navigation)."""
+
+    SKIP = {"script", "style", "noscript", "nav", "header", "footer", "svg", "form", "template"}
+    BLOCK = {"p", "div", "li", "br", "tr", "h1", "h2", "h3", "h4", "h5", "h6", "section", "article", "table"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self.title = ""
+        self._skip = 0
+        self._in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self._skip += 1
+        elif tag == "title":
+            self._in_title = True
+        elif tag in self.BLOCK:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP and self._skip:
+            self._skip -= 1
+        elif tag == "title":
+            self._in_title = False
+        elif tag in self.BLOCK:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+        elif not self._skip:
+            self.parts.append(data)
+
+    def text(self) -> str:
+        lines = (re.sub(r"\s+", " ", line).strip() for line in "".join(self.parts).splitlines())
+        return "\n".join(line for line in lines if line)
+
+
+def extract_text(html: str) -> tuple:
+    """(title, text) of an HTML document."""
+    parser = _TextExtractor()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception:
+        pass
+    return parser.title.strip(), parser.text()
+
+
+@dataclass
+class Page:
+    url: str
+    title: str
+    text: str
+    etag: str = ""
+    last_modified: str = ""
+    fetched_at: float = 0.0      # last successful fetch or revalidation
+    source: str = "network"      # network | cache | revalidated | stale
+    simhash: int = 0             # 64-bit SimHash of the text (0 = no text)
+
+
+class PageFetcher:
+    """Pooled, conditional-GET page fetcher with an LRU cache of extracted text."""
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        fresh_s: float = 300.0,
+        per_host: int = 4,
+        deadline_s: float = 4.0,
+        max_bytes: int = 2_000_000,
+        max_chars: int = 20_000,
+        user_agent: str = "Lusochat/1.0 (+https://www.ulusofona.pt)",
+    ):
+        if httpx is None:
+            raise RuntimeError("httpx is required for PageFetcher")
+        self.max_entries = max_entries
+        self.fresh_s = fresh_s
+        self.per_host = per_host
+        self.deadline_s = deadline_s
+        self.max_bytes = max_bytes
+        self.max_chars = max_chars
+        self.user_agent = user_agent
+        self.cache: "OrderedDict[str, Page]" = OrderedDict()
+        self.counters = {"hits": 0, "revalidated": 0, "fetched": 0, "stale": 0, "errors": 0, "timeouts": 0}
+        self._client = None
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def _get_client(self):
+        if self._client is None or self._client.is_closed:
+            try:
+                import h2  # noqa: F401
+
+                http2 = True
+            except Exception:  # pragma: no cover
+                http2 = False
+            self._client = httpx.AsyncClient(
+                http2=http2,
+                follow_redirects=True,
+                headers={"User-Agent": self.user_agent, "Accept": "text/html,application/xhtml+xml"},
+                limits=httpx.Limits(max_connections=64, max_keepalive_connections=32, keepalive_expiry=120),
+                timeout=httpx.Timeout(self.deadline_s),
+            )
+        return self._client
+
+    async def close(self) -> None:
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+
+    def _remember(self, key: str, page: Page) -> None:
+        self.cache[key] = page
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.max_entries:
+            self.cache.popitem(last=False)
+
+    async def fetch(self, url: str) -> Optional[Page]:
+        """Extracted page, from the cache when fresh; None when it cannot be fetched."""
+        key = normalize_url(url)
+        cached = self.cache.get(key)
+        if cached is not None and time.time() - cached.fetched_at < self.fresh_s:
+            self.cache.move_to_end(key)
+            self.counters["hits"] += 1
+            return Page(**{**cached.__dict__, "source": "cache"})
+
+        # Single flight: a burst of identical searches fetches each page once
+        if key in self._inflight:
+            return await asyncio.shield(self._inflight[key])
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            page = await self._fetch(url, key, cached)
+            future.set_result(page)
+            return page
+        except BaseException as e:
+            future.set_result(None)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            return None
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _fetch(self, url: str, key: str, cached: Optional[Page]) -> Optional[Page]:
+        headers = {}
+        if cached is not None:
+            if cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                headers["If-Modified-Since"] = cached.last_modified
+        host = urlsplit(url).netloc.lower()
+        limit = self._host_limits.setdefault(host, asyncio.Semaphore(self.per_host))
+        try:
+            # The deadline covers the wait for a host slot too, not only the request
+            response = await asyncio.wait_for(self._limited_get(limit, url, headers), timeout=self.deadline_s)
+        except asyncio.TimeoutError:
+            self.counters["timeouts"] += 1
+            return self._stale(cached)
+        except Exception:
+            self.counters["errors"] += 1
+            return self._stale(cached)
+
+        status, response_headers, body = response
+        if status == 304 and cached is not None:
+            self.counters["revalidated"] += 1
+            cached.fetched_at = time.time()
+            self._remember(key, cached)
+            return Page(**{**cached.__dict__, "source": "revalidated"})
+        if status != 200:
+            self.counters["errors"] += 1
+            return self._stale(cached)
+
+        title, text = extract_text(body)
+        text = text[: self.max_chars]
+        page = Page(
+            url=url,
+            title=title,
+            text=text,
+            etag=response_headers.get("etag", ""),
+            last_modified=response_headers.get("last-modified", ""),
+            fetched_at=time.time(),
+            simhash=simhash(text),
+        )
+        self.counters["fetched"] += 1
+        self._remember(key, page)
+        return page
+
+    async def _limited_get(self, limit: asyncio.Semaphore, url: str, headers: dict) -> tuple:
+        async with limit:
+            return await self._get(url, headers)
+
+    async def _get(self, url: str, headers: dict) -> tuple:
+        """(status, headers, text) with the body capped at max_bytes."""
+        async with self._get_client().stream("GET", url, headers=headers) as resp:
+            if resp.status_code != 200:
+                return resp.status_code, resp.headers, ""
+            content_type = resp.headers.get("content-type", "")
+            if "html" not in content_type and "text" not in content_type:
+                return 415, resp.headers, ""
+            chunks, size = [], 0
+            async for chunk in resp.aiter_bytes():
+                chunks.append(chunk)
+                size += len(chunk)
+                if size >= self.max_bytes:
+                    break
+            encoding = resp.charset_encoding or "utf-8"
+            return 200, resp.headers, b"".join(chunks).decode(encoding, errors="replace")
+
+    def _stale(self, cached: Optional[Page]) -> Optional[Page]:
+        if cached is None:
+            return None
+        self.counters["stale"] += 1
+        return Page(**{**cached.__dict__, "source": "stale"})
+
+    async def fetch_many(self, urls: List[str]) -> List[Optional[Page]]:
+        return list(await asyncio.gather(*(self.fetch(u) for u in urls)))
+
+    def metrics(self) -> dict:
+        return {**self.counters, "cached_pages": len(self.cache)}
+
+
+# ---- quota -----------------------------------------------------------------------
+
+# Token bucket + daily counter in one round trip.
+# KEYS: bucket hash, day counter. ARGV: capacity, refill/s, now, budget, day ttl.
+# Returns 0 = allowed, 1 = user bucket empty, 2 = daily budget spent.
+_ACQUIRE_LUA = """
+local b = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local capacity = tonumber(ARGV[1])
+local now = tonumber(ARGV[3])
+local tokens = tonumber(b[1]) or capacity
+local ts = tonumber(b[2]) or now
+tokens = math.min(capacity, tokens + (now - ts) * tonumber(ARGV[2]))
+if tokens < 1 then
+  redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+  redis.call('EXPIRE', KEYS[1], 86400)
+  return 1
+end
+local used = tonumber(redis.call('GET', KEYS[2]) or '0')
+if used >= tonumber(ARGV[4]) then
+  return 2
+end
+redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[5])
+redis.call('HSET', KEYS[1], 'tokens', tokens - 1, 'ts', now)
+redis.call('EXPIRE', KEYS[1], 86400)
+return 0
+"""
+
+# Daily counter only (background work such as pre-warming). KEYS: day counter.
+_ACQUIRE_GLOBAL_LUA = """
+local used = tonumber(redis.call('GET', KEYS[1]) or '0')
+if used >= tonumber(ARGV[1]) then
+  return 2
+end
+redis.call('INCR', KEYS[1])
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 0
+"""
+
+
+class QuotaGovernor:
+    """Per-user token buckets and a global daily budget for PSE queries."""
+
+    DENIALS = {1: "user_quota", 2: "daily_budget"}
+
+    def __init__(
+        self,
+        daily_budget: int = 100,
+        user_capacity: int = 10,
+        user_refill_per_hour: float = 5.0,
+        redis_url: str = "",
+        prefix: str = "lusochat:pse",
+        timezone: str = "America/Los_Angeles",  # the PSE quota resets at Pacific midnight
+        redis_retry_s: float = 60.0,
+        pace_timezone: str = "Europe/Lisbon",
+        pace_hours: Optional[Tuple[int, int]] = (8, 20),
+    ):
+        self.daily_budget = daily_budget
+        self.user_capacity = user_capacity
+        self.refill_per_s = user_refill_per_hour / 3600.0
+        self.redis_url = redis_url
+        self.prefix = prefix
+        self.tz = ZoneInfo(timezone) if ZoneInfo is not None else None
+        self.redis_retry_s = redis_retry_s
+        # Traffic is expected during pace_hours (local business hours); None paces on the budget only
+        self.pace_hours = pace_hours
+        self.pace_tz = ZoneInfo(pace_timezone) if ZoneInfo is not None and pace_hours else None
+        self._redis = None
+        self._redis_down_until = 0.0
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._day = ""
+        self._used = 0
+
+    def _now(self) -> datetime:
+        return datetime.now(self.tz)
+
+    def _day_key(self) -> str:
+        return self._now().strftime("%Y%m%d")
+
+    def _pace_seconds(self, start: datetime, end: datetime) -> float:
+        """Seconds of pace_hours (in pace_tz) between two aware datetimes."""
+        start, end = start.astimezone(self.pace_tz), end.astimezone(self.pace_tz)
+        first_hour, last_hour = self.pace_hours
+        seconds = 0.0
+        day = start.date()
+        while day <= end.date():
+            opens = datetime(day.year, day.month, day.day, tzinfo=self.pace_tz) + timedelta(hours=first_hour)
+            closes = opens + timedelta(hours=last_hour - first_hour)
+            seconds += max(0.0, (min(end, closes) - max(start, opens)).total_seconds())
+            day += timedelta(days=1)
+        return seconds
+
+    def _expected_fraction(self) -> Optional[float]:
+        """Share of the quota day's traffic expected by now (None: no pacing).
+
+        The quota day starts at Pacific midnight, 08:00 in Lisbon, so pacing on the
+        clock would make every busy Lisbon morning look ahead of schedule. Traffic is
+        assumed to be spread evenly over pace_hours instead.
+        """
+        if self.pace_tz is None or self.tz is None:
+            return None
+        now = self._now()
+        day_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        total = self._pace_seconds(day_start, day_start + timedelta(days=1))
+        if total <= 0:
+            return None
+        return self._pace_seconds(day_start, now) / total
+
+    def _get_redis(self):
+        if not self.redis_url or aioredis is None or time.time() < self._redis_down_until:
+            return None
+        if self._redis is None:
+            self._redis = aioredis.from_url(self.redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        return self._redis
+
+    def _redis_failed(self, e: Exception) -> None:
+        if self._redis_down_until <= time.time():
+            print(f"[lusochat_search] Redis unavailable ({e}); using in-process quota for {self.redis_retry_s:.0f}s")
+        self._redis_down_until = time.time() + self.redis_retry_s
+
+    def _acquire_local(self, user_id: Optional[str]) -> int:
+        day = self._day_key()
+        if day != self._day:
+            self._day, self._used = day, 0
+        if user_id is None:
+            if self._used >= self.daily_budget:
+                return 2
+            self._used += 1
+            return 0
+        now = time.time()
+        tokens, ts = self._buckets.get(user_id, [float(self.user_capacity), now])
+        tokens = min(float(self.user_capacity), tokens + (now - ts) * self.refill_per_s)
+        self._buckets[user_id] = [tokens, now]
+        self._buckets.move_to_end(user_id)
+        while len(self._buckets) > 10000:
+            self._buckets.popitem(last=False)
+        if tokens < 1:
+            return 1
+        if self._used >= self.daily_budget:
+            return 2
+        self._used += 1
+        self._buckets[user_id][0] = tokens - 1
+        return 0
+
+    async def acquire(self, user_id: Optional[str]) -> Tuple[bool, str]:
+        """Charge one PSE query to the user and the daily budget: (allowed, reason).
+
+        user_id=None charges the daily budget only (background work).
+        """
+        client = self._get_redis()
+        code = None
+        day_key = f"{self.prefix}:day:{self._day_key()}"
+        if client is not None:
+            try:
+                if user_id is None:
+                    code = int(await client.eval(_ACQUIRE_GLOBAL_LUA, 1, day_key, self.daily_budget, 2 * 86400))
+                else:
+                    code = int(await client.eval(
+                        _ACQUIRE_LUA, 2, f"{self.prefix}:user:{user_id}", day_key,
+                        self.user_capacity, self.refill_per_s, time.time(), self.daily_budget, 2 * 86400,
+                    ))
+            except Exception as e:
+                self._redis_failed(e)
+        if code is None:
+            code = self._acquire_local(user_id)
+        return code == 0, self.DENIALS.get(code, "ok")
+
+    async def used_today(self) -> int:
+        client = self._get_redis()
+        if client is not None:
+            try:
+                return int(await client.get(f"{self.prefix}:day:{self._day_key()}") or 0)
+            except Exception as e:
+                self._redis_failed(e)
+        return self._used if self._day == self._day_key() else 0
+
+    async def penalty(self) -> int:
+        """Score penalty (0..3) from how much of the budget is left and how fast it goes."""
+        if self.daily_budget <= 0:
+            return 3
+        spent = min(1.0, await self.used_today() / self.daily_budget)
+        remaining = 1.0 - spent
+        expected = self._expected_fraction()
+        # > 0: spending faster than the expected traffic of the day
+        ahead = spent - expected if expected is not None else 0.0
+        if remaining <= 0.1:
+            return 3
+        if remaining <= 0.25 or ahead > 0.25:
+            return 2
+        if remaining <= 0.5 or ahead > 0.1:
+            return 1
+        return 0
+
+    async def usage(self) -> dict:
+        used = await self.used_today()
+        expected = self._expected_fraction()
+        return {
+            "used": used,
+            "budget": self.daily_budget,
+            "expected_fraction": round(expected, 3) if expected is not None else None,
+            "backend": "redis" if self._get_redis() is not None else "memory",
+        }
+
+
+_GOVERNORS: Dict[tuple, QuotaGovernor] = {}
+
+
+def get_governor(**kwargs) -> QuotaGovernor:
+    """Shared governor per configuration, so all filters in the process draw on one budget."""
+    key = tuple(sorted(kwargs.items()))
+    if key not in _GOVERNORS:
+        _GOVERNORS[key] = QuotaGovernor(**kwargs)
+    return _GOVERNORS[key]
+
+
+# ---- normalization ---------------------------------------------------------------
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+# Light Portuguese stemming, RSLP-style: plural, then one derivational or verbal suffix,
+# then a final vowel. Aims at matching inflections, not at linguistic stems.
+_PLURAL_RULES = (
+    ("coes", "cao"), ("soes", "sao"), ("oes", "ao"), ("aes", "ao"), ("ais", "al"),
+    ("eis", "el"), ("ois", "ol"), ("ns", "m"), ("res", "r"), ("zes", "z"), ("s", ""),
+)
+_SUFFIXES = (
+    "amentos", "imentos", "amento", "imento", "mente", "ura", "acao", "cao",
+    "aram", "eram", "iram", "avam", "aria", "eria", "iria", "ando", "endo", "indo",
+    "ador", "edor", "idor", "ado", "ido", "ada", "ida", "ar", "er", "ir", "ou", "eu", "iu", "ei", "i",
+)
+# Stem alternations the suffix rules cannot reach (inscrever / inscrição)
+_STEM_ALTERNATIONS = (("screv", "scri"),)
+# Singular forms kept whole: their stem would collide with an unrelated keyword
+# (prazer/prazo, bolso/bolsa, regular/regulamento, público/publicado, obrigação/obrigado)
+_UNSTEMMED = frozenset({
+    "prazer", "bolso", "regular", "publico", "obrigacao", "obrigatorio", "obrigatoria",
+})
+
+
+def fold(text: str) -> str:
+    """Lowercase without accents ("Admissão" -> "admissao", "ç" -> "c")."""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+@lru_cache(maxsize=65536)
+def stem(token: str) -> str:
+    """Light stem of a folded token."""
+    if len(token) <= 3 or token.isdigit():
+        return token
+    for suffix, replacement in _PLURAL_RULES:
+        if token.endswith(suffix) and not token.endswith("ss") and len(token) - len(suffix) >= 2:
+            if suffix != "s" or len(token) > 4:
+                token = token[: -len(suffix)] + replacement
+                break
+    if token in _UNSTEMMED:
+        return token
+    for suffix in _SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 4:
+            token = token[: -len(suffix)]
+            break
+    else:
+        if len(token) >= 5 and token[-1] in "aeo":
+            token = token[:-1]
+    for old, new in _STEM_ALTERNATIONS:
+        if token.endswith(old):
+            token = token[: -len(old)] + new
+    return token
+
+
+@lru_cache(maxsize=4096)
+def fold_tokens(text: str) -> Tuple[str, ...]:
+    """Folded word tokens; hyphenated clitics split ("inscrevi-me" -> inscrevi, me)."""
+    return tuple(_TOKEN.findall(fold(text)))
+
+
+@lru_cache(maxsize=4096)
+def normalize_tokens(text: str) -> Tuple[str, ...]:
+    """Folded, stemmed tokens of a text (memoized: repeated queries cost a dict lookup)."""
+    return tuple(stem(t) for t in fold_tokens(text))
+
+
+class KeywordMatcher:
+    """A keyword list normalized once; count() = how many distinct keywords a text contains."""
+
+    def __init__(self, keywords: Tuple[str, ...]):
+        self.singles = set()
+        self.phrases = set()
+        self.numbers = set()
+        self.raw = set()
+        for keyword in keywords:
+            tokens = normalize_tokens(keyword)
+            if not tokens:
+                if fold(keyword).strip():
+                    self.raw.add(fold(keyword).strip())  # punctuation such as "?"
+            elif len(tokens) > 1:
+                self.phrases.add(" ".join(tokens))
+            elif tokens[0].isdigit():
+                self.numbers.add(tokens[0])  # "202" matches 2024, 2025, ...
+            else:
+                self.singles.add(tokens[0])
+
+    def count(self, text: str) -> int:
+        tokens = normalize_tokens(text or "")
+        hits = len(self.singles.intersection(tokens))
+        if self.phrases:
+            joined = f" {' '.join(tokens)} "
+            hits += sum(1 for p in self.phrases if f" {p} " in joined)
+        if self.numbers:
+            hits += sum(1 for n in self.numbers if any(t.startswith(n) for t in tokens if t.isdigit()))
+        if self.raw:
+            folded = fold(text or "")
+            hits += sum(1 for r in self.raw if r in folded)
+        return hits
+
+
+@lru_cache(maxsize=256)
+def compile_keywords(keywords: Tuple[str, ...]) -> KeywordMatcher:
+    """Matcher for a keyword list, compiled once per distinct list."""
+    return KeywordMatcher(keywords)
+
+
+# ---- query rewriting -------------------------------------------------------------
+
+_STOPWORDS = set("""
+a à ao aos as às com como da das de do dos e é em entre era essa esse está estão eu foi há
+isso isto já lá mais mas me mesmo meu minha muito na nas não nem no nos o os ou para pela
+pelo pelas pelos por qual quais quando que quem se sem ser seu sua são também te tem tenho
+um uma umas uns vou ver onde então agora sobre posso pode podes queria quero saber diz dizer
+the of and or to in on for what when where how is are about
+""".split())
+_ANAPHORA = set("""
+desse dessa desses dessas deste desta destes destas disso disto daquele daquela daquilo
+nesse nessa neste nesta nisso nisto esse essa este esta isso isto aquele aquela aquilo
+ele ela eles elas lá mesmo mesma it that this those them
+""".split())
+_FOLDED_STOPWORDS = {fold(w) for w in _STOPWORDS | _ANAPHORA}
+_FOLLOWUP_START = re.compile(r"^\s*(?:e|mas|então|entao|and|what about)\b[\s,]*", re.IGNORECASE)
+_COURSE_PREFIX = {"licenciatura", "mestrado", "doutoramento", "pós-graduação", "curso", "ctesp", "mba"}
+_COURSE_JOINERS = {"em", "de", "da", "do", "e"}
+_WORD = re.compile(r"[\w\-]+", re.UNICODE)
+
+
+def _words(text: str) -> List[str]:
+    return _WORD.findall((text or "").lower())
+
+
+def _content_words(text: str) -> List[str]:
+    return [w for w in _words(text) if w not in _STOPWORDS and w not in _ANAPHORA and (len(w) > 2 or w.isdigit())]
+
+
+def _course_entity(text: str) -> str:
+    """'licenciatura em engenharia informática' style phrase, or ''."""
+    words = _words(text)
+    for i, w in enumerate(words):
+        if w in _COURSE_PREFIX and i + 1 < len(words) and words[i + 1] in {"em", "de", "da", "do"}:
+            tail = []
+            for t in words[i + 2:i + 7]:
+                if t.isdigit() or (t in _STOPWORDS and t not in _COURSE_JOINERS) or t in _ANAPHORA:
+                    break
+                tail.append(t)
+            while tail and tail[-1] in _COURSE_JOINERS:
+                tail.pop()
+            if tail:
+                return " ".join(words[i:i + 2] + tail)
+    return ""
+
+
+@dataclass
+class Rewrite:
+    query: str
+    method: str           # verbatim | extractive | model
+    cached: bool = False
+
+
+class QueryRewriter:
+    """Standalone search queries for follow-up turns, memoized per chat."""
+
+    def __init__(
+        self,
+        model: str = "",
+        base_url: str = "",
+        api_key: str = "",
+        timeout_ms: float = 800.0,
+        history_turns: int = 3,
+        max_entries: int = 4096,
+    ):
+        self.model = model
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.timeout_ms = timeout_ms
+        self.history_turns = history_turns
+        self.max_entries = max_entries
+        self.memo: "OrderedDict[tuple, Rewrite]" = OrderedDict()
+        self.counters = {"verbatim": 0, "extractive": 0, "model": 0, "model_failed": 0, "memo_hits": 0}
+        self._session = None
+
+    @staticmethod
+    def needs_rewrite(text: str) -> bool:
+        words = _words(text)
+        return (
+            bool(_FOLLOWUP_START.match(text or ""))
+            or any(w in _ANAPHORA for w in words)
+            or len(_content_words(text)) <= 1
+        )
+
+    def extractive(self, user_turns: List[str]) -> str:
+        """Current question plus the course and topic words it leaves implicit."""
+        current, previous = user_turns[-1], user_turns[:-1][-self.history_turns:]
+        core = [w for w in _words(_FOLLOWUP_START.sub("", current)) if w not in _ANAPHORA]
+        have = set(core)  # also dedups the carried words below
+        carried: List[str] = []
+        if not _course_entity(current):
+            for turn in reversed(previous):
+                course = _course_entity(turn)
+                if course:
+                    carried.extend(course.split())
+                    break
+        for turn in reversed(previous):
+            words = _content_words(turn)
+            if words:
+                carried.extend(words[:6])
+                break
+        return " ".join(core + [w for w in carried if w not in have and not have.add(w)])
+
+    async def _model_rewrite(self, user_turns: List[str], draft: str) -> Optional[str]:
+        if aiohttp is None:
+            return None
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession()
+        history = "\n".join(f"- {t.strip()}" for t in user_turns[-(self.history_turns + 1):])
+        payload = {
+            "model": self.model,
+            "temperature": 0,
+            "max_tokens": 48,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": (
+                        "Reescreve a última pergunta do utilizador como uma pesquisa web autónoma, "
+                        "com o curso, tema e ano implícitos nas perguntas anteriores. "
+                        "Responde apenas com a pesquisa, numa linha, sem aspas."
+                    ),
+                },
+                {"role": "user", "content": f"Perguntas (a última é a atual):\n{history}\n\nRascunho: {draft}"},
+            ],
+        }
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+        async with self._session.post(f"{self.base_url}/chat/completions", json=payload, headers=headers) as resp:
+            resp.raise_for_status()
+            data = await resp.json(content_type=None)
+        text = (data["choices"][0]["message"]["content"] or "").strip().splitlines()
+        query = text[0].strip().strip('"\'«»') if text else ""
+        return query[:200] or None
+
+    async def rewrite(self, chat_id: str, user_turns: List[str]) -> Rewrite:
+        """Rewrite the last of the user's turns (oldest first)."""
+        user_turns = [t for t in user_turns if t and t.strip()]
+        if not user_turns:
+            return Rewrite(query="", method="verbatim")
+        window = user_turns[-(self.history_turns + 1):]
+        key = (chat_id or "", hashlib.sha1("\x1f".join(window).encode("utf-8")).hexdigest())
+        memo = self.memo.get(key)
+        if memo is not None:
+            self.memo.move_to_end(key)
+            self.counters["memo_hits"] += 1
+            return Rewrite(query=memo.query, method=memo.method, cached=True)
+
+        current = window[-1].strip()
+        if len(window) == 1 or not self.needs_rewrite(current):
+            result = Rewrite(query=current, method="verbatim")
+        else:
+            result = Rewrite(query=self.extractive(window), method="extractive")
+            if self.model and self.base_url:
+                try:
+                    query = await asyncio.wait_for(
+                        self._model_rewrite(window, result.query), timeout=self.timeout_ms / 1000
+                    )
+                    if query:
+                        result = Rewrite(query=query, method="model")
+                except Exception:
+                    self.counters["model_failed"] += 1
+        self.counters[result.method] += 1
+
+        self.memo[key] = result
+        while len(self.memo) > self.max_entries:
+            self.memo.popitem(last=False)
+        return result
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+
+# ---- topic tracking --------------------------------------------------------------
+
+def hashed_bow(text: str, dims: int = 1024) -> Dict[int, float]:
+    """L2-normalized hashed bag of content words (sparse)."""
+    vec: Dict[int, float] = {}
+    for token in fold_tokens(text):
+        if token in _FOLDED_STOPWORDS or (len(token) <= 2 and not token.isdigit()):
+            continue
+        # Stemmed, so "propina" / "propinas" / "Propinas" land in the same bucket
+        w = stem(token)
+        h = int.from_bytes(hashlib.blake2b(w.encode("utf-8"), digest_size=4).digest(), "little") % dims
+        vec[h] = vec.get(h, 0.0) + 1.0
+    norm = math.sqrt(sum(v * v for v in vec.values()))
+    return {k: v / norm for k, v in vec.items()} if norm else {}
+
+
+def _sparse_cosine(a: Dict[int, float], b: Dict[int, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    dot = sum(v * b.get(k, 0.0) for k, v in a.items())
+    na = math.sqrt(sum(v * v for v in a.values()))
+    nb = math.sqrt(sum(v * v for v in b.values()))
+    return dot / (na * nb) if na and nb else 0.0
+
+
+def _dense_cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    na = math.sqrt(sum(x * x for x in a))
+    nb = math.sqrt(sum(y * y for y in b))
+    return dot / (na * nb) if na and nb else 0.0
+
+
+class OpenAIEmbedder:
+    """Embeddings from an OpenAI-compatible /embeddings endpoint; None on failure or timeout."""
+
+    def __init__(self, base_url: str, model: str, api_key: str = "", timeout_ms: float = 300.0):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.api_key = api_key
+        self.timeout_ms = timeout_ms
+        self._session = None
+
+    async def _embed(self, text: str) -> List[float]:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession()
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+        async with self._session.post(
+            f"{self.base_url}/embeddings", json={"model": self.model, "input": text}, headers=headers
+        ) as resp:
+            resp.raise_for_status()
+            data = await resp.json(content_type=None)
+        return data["data"][0]["embedding"]
+
+    async def __call__(self, text: str) -> Optional[List[float]]:
+        if aiohttp is None:
+            return None
+        try:
+            return await asyncio.wait_for(self._embed(text), timeout=self.timeout_ms / 1000)
+        except Exception:
+            return None
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+
+@dataclass
+class ChatTopic:
+    vector: Dict[int, float]
+    embedding: Optional[List[float]] = None
+    sources: str = ""             # formatted results fetched for this topic
+    sources_at: float = 0.0
+    turns: int = 1                # turns in the current topic
+    topics: int = 1               # topics seen in the chat
+
+
+@dataclass
+class TopicObservation:
+    shift: bool
+    similarity: Optional[float]
+    turns: int
+    sources: str                  # reusable sources ("" when there are none or they expired)
+
+
+class TopicTracker:
+    """Per-chat topic segments: a turn either continues the current topic or starts a new one."""
+
+    def __init__(
+        self,
+        threshold: float = 0.2,
+        embed_threshold: float = 0.75,
+        decay: float = 0.7,
+        max_topic_turns: int = 8,
+        max_source_age_s: float = 1800.0,
+        max_chats: int = 2048,
+        dims: int = 1024,
+        embed: Optional[Callable[[str], Awaitable[Optional[List[float]]]]] = None,
+    ):
+        self.threshold = threshold
+        self.embed_threshold = embed_threshold
+        self.decay = decay
+        self.max_topic_turns = max_topic_turns
+        self.max_source_age_s = max_source_age_s
+        self.max_chats = max_chats
+        self.dims = dims
+        self.embed = embed
+        self.chats: "OrderedDict[str, ChatTopic]" = OrderedDict()
+        self.counters = {"turns": 0, "shifts": 0, "reused": 0}
+
+    async def observe(self, chat_id: str, text: str) -> TopicObservation:
+        """Fold a turn into the chat's topic and report whether it shifted."""
+        self.counters["turns"] += 1
+        vector = hashed_bow(text, self.dims)
+        embedding = await self.embed(text) if self.embed is not None else None
+        state = self.chats.get(chat_id)
+
+        similarity = None
+        if state is not None and (vector or embedding):
+            if embedding is not None and state.embedding is not None and len(embedding) == len(state.embedding):
+                similarity = _dense_cosine(embedding, state.embedding)
+                shift = similarity < self.embed_threshold
+            else:
+                similarity = _sparse_cosine(vector, state.vector)
+                shift = similarity < self.threshold
+        else:
+            # First turn, or a turn without content words ("ok"): no evidence of a shift
+            shift = state is None
+
+        if state is None:
+            state = ChatTopic(vector=vector, embedding=embedding)
+        elif shift:
+            state = ChatTopic(vector=vector, embedding=embedding, topics=state.topics + 1)
+            self.counters["shifts"] += 1
+        else:
+            state.turns += 1
+            state.vector = self._blend(state.vector, vector)
+            if embedding is not None and state.embedding is not None and len(embedding) == len(state.embedding):
+                state.embedding = [self.decay * a + (1 - self.decay) * b for a, b in zip(state.embedding, embedding)]
+            elif embedding is not None:
+                state.embedding = embedding
+
+        self.chats[chat_id] = state
+        self.chats.move_to_end(chat_id)
+        while len(self.chats) > self.max_chats:
+            self.chats.popitem(last=False)
+
+        sources = ""
+        if (
+            not shift
+            and state.sources
+            and state.turns <= self.max_topic_turns
+            and time.time() - state.sources_at < self.max_source_age_s
+        ):
+            sources = state.sources
+            self.counters["reused"] += 1
+        return TopicObservation(
+            shift=shift,
+            similarity=round(similarity, 3) if similarity is not None else None,
+            turns=state.turns,
+            sources=sources,
+        )
+
+    def _blend(self, old: Dict[int, float], new: Dict[int, float]) -> Dict[int, float]:
+        if not new:
+            return old
+        keys = set(old) | set(new)
+        return {k: self.decay * old.get(k, 0.0) + (1 - self.decay) * new.get(k, 0.0) for k in keys}
+
+    def attach_sources(self, chat_id: str, sources: str) -> None:
+        """Remember the sources fetched for the chat's current topic (restarts its turn budget)."""
+        state = self.chats.get(chat_id)
+        if state is not None:
+            state.sources = sources
+            state.sources_at = time.time()
+            state.turns = 1
+
+
+# ---- pre-warming ----------------------------------------------------------------
+
+class DecisionLog:
+    """Searches the filter ran: (time, query, category, count), in memory and as JSONL."""
+
+    def __init__(self, path: str = "", max_entries: int = 5000):
+        self.path = path
+        self.entries: Deque[tuple] = deque(maxlen=max_entries)
+        self._load()
+
+    def _load(self) -> None:
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                lines = f.readlines()
+        except OSError:
+            return
+        for line in lines[-self.entries.maxlen:]:
+            try:
+                e = json.loads(line)
+                self.entries.append((float(e["t"]), e["q"], e["c"], int(e["n"])))
+            except (ValueError, KeyError, TypeError):
+                continue
+        if len(lines) > 2 * self.entries.maxlen:
+            self._compact()
+
+    def _compact(self) -> None:
+        tmp = f"{self.path}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                for t, q, c, n in self.entries:
+                    f.write(json.dumps({"t": t, "q": q, "c": c, "n": n}, ensure_ascii=False) + "\n")
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+
+    def record(self, query: str, category: str, count: int) -> None:
+        entry = (time.time(), normalize_query(query), category, int(count))
+        self.entries.append(entry)
+        if self.path:
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(dict(zip("tqcn", entry)), ensure_ascii=False) + "\n")
+            except OSError:
+                pass
+
+    def top(self, category: str, n: int, window_s: float, min_count: int = 1) -> List[Tuple[str, int, int]]:
+        """Most frequent (query, result count, hits) of a category within the window."""
+        since = time.time() - window_s
+        hits: Counter = Counter()
+        counts: Dict[str, int] = {}
+        for t, q, c, cnt in self.entries:
+            if c == category and t >= since:
+                hits[q] += 1
+                counts[q] = cnt  # the latest count, as the cache key uses it
+        return [(q, counts[q], h) for q, h in hits.most_common(n) if h >= min_count]
+
+
+class Prewarmer:
+    """Re-runs the hottest searches per category on a schedule, in the filter's event loop."""
+
+    def __init__(
+        self,
+        fanout: SearchFanout,
+        log: DecisionLog,
+        fetcher: Optional["PageFetcher"] = None,
+        intervals_s: Optional[Dict[str, float]] = None,
+        top_n: int = 5,
+        min_count: int = 3,
+        window_s: float = 86400.0,
+        concurrency: int = 2,
+        governor: Optional[QuotaGovernor] = None,
+    ):
+        self.fanout = fanout
+        self.governor = governor
+        self.log = log
+        self.fetcher = fetcher
+        self.intervals_s = intervals_s or {"simple_recent": 600, "simple": 1800, "complex": 3600, "default": 3600}
+        self.top_n = top_n
+        self.min_count = min_count
+        self.window_s = window_s
+        self.concurrency = concurrency
+        self.last_run: Dict[str, float] = {}
+        self.runs: List[dict] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def warm(self, category: str) -> dict:
+        """One pass over a category; returns a summary of what was refreshed."""
+        started = time.perf_counter()
+        queries = self.log.top(category, self.top_n, self.window_s, self.min_count)
+        if self.governor is not None and await self.governor.penalty() > 0:
+            # The budget is under pressure: keep it for real users
+            queries = []
+        limit = asyncio.Semaphore(self.concurrency)
+        pages = 0
+
+        async def one(query: str, count: int):
+            nonlocal pages
+            async with limit:
+                use_primary = True
+                if self.governor is not None:
+                    use_primary, _ = await self.governor.acquire(None)
+                if not use_primary and self.fanout.secondary is None:
+                    return
+                response = await self.fanout.search(query, count, refresh=True, use_primary=use_primary)
+                if self.fetcher is not None and response.results:
+                    fetched = await self.fetcher.fetch_many([r.url for r in response.results])
+                    pages += sum(1 for p in fetched if p is not None)
+
+        await asyncio.gather(*(one(q, n) for q, n, _ in queries), return_exceptions=True)
+        self.last_run[category] = time.time()
+        summary = {
+            "category": category,
+            "queries": len(queries),
+            "pages": pages,
+            "ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+        self.runs = (self.runs + [summary])[-50:]
+        return summary
+
+    def due(self) -> List[str]:
+        now = time.time()
+        return [c for c, every in self.intervals_s.items() if every and now - self.last_run.get(c, 0) >= every]
+
+    async def run_forever(self, tick_s: float = 30.0) -> None:
+        while True:
+            for category in self.due():
+                try:
+                    await self.warm(category)
+                except Exception as e:  # pragma: no cover
+                    print(f"[lusochat_search] Pre-warm of {category} failed: {e}")
+            await asyncio.sleep(tick_s)
+
+    def start(self) -> None:
+        """Start the schedule on the running loop (no-op if it is already running)."""
+        if self._task is None or self._task.done():
+            # Give the caches time to see some traffic before the first pass
+            for category in self.intervals_s:
+                self.last_run.setdefault(category, time.time())
+            self._task = asyncio.get_running_loop().create_task(self.run_forever())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+# ---- near-duplicates -----------------------------------------------------------
+
+_LANGUAGE_SEGMENTS = {"en", "pt", "pt-pt", "pt-br", "es", "fr", "de", "it", "english", "portugues"}
+_VARIANT_PARAMS = {"lang", "language", "locale", "hl", "print", "printable"}
+# These can also select a different page (index.php?view=article vs ?view=category)
+_LOOSE_VARIANT_PARAMS = {"view", "format", "output"}
+_PRINT_SEGMENTS = {"print", "imprimir"}
+
+
+def variant_key(url: str, loose: bool = False) -> str:
+    """URL with language segments and lang/print parameters removed (PT/EN mirrors, print views).
+
+    loose=True also removes view/format/output parameters and a trailing /print segment;
+    dedup_pages() only drops a loose match whose text is similar too.
+    """
+    parts = urlsplit(normalize_url("//" + url.split("://", 1)[-1]))
+    segments = [seg for seg in parts.path.split("/") if seg and seg.lower() not in _LANGUAGE_SEGMENTS]
+    params = _VARIANT_PARAMS
+    if loose:
+        params = params | _LOOSE_VARIANT_PARAMS
+        if segments and segments[-1].lower() in _PRINT_SEGMENTS:
+            segments.pop()
+    query = urlencode([(k, v) for k, v in parse_qsl(parts.query) if k.lower() not in params])
+    return urlunsplit(("", parts.netloc, "/" + "/".join(segments), query, ""))
+
+
+def simhash(text: str, shingle: int = 3, max_words: int = 3000) -> int:
+    """64-bit SimHash over word shingles of the text's content words."""
+    words = _content_words(text)[:max_words]
+    if not words:
+        return 0
+    grams = [" ".join(words[i:i + shingle]) for i in range(max(1, len(words) - shingle + 1))]
+    weights = [0] * 64
+    for gram, count in Counter(grams).items():
+        h = int.from_bytes(hashlib.blake2b(gram.encode("utf-8"), digest_size=8).digest(), "little")
+        for bit in range(64):
+            weights[bit] += count if h >> bit & 1 else -count
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def dedup_pages(
+    results: List[SearchResult],
+    pages: List[Optional[Page]],
+    similarity: float = 0.9,
+) -> Tuple[List[SearchResult], List[Optional[Page]], List[SearchResult]]:
+    """Drop near-duplicate results, keeping the best-ranked copy: (results, pages, dropped).
+
+    similarity is the share of matching SimHash bits (0.9 = at most 6 of 64 bits differ).
+    A language or print variant of a kept URL is dropped outright. A loose variant
+    (other view/format, /print path) is dropped only when its text is within twice that
+    budget, since a print view loses the page chrome but the same URL family can also
+    hold different pages.
+    """
+    max_distance = int(round((1.0 - similarity) * 64))
+    kept_results: List[SearchResult] = []
+    kept_pages: List[Optional[Page]] = []
+    dropped: List[SearchResult] = []
+    seen_variants = set()
+    seen_hashes: List[int] = []
+    seen_loose: Dict[str, List[int]] = {}
+    for i, result in enumerate(results):
+        page = pages[i] if i < len(pages) else None
+        key, loose_key = variant_key(result.url), variant_key(result.url, loose=True)
+        duplicate = key in seen_variants
+        if not duplicate and page is not None and page.simhash:
+            duplicate = any(hamming(page.simhash, h) <= max_distance for h in seen_hashes) or any(
+                hamming(page.simhash, h) <= 2 * max_distance for h in seen_loose.get(loose_key, ())
+            )
+        if duplicate:
+            dropped.append(result)
+            continue
+        seen_variants.add(key)
+        if page is not None and page.simhash:
+            seen_hashes.append(page.simhash)
+            seen_loose.setdefault(loose_key, []).append(page.simhash)
+        kept_results.append(result)
+        kept_pages.append(page)
+    return kept_results, kept_pages, dropped
+
+
+def format_results(
+    results: List[SearchResult],
+    header: str = "Web search results",
+    pages: Optional[List[Optional[Page]]] = None,
+    excerpt_chars: int = 1200,
+) -> str:
+    """Numbered source list to append to the system prompt (with page excerpts if fetched)."""
+    lines = [f"{header}:"]
+    for i, r in enumerate(results, 1):
+        lines.append(f"[{i}] {r.title} — {r.url}")
+        page = pages[i - 1] if pages and i - 1 < len(pages) else None
+        if page is not None and page.text:
+            lines.append("    " + page.text[:excerpt_chars].replace("\n", "\n    "))
+        elif r.snippet:
+            lines.append(f"    {r.snippet.strip()}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":  # pragma: no cover
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run one hedged PSE + SearXNG search")
+    parser.add_argument("query")
+    parser.add_argument("--pse-key", default="")
+    parser.add_argument("--pse-cx", default="")
+    parser.add_argument("--searxng-url", default="http://localhost:8083")
+    parser.add_argument("--mode", choices=["hedge", "parallel"], default="hedge")
+    parser.add_argument("--count", type=int, default=5)
+    parser.add_argument("--fetch", action="store_true", help="Also fetch the result pages (twice, to show the cache)")
+    args = parser.parse_args()
+
+    async def run():
+        searxng = SearXNG(args.searxng_url)
+        primary, secondary = (GooglePSE(args.pse_key, args.pse_cx), searxng) if args.pse_key else (searxng, None)
+        fanout = SearchFanout(primary, secondary, mode=args.mode)
+        response = await fanout.search(args.query, args.count)
+        pages = None
+        if args.fetch:
+            fetcher = PageFetcher(fresh_s=0)
+            for attempt in ("cold", "revalidate"):
+                started = time.perf_counter()
+                pages = await fetcher.fetch_many([r.url for r in response.results])
+                print(f"{attempt}: {(time.perf_counter() - started) * 1000:.0f} ms "
+                      f"{[p.source if p else None for p in pages]}")
+            print(json.dumps(fetcher.metrics(), indent=2))
+            await fetcher.close()
+        print(format_results(response.results, pages=pages, excerpt_chars=300))
+        print(json.dumps({"winner": response.winner, "latency_ms": response.latency_ms, "hedged": response.hedged,
+                          "backend_ms": response.backend_ms, "errors": response.errors}, indent=2))
+        print(json.dumps(fanout.metrics(), indent=2))
+        await fanout.close()
+
+    asyncio.run(run())
@@ -2,7 +2,7 @@
 id: smart_google_pse_web_search
 title: Smart_Google_PSE_Web_Search
 author: LusoChat
-version: 0.1.0
+version: 0.2.0
 license: MIT
 description: Conditionally enable Web Search using Google PSE based on the user's query and simple heuristics (RAG-first). Supports modes: off, auto, always_on. Emits status events explaining the decision.
 requirements:
@@ -16,6 +16,22 @@ Notes:
 - In auto mode, it runs quick heuristics to avoid searches for common "local knowledge" questions (e.g., known contacts) and enables search for time-sensitive or policy/process queries.
 - Emits a status event indicating skip/enable/cause so you can observe behavior in the stream.
 - Optionally invokes OpenWebUI's built-in chat_web_search_handler to prefetch results when search is enabled.
+- search_backend=fanout searches through lusochat_search (mounted into the container by
+  .lusochat-ldap/docker-compose.yaml): Google PSE hedged with the bundled SearXNG, results
+  appended to the system prompt instead of the built-in web search.
+- With quota on, every PSE search is charged to a per-user token bucket and a daily budget
+  (lusochat_search.QuotaGovernor, shared with the always-on filter). As the budget drains,
+  auto mode lowers its effective aggressiveness; when it is spent, searches are skipped
+  (or go to SearXNG only in fanout mode) instead of failing slowly.
+- With query_rewrite on, follow-ups like "e quando?" are rewritten into a standalone query from
+  the last few turns (lusochat_search.QueryRewriter: extractive, optionally a small model with a
+  strict timeout), memoized per chat. The fan-out searches with, and caches under, the rewrite.
+- With topic_tracking on (fanout), each chat keeps a rolling topic vector
+  (lusochat_search.TopicTracker). Turns within the topic reuse the sources already fetched
+  for it; only a topic shift can trigger a new search. This replaces the follow-up cooldown.
+- Keyword matching is accent-, case- and inflection-insensitive when lusochat_search is available
+  (admissão/admissao/admissões, inscrição/inscrevi-me): each valve list is normalized once and the
+  query once per request. Listing both accented and plural forms is no longer needed.
 
 Tested against OpenWebUI 0.3x APIs; adjust imports if upstream API changes.
 """
@@ -24,6 +40,7 @@ from __future__ import annotations
 
 from typing import Any, Awaitable, Callable, Optional, List, Tuple
 from pydantic import BaseModel, Field
+import os
 import re
 
 try:
@@ -35,6 +52,11 @@ except Exception:  # pragma: no cover
     chat_web_search_handler = None
     UserModel = None
 
+try:
+    import lusochat_search
+except Exception:  # pragma: no cover
+    lusochat_search = None
+
 
 class Filter:
     """Smart Web Search controller for Google PSE in OpenWebUI.
@@ -53,6 +75,11 @@ class Filter:
     )
     type = "filter"
 
+    QUOTA_MESSAGES = {
+        "user_quota": "your web search quota is used up for now",
+        "daily_budget": "daily web search budget used up",
+    }
+
     class Valves(BaseModel):
         status: bool = Field(
             default=True, description="Enable/disable this filter"
@@ -240,9 +267,141 @@ class Filter:
             default=None,
             description="Optional override for search result count (if supported by current OpenWebUI build)",
         )
+        # Search backend
+        search_backend: str = Field(
+            default="openwebui",
+            description="openwebui (built-in web search) | fanout (Google PSE hedged with SearXNG via lusochat_search)",
+        )
+        pse_api_key: str = Field(
+            default="", description="Fanout: Google PSE API key (blank = Admin > Settings > Web Search)"
+        )
+        pse_engine_id: str = Field(
+            default="", description="Fanout: Google PSE engine id (blank = Admin > Settings > Web Search)"
+        )
+        searxng_url: str = Field(
+            default="http://searxng:8080", description="Fanout: SearXNG base URL (blank = PSE only)"
+        )
+        fanout_mode: str = Field(
+            default="hedge",
+            description="Fanout: hedge (SearXNG only when PSE is slow or thin) | parallel (query both at once)",
+        )
+        hedge_delay_ms: int = Field(
+            default=0, description="Fanout: wait this long for PSE before asking SearXNG (0 = PSE's observed p95)"
+        )
+        min_results: int = Field(
+            default=2, description="Fanout: a backend answer with at least this many results is sufficient"
+        )
+        search_timeout_s: float = Field(
+            default=6.0, description="Fanout: give up on the backends after this many seconds"
+        )
+        fetch_pages: bool = Field(
+            default=True, description="Fanout: fetch the result pages and add an excerpt of each (cached, revalidated)"
+        )
+        page_excerpt_chars: int = Field(
+            default=1200, description="Fanout: characters of page text added per result"
+        )
+        page_fresh_s: int = Field(
+            default=300, description="Fanout: serve a cached page without revalidation for this many seconds"
+        )
+        page_deadline_s: float = Field(
+            default=4.0, description="Fanout: hard deadline per page fetch (the snippet is used instead)"
+        )
+        dedup_similarity: float = Field(
+            default=0.9,
+            description="Fanout: drop fetched pages this similar (SimHash) to a better-ranked one, and PT/EN or print variants (0 = off)",
+        )
+        result_cache_s: int = Field(
+            default=900, description="Fanout: reuse a search answer for the same query for this many seconds (0 = off)"
+        )
+        # Pre-warming (fanout only)
+        prewarm: bool = Field(
+            default=True,
+            description="Fanout: periodically re-run the most frequent searches so the caches are hot before peaks (each re-run costs a PSE query)",
+        )
+        prewarm_interval_recent_s: int = Field(
+            default=600, description="Pre-warm: interval for simple_recent queries (prazos/propinas with a year)"
+        )
+        prewarm_interval_s: int = Field(
+            default=3600, description="Pre-warm: interval for the other categories"
+        )
+        prewarm_top_n: int = Field(
+            default=5, description="Pre-warm: queries per category"
+        )
+        prewarm_min_count: int = Field(
+            default=3, description="Pre-warm: only queries seen at least this often in the last 24h"
+        )
+        decision_log_path: str = Field(
+            default="/app/backend/data/lusochat_search_decisions.jsonl",
+            description="Pre-warm: where searches are logged (blank = memory only)",
+        )
+        # PSE quota governor (needs lusochat_search)
+        quota: bool = Field(
+            default=True, description="Ration Google PSE queries per user and per day"
+        )
+        quota_daily_budget: int = Field(
+            default=100, description="Quota: PSE queries per day for all users (match your Google quota)"
+        )
+        quota_user_capacity: int = Field(
+            default=10, description="Quota: PSE queries a user can burst"
+        )
+        quota_user_refill_per_hour: float = Field(
+            default=5.0, description="Quota: PSE queries a user gets back per hour"
+        )
+        quota_redis_url: str = Field(
+            default="",
+            description="Quota: Redis shared by all workers (blank = REDIS_URL, else per-process counters)",
+        )
+        quota_adjust_aggressiveness: bool = Field(
+            default=True,
+            description="Quota: lower the effective aggressiveness (up to -3) as the daily budget drains",
+        )
+        # Query rewriting (fanout only; the built-in search generates its own queries)
+        query_rewrite: bool = Field(
+            default=True,
+            description="Rewrite follow-ups ('e quando?') into a standalone search query from the last turns",
+        )
+        rewrite_model: str = Field(
+            default="", description="Rewrite: small model for follow-ups (blank = extractive only)"
+        )
+        rewrite_base_url: str = Field(
+            default="http://litellm:4000/v1", description="Rewrite: OpenAI-compatible endpoint serving rewrite_model"
+        )
+        rewrite_api_key: str = Field(
+            default="", description="Rewrite: API key for rewrite_base_url"
+        )
+        rewrite_timeout_ms: int = Field(
+            default=800, description="Rewrite: give up on the model after this long and use the extractive rewrite"
+        )
+        # Topic tracking (fanout only)
+        topic_tracking: bool = Field(
+            default=True,
+            description="Search once per topic: reuse the topic's sources for in-topic turns, search again on a topic shift",
+        )
+        topic_threshold: float = Field(
+            default=0.2, description="Topic: bag-of-words similarity below which a turn starts a new topic"
+        )
+        topic_max_turns: int = Field(
+            default=8, description="Topic: search again after this many turns on the same sources"
+        )
+        topic_embedding_model: str = Field(
+            default="",
+            description="Topic: embedding model served at rewrite_base_url (blank = hashed bag of words)",
+        )
+        topic_embedding_threshold: float = Field(
+            default=0.75, description="Topic: embedding similarity below which a turn starts a new topic"
+        )
 
     def __init__(self):
         self.valves = self.Valves()
+        self._fanout = None
+        self._fanout_key: Optional[tuple] = None
+        self._fetcher = None
+        self._decisions = None
+        self._prewarmer = None
+        self._rewriter = None
+        self._rewriter_key: Optional[tuple] = None
+        self._topics = None
+        self._topics_key: Optional[tuple] = None
 
     # ---- helpers ----
     async def emit_status(
@@ -263,6 +422,17 @@ class Filter:
                 }
             )
 
+    def _get_user_turns(self, body: dict) -> List[str]:
+        turns = []
+        for m in body.get("messages") or []:
+            if (m.get("role") or "").lower() == "user":
+                content = m.get("content")
+                if isinstance(content, list) and content and isinstance(content[0], dict):
+                    content = content[0].get("text", "")
+                if isinstance(content, str) and content.strip():
+                    turns.append(content)
+        return turns
+
     def _get_last_user_text(self, body: dict) -> str:
         msgs = body.get("messages") or []
         for m in reversed(msgs):
@@ -281,6 +451,9 @@ class Filter:
     def _contains_any(self, text: str, words: List[str]) -> int:
         if not text or not words:
             return 0
+        if lusochat_search is not None:
+            # Normalized tokens; forms that normalize alike count once
+            return lusochat_search.compile_keywords(tuple(words)).count(text)
         score = 0
         lowered = text.lower()
         for w in words:
@@ -376,7 +549,9 @@ class Filter:
         # Consider intent present if either set is hit; stronger if both
         return (resource > 0) or (domain > 0)
 
-    def _decide_auto(self, text: str, body: dict) -> Tuple[bool, str]:
+    def _decide_auto(
+        self, text: str, body: dict, penalty: int = 0, topic_shift: Optional[bool] = None
+    ) -> Tuple[bool, str]:
         # Basic guardrails
         if not text:
             return False, "empty_text"
@@ -394,7 +569,12 @@ class Filter:
             return False, "no_domain_intent"
 
         # Follow-up cooldown: if we recently provided links and this looks anaphoric/vague, skip
-        if self.valves.followup_cooldown_turns > 0 and self._recent_assistant_had_links(body, self.valves.followup_cooldown_turns):
+        # (the topic tracker, when active, decides this instead)
+        if (
+            topic_shift is None
+            and self.valves.followup_cooldown_turns > 0
+            and self._recent_assistant_had_links(body, self.valves.followup_cooldown_turns)
+        ):
             if self.valves.penalize_anaphora and self._is_anaphoric(text):
                 return False, "cooldown_followup"
 
@@ -461,9 +641,12 @@ class Filter:
                 score += 1
 
         # Aggressiveness and final threshold
-        score += int(self.valves.aggressiveness)
+        # Quota penalty: as the PSE budget drains only the highest-scoring queries search
+        score += int(self.valves.aggressiveness) - penalty
         enable = score >= int(self.valves.force_threshold)
         reason = f"score={score}, force={force_hits}, skip={skip_hits}, aggr={self.valves.aggressiveness}, thr={self.valves.force_threshold}"
+        if penalty:
+            reason += f", quota_penalty={penalty}"
         return enable, reason
 
     def _classify_category(self, text: str) -> Tuple[str, int]:
@@ -524,6 +707,7 @@ class Filter:
         __request__: Any,
         __user__: Optional[dict] = None,
         __model__: Optional[dict] = None,
+        __metadata__: Optional[dict] = None,
     ) -> dict:
         """Decide whether to enable web search and optionally prefetch using OpenWebUI's handler.
 
@@ -554,9 +738,38 @@ class Filter:
                 )
                 return body
 
+            # Same topic as the last search: reuse its sources instead of searching again
+            chat_id = (__metadata__ or {}).get("chat_id") or body.get("chat_id") or ""
+            topic = await self._observe_topic(body, __metadata__, chat_id)
+            if topic is not None and topic.sources:
+                self._append_to_system_prompt(body, topic.sources)
+                features["web_search"] = False
+                body["features"] = features
+                await self.emit_status(
+                    __event_emitter__,
+                    level="info",
+                    message=(
+                        f"Smart search: reusing this topic's sources (turn {topic.turns})"
+                        + (f" — similarity={topic.similarity}" if self.valves.debug_decision else "")
+                    ),
+                    done=True,
+                )
+                return body
+
             if mode == "always_on":
-                features["web_search"] = True
                 body["features"] = features
+                query = await self._search_query(body, __metadata__)
+                admission, why = await self._admit_search(__request__, body, __user__, query)
+                if admission == "denied":
+                    features["web_search"] = False
+                    await self.emit_status(
+                        __event_emitter__,
+                        level="info",
+                        message=f"Smart search: skipped ({self.QUOTA_MESSAGES.get(why, why)})",
+                        done=True,
+                    )
+                    return body
+                features["web_search"] = True
                 await self.emit_status(
                     __event_emitter__,
                     level="info",
@@ -564,17 +777,26 @@ class Filter:
                     done=True,
                 )
                 if self.valves.prefetch:
-                    await self._maybe_prefetch(__request__, body, __event_emitter__, __user__)
+                    await self._search(__request__, body, __event_emitter__, __user__, admission == "full", query, chat_id)
                 return body
 
             # Auto mode
-            enable, reason = self._decide_auto(msg_text, body)
+            enable, reason = self._decide_auto(
+                msg_text, body, await self._quota_penalty(), topic.shift if topic is not None else None
+            )
             category, cat_count = self._classify_category(msg_text)
-            features["web_search"] = bool(enable)
             # If enabling search and no explicit override set, apply category-based count
             if enable and self.valves.max_result_count_override is None:
                 features["web_search_result_count"] = int(cat_count)
             body["features"] = features
+            admission, query = "full", msg_text
+            if enable:
+                query = await self._search_query(body, __metadata__)
+                admission, why = await self._admit_search(__request__, body, __user__, query)
+                if admission == "denied":
+                    enable = False
+                    reason = f"{reason}, quota={why}"
+            features["web_search"] = bool(enable)
 
             if enable:
                 await self.emit_status(
@@ -590,13 +812,17 @@ class Filter:
                 if self.valves.debug_decision:
                     features["web_search_reason"] = reason
                 if self.valves.prefetch:
-                    await self._maybe_prefetch(__request__, body, __event_emitter__, __user__)
+                    await self._search(__request__, body, __event_emitter__, __user__, admission == "full", query, chat_id)
             else:
                 await self.emit_status(
                     __event_emitter__,
                     level="info",
                     message=(
-                        "Smart search: skipped (RAG/local likely sufficient)"
+                        (
+                            f"Smart search: skipped ({self.QUOTA_MESSAGES.get(why, why)})"
+                            if admission == "denied"
+                            else "Smart search: skipped (RAG/local likely sufficient)"
+                        )
                         + (f" — cat={category}" if self.valves.debug_decision else "")
                         + (f" — {reason}" if self.valves.debug_decision else "")
                     ),
@@ -610,6 +836,318 @@ class Filter:
 
         return body
 
+    async def _search(
+        self,
+        __request__: Any,
+        body: dict,
+        __event_emitter__: Callable[[Any], Awaitable[None]],
+        __user__: Optional[dict],
+        use_pse: bool = True,
+        query: str = "",
+        chat_id: str = "",
+    ) -> None:
+        """Run the configured search backend; fanout falls back to the built-in handler.
+
+        use_pse=False (PSE quota spent) searches SearXNG only, without the fallback.
+        """
+        if (self.valves.search_backend or "openwebui").lower() == "fanout":
+            if lusochat_search is None:
+                print("[Smart Google PSE Filter] INFO: lusochat_search not importable; using built-in web search.")
+            elif await self._fanout_search(__request__, body, __event_emitter__, use_pse, query, chat_id):
+                return
+        if not use_pse:
+            # The built-in search would spend a PSE query the quota has not granted
+            (body.get("features") or {})["web_search"] = False
+            return
+        await self._maybe_prefetch(__request__, body, __event_emitter__, __user__)
+
+    def _get_governor(self):
+        if not self.valves.quota or lusochat_search is None:
+            return None
+        return lusochat_search.get_governor(
+            daily_budget=int(self.valves.quota_daily_budget),
+            user_capacity=int(self.valves.quota_user_capacity),
+            user_refill_per_hour=float(self.valves.quota_user_refill_per_hour),
+            redis_url=self.valves.quota_redis_url or os.environ.get("REDIS_URL", ""),
+        )
+
+    async def _quota_penalty(self) -> int:
+        governor = self._get_governor()
+        if governor is None or not self.valves.quota_adjust_aggressiveness:
+            return 0
+        try:
+            return await governor.penalty()
+        except Exception as e:  # pragma: no cover
+            print(f"[Smart Google PSE Filter] Quota error: {e}")
+            return 0
+
+    def _get_rewriter(self):
+        key = (
+            self.valves.rewrite_model,
+            self.valves.rewrite_base_url,
+            self.valves.rewrite_api_key,
+            self.valves.rewrite_timeout_ms,
+        )
+        if self._rewriter is None or self._rewriter_key != key:
+            previous = self._rewriter
+            self._rewriter = lusochat_search.QueryRewriter(
+                model=self.valves.rewrite_model,
+                base_url=self.valves.rewrite_base_url,
+                api_key=self.valves.rewrite_api_key,
+                timeout_ms=float(self.valves.rewrite_timeout_ms),
+            )
+            if previous is not None:
+                # New settings, same connection pool
+                self._rewriter._session = previous._session
+            self._rewriter_key = key
+        return self._rewriter
+
+    def _append_to_system_prompt(self, body: dict, block: str) -> None:
+        messages = body.setdefault("messages", [])
+        if messages and (messages[0].get("role") or "").lower() == "system" and isinstance(messages[0].get("content"), str):
+            messages[0]["content"] = f"{messages[0]['content']}\n\n{block}"
+        else:
+            messages.insert(0, {"role": "system", "content": block})
+
+    async def _observe_topic(self, body: dict, __metadata__: Optional[dict], chat_id: str):
+        """Fold this turn into the chat's topic; None when topic tracking does not apply."""
+        if (
+            not self.valves.topic_tracking
+            or lusochat_search is None
+            or not chat_id
+            or (self.valves.search_backend or "openwebui").lower() != "fanout"
+        ):
+            return None
+        key = (
+            self.valves.topic_threshold,
+            self.valves.topic_max_turns,
+            self.valves.topic_embedding_model,
+            self.valves.topic_embedding_threshold,
+            self.valves.rewrite_base_url,
+            self.valves.rewrite_api_key,
+        )
+        if self._topics is None or self._topics_key != key:
+            embed = None
+            if self.valves.topic_embedding_model:
+                embed = lusochat_search.OpenAIEmbedder(
+                    self.valves.rewrite_base_url, self.valves.topic_embedding_model, self.valves.rewrite_api_key
+                )
+            previous = self._topics
+            self._topics = lusochat_search.TopicTracker(
+                threshold=float(self.valves.topic_threshold),
+                embed_threshold=float(self.valves.topic_embedding_threshold),
+                max_topic_turns=int(self.valves.topic_max_turns),
+                embed=embed,
+            )
+            if previous is not None:
+                self._topics.chats = previous.chats
+            self._topics_key = key
+        try:
+            # The rewrite carries a follow-up's topic words, so "e quando?" stays in topic
+            return await self._topics.observe(chat_id, await self._search_query(body, __metadata__))
+        except Exception as e:  # pragma: no cover
+            print(f"[Smart Google PSE Filter] Topic tracking error: {e}")
+            return None
+
+    async def _search_query(self, body: dict, __metadata__: Optional[dict]) -> str:
+        """Standalone search query for the last user turn (memoized per chat)."""
+        text = self._get_last_user_text(body)
+        if not self.valves.query_rewrite or lusochat_search is None:
+            return text
+        chat_id = (__metadata__ or {}).get("chat_id") or body.get("chat_id") or ""
+        try:
+            rewrite = await self._get_rewriter().rewrite(chat_id, self._get_user_turns(body))
+        except Exception as e:  # pragma: no cover
+            print(f"[Smart Google PSE Filter] Rewrite error: {e}")
+            return text
+        return rewrite.query or text
+
+    async def _admit_search(
+        self, __request__: Any, body: dict, __user__: Optional[dict], query: str = ""
+    ) -> Tuple[str, str]:
+        """Charge one PSE query to the quota: ("full" | "secondary" | "denied", reason).
+
+        Cached fan-out answers and SearXNG-only fan-outs cost no PSE query. When the quota
+        is spent, a fan-out with SearXNG still searches ("secondary").
+        """
+        governor = self._get_governor()
+        if governor is None:
+            return "full", "ok"
+        fanout = None
+        if (self.valves.search_backend or "openwebui").lower() == "fanout":
+            fanout = self._get_fanout(__request__)
+            if fanout is not None:
+                features = body.get("features") or {}
+                count = int(features.get("web_search_result_count") or self.valves.result_count_default)
+                if fanout.primary.name != "pse" or fanout.is_cached(query or self._get_last_user_text(body), count):
+                    return "full", "ok"
+        try:
+            allowed, why = await governor.acquire(str((__user__ or {}).get("id") or "anonymous"))
+        except Exception as e:  # pragma: no cover
+            print(f"[Smart Google PSE Filter] Quota error: {e}")
+            return "full", "ok"
+        if allowed:
+            return "full", why
+        if fanout is not None and fanout.secondary is not None:
+            return "secondary", why
+        return "denied", why
+
+    def _get_fanout(self, __request__: Any):
+        """Build (or reuse) the fan-out; it is rebuilt only when the valves change."""
+        config = getattr(getattr(getattr(__request__, "app", None), "state", None), "config", None)
+        api_key = self.valves.pse_api_key or getattr(config, "GOOGLE_PSE_API_KEY", "") or ""
+        engine_id = self.valves.pse_engine_id or getattr(config, "GOOGLE_PSE_ENGINE_ID", "") or ""
+        key = (
+            api_key,
+            engine_id,
+            self.valves.searxng_url,
+            self.valves.fanout_mode,
+            self.valves.hedge_delay_ms,
+            self.valves.min_results,
+            self.valves.search_timeout_s,
+            self.valves.result_cache_s,
+        )
+        if self._fanout is not None and self._fanout_key == key:
+            return self._fanout
+
+        backends = []
+        if api_key and engine_id:
+            backends.append(lusochat_search.GooglePSE(api_key, engine_id))
+        if self.valves.searxng_url:
+            backends.append(lusochat_search.SearXNG(self.valves.searxng_url))
+        if not backends:
+            return None
+        # Only the configuration changed: keep the latency history for the hedge delay
+        previous = self._fanout
+        self._fanout = lusochat_search.SearchFanout(
+            backends[0],
+            backends[1] if len(backends) > 1 else None,
+            mode=(self.valves.fanout_mode or "hedge").lower(),
+            hedge_delay_ms=self.valves.hedge_delay_ms or None,
+            min_results=int(self.valves.min_results),
+            timeout_s=float(self.valves.search_timeout_s),
+            result_ttl_s=float(self.valves.result_cache_s),
+        )
+        if previous is not None:
+            for name, stats in previous.stats.items():
+                if name in self._fanout.stats:
+                    self._fanout.stats[name] = stats
+        self._fanout_key = key
+        return self._fanout
+
+    def _get_fetcher(self):
+        """Shared page fetcher (connection pool and page cache live across requests)."""
+        if self._fetcher is None:
+            try:
+                self._fetcher = lusochat_search.PageFetcher()
+            except Exception as e:  # pragma: no cover
+                print(f"[Smart Google PSE Filter] Page fetcher unavailable: {e}")
+                return None
+        self._fetcher.fresh_s = float(self.valves.page_fresh_s)
+        self._fetcher.deadline_s = float(self.valves.page_deadline_s)
+        return self._fetcher
+
+    def _ensure_prewarmer(self, fanout) -> None:
+        """Log-driven pre-warming; the schedule runs as a task in the server's event loop."""
+        if self._decisions is None or self._decisions.path != self.valves.decision_log_path:
+            self._decisions = lusochat_search.DecisionLog(self.valves.decision_log_path)
+        if not self.valves.prewarm:
+            if self._prewarmer is not None:
+                self._prewarmer.stop()
+                self._prewarmer = None
+            return
+        if self._prewarmer is None:
+            self._prewarmer = lusochat_search.Prewarmer(fanout, self._decisions)
+        p = self._prewarmer
+        p.fanout, p.log = fanout, self._decisions
+        p.governor = self._get_governor() if fanout.primary.name == "pse" else None
+        p.fetcher = self._get_fetcher() if self.valves.fetch_pages else None
+        p.intervals_s = {
+            "simple_recent": self.valves.prewarm_interval_recent_s,
+            "simple": self.valves.prewarm_interval_s,
+            "complex": self.valves.prewarm_interval_s,
+            "default": self.valves.prewarm_interval_s,
+        }
+        p.top_n = int(self.valves.prewarm_top_n)
+        p.min_count = int(self.valves.prewarm_min_count)
+        p.start()
+
+    async def _fanout_search(
+        self,
+        __request__: Any,
+        body: dict,
+        __event_emitter__: Callable[[Any], Awaitable[None]],
+        use_pse: bool = True,
+        query: str = "",
+        chat_id: str = "",
+    ) -> bool:
+        """Search through lusochat_search and append the results to the system prompt.
+
+        Returns False when nothing was found, so the built-in web search still runs.
+        """
+        try:
+            fanout = self._get_fanout(__request__)
+            query = query or self._get_last_user_text(body)
+            if fanout is None or not query:
+                return False
+            features = body.get("features") or {}
+            count = int(features.get("web_search_result_count") or self.valves.result_count_default)
+            response = await fanout.search(query, count, use_primary=use_pse)
+            self._ensure_prewarmer(fanout)
+            self._decisions.record(query, self._classify_category(query)[0], count)
+        except Exception as e:  # pragma: no cover
+            print(f"[Smart Google PSE Filter] Fanout error: {e}")
+            return False
+
+        if not response.results:
+            if response.errors:
+                print(f"[Smart Google PSE Filter] Fanout found nothing: {response.errors}")
+            return False
+
+        results, pages, dropped = response.results, None, []
+        fetcher = self._get_fetcher() if self.valves.fetch_pages else None
+        if fetcher is not None:
+            pages = await fetcher.fetch_many([r.url for r in results])
+            if self.valves.dedup_similarity > 0:
+                results, pages, dropped = lusochat_search.dedup_pages(
+                    results, pages, float(self.valves.dedup_similarity)
+                )
+        block = lusochat_search.format_results(
+            results, pages=pages, excerpt_chars=int(self.valves.page_excerpt_chars)
+        )
+        self._append_to_system_prompt(body, block)
+        if chat_id and self._topics is not None:
+            self._topics.attach_sources(chat_id, block)
+        # The results are in the prompt already; don't let the pipeline search again
+        features["web_search"] = False
+        body["features"] = features
+
+        if response.cached:
+            message = f"Web search: {len(results)} cached results from {response.winner}"
+        else:
+            message = (
+                f"Web search: {len(results)} results from {response.winner} "
+                f"in {response.latency_ms:.0f} ms" + (" (hedged)" if response.hedged else "")
+            )
+        if dropped:
+            message += f", {len(dropped)} duplicate{'s' if len(dropped) > 1 else ''} dropped"
+        if self.valves.debug_decision:
+            if query.strip() != self._get_last_user_text(body).strip():
+                message += f" — query: {query}"
+            m = fanout.metrics()
+            rates = ", ".join(
+                f"{name} win={s['win_rate']} p95={s['p95_ms']}ms" for name, s in m["backends"].items()
+            )
+            message += f" — hedge delay {m['hedge_delay_ms']} ms; {rates}"
+            if pages is not None:
+                sources = [p.source if p else "failed" for p in pages]
+                message += "; pages " + ", ".join(f"{src}={sources.count(src)}" for src in sorted(set(sources)))
+            if self._prewarmer is not None and self._prewarmer.runs:
+                last = self._prewarmer.runs[-1]
+                message += f"; last pre-warm {last['category']}: {last['queries']} queries, {last['pages']} pages"
+        await self.emit_status(__event_emitter__, level="info", message=message, done=True)
+        return True
+
     async def _maybe_prefetch(
         self,
         __request__: Any,
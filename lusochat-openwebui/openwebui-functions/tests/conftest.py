@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# lusochat_search is imported as a top-level module, as inside the OpenWebUI backend
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
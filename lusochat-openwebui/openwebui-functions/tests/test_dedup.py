@@ -0,0 +1,77 @@
+"""URL-variant and SimHash deduplication of fetched pages."""
+
+import random
+
+import lusochat_search as ls
+
+ARTICLE = ("As propinas da licenciatura em Engenharia Informática para o ano letivo 2025/2026 "
+           "são pagas em dez prestações mensais, com desconto para pagamento anual antecipado. ") * 6
+CATEGORY = ("Notícias da Universidade Lusófona: abertura de candidaturas, eventos de investigação, "
+            "prémios de estudantes e parcerias internacionais com outras instituições. ") * 6
+
+
+def result(url, rank):
+    return ls.SearchResult(url, url, "", "pse", rank)
+
+
+def page(url, text):
+    return ls.Page(url=url, title="", text=text, simhash=ls.simhash(text))
+
+
+def dedup(entries, similarity=0.9):
+    results = [result(url, i) for i, (url, _) in enumerate(entries)]
+    pages = [page(url, text) if text is not None else None for url, text in entries]
+    kept, _, dropped = ls.dedup_pages(results, pages, similarity)
+    return [r.url for r in kept], [r.url for r in dropped]
+
+
+def test_language_and_print_variants_are_dropped_without_text():
+    kept, dropped = dedup([
+        ("https://www.ulusofona.pt/propinas", ARTICLE),
+        ("https://www.ulusofona.pt/en/propinas", None),
+        ("https://ulusofona.pt/propinas?lang=en&utm_source=x", CATEGORY),
+        ("https://www.ulusofona.pt/propinas?print=1", None),
+    ])
+    assert kept == ["https://www.ulusofona.pt/propinas"]
+    assert len(dropped) == 3
+
+
+def test_view_parameter_does_not_merge_different_pages():
+    kept, dropped = dedup([
+        ("https://www.ulusofona.pt/index.php?view=article&id=5", ARTICLE),
+        ("https://www.ulusofona.pt/index.php?view=category&id=5", CATEGORY),
+    ])
+    assert dropped == []
+    assert len(kept) == 2
+
+
+def test_loose_variant_is_dropped_when_the_text_matches():
+    words = ("propinas licenciatura engenharia informática ano letivo prestações mensais desconto pagamento "
+             "anual candidaturas prazo matrícula inscrição estudantes bolsa ação social secretaria documentos "
+             "certificado regulamento avaliação exames época recurso créditos unidades curriculares").split()
+    rng = random.Random(3)
+    body = " ".join(rng.choice(words) for _ in range(150))
+    # The print view is the article without the site's header and footer
+    full = ("Início Cursos Candidaturas Notícias Eventos Contactos Pesquisar " + body
+            + " Universidade Lusófona Campo Grande 376 Lisboa Política de privacidade Cookies")
+    assert 6 < ls.hamming(ls.simhash(full), ls.simhash(body)) <= 12
+    kept, dropped = dedup([
+        ("https://www.ulusofona.pt/propinas/informatica", full),
+        ("https://www.ulusofona.pt/propinas/informatica/imprimir", body),
+        ("https://www.ulusofona.pt/propinas/informatica?format=pdf", None),
+        ("https://www.ulusofona.pt/noticias/imprimir", body),
+    ])
+    assert dropped == ["https://www.ulusofona.pt/propinas/informatica/imprimir"]
+    # Without text there is nothing to compare, so the loose variant stays; another URL needs the strict budget
+    assert kept[1:] == ["https://www.ulusofona.pt/propinas/informatica?format=pdf",
+                        "https://www.ulusofona.pt/noticias/imprimir"]
+
+
+def test_near_duplicate_text_under_another_url_is_dropped():
+    kept, dropped = dedup([
+        ("https://www.ulusofona.pt/propinas", ARTICLE),
+        ("https://noticias.example/propinas-lusofona", ARTICLE + " Fonte: ulusofona.pt"),
+        ("https://www.ulusofona.pt/noticias", CATEGORY),
+    ])
+    assert dropped == ["https://noticias.example/propinas-lusofona"]
+    assert len(kept) == 2
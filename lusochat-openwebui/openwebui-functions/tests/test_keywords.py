@@ -0,0 +1,55 @@
+"""Accent-folded, stemmed keyword matching and the smart filter's auto decision."""
+
+import pytest
+
+import lusochat_search as ls
+
+
+@pytest.mark.parametrize("a, b", [
+    ("admissões", "admissao"),
+    ("inscrevi-me", "inscrição"),
+    ("Prazos", "prazo"),
+    ("bolsas", "bolsa"),
+    ("regulamentos", "regulamento"),
+    ("candidaturas", "candidatura"),
+])
+def test_inflections_share_a_stem(a, b):
+    assert ls.normalize_tokens(a)[0] == ls.normalize_tokens(b)[0]
+
+
+@pytest.mark.parametrize("word, keyword", [
+    ("prazer", "prazo"),
+    ("prazeres", "prazos"),
+    ("bolso", "bolsa"),
+    ("bolsos", "bolsas"),
+    ("regular", "regulamento"),
+    ("regulares", "regulamentos"),
+    ("públicos", "publicado"),
+    ("obrigações", "obrigado"),
+])
+def test_unrelated_words_do_not_collapse_onto_keywords(word, keyword):
+    assert ls.normalize_tokens(word) != ls.normalize_tokens(keyword)
+    assert ls.compile_keywords((keyword,)).count(word) == 0
+
+
+def test_matcher_counts_distinct_keywords_once():
+    matcher = ls.compile_keywords(("prazo", "prazos", "propinas", "plano de estudos", "202"))
+    assert matcher.count("Quais os prazos e as propinas do Plano de Estudos 2025?") == 4
+    assert matcher.count("Foi um prazer") == 0
+
+
+smart_filter = pytest.importorskip("smart_web_search_filter", reason="needs pydantic")
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Obrigado, foi um prazer falar contigo sobre isto tudo!", (False, "chitchat_skip")),
+    ("Com todo o prazer, até amanhã então", (False, "no_domain_intent")),
+    ("Perdi a carteira do bolso, é regular acontecer?", (False, "no_domain_intent")),
+])
+def test_chitchat_with_lookalike_words_does_not_search(text, expected):
+    assert smart_filter.Filter()._decide_auto(text, {}) == expected
+
+
+def test_institutional_question_still_searches():
+    enabled, reason = smart_filter.Filter()._decide_auto("Qual o prazo das candidaturas a bolsas em 2025?", {})
+    assert enabled, reason
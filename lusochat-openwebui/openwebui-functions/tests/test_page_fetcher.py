@@ -0,0 +1,61 @@
+"""PageFetcher deadlines and revalidation against an in-process httpx transport."""
+
+import time
+import asyncio
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+import lusochat_search as ls  # noqa: E402
+
+PAGE = "<html><head><title>Propinas</title></head><body><p>Propinas 2025/2026</p></body></html>"
+
+
+def fetcher_with(handler, **kwargs):
+    fetcher = ls.PageFetcher(**kwargs)
+    fetcher._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return fetcher
+
+
+def test_deadline_includes_waiting_for_a_host_slot():
+    async def slow(request):
+        await asyncio.sleep(0.25)
+        return httpx.Response(200, headers={"content-type": "text/html"}, text=PAGE)
+
+    async def go():
+        fetcher = fetcher_with(slow, per_host=1, deadline_s=0.4)
+        started = time.perf_counter()
+        pages = await fetcher.fetch_many([f"https://www.ulusofona.pt/p{i}" for i in range(3)])
+        elapsed = time.perf_counter() - started
+        await fetcher.close()
+        return fetcher, pages, elapsed
+
+    fetcher, pages, elapsed = asyncio.run(go())
+    # One slot: the first page fits in the deadline, the ones queued behind it do not
+    assert pages[0] is not None and pages[0].title == "Propinas"
+    assert pages[1:] == [None, None]
+    assert fetcher.counters["timeouts"] == 2
+    assert elapsed < 0.6
+
+
+def test_revalidation_serves_cached_text_on_304():
+    seen = []
+
+    async def handler(request):
+        seen.append(request.headers.get("if-none-match"))
+        if request.headers.get("if-none-match") == '"v1"':
+            return httpx.Response(304)
+        return httpx.Response(200, headers={"content-type": "text/html", "etag": '"v1"'}, text=PAGE)
+
+    async def go():
+        fetcher = fetcher_with(handler, fresh_s=0.0)
+        first = await fetcher.fetch("https://www.ulusofona.pt/propinas")
+        second = await fetcher.fetch("https://ulusofona.pt/propinas/")
+        await fetcher.close()
+        return fetcher, first, second
+
+    fetcher, first, second = asyncio.run(go())
+    assert seen == [None, '"v1"']
+    assert (first.source, second.source) == ("network", "revalidated")
+    assert second.text == first.text and second.simhash == first.simhash
+    assert fetcher.counters["revalidated"] == 1
@@ -0,0 +1,49 @@
+"""QuotaGovernor penalty pacing (in-process counters, no Redis)."""
+
+import asyncio
+from datetime import datetime
+
+import pytest
+
+import lusochat_search as ls
+
+pytest.importorskip("zoneinfo")
+from zoneinfo import ZoneInfo  # noqa: E402
+
+LISBON = ZoneInfo("Europe/Lisbon")
+
+
+def governor_at(lisbon_time, used, budget=100, **kwargs):
+    governor = ls.QuotaGovernor(daily_budget=budget, **kwargs)
+    now = lisbon_time.replace(tzinfo=LISBON).astimezone(governor.tz)
+    governor._now = lambda: now
+    governor._day, governor._used = governor._day_key(), used
+    return governor
+
+
+@pytest.mark.parametrize("when, used, penalty", [
+    # 10:00 in Lisbon is 02:00 Pacific: 1/6 of business hours, 1/12 of the quota day
+    (datetime(2025, 10, 15, 10, 0), 15, 0),
+    (datetime(2025, 10, 15, 10, 0), 30, 1),
+    (datetime(2025, 10, 15, 10, 0), 45, 2),
+    (datetime(2025, 10, 15, 14, 0), 55, 1),   # half the day gone, less than half the budget left
+    (datetime(2025, 10, 15, 22, 0), 80, 2),   # after hours: only the remaining budget counts
+    (datetime(2025, 10, 16, 7, 30), 95, 3),
+    (datetime(2025, 1, 15, 10, 0), 15, 0),    # winter time, same offsets
+])
+def test_penalty_paces_on_lisbon_business_hours(when, used, penalty):
+    assert asyncio.run(governor_at(when, used).penalty()) == penalty
+
+
+def test_morning_traffic_is_not_ahead_of_schedule():
+    governor = governor_at(datetime(2025, 10, 15, 11, 0), used=25)
+    assert governor._expected_fraction() == pytest.approx(3 / 12)
+    # The Pacific clock says 03:00, 1/8 of the day: pacing on it would add a penalty
+    assert asyncio.run(governor.penalty()) == 0
+    assert asyncio.run(governor.usage())["expected_fraction"] == 0.25
+
+
+def test_pacing_can_be_turned_off():
+    governor = governor_at(datetime(2025, 10, 15, 9, 0), used=40, pace_hours=None)
+    assert governor._expected_fraction() is None
+    assert asyncio.run(governor.penalty()) == 0
@@ -0,0 +1,122 @@
+"""SearchFanout hedging, merging and caching against in-process stub backends."""
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiohttp")
+import lusochat_search as ls  # noqa: E402
+
+
+class StubBackend:
+    """Duck-typed backend: search(session, query, count) after a fixed delay."""
+
+    def __init__(self, name, delay_s=0.0, results=5, error=None, prefix=None):
+        self.name = name
+        self.delay_s = delay_s
+        self.results = results
+        self.error = error
+        self.prefix = prefix or f"https://{name}.example/"
+        self.calls = 0
+
+    async def search(self, session, query, count):
+        self.calls += 1
+        await asyncio.sleep(self.delay_s)
+        if self.error:
+            raise self.error
+        return [ls.SearchResult(f"{self.prefix}{i}", f"{self.name} {i}", "", self.name, i)
+                for i in range(min(count, self.results))]
+
+
+def run(fanout, *searches):
+    """Run searches one after another on one event loop; returns the responses."""
+
+    async def go():
+        try:
+            responses = [await fanout.search(query, **kwargs) for query, kwargs in searches]
+            # Let detached (losing) requests finish so their latency is recorded
+            await asyncio.gather(*list(fanout._background))
+            return responses
+        finally:
+            await fanout.close()
+
+    return asyncio.run(go())
+
+
+def test_fast_primary_wins_without_hedging():
+    pse, searxng = StubBackend("pse", 0.01), StubBackend("searxng", 0.01)
+    fanout = ls.SearchFanout(pse, searxng, hedge_delay_ms=200)
+    [response] = run(fanout, ("propinas", {}))
+    assert (response.winner, response.hedged) == ("pse", False)
+    assert len(response.results) == 5
+    assert searxng.calls == 0
+    assert fanout.metrics()["hedges"] == 0
+
+
+def test_slow_primary_is_hedged_after_the_delay():
+    pse, searxng = StubBackend("pse", 0.5), StubBackend("searxng", 0.02)
+    fanout = ls.SearchFanout(pse, searxng, hedge_delay_ms=100)
+    [response] = run(fanout, ("propinas", {}))
+    assert (response.winner, response.hedged) == ("searxng", True)
+    assert 100 <= response.latency_ms < 400
+    # The losing PSE request is not cancelled: its real latency is still recorded
+    assert fanout.stats["pse"].latencies_ms[-1] >= 500
+    assert fanout.stats["searxng"].wins == 1
+
+
+def test_primary_error_hedges_immediately():
+    pse = StubBackend("pse", 0.0, error=RuntimeError("quota exceeded"))
+    searxng = StubBackend("searxng", 0.02)
+    fanout = ls.SearchFanout(pse, searxng, hedge_delay_ms=1000)
+    [response] = run(fanout, ("propinas", {}))
+    assert response.winner == "searxng"
+    assert response.errors["pse"] == "RuntimeError: quota exceeded"
+    assert response.latency_ms < 500
+    assert fanout.metrics()["backends"]["pse"]["errors"] == 1
+
+
+def test_thin_answers_are_merged_and_deduplicated():
+    pse = StubBackend("pse", 0.01, results=2, prefix="https://www.ulusofona.pt/p")
+    searxng = StubBackend("searxng", 0.01, results=2, prefix="https://ulusofona.pt/p")
+    fanout = ls.SearchFanout(pse, searxng, hedge_delay_ms=50, min_results=3)
+    [response] = run(fanout, ("propinas", {}))
+    assert response.hedged and response.winner == "merged"
+    # Same pages once www. is normalized away: the primary's copy is kept
+    assert [r.url for r in response.results] == ["https://www.ulusofona.pt/p0", "https://www.ulusofona.pt/p1"]
+    assert fanout.metrics()["merges"] == 1
+
+
+def test_result_cache_hit_skips_the_backends():
+    pse, searxng = StubBackend("pse", 0.01), StubBackend("searxng", 0.01)
+    fanout = ls.SearchFanout(pse, searxng, hedge_delay_ms=200, result_ttl_s=60)
+    first, second, other, refreshed = run(
+        fanout,
+        ("Propinas  2025", {}),
+        ("propinas 2025", {}),
+        ("propinas 2025", {"count": 3}),
+        ("propinas 2025", {"refresh": True}),
+    )
+    assert not first.cached
+    assert second.cached and second.winner == "pse" and len(second.results) == 5
+    assert not other.cached and not refreshed.cached
+    assert pse.calls == 3
+    assert fanout.cache_hits == 1
+    assert fanout.is_cached("PROPINAS 2025", 5)
+
+
+def test_hedge_delay_follows_primary_p95_after_min_samples():
+    pse, searxng = StubBackend("pse", 0.0), StubBackend("searxng", 0.0)
+    fanout = ls.SearchFanout(pse, searxng, default_hedge_delay_ms=800, min_hedge_delay_ms=150, min_samples=5)
+    assert fanout.current_hedge_delay_ms() == 800
+
+    # Fast samples: the p95 is clamped to the minimum once there are enough of them
+    run(fanout, *[("q", {"refresh": True})] * 4)
+    assert fanout.current_hedge_delay_ms() == 800
+    run(fanout, ("q", {"refresh": True}))
+    assert fanout.current_hedge_delay_ms() == 150
+
+    # Slow samples push the p95, and so the delay, up
+    pse.delay_s = 0.3
+    run(fanout, *[("q", {"refresh": True})] * 3)
+    assert fanout.current_hedge_delay_ms() == pytest.approx(fanout.stats["pse"].percentile(0.95))
+    assert fanout.current_hedge_delay_ms() >= 300
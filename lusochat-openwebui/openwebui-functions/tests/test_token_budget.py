@@ -0,0 +1,81 @@
+"""Token budget trimming: the summary of dropped turns counts against the budget."""
+
+import re
+import time
+import asyncio
+
+import pytest
+
+pytest.importorskip("pydantic")
+from token_budget_filter import Filter  # noqa: E402
+
+SYSTEM = "És o Lusobot, o assistente da Universidade Lusófona. Responde em português europeu."
+
+
+def long_chat(turns):
+    messages = [{"role": "system", "content": SYSTEM}]
+    for n in range(turns):
+        messages.append({
+            "role": "user",
+            "content": f"Pergunta {n}: qual é o prazo e o procedimento exato para entregar o requerimento de "
+                       f"equivalência da unidade curricular {n} no curso de Engenharia Informática sem pagar "
+                       f"a taxa de urgência da secretaria académica? Obrigado.",
+        })
+        messages.append({"role": "assistant", "content": f"Resposta {n}: " + "o prazo termina a 30 de setembro. " * 8})
+    return messages
+
+
+def tokens(f, messages):
+    return sum(f._count(m) for m in messages)
+
+
+@pytest.mark.parametrize("summarize", [True, False])
+def test_long_chat_fits_budget_with_its_summary(summarize):
+    f = Filter()
+    f.valves.summarize_middle = summarize
+    messages = long_chat(80)
+    budget = 1500
+    trimmed, before, dropped = f._fit(messages, budget)
+
+    assert before == tokens(f, messages) > budget
+    assert dropped > 100
+    assert tokens(f, trimmed) <= budget
+    assert trimmed[0]["content"].startswith(SYSTEM)
+    assert trimmed[-6:] == messages[-6:]  # keep_recent_turns=3 user turns and their answers
+    assert ("Resumo da conversa anterior" in trimmed[0]["content"]) is summarize
+
+
+def test_summary_keeps_the_most_recent_dropped_questions():
+    f = Filter()
+    messages = long_chat(80)
+    trimmed, _, _ = f._fit(messages, 1500)
+    summarized = [int(n) for n in re.findall(r"^- Pergunta (\d+):", trimmed[0]["content"], re.M)]
+    kept_in_tail = [m["content"].split(":")[0] for m in trimmed[1:] if m["role"] == "user"]
+    assert kept_in_tail == ["Pergunta 77", "Pergunta 78", "Pergunta 79"]
+    # Only the newest dropped questions fit: a contiguous run ending right before the tail
+    assert 0 < len(summarized) < 74
+    assert summarized == list(range(77 - len(summarized), 77))
+
+
+def test_no_summary_when_recent_turns_fill_the_budget():
+    f = Filter()
+    messages = long_chat(20)
+    tail = tokens(f, [messages[0]] + messages[-6:])
+    trimmed, _, dropped = f._fit(messages, tail + 2)
+    assert dropped == 34
+    assert trimmed == [messages[0]] + messages[-6:]
+
+
+def test_status_reports_when_recent_turns_alone_are_over_budget():
+    f = Filter()
+    f._budgets_loaded_at = time.time()  # skip /model/info
+    f.valves.default_max_tokens = 500
+    events = []
+
+    async def emit(event):
+        events.append(event)
+
+    body = {"model": "Qwen3-8B-Lusofona-On-Premise", "messages": long_chat(10)}
+    asyncio.run(f.inlet(body, __event_emitter__=emit))
+    assert len(body["messages"]) == 7
+    assert events[0]["data"]["description"].endswith("budget 300, recent turns alone are over budget)")
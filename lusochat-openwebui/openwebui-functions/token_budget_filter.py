@@ -0,0 +1,313 @@
+"""
+id: lusobot_token_budget
+title: Lusobot_Token_Budget
+author: LusoChat
+version: 0.1.0
+license: MIT
+description: Keep long chats inside the model's context budget. Keeps the system prompt and the most recent turns, summarizes (or drops) the middle of the conversation, and reports the tokens saved per request.
+requirements:
+
+Paste this into OpenWebUI > Admin Panel > Functions > New Function
+Type: Filter
+Purpose: Stop long chats from overflowing the 8B on-prem models and slowing every turn's prefill.
+
+Notes:
+- The per-model budget comes from model_info.max_tokens in the LiteLLM model catalog
+  (litellm-lusofona/.litellm-lusofona/models/*.yaml), read through LiteLLM's /model/info and cached.
+  Models without max_tokens use default_max_tokens. Only models matching model_pattern are trimmed.
+- Token counts are cached per message (message id, or a hash of role + content), so each turn only
+  tokenizes the new messages. Uses tiktoken (installed with OpenWebUI) or ~4 chars/token without it.
+- The middle of the chat is replaced by a short extractive summary (first sentence of each dropped
+  user question) appended to the system prompt, or simply dropped with summarize_middle=False.
+  The summary counts against the budget: more turns are dropped to make room for it, and the oldest
+  questions are left out of it when the recent turns alone nearly fill the budget.
+  The static system prompt stays first, so llama.cpp prefix caching keeps working.
+- Emits "Token budget: ..." status events with the tokens saved.
+
+Tested against OpenWebUI 0.6x APIs; adjust imports if upstream API changes.
+"""
+
+from __future__ import annotations
+
+import re
+import time
+import hashlib
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from pydantic import BaseModel, Field
+
+try:
+    import tiktoken
+except Exception:  # pragma: no cover
+    tiktoken = None
+
+try:
+    import aiohttp
+except Exception:  # pragma: no cover
+    aiohttp = None
+
+
+SUMMARY_HEADER = "Resumo da conversa anterior (mensagens omitidas), o utilizador perguntou:"
+
+
+class Filter:
+    """Token budget manager for Lusobot conversations."""
+
+    id = "lusobot_token_budget"
+    name = "Lusobot_Token_Budget"
+    description = (
+        "Keep long chats inside the model's context budget: keeps the system prompt and recent turns, "
+        "summarizes or drops the middle, and reports tokens saved."
+    )
+    type = "filter"
+
+    class Valves(BaseModel):
+        status: bool = Field(default=True, description="Enable/disable status events")
+        litellm_base_url: str = Field(
+            default="http://litellm:4000",
+            description="LiteLLM proxy URL, used to read model_info.max_tokens from /model/info",
+        )
+        litellm_api_key: str = Field(default="", description="LiteLLM key allowed to call /model/info")
+        model_pattern: str = Field(
+            default="Lusofona-On-Premise",
+            description="Regex; only models whose id (or base model id) matches are trimmed",
+        )
+        default_max_tokens: int = Field(
+            default=8192, description="Context size for models without model_info.max_tokens"
+        )
+        budget_ratio: float = Field(
+            default=0.6,
+            description="Share of max_tokens available to the conversation; the rest is left for RAG/web context and the answer",
+        )
+        keep_recent_turns: int = Field(
+            default=3, description="User turns (with their answers) always kept at the end of the chat"
+        )
+        summarize_middle: bool = Field(
+            default=True,
+            description="Replace dropped messages with a short summary of the questions asked; False just drops them",
+        )
+        summary_chars_per_question: int = Field(
+            default=160, description="Maximum characters kept from each dropped user question"
+        )
+        catalog_ttl_seconds: int = Field(
+            default=600, description="How long the /model/info budgets are cached"
+        )
+        cache_size: int = Field(
+            default=20000, description="Messages whose token count is cached"
+        )
+
+    def __init__(self):
+        self.valves = self.Valves()
+        self._counts: "OrderedDict[str, int]" = OrderedDict()
+        self._budgets: Dict[str, int] = {}
+        self._budgets_loaded_at = 0.0
+        self._encoder = None
+        if tiktoken is not None:
+            try:
+                self._encoder = tiktoken.get_encoding("cl100k_base")
+            except Exception:  # pragma: no cover - encoding download blocked
+                self._encoder = None
+
+    # ---- helpers ----
+    async def emit_status(
+        self,
+        __event_emitter__: Callable[[dict], Awaitable[None]],
+        level: str,
+        message: str,
+        done: bool,
+    ) -> None:
+        if self.valves.status and __event_emitter__ is not None:
+            await __event_emitter__(
+                {
+                    "type": level,
+                    "data": {
+                        "description": message,
+                        "done": done,
+                    },
+                }
+            )
+
+    @staticmethod
+    def _text(message: dict) -> str:
+        content = message.get("content")
+        if isinstance(content, str):
+            return content
+        if isinstance(content, list):
+            return "\n".join(
+                part.get("text", "") for part in content if isinstance(part, dict) and part.get("type") == "text"
+            )
+        return ""
+
+    def _tokens(self, text: str) -> int:
+        if self._encoder is not None:
+            return len(self._encoder.encode(text, disallowed_special=()))
+        return len(text) // 4
+
+    def _count(self, message: dict) -> int:
+        """Token count of one message, cached by message id or content hash."""
+        text = self._text(message)
+        key = message.get("id") or hashlib.sha1(
+            f"{message.get('role')}\x00{text}".encode("utf-8")
+        ).hexdigest()
+        cached = self._counts.get(key)
+        if cached is not None:
+            self._counts.move_to_end(key)
+            return cached
+        tokens = self._tokens(text) + 4  # role and separator tokens of the chat template
+        self._counts[key] = tokens
+        while len(self._counts) > self.valves.cache_size:
+            self._counts.popitem(last=False)
+        return tokens
+
+    async def _load_budgets(self) -> None:
+        if time.time() - self._budgets_loaded_at < self.valves.catalog_ttl_seconds:
+            return
+        self._budgets_loaded_at = time.time()
+        if aiohttp is None:
+            return
+        headers = {"Authorization": f"Bearer {self.valves.litellm_api_key}"} if self.valves.litellm_api_key else {}
+        url = self.valves.litellm_base_url.rstrip("/") + "/model/info"
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=5)) as response:
+                    response.raise_for_status()
+                    payload = await response.json()
+        except Exception as e:
+            print(f"[Lusobot Token Budget] Could not read {url}: {e}")
+            return
+        budgets = {}
+        for item in payload.get("data") or []:
+            max_tokens = (item.get("model_info") or {}).get("max_tokens")
+            if item.get("model_name") and max_tokens:
+                budgets[item["model_name"]] = int(max_tokens)
+        self._budgets = budgets
+
+    def _model_ids(self, body: dict, __model__: Optional[dict]) -> List[str]:
+        ids = []
+        info = (__model__ or {}).get("info") or {}
+        for candidate in (info.get("base_model_id"), body.get("model"), (__model__ or {}).get("id")):
+            if candidate and candidate not in ids:
+                ids.append(candidate)
+        return ids
+
+    def _max_tokens(self, model_ids: List[str]) -> int:
+        for model_id in model_ids:
+            if model_id in self._budgets:
+                return self._budgets[model_id]
+            # OpenWebUI connection prefixes ("litellm.Qwen3-8B-...")
+            for name, max_tokens in self._budgets.items():
+                if model_id.endswith("." + name):
+                    return max_tokens
+        return self.valves.default_max_tokens
+
+    def _summary_line(self, message: dict) -> Optional[str]:
+        if message.get("role") != "user":
+            return None
+        text = " ".join(self._text(message).split())
+        first = re.split(r"(?<=[.?!])\s", text, maxsplit=1)[0]
+        limit = self.valves.summary_chars_per_question
+        return "- " + (first if len(first) <= limit else first[: limit - 1] + "…")
+
+    @staticmethod
+    def _summary(lines: List[str]) -> str:
+        if not lines:
+            return ""
+        return SUMMARY_HEADER + "\n" + "\n".join(lines)
+
+    def _fit(self, messages: List[dict], budget: int) -> Tuple[List[dict], int, int]:
+        """Return (messages, tokens before, dropped message count)."""
+        counts = [self._count(m) for m in messages]
+        total = sum(counts)
+        if total <= budget:
+            return messages, total, 0
+
+        system_idx = [i for i, m in enumerate(messages) if m.get("role") == "system"]
+        convo_idx = [i for i, m in enumerate(messages) if m.get("role") != "system"]
+
+        # Start of the protected tail: the last keep_recent_turns user turns
+        user_positions = [pos for pos, i in enumerate(convo_idx) if messages[i].get("role") == "user"]
+        keep_from = user_positions[-self.valves.keep_recent_turns] if len(user_positions) >= self.valves.keep_recent_turns \
+            else 0
+        middle = convo_idx[:keep_from]
+
+        # Drop the oldest middle messages until the conversation, and the summary
+        # of what was dropped, fits (line costs are summed, the joined text is checked below)
+        summarize = self.valves.summarize_middle
+        header_tokens = self._tokens(SUMMARY_HEADER) + 4 if summarize else 0
+        running = total
+        dropped, lines, line_tokens = [], [], []
+        for i in middle:
+            if running + (header_tokens + sum(line_tokens) if lines else 0) <= budget:
+                break
+            running -= counts[i]
+            dropped.append(i)
+            line = self._summary_line(messages[i]) if summarize else None
+            if line:
+                lines.append(line)
+                line_tokens.append(self._tokens(line) + 1)
+        # Never start the kept history with an orphan assistant answer
+        while len(dropped) < len(middle) and messages[middle[len(dropped)]].get("role") == "assistant":
+            running -= counts[middle[len(dropped)]]
+            dropped.append(middle[len(dropped)])
+        if not dropped:
+            return messages, total, 0
+
+        # Keep the most recent questions the budget still has room for
+        while lines and running + header_tokens + sum(line_tokens) > budget:
+            lines.pop(0)
+            line_tokens.pop(0)
+        summary = self._summary(lines)
+        while lines and running + self._tokens(summary) + 4 > budget:
+            lines.pop(0)
+            summary = self._summary(lines)
+
+        dropped_set = set(dropped)
+        result = [m for i, m in enumerate(messages) if i not in dropped_set]
+        if summary:
+            if system_idx:
+                first_system = messages[system_idx[0]]
+                position = result.index(first_system)
+                result[position] = {
+                    **first_system,
+                    "content": f"{self._text(first_system).rstrip()}\n\n{summary}",
+                }
+            else:
+                result.insert(0, {"role": "system", "content": summary})
+        return result, total, len(dropped)
+
+    # ---- OpenWebUI hooks ----
+    async def inlet(
+        self,
+        body: dict,
+        __event_emitter__: Callable[[Any], Awaitable[None]] = None,
+        __user__: Optional[dict] = None,
+        __model__: Optional[dict] = None,
+    ) -> dict:
+        """Trim the middle of long conversations to the model's token budget."""
+        try:
+            messages = body.get("messages") or []
+            model_ids = self._model_ids(body, __model__)
+            pattern = self.valves.model_pattern
+            if len(messages) < 3 or (pattern and not any(re.search(pattern, m) for m in model_ids)):
+                return body
+
+            await self._load_budgets()
+            budget = int(self._max_tokens(model_ids) * self.valves.budget_ratio)
+            trimmed, before, dropped = self._fit(messages, budget)
+            if not dropped:
+                return body
+
+            after = sum(self._count(m) for m in trimmed)
+            body["messages"] = trimmed
+            action = "summarized" if self.valves.summarize_middle else "dropped"
+            over = ", recent turns alone are over budget" if after > budget else ""
+            await self.emit_status(
+                __event_emitter__,
+                level="info",
+                message=f"Token budget: {before} → {after} tokens (−{before - after}, {dropped} messages {action}, budget {budget}{over})",
+                done=True,
+            )
+        except Exception as e:  # pragma: no cover
+            print(f"[Lusobot Token Budget] Error: {e}")
+
+        return body
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Lusochat Patch Engine
+
+Applies the declarative patch manifest (lusochat_patches.yaml) to an Open WebUI
+checkout. Replaces the per-edit safe_replace calls of
+deploy_and_apply_lusochat_customizations.sh, which ran grep, sed -i, grep and a
+backup copy for every single replacement.
+
+How it works:
+1. The manifest is expanded into edits per file (globs resolved, {value} and
+   {locale} substituted).
+2. Every file is read once and all of its edits are applied in memory, files
+   in parallel. Nothing is written yet, so a missing anchor in any file stops
+   the run before the tree is touched.
+3. Changed files are written with one atomic replace each.
+
+Each edit ends up as:
+    applied    anchor found and replaced
+    already    anchor gone, replacement present (tree patched before)
+    skipped    optional patch whose anchor is missing
+    missing    required anchor not found (error, nothing is written)
+
+Usage:
+    python apply_patches.py --root open-webui                 # Apply
+    python apply_patches.py --root open-webui --dry-run       # Show the diff, write nothing
+    python apply_patches.py --root open-webui --check         # Validate anchors only (exit 1 on errors)
+    python apply_patches.py --root open-webui --manifest my_patches.yaml --jobs 8
+"""
+
+import os
+import re
+import sys
+import glob
+import json
+import time
+import difflib
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+DEFAULT_MANIFEST = Path(__file__).resolve().parent / "lusochat_patches.yaml"
+
+
+def info(msg: str) -> None:
+    print(f"[INFO] {msg}")
+
+
+def success(msg: str) -> None:
+    print(f"[SUCCESS] {msg}")
+
+
+def warning(msg: str) -> None:
+    print(f"[WARNING] {msg}")
+
+
+def error(msg: str) -> None:
+    print(f"[ERROR] {msg}", file=sys.stderr)
+
+
+@dataclass
+class Edit:
+    description: str
+    search: Optional[str] = None
+    regex: Optional["re.Pattern"] = None
+    replace: str = ""
+    optional: bool = False
+
+
+@dataclass
+class FilePlan:
+    path: Path
+    edits: List[Edit] = field(default_factory=list)
+    original: Optional[str] = None
+    patched: Optional[str] = None
+    results: List[tuple] = field(default_factory=list)  # (status, description)
+    seconds: float = 0.0
+
+    @property
+    def changed(self) -> bool:
+        return self.original is not None and self.patched != self.original
+
+
+# ---- manifest ------------------------------------------------------------------
+
+def load_manifest(path: Path) -> List[Dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        if path.suffix == ".json":
+            data = json.load(f)
+        else:
+            import yaml
+
+            data = yaml.safe_load(f)
+    patches = (data or {}).get("patches") or []
+    for i, patch in enumerate(patches):
+        if bool(patch.get("search")) == bool(patch.get("regex")):
+            raise ValueError(f"Patch {i} ({patch.get('description')}): set exactly one of search/regex")
+        if not (patch.get("file") or patch.get("files")):
+            raise ValueError(f"Patch {i} ({patch.get('description')}): no file/files")
+    return patches
+
+
+def substitute(text: str, value: str, locale: str) -> str:
+    # Plain token replacement: templates contain {{WEBUI_NAME}}, so no str.format
+    return text.replace("{value}", value).replace("{locale}", locale)
+
+
+def plan(patches: List[Dict], root: Path) -> Dict[Path, FilePlan]:
+    """Expand the manifest into edits per file, in manifest order."""
+    plans: Dict[Path, FilePlan] = {}
+    missing_files = FilePlan(path=root)  # patches whose file/glob matched nothing
+    for patch in patches:
+        pattern = patch.get("file") or patch.get("files")
+        paths = sorted(Path(p) for p in glob.glob(str(root / pattern)))
+        if not paths:
+            status = "skipped" if patch.get("optional") else "missing"
+            missing_files.results.append((status, f"{patch['description']} (no file matches {pattern})"))
+            continue
+        values = patch.get("values") or {}
+        for path in paths:
+            locale = path.parent.name
+            value = str(values.get(locale, values.get("default", "")))
+            plans.setdefault(path, FilePlan(path=path)).edits.append(Edit(
+                description=substitute(patch["description"], value, locale),
+                search=patch.get("search"),
+                regex=re.compile(patch["regex"]) if patch.get("regex") else None,
+                replace=substitute(patch.get("replace", ""), value, locale),
+                optional=bool(patch.get("optional")),
+            ))
+    if missing_files.results:
+        plans[missing_files.path] = missing_files
+    return plans
+
+
+# ---- apply ---------------------------------------------------------------------
+
+def apply_edits(text: str, edits: List[Edit]) -> tuple:
+    """Apply edits to text in order; returns (new text, [(status, description)])."""
+    results = []
+    for edit in edits:
+        if edit.search is not None:
+            found = edit.search in text
+            if found:
+                text = text.replace(edit.search, edit.replace)
+        else:
+            matches = [m.group(0) for m in edit.regex.finditer(text)]
+            found = any(m != edit.replace for m in matches)
+            if found:
+                text = edit.regex.sub(lambda _m: edit.replace, text)
+            elif matches:
+                results.append(("already", edit.description))
+                continue
+        if found:
+            results.append(("applied", edit.description))
+        elif edit.replace and edit.replace in text:
+            results.append(("already", edit.description))
+        else:
+            results.append(("skipped" if edit.optional else "missing", edit.description))
+    return text, results
+
+
+def prepare(file_plan: FilePlan) -> FilePlan:
+    """Read a file once and patch it in memory."""
+    started = time.perf_counter()
+    if file_plan.edits:
+        with open(file_plan.path, "r", encoding="utf-8", newline="") as f:
+            file_plan.original = f.read()
+        file_plan.patched, results = apply_edits(file_plan.original, file_plan.edits)
+        file_plan.results.extend(results)
+    file_plan.seconds = time.perf_counter() - started
+    return file_plan
+
+
+def write_atomic(file_plan: FilePlan) -> None:
+    path = file_plan.path
+    mode = path.stat().st_mode & 0o7777
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".patch")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+            f.write(file_plan.patched)
+        os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def print_diff(file_plan: FilePlan, root: Path) -> None:
+    name = os.path.relpath(file_plan.path, root)
+    sys.stdout.writelines(difflib.unified_diff(
+        file_plan.original.splitlines(keepends=True),
+        file_plan.patched.splitlines(keepends=True),
+        fromfile=f"a/{name}",
+        tofile=f"b/{name}",
+    ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply the Lusochat patch manifest to an Open WebUI checkout")
+    parser.add_argument("--root", type=Path, default=Path("."), help="Open WebUI checkout")
+    parser.add_argument("--manifest", type=Path, default=DEFAULT_MANIFEST, help="Patch manifest (YAML or JSON)")
+    parser.add_argument("--jobs", type=int, default=min(8, os.cpu_count() or 2), help="Files patched in parallel")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--dry-run", action="store_true", help="Print a unified diff, write nothing")
+    mode.add_argument("--check", action="store_true", help="Only validate the anchors")
+    parser.add_argument("--quiet", action="store_true", help="Only print warnings, errors and the summary")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    try:
+        patches = load_manifest(args.manifest)
+    except Exception as e:
+        error(f"Cannot load {args.manifest}: {e}")
+        sys.exit(1)
+    plans = plan(patches, args.root)
+
+    # Phase 1: read and patch every file in memory
+    with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        file_plans = list(pool.map(prepare, plans.values()))
+    prepared = time.perf_counter()
+
+    counts = {"applied": 0, "already": 0, "skipped": 0, "missing": 0}
+    for file_plan in file_plans:
+        where = f" in {os.path.relpath(file_plan.path, args.root)}" if file_plan.edits else ""
+        for status, description in file_plan.results:
+            counts[status] += 1
+            if status == "missing":
+                error(f"Anchor not found{where}: {description}")
+            elif status == "skipped":
+                warning(f"Skipped (anchor not found{where}): {description}")
+            elif not args.quiet:
+                if status == "applied":
+                    success(description)
+                else:
+                    info(f"{description} - already applied")
+
+    changed = [p for p in file_plans if p.changed]
+    if counts["missing"]:
+        error(f"{counts['missing']} required anchors missing - no file was modified")
+        sys.exit(1)
+
+    # Phase 2: one atomic write per changed file
+    if args.dry_run:
+        for file_plan in changed:
+            print_diff(file_plan, args.root)
+    elif not args.check:
+        with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+            list(pool.map(write_atomic, changed))
+    finished = time.perf_counter()
+
+    verb = "would change" if args.dry_run or args.check else "changed"
+    summary = (
+        f"{counts['applied']} applied, {counts['already']} already applied, {counts['skipped']} skipped; "
+        f"{len(changed)} of {len(file_plans)} files {verb} in {(finished - started) * 1000:.0f} ms "
+        f"(read+patch {(prepared - started) * 1000:.0f} ms, write {(finished - prepared) * 1000:.0f} ms)"
+    )
+    success(summary)
+    slowest = sorted(file_plans, key=lambda p: p.seconds, reverse=True)[:3]
+    if not args.quiet and slowest:
+        info("Slowest files: " + ", ".join(
+            f"{os.path.relpath(p.path, args.root)} {p.seconds * 1000:.1f} ms" for p in slowest
+        ))
+
+
+if __name__ == "__main__":
+    main()
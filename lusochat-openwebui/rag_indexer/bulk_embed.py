@@ -0,0 +1,738 @@
+#!/usr/bin/env python3
+"""
+Lusochat Bulk Embedding Pipeline
+
+Re-indexes the Lusobot knowledge base without going through OpenWebUI one
+upload at a time: documents are read from a directory, chunked, embedded
+through the LiteLLM proxy and written to a compact vector file that can be
+bulk-loaded into the vector store. A crash or Ctrl-C loses at most the last
+checkpoint; rerunning the same command picks up where it stopped.
+
+How it works:
+1. Files under the input directory are streamed in path order (.md, .txt,
+   .html, .pdf, ...) and split like OpenWebUI's recursive character splitter
+   (CHUNK_SIZE 1000 / CHUNK_OVERLAP 100 by default).
+2. Every chunk is keyed by sha256 of its whitespace-normalized text. Chunks
+   already in the index (chunks.jsonl), or already on their way, are not
+   embedded again, and neither are documents whose sha256 has not changed.
+3. New chunks are grouped into batches on a bounded queue; --concurrency
+   workers send them to /v1/embeddings. When the queue is full the reader
+   waits (memory stays flat on any corpus size), and a 429/503 or timeout
+   pauses every worker for Retry-After or an exponential backoff.
+4. Vectors go to a memory-mapped file (float16, or int8 with one float32
+   scale per row) that grows as needed. Each checkpoint flushes the vectors
+   and metadata, then records the committed row count and byte offsets in
+   index.json; on resume anything past those offsets is discarded.
+
+Output directory:
+    index.json        model, dims, dtype, chunking and the committed counts
+    vectors.f16       rows x dims float16 (or vectors.i8 + scales.f32)
+    chunks.jsonl      one line per row: {"row", "hash", "text"}
+    documents.jsonl   one line per indexed document: {"path", "sha256", "title",
+                      "chunks": [[hash, start_index], ...]}; the last line per
+                      path wins, {"path", "deleted": true} marks removed files
+
+Usage:
+    python bulk_embed.py embed ./kb --out ./kb-index                  # Index (or resume)
+    python bulk_embed.py embed ./kb --out ./kb-index --dtype int8 --concurrency 8
+    python bulk_embed.py info ./kb-index
+    python bulk_embed.py load-chroma ./kb-index --collection lusobot-kb --chroma-path ./vector_db
+"""
+
+import io
+import os
+import re
+import sys
+import json
+import time
+import random
+import asyncio
+import hashlib
+import argparse
+import tempfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+import aiohttp
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "openwebui-functions"))
+from lusochat_search import extract_text  # noqa: E402
+
+INDEX_VERSION = 1
+DEFAULT_MODEL = "embeddings-bge-m3-Lusofona-On-Premise"
+DEFAULT_EXTENSIONS = ".md,.markdown,.txt,.rst,.html,.htm,.csv,.json,.pdf"
+SEPARATORS = ["\n\n", "\n", ". ", " "]
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+def info(msg: str) -> None:
+    print(f"[INFO] {msg}")
+
+
+def success(msg: str) -> None:
+    print(f"[SUCCESS] {msg}")
+
+
+def warning(msg: str) -> None:
+    print(f"[WARNING] {msg}")
+
+
+def error(msg: str) -> None:
+    print(f"[ERROR] {msg}", file=sys.stderr)
+
+
+def write_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+# ---- documents and chunks ----
+
+@dataclass
+class Chunk:
+    hash: str
+    text: str
+    start: int  # character offset in the document (OpenWebUI's start_index)
+
+
+@dataclass
+class Document:
+    path: str  # relative to the input directory
+    sha256: str
+    size: int
+    title: str
+    chunks: List[Chunk] = field(default_factory=list)
+
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()[:32]
+
+
+def _spans(text: str, start: int, end: int, size: int, separators: List[str]) -> List[Tuple[int, int]]:
+    """Cut text[start:end] at the coarsest separator that gives pieces <= size."""
+    if end - start <= size:
+        return [(start, end)]
+    if not separators:
+        return [(s, min(s + size, end)) for s in range(start, end, size)]
+    sep, spans, pos = separators[0], [], start
+    while pos < end:
+        cut = text.find(sep, pos, end)
+        stop = end if cut < 0 else cut + len(sep)
+        if stop - pos <= size:
+            spans.append((pos, stop))
+        else:
+            spans.extend(_spans(text, pos, stop, size, separators[1:]))
+        pos = stop
+    return spans
+
+
+def split_text(text: str, size: int, overlap: int) -> List[Tuple[int, str]]:
+    """(start, chunk) pairs: pieces merged up to size characters, each chunk
+    repeating up to overlap characters of the previous one."""
+    pieces = _spans(text, 0, len(text), size, SEPARATORS)
+    chunks: List[Tuple[int, str]] = []
+    i = 0
+    while i < len(pieces):
+        start, end, j = pieces[i][0], pieces[i][1], i + 1
+        while j < len(pieces) and pieces[j][1] - start <= size:
+            end = pieces[j][1]
+            j += 1
+        raw = text[start:end]
+        chunk = raw.strip()
+        if chunk:
+            chunks.append((start + len(raw) - len(raw.lstrip()), chunk))
+        if j >= len(pieces):
+            break
+        k = j
+        while k - 1 > i and end - pieces[k - 1][0] <= overlap:
+            k -= 1
+        i = k
+    return chunks
+
+
+def read_text(path: Path, data: bytes) -> Tuple[str, str]:
+    """(title, text) of a file; the title falls back to the file name."""
+    suffix = path.suffix.lower()
+    title = ""
+    if suffix in (".html", ".htm"):
+        title, text = extract_text(data.decode("utf-8", "replace"))
+    elif suffix == ".pdf":
+        from pypdf import PdfReader  # optional: pip install pypdf
+
+        reader = PdfReader(io.BytesIO(data))
+        title = str((reader.metadata or {}).get("/Title") or "")
+        text = "\n\n".join(page.extract_text() or "" for page in reader.pages)
+    else:
+        text = data.decode("utf-8", "replace")
+        if suffix in (".md", ".markdown"):
+            heading = re.search(r"^#\s+(.+)$", text, re.MULTILINE)
+            title = heading.group(1).strip() if heading else ""
+    return title.strip() or path.stem, text
+
+
+def iter_files(root: Path, extensions: Set[str]) -> Iterator[Path]:
+    """Files under root in a stable order, without listing the whole tree first."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        for name in sorted(filenames):
+            if Path(name).suffix.lower() in extensions and not name.startswith("."):
+                yield Path(dirpath) / name
+
+
+# ---- vector index ----
+
+class VectorIndex:
+    """Append-only vector file plus metadata, committed at checkpoints."""
+
+    def __init__(self, out_dir: Path, model: str = "", dtype: str = "float16",
+                 chunk_size: int = 1000, chunk_overlap: int = 100):
+        self.out_dir = out_dir
+        self.meta = {
+            "version": INDEX_VERSION, "model": model, "dtype": dtype, "dims": 0,
+            "chunk_size": chunk_size, "chunk_overlap": chunk_overlap,
+            "rows": 0, "chunks_bytes": 0, "documents_bytes": 0, "documents": 0,
+        }
+        self.rows: Dict[str, int] = {}       # chunk hash -> row
+        self.documents: Dict[str, str] = {}  # path -> sha256 of the indexed version
+        self.vectors: Optional[np.memmap] = None
+        self.scales: Optional[np.memmap] = None
+        self._chunks_file = None
+        self._documents_file = None
+
+    @property
+    def quantized(self) -> bool:
+        return self.meta["dtype"] == "int8"
+
+    @property
+    def vectors_path(self) -> Path:
+        return self.out_dir / ("vectors.i8" if self.quantized else "vectors.f16")
+
+    @classmethod
+    def load_meta(cls, out_dir: Path) -> Optional[Dict]:
+        path = out_dir / "index.json"
+        return json.loads(path.read_text(encoding="utf-8")) if path.exists() else None
+
+    def open(self, writable: bool = True) -> "VectorIndex":
+        """Load the committed state; with writable, drop anything written after it."""
+        committed = self.load_meta(self.out_dir)
+        if committed is not None:
+            for key in ("model", "dtype", "chunk_size", "chunk_overlap"):
+                if writable and self.meta[key] and committed.get(key) != self.meta[key]:
+                    raise ValueError(
+                        f"{self.out_dir} was built with {key}={committed.get(key)!r}, not {self.meta[key]!r}; "
+                        f"use another --out"
+                    )
+            self.meta.update(committed)
+        elif not writable:
+            raise FileNotFoundError(f"{self.out_dir / 'index.json'} not found")
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+
+        for name, offset in (("chunks.jsonl", self.meta["chunks_bytes"]),
+                             ("documents.jsonl", self.meta["documents_bytes"])):
+            path = self.out_dir / name
+            if writable:
+                with open(path, "ab") as f:
+                    f.truncate(offset)
+            elif not path.exists():
+                raise FileNotFoundError(path)
+        with open(self.out_dir / "chunks.jsonl", "r", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                self.rows[record["hash"]] = record["row"]
+        with open(self.out_dir / "documents.jsonl", "r", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if record.get("deleted"):
+                    self.documents.pop(record["path"], None)
+                else:
+                    self.documents[record["path"]] = record["sha256"]
+
+        if self.meta["dims"]:
+            self._map(max(self.meta["rows"], 1), writable)
+        if writable:
+            self._chunks_file = open(self.out_dir / "chunks.jsonl", "a", encoding="utf-8")
+            self._documents_file = open(self.out_dir / "documents.jsonl", "a", encoding="utf-8")
+        return self
+
+    def _map(self, capacity: int, writable: bool) -> None:
+        """(Re)open the memmaps with room for capacity rows."""
+        dims = self.meta["dims"]
+        files = [(self.vectors_path, np.int8 if self.quantized else np.float16, (capacity, dims))]
+        if self.quantized:
+            files.append((self.out_dir / "scales.f32", np.float32, (capacity,)))
+        maps = []
+        for path, dtype, shape in files:
+            if writable:
+                needed = int(np.prod(shape)) * np.dtype(dtype).itemsize
+                with open(path, "ab") as f:
+                    if f.tell() < needed:
+                        f.truncate(needed)
+                maps.append(np.memmap(path, dtype=dtype, mode="r+", shape=shape))
+            else:
+                rows = self.meta["rows"]
+                maps.append(np.memmap(path, dtype=dtype, mode="r", shape=(rows,) + shape[1:]) if rows else None)
+        self.vectors = maps[0]
+        self.scales = maps[1] if self.quantized else None
+
+    def append(self, chunks: List[Chunk], vectors: np.ndarray) -> None:
+        rows = self.meta["rows"]
+        if not self.meta["dims"]:
+            self.meta["dims"] = int(vectors.shape[1])
+            self._map(max(1024, len(chunks)), True)
+        elif vectors.shape[1] != self.meta["dims"]:
+            raise ValueError(f"model returned {vectors.shape[1]} dims, index has {self.meta['dims']}")
+        if rows + len(chunks) > self.vectors.shape[0]:
+            self.vectors.flush()
+            self._map(max(2 * self.vectors.shape[0], rows + len(chunks)), True)
+
+        if self.quantized:
+            scales = np.abs(vectors).max(axis=1) / 127
+            scales[scales == 0] = 1.0
+            self.vectors[rows:rows + len(chunks)] = np.clip(np.rint(vectors / scales[:, None]), -127, 127)
+            self.scales[rows:rows + len(chunks)] = scales
+        else:
+            self.vectors[rows:rows + len(chunks)] = vectors
+        for offset, chunk in enumerate(chunks):
+            self.rows[chunk.hash] = rows + offset
+            self._chunks_file.write(json.dumps({"row": rows + offset, "hash": chunk.hash, "text": chunk.text},
+                                               ensure_ascii=False) + "\n")
+        self.meta["rows"] = rows + len(chunks)
+
+    def add_document(self, doc: Document) -> None:
+        self.documents[doc.path] = doc.sha256
+        self._documents_file.write(json.dumps({
+            "path": doc.path, "sha256": doc.sha256, "size": doc.size, "title": doc.title,
+            "chunks": [[c.hash, c.start] for c in doc.chunks],
+        }, ensure_ascii=False) + "\n")
+
+    def remove_document(self, path: str) -> None:
+        self.documents.pop(path, None)
+        self._documents_file.write(json.dumps({"path": path, "deleted": True}) + "\n")
+
+    def checkpoint(self) -> None:
+        """Make everything appended so far durable, then commit it in index.json."""
+        if self.vectors is not None:
+            self.vectors.flush()
+        if self.scales is not None:
+            self.scales.flush()
+        for f in (self._chunks_file, self._documents_file):
+            f.flush()
+            os.fsync(f.fileno())
+        self.meta["chunks_bytes"] = self._chunks_file.tell()
+        self.meta["documents_bytes"] = self._documents_file.tell()
+        self.meta["documents"] = len(self.documents)
+        self.meta["updated_at"] = time.strftime("%Y-%m-%dT%H:%M:%S%z")
+        write_atomic(self.out_dir / "index.json", (json.dumps(self.meta, indent=2) + "\n").encode("utf-8"))
+
+    def close(self) -> None:
+        """Final checkpoint; the vector files are trimmed to the committed rows."""
+        self.checkpoint()
+        rows, dims = self.meta["rows"], self.meta["dims"]
+        self.vectors = self.scales = None
+        if dims:
+            with open(self.vectors_path, "r+b") as f:
+                f.truncate(rows * dims * (1 if self.quantized else 2))
+            if self.quantized:
+                with open(self.out_dir / "scales.f32", "r+b") as f:
+                    f.truncate(rows * 4)
+        for f in (self._chunks_file, self._documents_file):
+            f.close()
+
+    def read(self, rows) -> np.ndarray:
+        """float32 vectors for the given rows (int8 rows are rescaled)."""
+        vectors = np.asarray(self.vectors[rows], dtype=np.float32)
+        if self.quantized:
+            vectors *= np.asarray(self.scales[rows], dtype=np.float32)[..., None]
+        return vectors
+
+
+def _committed_lines(path: Path, size: int) -> Iterator[Dict]:
+    with open(path, "rb") as f:
+        data = f.read(size)
+    for line in data.splitlines():
+        yield json.loads(line)
+
+
+def iter_records(out_dir: Path) -> Iterator[Dict]:
+    """Every chunk of every live document, ready for a vector store: the id is
+    stable per (path, chunk), so reloading upserts instead of duplicating, and
+    ids the store holds but this no longer yields are stale."""
+    meta = json.loads((out_dir / "index.json").read_text(encoding="utf-8"))
+    latest: Dict[str, Dict] = {}
+    for record in _committed_lines(out_dir / "documents.jsonl", meta["documents_bytes"]):
+        if record.get("deleted"):
+            latest.pop(record["path"], None)
+        else:
+            latest[record["path"]] = record
+    wanted = {h for doc in latest.values() for h, _ in doc["chunks"]}
+    texts = {r["hash"]: r["text"] for r in _committed_lines(out_dir / "chunks.jsonl", meta["chunks_bytes"])
+             if r["hash"] in wanted}
+    for doc in latest.values():
+        prefix = hashlib.sha256(doc["path"].encode("utf-8")).hexdigest()[:16]
+        for position, (digest, start) in enumerate(doc["chunks"]):
+            yield {
+                "id": f"{prefix}-{position}",
+                "hash": digest,
+                "text": texts[digest],
+                "metadata": {"source": doc["path"], "name": doc["title"], "hash": digest,
+                             "start_index": start, "file_sha256": doc["sha256"]},
+            }
+
+
+# ---- embedding ----
+
+class EmbeddingError(Exception):
+    pass
+
+
+class Embedder:
+    """Batches to an OpenAI-compatible /embeddings endpoint, with retries.
+    A 429/5xx or timeout pauses every worker, not just the one that saw it."""
+
+    def __init__(self, session, base_url: str, model: str, api_key: str = "",
+                 retries: int = 6, timeout: float = 120.0):
+        self.session = session
+        self.url = f"{base_url.rstrip('/')}/embeddings"
+        self.model = model
+        self.headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self.retries = retries
+        self.timeout = timeout
+        self.paused_until = 0.0
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        attempt = 0
+        while True:
+            delay = self.paused_until - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                async with self.session.post(
+                    self.url, json={"model": self.model, "input": texts}, headers=self.headers,
+                    timeout=aiohttp.ClientTimeout(total=self.timeout),
+                ) as resp:
+                    if resp.status == 200:
+                        data = await resp.json(content_type=None)
+                        items = sorted(data["data"], key=lambda d: d["index"])
+                        if len(items) != len(texts):
+                            raise EmbeddingError(f"{len(items)} vectors for {len(texts)} inputs")
+                        return np.asarray([d["embedding"] for d in items], dtype=np.float32)
+                    body = (await resp.text())[:300]
+                    if resp.status not in RETRY_STATUSES:
+                        raise EmbeddingError(f"HTTP {resp.status}: {body}")
+                    retry_after = resp.headers.get("Retry-After", "")
+                    reason = f"HTTP {resp.status}"
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                retry_after, reason = "", type(e).__name__
+            if attempt == self.retries:
+                raise EmbeddingError(f"{reason} after {self.retries} retries")
+            wait = float(retry_after) if retry_after.replace(".", "", 1).isdigit() else min(60.0, 2 ** attempt)
+            wait *= 1 + random.uniform(0, 0.25)
+            self.paused_until = max(self.paused_until, time.monotonic() + wait)
+            attempt += 1
+            warning(f"{reason}, retrying in {wait:.1f}s")
+
+
+# ---- pipeline ----
+
+@dataclass
+class Progress:
+    files: int = 0
+    unchanged: int = 0
+    failed: int = 0
+    chunks: int = 0
+    duplicates: int = 0
+    embedded: int = 0
+    started: float = field(default_factory=time.perf_counter)
+
+    def line(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        return (f"{self.files} files ({self.unchanged} unchanged, {self.failed} unreadable), {self.chunks} chunks, "
+                f"{self.duplicates} duplicate, {self.embedded} embedded ({self.embedded / elapsed:.1f}/s)")
+
+
+class Pipeline:
+    def __init__(self, index: VectorIndex, embedder: Embedder, root: Path, extensions: Set[str],
+                 batch_size: int, concurrency: int, checkpoint_s: float):
+        self.index = index
+        self.embedder = embedder
+        self.root = root
+        self.extensions = extensions
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.checkpoint_s = checkpoint_s
+        # Bounded: the reader waits while the workers are busy
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+        self.in_flight: Dict[str, List[Document]] = {}  # chunk hash -> documents waiting for it
+        self.waiting: Dict[str, int] = {}                # document path -> chunks still in flight (+1 while read)
+        self.progress = Progress()
+        self.last_checkpoint = time.monotonic()
+        self.last_report = time.monotonic()
+
+    def _document(self, path: Path) -> Optional[Document]:
+        relative = path.relative_to(self.root).as_posix()
+        data = path.read_bytes()
+        digest = hashlib.sha256(data).hexdigest()
+        if self.index.documents.get(relative) == digest:
+            self.progress.unchanged += 1
+            return None
+        title, text = read_text(path, data)
+        doc = Document(path=relative, sha256=digest, size=len(data), title=title)
+        for start, chunk in split_text(text, self.index.meta["chunk_size"], self.index.meta["chunk_overlap"]):
+            doc.chunks.append(Chunk(hash=chunk_hash(chunk), text=chunk, start=start))
+        return doc
+
+    async def produce(self) -> None:
+        batch: List[Chunk] = []
+        seen: Set[str] = set()
+        for path in iter_files(self.root, self.extensions):
+            self.progress.files += 1
+            seen.add(path.relative_to(self.root).as_posix())
+            try:
+                doc = self._document(path)
+            except Exception as e:
+                self.progress.failed += 1
+                warning(f"Skipping {path}: {type(e).__name__}: {e}")
+                continue
+            if doc is None:
+                continue
+            # Workers may finish this document's first chunks while the rest
+            # are still being queued; the extra 1 keeps it open until then
+            self.waiting[doc.path] = 1
+            pending: Set[str] = set()
+            for chunk in doc.chunks:
+                self.progress.chunks += 1
+                if chunk.hash in self.index.rows:
+                    self.progress.duplicates += 1
+                elif chunk.hash in self.in_flight:
+                    if chunk.hash not in pending:
+                        self.in_flight[chunk.hash].append(doc)
+                        self.waiting[doc.path] += 1
+                        pending.add(chunk.hash)
+                    self.progress.duplicates += 1
+                else:
+                    self.in_flight[chunk.hash] = [doc]
+                    self.waiting[doc.path] += 1
+                    pending.add(chunk.hash)
+                    batch.append(chunk)
+                    if len(batch) >= self.batch_size:
+                        await self.queue.put(batch)
+                        batch = []
+            self._release(doc)
+            self._tick()
+        if batch:
+            await self.queue.put(batch)
+        for path in sorted(set(self.index.documents) - seen):
+            self.index.remove_document(path)
+            info(f"Removed {path} (no longer in {self.root})")
+        for _ in range(self.concurrency):
+            await self.queue.put(None)
+
+    async def work(self) -> None:
+        while True:
+            batch = await self.queue.get()
+            if batch is None:
+                return
+            vectors = await self.embedder.embed([c.text for c in batch])
+            self.index.append(batch, vectors)
+            self.progress.embedded += len(batch)
+            for chunk in batch:
+                for doc in self.in_flight.pop(chunk.hash, []):
+                    self._release(doc)
+            self._tick()
+
+    def _release(self, doc: Document) -> None:
+        """Record the document once all of its chunks are in the index."""
+        self.waiting[doc.path] -= 1
+        if not self.waiting[doc.path]:
+            del self.waiting[doc.path]
+            self.index.add_document(doc)
+
+    def _tick(self) -> None:
+        now = time.monotonic()
+        if now - self.last_checkpoint >= self.checkpoint_s:
+            self.index.checkpoint()
+            self.last_checkpoint = now
+        if now - self.last_report >= 10:
+            info(self.progress.line())
+            self.last_report = now
+
+    async def run(self) -> None:
+        tasks = [asyncio.ensure_future(self.produce())]
+        tasks += [asyncio.ensure_future(self.work()) for _ in range(self.concurrency)]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def embed_command(args) -> int:
+    index = VectorIndex(args.out, args.model, args.dtype, args.chunk_size, args.chunk_overlap)
+    try:
+        index.open()
+    except ValueError as e:
+        error(str(e))
+        return 1
+    if index.meta["rows"]:
+        info(f"Resuming {args.out}: {index.meta['rows']} chunks from {len(index.documents)} documents already indexed")
+    extensions = {e.strip().lower() if e.strip().startswith(".") else f".{e.strip().lower()}"
+                  for e in args.extensions.split(",") if e.strip()}
+
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        embedder = Embedder(session, args.base_url, args.model, args.api_key, args.retries, args.timeout)
+        pipeline = Pipeline(index, embedder, args.input, extensions, args.batch_size, args.concurrency,
+                            args.checkpoint_s)
+        try:
+            await pipeline.run()
+        except EmbeddingError as e:
+            error(f"Embedding failed: {e}")
+            return 1
+        finally:
+            index.close()
+            info(pipeline.progress.line())
+    success(f"{args.out}: {index.meta['rows']} vectors ({index.meta['dims']} dims, {index.meta['dtype']}) "
+            f"for {len(index.documents)} documents")
+    return 0
+
+
+def info_command(args) -> int:
+    try:
+        index = VectorIndex(args.out).open(writable=False)
+    except FileNotFoundError as e:
+        error(str(e))
+        return 1
+    meta = index.meta
+    occurrences = sum(1 for _ in iter_records(args.out))
+    vector_bytes = index.vectors_path.stat().st_size if index.vectors_path.exists() else 0
+    print(json.dumps({
+        **{k: meta.get(k) for k in ("model", "dims", "dtype", "chunk_size", "chunk_overlap", "updated_at")},
+        "documents": len(index.documents),
+        "unique_chunks": meta["rows"],
+        "chunk_occurrences": occurrences,
+        "vector_bytes": vector_bytes,
+        "float32_bytes": meta["rows"] * meta["dims"] * 4,
+    }, indent=2))
+    return 0
+
+
+def load_chroma_command(args) -> int:
+    try:
+        import chromadb  # optional: pip install chromadb
+    except ImportError:
+        error("chromadb is not installed (pip install chromadb)")
+        return 1
+    try:
+        index = VectorIndex(args.out).open(writable=False)
+    except FileNotFoundError as e:
+        error(str(e))
+        return 1
+    if args.chroma_url:
+        host, _, port = args.chroma_url.split("://")[-1].partition(":")
+        client = chromadb.HttpClient(host=host, port=int(port or 8000))
+    else:
+        client = chromadb.PersistentClient(path=str(args.chroma_path))
+    collection = client.get_or_create_collection(args.collection, metadata={"hnsw:space": "cosine"})
+
+    loaded: Set[str] = set()
+    batch: List[Dict] = []
+
+    def flush() -> None:
+        vectors = index.read([index.rows[r["hash"]] for r in batch])
+        collection.upsert(
+            ids=[r["id"] for r in batch], embeddings=vectors.tolist(),
+            documents=[r["text"] for r in batch], metadatas=[r["metadata"] for r in batch],
+        )
+        loaded.update(r["id"] for r in batch)
+        batch.clear()
+
+    for record in iter_records(args.out):
+        batch.append(record)
+        if len(batch) >= args.batch_size:
+            flush()
+    if batch:
+        flush()
+
+    # Chunks of deleted files, and the tail of files that now have fewer chunks
+    stale = [i for i in loaded_ids(collection, args.batch_size) if i not in loaded]
+    for start in range(0, len(stale), args.batch_size):
+        collection.delete(ids=stale[start:start + args.batch_size])
+    success(f"Loaded {len(loaded)} chunks into Chroma collection '{args.collection}', "
+            f"removed {len(stale)} stale chunks")
+    return 0
+
+
+def loaded_ids(collection, page_size: int) -> List[str]:
+    """Ids of the chunks a previous load-chroma wrote (they carry file_sha256)."""
+    ids: List[str] = []
+    offset = 0
+    while True:
+        page = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+        ids.extend(i for i, m in zip(page["ids"], page["metadatas"]) if m and "file_sha256" in m)
+        if len(page["ids"]) < page_size:
+            return ids
+        offset += page_size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resumable bulk embedding of a document directory via LiteLLM")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    embed = commands.add_parser("embed", help="Index a directory (resumes an existing --out)")
+    embed.add_argument("input", type=Path, help="Directory with the documents")
+    embed.add_argument("--out", type=Path, required=True, help="Index directory")
+    embed.add_argument("--base-url", default=os.environ.get("LITELLM_BASE_URL", "http://localhost:4000/v1"),
+                       help="OpenAI-compatible endpoint (LiteLLM proxy)")
+    embed.add_argument("--api-key", default=os.environ.get("LITELLM_API_KEY", ""), help="Proxy key (LITELLM_API_KEY)")
+    embed.add_argument("--model", default=DEFAULT_MODEL)
+    embed.add_argument("--dtype", choices=["float16", "int8"], default="float16")
+    embed.add_argument("--chunk-size", type=int, default=1000, help="Characters, as OpenWebUI's CHUNK_SIZE")
+    embed.add_argument("--chunk-overlap", type=int, default=100, help="Characters, as OpenWebUI's CHUNK_OVERLAP")
+    embed.add_argument("--extensions", default=DEFAULT_EXTENSIONS)
+    embed.add_argument("--batch-size", type=int, default=32, help="Chunks per /embeddings request")
+    embed.add_argument("--concurrency", type=int, default=4, help="Requests in flight")
+    embed.add_argument("--retries", type=int, default=6)
+    embed.add_argument("--timeout", type=float, default=120.0, help="Seconds per request")
+    embed.add_argument("--checkpoint-s", type=float, default=10.0, help="Seconds between checkpoints")
+
+    show = commands.add_parser("info", help="Summarize an index")
+    show.add_argument("out", type=Path)
+
+    chroma = commands.add_parser("load-chroma", help="Sync an index into a Chroma collection")
+    chroma.add_argument("out", type=Path)
+    chroma.add_argument("--collection", required=True)
+    chroma.add_argument("--chroma-path", type=Path, default=Path("vector_db"), help="PersistentClient directory")
+    chroma.add_argument("--chroma-url", default="", help="Chroma server, e.g. http://localhost:8000")
+    chroma.add_argument("--batch-size", type=int, default=512)
+    args = parser.parse_args()
+
+    if args.command == "embed":
+        if not args.input.is_dir():
+            error(f"Input directory not found: {args.input}")
+            sys.exit(1)
+        try:
+            sys.exit(asyncio.run(embed_command(args)))
+        except KeyboardInterrupt:
+            warning("Interrupted; progress up to the last checkpoint is kept, rerun to resume")
+            sys.exit(130)
+    sys.exit(info_command(args) if args.command == "info" else load_chroma_command(args))
+
+
+if __name__ == "__main__":
+    main()